@@ -0,0 +1,472 @@
+"""
+local catalog of activities
+
+each fit file is read once for its file_id, session and lap
+messages and its summary is saved in a sqlite database indexed
+by start time and sport, so activities are found with a query
+in milliseconds and the record data is only parsed for the hits
+"""
+import json
+import logging
+import os
+import sqlite3
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_data, hash_fit_file
+from analyse_fit_files.parse_fit_file import find_fit_files, get_fit_file_messages
+from analyse_fit_files.summaries import (
+    LOCAL_TIMEZONE,
+    SUMMARY_MESSAGES,
+    activity_summary,
+    json_value,
+    local_start_times,
+    utc_text,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.environ.get(
+    "ANALYSE_FIT_FILES_CATALOG",
+    os.path.join(
+        os.path.expanduser("~"), ".local", "share", "analyse_fit_files", "catalog.sqlite"
+    ),
+)
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    activity_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    file_size INTEGER,
+    modified_time REAL,
+    sport TEXT,
+    sub_sport TEXT,
+    start_time TEXT,
+    duration_s REAL,
+    timer_time_s REAL,
+    distance_m REAL,
+    number_of_laps INTEGER,
+    manufacturer TEXT,
+    product TEXT,
+    serial_number TEXT,
+    added_time TEXT
+);
+CREATE INDEX IF NOT EXISTS activities_start_time ON activities (start_time);
+CREATE INDEX IF NOT EXISTS activities_sport_start_time ON activities (sport, start_time);
+CREATE INDEX IF NOT EXISTS activities_path ON activities (path);
+CREATE TABLE IF NOT EXISTS summaries (
+    activity_id TEXT NOT NULL REFERENCES activities (activity_id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    message_index INTEGER NOT NULL,
+    fields TEXT NOT NULL,
+    PRIMARY KEY (activity_id, message, message_index)
+);
+"""
+
+ACTIVITY_COLUMNS = [
+    "activity_id",
+    "path",
+    "file_size",
+    "modified_time",
+    "sport",
+    "sub_sport",
+    "start_time",
+    "duration_s",
+    "timer_time_s",
+    "distance_m",
+    "number_of_laps",
+    "manufacturer",
+    "product",
+    "serial_number",
+    "added_time",
+]
+
+# columns of the activities table declared REAL
+REAL_ACTIVITY_COLUMNS = ["modified_time", "duration_s", "timer_time_s", "distance_m"]
+
+
+def connect_catalog(catalog_path=DEFAULT_CATALOG_PATH):
+    """
+    this function will open the catalog database,
+    making its tables and indexes if they do not exist
+    options:
+        catalog_path: str
+            path of the sqlite database, defaults to the
+            ANALYSE_FIT_FILES_CATALOG environment variable
+            or ~/.local/share/analyse_fit_files/catalog.sqlite
+    returns:
+        connection: sqlite3 connection
+            open connection to the catalog
+    """
+    if catalog_path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+    connection = sqlite3.connect(catalog_path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(CATALOG_SCHEMA)
+    return connection
+
+
+def _local_bound_as_utc_text(date):
+    """
+    this function will turn a date filter in the local
+    time zone into utc text to compare with start times
+    options:
+        date: str, date or timestamp
+            date or time, naive values are in the local time zone
+    returns:
+        bound_text: str
+            utc time as text
+    """
+    timestamp = pd.Timestamp(date)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(LOCAL_TIMEZONE)
+    bound_text = utc_text(timestamp)
+    return bound_text
+
+
+def _summary_rows(activity_id, fit_messages):
+    """
+    this function will make the rows of the summaries
+    table, one per file_id, session and lap message
+    options:
+        activity_id: str
+            content hash naming the activity
+        fit_messages: dict
+            dictionary of message name to dataframe
+    returns:
+        summary_rows: list
+            (activity_id, message, message_index, fields json) tuples
+    """
+    summary_rows = []
+    for message, message_dataframe in fit_messages.items():
+        for message_index, fields in enumerate(message_dataframe.to_dict(orient="records")):
+            fields = {label: json_value(value) for label, value in fields.items()}
+            summary_rows.append((activity_id, message, message_index, json.dumps(fields)))
+    return summary_rows
+
+
+def _catalogued_activity(connection, path_to_file):
+    """
+    this function will check if a fit file is in the
+    catalog, a file unchanged since it was added is not
+    even hashed and a moved or copied file keeps one
+    entry at its latest path
+    options:
+        connection: sqlite3 connection
+            open connection to the catalog
+        path_to_file: str
+            file path for fit file
+    returns:
+        activity_id: str
+            content hash naming the activity
+        is_catalogued: bool
+            True if the activity is already in the catalog
+    """
+    file_size = os.path.getsize(path_to_file)
+    modified_time = os.path.getmtime(path_to_file)
+    unchanged = connection.execute(
+        "SELECT activity_id FROM activities WHERE path = ? AND file_size = ? AND modified_time = ?",
+        (path_to_file, file_size, modified_time),
+    ).fetchone()
+    if unchanged is not None:
+        return unchanged[0], True
+
+    activity_id = hash_fit_file(path_to_file)
+    with connection:
+        is_catalogued = (
+            connection.execute(
+                "UPDATE activities SET path = ?, file_size = ?, modified_time = ? "
+                "WHERE activity_id = ?",
+                (path_to_file, file_size, modified_time, activity_id),
+            ).rowcount
+            > 0
+        )
+    return activity_id, is_catalogued
+
+
+def _summary_messages_or_error(path_to_file, engine):
+    """
+    this function will read the summary messages of a fit
+    file and report an error instead of raising
+    options:
+        path_to_file: str
+            file path for fit file
+        engine: str
+            native or fitparse
+    returns:
+        fit_messages: dict
+            dictionary of message name to dataframe, None on error
+        error: str
+            why the file could not be read, None if it was
+    """
+    try:
+        fit_messages = get_fit_file_messages(
+            path_to_file, messages=list(SUMMARY_MESSAGES), engine=engine
+        )
+        return fit_messages, None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+
+def _insert_activity(connection, activity_id, path_to_file, fit_messages):
+    """
+    this function will save the summary of a new activity
+    options:
+        connection: sqlite3 connection
+            open connection to the catalog
+        activity_id: str
+            content hash naming the activity
+        path_to_file: str
+            file path for fit file
+        fit_messages: dict
+            dictionary of message name to dataframe with
+            the file_id, session and lap messages
+    returns:
+        None
+    """
+    row = {
+        "activity_id": activity_id,
+        "path": path_to_file,
+        "file_size": os.path.getsize(path_to_file),
+        "modified_time": os.path.getmtime(path_to_file),
+        **activity_summary(fit_messages),
+        "added_time": utc_text(pd.Timestamp.now(tz="UTC")),
+    }
+    with connection:
+        connection.execute(
+            f"INSERT INTO activities ({', '.join(ACTIVITY_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(ACTIVITY_COLUMNS))})",
+            [row[column] for column in ACTIVITY_COLUMNS],
+        )
+        connection.executemany(
+            "INSERT INTO summaries VALUES (?, ?, ?, ?)", _summary_rows(activity_id, fit_messages)
+        )
+
+
+def add_fit_files_to_catalog(
+    path_pattern, catalog_path=DEFAULT_CATALOG_PATH, engine="native", workers=os.cpu_count()
+):
+    """
+    this function will add fit files to the catalog, reading
+    only their file_id, session and lap messages in parallel,
+    files already in the catalog are skipped without being
+    read and a file that cannot be read is logged and skipped
+    options:
+        path_pattern: str or list
+            fit file, folder searched recursively for fit
+            files, glob pattern or list of fit file paths
+        catalog_path: str
+            path of the sqlite database
+        engine: str
+            native to step over the records or fitparse
+        workers: int
+            number of processes reading new fit files
+    returns:
+        activity_ids: list
+            content hashes of the activities, None for
+            files that could not be read
+    """
+    fit_file_paths = find_fit_files(path_pattern)
+    activity_ids = [None] * len(fit_file_paths)
+    new_activities, copies = {}, {}
+    connection = connect_catalog(catalog_path)
+    try:
+        for position, path_to_file in enumerate(fit_file_paths):
+            try:
+                activity_id, is_catalogued = _catalogued_activity(connection, path_to_file)
+            except OSError as error:
+                logger.error(f"could not add '{path_to_file}' to the catalog: {error}")
+                continue
+            if is_catalogued:
+                activity_ids[position] = activity_id
+            elif activity_id in copies:
+                copies[activity_id].append(position)
+            else:
+                new_activities[position] = activity_id
+                copies[activity_id] = []
+
+        new_paths = [fit_file_paths[position] for position in new_activities]
+        engines = [engine] * len(new_paths)
+        workers = max(1, min(workers or 1, len(new_paths)))
+        if workers == 1:
+            read_results = map(_summary_messages_or_error, new_paths, engines)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            read_results = executor.map(
+                _summary_messages_or_error,
+                new_paths,
+                engines,
+                chunksize=max(1, len(new_paths) // (workers * 8)),
+            )
+        try:
+            for (position, activity_id), (fit_messages, error) in zip(
+                new_activities.items(), read_results
+            ):
+                if error is not None:
+                    logger.error(
+                        f"could not add '{fit_file_paths[position]}' to the catalog: {error}"
+                    )
+                    continue
+                _insert_activity(connection, activity_id, fit_file_paths[position], fit_messages)
+                for added_position in [position] + copies[activity_id]:
+                    activity_ids[added_position] = activity_id
+        finally:
+            if workers > 1:
+                executor.shutdown()
+    finally:
+        connection.close()
+    number_added = sum(activity_ids[position] is not None for position in new_activities)
+    logger.info(f"added {number_added} of {len(fit_file_paths)} fit files to '{catalog_path}'")
+    return activity_ids
+
+
+def query_activities(
+    sport=None,
+    start=None,
+    end=None,
+    min_distance_m=None,
+    max_distance_m=None,
+    min_duration_s=None,
+    max_duration_s=None,
+    catalog_path=DEFAULT_CATALOG_PATH,
+):
+    """
+    this function will select activities from the catalog
+    such as all runs over 20 km in 2025 with
+    query_activities("running", "2025-01-01", "2026-01-01", min_distance_m=20000)
+    options:
+        sport: str or list
+            sport or sports to keep such as running, None for every sport
+        start: str, date or timestamp
+            earliest start time kept, naive dates are in the local time zone
+        end: str, date or timestamp
+            start times from this time on are left out
+        min_distance_m: float
+            shortest distance kept in meters
+        max_distance_m: float
+            longest distance kept in meters
+        min_duration_s: float
+            shortest elapsed time kept in seconds
+        max_duration_s: float
+            longest elapsed time kept in seconds
+        catalog_path: str
+            path of the sqlite database
+    returns:
+        activities: dataframe
+            one row per activity sorted by start time, with
+            start_time in the local time zone
+    """
+    conditions, parameters = [], []
+    if sport is not None:
+        sports = [sport] if isinstance(sport, str) else list(sport)
+        conditions.append(f"sport IN ({', '.join('?' * len(sports))})")
+        parameters.extend(sports)
+    for column, operator, value in (
+        ("start_time", ">=", None if start is None else _local_bound_as_utc_text(start)),
+        ("start_time", "<", None if end is None else _local_bound_as_utc_text(end)),
+        ("distance_m", ">=", min_distance_m),
+        ("distance_m", "<=", max_distance_m),
+        ("duration_s", ">=", min_duration_s),
+        ("duration_s", "<=", max_duration_s),
+    ):
+        if value is not None:
+            conditions.append(f"{column} {operator} ?")
+            parameters.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    connection = connect_catalog(catalog_path)
+    try:
+        activities = pd.read_sql_query(
+            f"SELECT * FROM activities {where} ORDER BY start_time",
+            connection,
+            params=parameters,
+        )
+    finally:
+        connection.close()
+    # sqlite gives untyped columns when nothing matches, so the real columns are cast
+    activities = activities.astype({column: "float64" for column in REAL_ACTIVITY_COLUMNS})
+    activities["start_time"] = local_start_times(activities["start_time"])
+    return activities
+
+
+def activity_messages(activity_id, message="lap", catalog_path=DEFAULT_CATALOG_PATH):
+    """
+    this function will give the saved file_id, session
+    or lap messages of an activity without reading its fit file
+    options:
+        activity_id: str
+            content hash naming the activity
+        message: str
+            file_id, session or lap
+        catalog_path: str
+            path of the sqlite database
+    returns:
+        message_dataframe: dataframe
+            one row per message with times as utc text
+    """
+    connection = connect_catalog(catalog_path)
+    try:
+        rows = connection.execute(
+            "SELECT fields FROM summaries WHERE activity_id = ? AND message = ? "
+            "ORDER BY message_index",
+            (activity_id, message),
+        ).fetchall()
+    finally:
+        connection.close()
+    message_dataframe = pd.DataFrame([json.loads(fields) for (fields,) in rows])
+    return message_dataframe
+
+
+def iter_activity_records(activities, engine="fitparse", fields=None):
+    """
+    this function will parse the record data of selected
+    activities one at a time, only when it is asked for
+    options:
+        activities: dataframe
+            activities from query_activities
+        engine: str
+            fitparse or native
+        fields: list
+            names of the record fields to keep, None for every field
+    yields:
+        activity_id: str
+            content hash naming the activity
+        fit_file_dataframe: dataframe
+            parsed record data of the activity
+    """
+    for activity_id, path_to_file in zip(activities["activity_id"], activities["path"]):
+        fit_file_dataframe = get_cached_fit_file_data(
+            path_to_file=path_to_file, engine=engine, fields=fields
+        )
+        yield activity_id, fit_file_dataframe
+
+
+def remove_missing_activities(catalog_path=DEFAULT_CATALOG_PATH):
+    """
+    this function will remove activities whose fit
+    file no longer exists from the catalog
+    options:
+        catalog_path: str
+            path of the sqlite database
+    returns:
+        removed_activity_ids: list
+            content hashes of the removed activities
+    """
+    connection = connect_catalog(catalog_path)
+    try:
+        removed_activity_ids = [
+            activity_id
+            for activity_id, path_to_file in connection.execute(
+                "SELECT activity_id, path FROM activities"
+            ).fetchall()
+            if not os.path.exists(path_to_file)
+        ]
+        with connection:
+            connection.executemany(
+                "DELETE FROM activities WHERE activity_id = ?",
+                [(activity_id,) for activity_id in removed_activity_ids],
+            )
+    finally:
+        connection.close()
+    return removed_activity_ids
@@ -0,0 +1,264 @@
+"""
+common timeline for comparing devices
+
+every device is put on one shared time grid with as of joins,
+after moving its timestamps by the clock lag found from the
+cross correlation of a signal against a reference device
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.parse_fit_file import (
+    get_earliest_maximum_timestamp,
+    get_latest_minimum_timestamp,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _numeric_signals(fit_file_dataframe, signals):
+    """
+    this function will give the signals of a dataframe as floats
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+        signals: list
+            columns to keep, missing columns are left out
+    returns:
+        numeric_dataframe: dataframe
+            timestamp_None and the float signals sorted by time
+    """
+    numeric_dataframe = pd.DataFrame(
+        {
+            signal: pd.to_numeric(fit_file_dataframe[signal], errors="coerce").astype(float)
+            for signal in signals
+            if signal in fit_file_dataframe.columns
+        }
+    )
+    numeric_dataframe.insert(0, "timestamp_None", fit_file_dataframe["timestamp_None"])
+    numeric_dataframe = numeric_dataframe.dropna(subset=["timestamp_None"]).sort_values(
+        "timestamp_None", kind="stable", ignore_index=True
+    )
+    return numeric_dataframe
+
+
+def resample_to_grid(fit_file_dataframe, grid, signals, tolerance="2s"):
+    """
+    this function will put the signals of a dataframe on a
+    time grid, taking the nearest sample to each grid time
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+        grid: datetimeindex
+            times to sample at
+        signals: list
+            columns to resample
+        tolerance: str
+            furthest a sample may be from a grid time,
+            grid times with no sample this close are missing
+    returns:
+        grid_dataframe: dataframe
+            one row per grid time indexed by timestamp_None
+    """
+    numeric_dataframe = _numeric_signals(fit_file_dataframe, signals)
+    grid_dataframe = pd.merge_asof(
+        pd.DataFrame({"timestamp_None": grid}),
+        numeric_dataframe.astype({"timestamp_None": grid.dtype}),
+        on="timestamp_None",
+        direction="nearest",
+        tolerance=pd.Timedelta(tolerance),
+    ).set_index("timestamp_None")
+    return grid_dataframe
+
+
+def _standardize(values, is_present):
+    """
+    this function will scale a signal to zero mean and
+    unit variance with missing samples set to zero
+    options:
+        values: array
+            signal on the grid
+        is_present: array
+            True where the signal has a sample
+    returns:
+        standardized_values: array
+            scaled signal
+    """
+    values = values - values[is_present].mean()
+    scale = values[is_present].std()
+    standardized_values = np.where(is_present, values / scale if scale > 0 else 0.0, 0.0)
+    return standardized_values
+
+
+def _cross_correlate(first, second):
+    """
+    this function will cross correlate two signals of the
+    same length with the fft, padding so nothing wraps around
+    options:
+        first: array
+            first signal
+        second: array
+            second signal
+    returns:
+        correlation: array
+            correlation[k] is the sum of first[t] * second[t + k],
+            negative k are counted from the end
+    """
+    fft_length = 1 << int(2 * len(first) - 1).bit_length()
+    correlation = np.fft.irfft(
+        np.conj(np.fft.rfft(first, fft_length)) * np.fft.rfft(second, fft_length),
+        fft_length,
+    )
+    return correlation
+
+
+def estimate_clock_lag(reference_values, values, max_lag_samples, min_overlap=0.5):
+    """
+    this function will find how far a signal runs ahead of a
+    reference signal on the same grid from the peak of their
+    cross correlation, worked out with the fft
+    options:
+        reference_values: array
+            reference signal on the grid, nan where missing
+        values: array
+            signal to compare on the grid, nan where missing
+        max_lag_samples: int
+            largest lag searched in grid steps
+        min_overlap: float
+            smallest share of the shorter signal that must
+            overlap the reference for a lag to count
+    returns:
+        lag_samples: int
+            grid steps the signal runs ahead of the reference,
+            0 when no lag can be found
+    """
+    reference_values = np.asarray(reference_values, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    reference_present = ~np.isnan(reference_values)
+    present = ~np.isnan(values)
+    if reference_present.sum() < 2 or present.sum() < 2:
+        return 0
+    number_of_samples = len(values)
+    correlation = _cross_correlate(
+        _standardize(reference_values, reference_present), _standardize(values, present)
+    )
+    overlap = np.rint(
+        _cross_correlate(reference_present.astype(float), present.astype(float))
+    )
+    max_lag_samples = int(min(max_lag_samples, number_of_samples - 1))
+    lags = np.arange(-max_lag_samples, max_lag_samples + 1)
+    overlap = overlap[lags]
+    enough_overlap = overlap >= min_overlap * min(reference_present.sum(), present.sum())
+    if not enough_overlap.any():
+        return 0
+    normalized_correlation = np.where(
+        enough_overlap, correlation[lags] / np.maximum(overlap, 1), -np.inf
+    )
+    lag_samples = int(lags[np.argmax(normalized_correlation)])
+    return lag_samples
+
+
+def align_fit_file_dataframes(
+    fit_file_dataframe_list,
+    datasource_list,
+    signals=None,
+    lag_signal=None,
+    reference=0,
+    frequency="1s",
+    max_lag="5min",
+    tolerance="2s",
+):
+    """
+    this function will align the fit file data of several
+    devices on one time grid covering the time they all
+    recorded, correcting each device clock against the
+    reference device when a lag signal is given
+    options:
+        fit_file_dataframe_list: list
+            list of dataframes to align
+        datasource_list: list
+            list of the device name or name of the source of the data
+        signals: list
+            columns to align, defaults to every numeric column
+            the dataframes share
+        lag_signal: str
+            signal cross correlated to find each device's
+            clock lag such as heart_rate_bpm, None to keep
+            the recorded clocks
+        reference: int
+            position of the device the others are aligned to
+        frequency: str
+            spacing of the time grid
+        max_lag: str
+            largest clock lag searched for
+        tolerance: str
+            furthest a sample may be from a grid time
+    returns:
+        aligned_dataframe: dataframe
+            one row per grid time indexed by timestamp_None with
+            (datasource, signal) columns
+        clock_lags: dict
+            time each device's clock runs ahead of the reference
+    """
+    if len(fit_file_dataframe_list) != len(datasource_list):
+        raise ValueError("every dataframe needs a datasource name")
+    if signals is None:
+        shared_columns = set.intersection(
+            *[set(dataframe.columns) for dataframe in fit_file_dataframe_list]
+        )
+        reference_dataframe = fit_file_dataframe_list[reference]
+        signals = [
+            column
+            for column in reference_dataframe.columns
+            if column in shared_columns
+            and column != "timestamp_None"
+            and pd.to_numeric(reference_dataframe[column], errors="coerce").notna().any()
+        ]
+    step = pd.Timedelta(frequency)
+
+    clock_lags = {datasource: pd.Timedelta(0) for datasource in datasource_list}
+    if lag_signal is not None:
+        # the lags are found on a grid covering every device
+        full_grid = pd.date_range(
+            start=min(df["timestamp_None"].min() for df in fit_file_dataframe_list).floor(step),
+            end=max(df["timestamp_None"].max() for df in fit_file_dataframe_list).ceil(step),
+            freq=step,
+        )
+        lag_values = [
+            resample_to_grid(dataframe, full_grid, [lag_signal], tolerance)
+            .reindex(columns=[lag_signal])[lag_signal]
+            .to_numpy()
+            for dataframe in fit_file_dataframe_list
+        ]
+        max_lag_samples = int(pd.Timedelta(max_lag) / step)
+        for position, datasource in enumerate(datasource_list):
+            if position == reference:
+                continue
+            lag_samples = estimate_clock_lag(
+                lag_values[reference], lag_values[position], max_lag_samples
+            )
+            clock_lags[datasource] = lag_samples * step
+            logger.info(f"'{datasource}' clock runs {clock_lags[datasource]} ahead of the reference")
+
+    shifted_dataframes = [
+        dataframe.assign(timestamp_None=dataframe["timestamp_None"] - clock_lags[datasource])
+        for dataframe, datasource in zip(fit_file_dataframe_list, datasource_list)
+    ]
+    grid = pd.date_range(
+        start=get_latest_minimum_timestamp(shifted_dataframes).ceil(step),
+        end=get_earliest_maximum_timestamp(shifted_dataframes).floor(step),
+        freq=step,
+        name="timestamp_None",
+    )
+    aligned_dataframe = pd.concat(
+        {
+            datasource: resample_to_grid(dataframe, grid, signals, tolerance).reindex(
+                columns=signals
+            )
+            for dataframe, datasource in zip(shifted_dataframes, datasource_list)
+        },
+        axis=1,
+    )
+    return aligned_dataframe, clock_lags
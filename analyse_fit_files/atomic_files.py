@@ -0,0 +1,105 @@
+"""
+atomic file writes
+
+every output is written to a temporary file next to it and moved
+into place, so readers and up to date checks never see a partly
+written file, and the output is left readable like any other file,
+stores changed by read, modify and write take a lock file first
+"""
+import contextlib
+import os
+import tempfile
+import time
+
+# mode of every output, mkstemp would leave it private to the owner
+OUTPUT_FILE_MODE = 0o644
+
+# file held by the process changing the files of a directory
+LOCK_FILE_NAME = ".lock"
+
+
+def replace_atomically(save_path, write):
+    """
+    this function will write a file to a temporary file
+    next to it and move it into place so readers never
+    see a partly written file
+    options:
+        save_path: str
+            path of the file to write
+        write: callable
+            called with the temporary path to write to
+    returns:
+        result: object
+            whatever write returned
+    """
+    save_directory = os.path.dirname(os.path.abspath(save_path))
+    os.makedirs(save_directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=save_directory, suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        result = write(temporary_path)
+        os.chmod(temporary_path, OUTPUT_FILE_MODE)
+        os.replace(temporary_path, save_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return result
+
+
+def write_parquet_atomically(dataframe, save_path):
+    """
+    this function will atomically write a dataframe to a parquet file
+    options:
+        dataframe: dataframe
+            dataframe to write
+        save_path: str
+            path of the parquet file
+    returns:
+        None
+    """
+    replace_atomically(
+        save_path, lambda temporary_path: dataframe.to_parquet(temporary_path, index=False)
+    )
+
+
+@contextlib.contextmanager
+def locked_directory(directory, timeout_seconds=60.0, stale_seconds=600.0):
+    """
+    this function will hold a lock file in a directory so a read,
+    modify and write of the files in it by one process never
+    loses the changes of another, a lock older than
+    stale_seconds is left from a crashed process and taken over
+    options:
+        directory: str
+            directory to lock
+        timeout_seconds: float
+            longest time to wait for the lock
+        stale_seconds: float
+            age after which a lock file is ignored
+    returns:
+        None
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock_path = os.path.join(directory, LOCK_FILE_NAME)
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            file_descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_seconds:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue  # released while checking
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"could not lock '{directory}' within {timeout_seconds}s")
+            time.sleep(0.05)
+    try:
+        os.write(file_descriptor, str(os.getpid()).encode())
+        os.close(file_descriptor)
+        yield
+    finally:
+        os.remove(lock_path)
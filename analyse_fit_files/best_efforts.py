@@ -0,0 +1,339 @@
+"""
+persistent store of best effort curves
+
+each activity's mean max curves are computed once when it is
+added and merged into envelopes of the best efforts over all
+time and over the last 42, 90 and 365 days, for every sport
+together and for each sport on its own, every point keeping
+the activity and the time that set it
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.atomic_files import locked_directory, write_parquet_atomically
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_messages, hash_fit_file
+from analyse_fit_files.parquet_store import read_table, table_path
+from analyse_fit_files.peak_curves import hold_on_second_grid, log_spaced_durations, mean_max
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BEST_EFFORTS_DIRECTORY = os.environ.get(
+    "ANALYSE_FIT_FILES_BEST_EFFORTS",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "analyse_fit_files", "best_efforts"),
+)
+
+# envelope name and the number of days it looks back, None for all time
+ENVELOPE_WINDOWS = {"all_time": None, "42d": 42, "90d": 90, "365d": 365}
+
+# sport of the envelopes that hold every sport together
+ALL_SPORTS = "all"
+
+DEFAULT_BEST_EFFORT_SIGNALS = ("speed_m/s", "power_watts", "heart_rate_bpm")
+
+# 1 second to 6 hours
+DEFAULT_BEST_EFFORT_DURATIONS = log_spaced_durations(6 * 3600, number_of_durations=100)
+
+CURVE_COLUMNS = [
+    "activity_id",
+    "sport",
+    "activity_start",
+    "signal",
+    "duration",
+    "value",
+    "timestamp",
+]
+
+ENVELOPE_KEYS = ["envelope", "sport", "signal", "duration"]
+
+ENVELOPE_COLUMNS = ENVELOPE_KEYS + ["value", "activity_id", "activity_start", "timestamp"]
+
+
+def _concat(dataframes, columns):
+    """
+    this function will join tables, skipping empty ones
+    options:
+        dataframes: list
+            tables to join
+        columns: list
+            columns of the joined table
+    returns:
+        joined_dataframe: dataframe
+            joined table with a fresh index
+    """
+    dataframes = [dataframe[columns] for dataframe in dataframes if not dataframe.empty]
+    if not dataframes:
+        return pd.DataFrame(columns=columns)
+    joined_dataframe = pd.concat(dataframes, ignore_index=True)
+    return joined_dataframe
+
+
+def _best_rows(candidates):
+    """
+    this function will keep the highest value
+    for each point of each envelope
+    options:
+        candidates: dataframe
+            envelope rows competing for each point
+    returns:
+        best_dataframe: dataframe
+            one row per envelope point
+    """
+    candidates = candidates.dropna(subset=["value"]).reset_index(drop=True)
+    if candidates.empty:
+        return candidates
+    best_index = candidates["value"].astype(float).groupby(
+        [candidates[key] for key in ENVELOPE_KEYS], sort=True
+    ).idxmax()
+    best_dataframe = candidates.loc[best_index.to_numpy()].reset_index(drop=True)
+    return best_dataframe
+
+
+def _envelope_candidates(curves, as_of, envelopes=ENVELOPE_WINDOWS):
+    """
+    this function will label activity curves with every
+    envelope they belong to on the date as_of
+    options:
+        curves: dataframe
+            activity curves from the store
+        as_of: timestamp
+            date the envelopes look back from
+        envelopes: list
+            names of the envelopes to fill
+    returns:
+        candidates: dataframe
+            envelope rows for the curves
+    """
+    candidates = []
+    for envelope in envelopes:
+        window_days = ENVELOPE_WINDOWS[envelope]
+        in_window = curves["activity_start"] <= as_of
+        if window_days is not None:
+            in_window &= curves["activity_start"] >= as_of - pd.Timedelta(days=window_days)
+        window_curves = curves[in_window]
+        candidates.append(window_curves.assign(envelope=envelope))
+        candidates.append(window_curves.assign(envelope=envelope, sport=ALL_SPORTS))
+    candidates = _concat(candidates, ENVELOPE_COLUMNS)
+    return candidates
+
+
+def _refresh_expired(envelopes, curves, as_of):
+    """
+    this function will rebuild the envelopes holding points set
+    by activities that have left their window, from the stored
+    activity curves rather than from the fit files
+    options:
+        envelopes: dataframe
+            envelopes from the store
+        curves: dataframe
+            activity curves from the store
+        as_of: timestamp
+            date the envelopes look back from
+    returns:
+        envelopes: dataframe
+            envelopes with no expired points
+    """
+    expired_envelopes = []
+    for envelope, window_days in ENVELOPE_WINDOWS.items():
+        if window_days is None:
+            continue
+        activity_starts = envelopes.loc[envelopes["envelope"] == envelope, "activity_start"]
+        if (activity_starts < as_of - pd.Timedelta(days=window_days)).any():
+            expired_envelopes.append(envelope)
+    if not expired_envelopes:
+        return envelopes
+    logger.debug(f"rebuilding expired envelopes {expired_envelopes}")
+    envelopes = _concat(
+        [
+            envelopes[~envelopes["envelope"].isin(expired_envelopes)],
+            _best_rows(_envelope_candidates(curves, as_of, expired_envelopes)),
+        ],
+        ENVELOPE_COLUMNS,
+    )
+    return envelopes
+
+
+def activity_best_efforts(
+    fit_file_dataframe,
+    activity_id,
+    sport,
+    signals=DEFAULT_BEST_EFFORT_SIGNALS,
+    durations=DEFAULT_BEST_EFFORT_DURATIONS,
+):
+    """
+    this function will find the mean max curve of each
+    signal of one activity, resampled to one second first
+    so smart recording and pauses give true durations
+    options:
+        fit_file_dataframe: dataframe
+            parsed records of the activity
+        activity_id: str
+            name of the activity in the store
+        sport: str
+            sport of the activity such as running or cycling
+        signals: list
+            columns to find the best efforts of, missing
+            columns are left out
+        durations: list
+            window lengths in seconds
+    returns:
+        activity_curve: dataframe
+            one row per signal and duration with the best
+            value and the time its window starts
+    """
+    signals = [signal for signal in signals if signal in fit_file_dataframe.columns]
+    records = fit_file_dataframe.dropna(subset=["timestamp_None"]).sort_values("timestamp_None")
+    if not signals or records.empty:
+        return pd.DataFrame(columns=CURVE_COLUMNS)
+    activity_start = records["timestamp_None"].iloc[0]
+    seconds = (records["timestamp_None"] - activity_start).dt.total_seconds().to_numpy()
+    values = np.column_stack(
+        [
+            pd.to_numeric(records[signal], errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+            for signal in signals
+        ]
+    )
+    grid_seconds, grid_values = hold_on_second_grid(seconds, values)
+    durations = np.asarray(durations, dtype=np.int64)
+    best_averages, best_starts = mean_max(grid_values, durations, return_starts=True)
+    best_starts = best_starts.T.ravel()
+    activity_curve = pd.DataFrame(
+        {
+            "activity_id": activity_id,
+            "sport": sport,
+            "activity_start": activity_start,
+            "signal": np.repeat(signals, len(durations)),
+            "duration": np.tile(durations, len(signals)),
+            "value": best_averages.T.ravel(),
+            "timestamp": activity_start
+            + pd.to_timedelta(np.where(best_starts < 0, np.nan, best_starts), unit="s"),
+        }
+    )
+    activity_curve = activity_curve.dropna(subset=["value"]).reset_index(drop=True)
+    return activity_curve
+
+
+def add_activity_to_best_efforts(
+    path_to_file,
+    sport=None,
+    store_directory=DEFAULT_BEST_EFFORTS_DIRECTORY,
+    engine="fitparse",
+    signals=DEFAULT_BEST_EFFORT_SIGNALS,
+    durations=DEFAULT_BEST_EFFORT_DURATIONS,
+):
+    """
+    this function will add an activity to the best effort
+    store, computing only its own curves and merging them
+    into the envelopes, adding the same fit file again does nothing
+    options:
+        path_to_file: str
+            file path for fit file
+        sport: str
+            sport of the activity, read from the session
+            message of the fit file if not given
+        store_directory: str
+            directory of the best effort store, defaults to the
+            ANALYSE_FIT_FILES_BEST_EFFORTS environment variable
+            or ~/.local/share/analyse_fit_files/best_efforts
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        signals: list
+            columns to find the best efforts of
+        durations: list
+            window lengths in seconds
+    returns:
+        activity_id: str
+            content hash naming the activity in the store
+    """
+    activity_id = hash_fit_file(path_to_file)
+    curves = read_table(store_directory, "curves", CURVE_COLUMNS)
+    if (curves["activity_id"] == activity_id).any():
+        logger.info(f"'{path_to_file}' is already in the best effort store")
+        return activity_id
+
+    fit_messages = get_cached_fit_file_messages(
+        path_to_file=path_to_file,
+        messages=["record", "session"],
+        engine=engine,
+    )
+    if sport is None:
+        session_sports = fit_messages["session"].get("sport_None", pd.Series(dtype=object))
+        sport = session_sports.dropna().iloc[0] if session_sports.notna().any() else "generic"
+    activity_curve = activity_best_efforts(
+        fit_messages["record"], activity_id, str(sport), signals, durations
+    )
+
+    # the tables are read again under the lock so concurrent adds are all kept
+    with locked_directory(store_directory):
+        curves = read_table(store_directory, "curves", CURVE_COLUMNS)
+        if (curves["activity_id"] == activity_id).any():
+            logger.info(f"'{path_to_file}' is already in the best effort store")
+            return activity_id
+        curves = _concat([curves, activity_curve], CURVE_COLUMNS)
+
+        as_of = pd.Timestamp.now(tz="UTC")
+        envelopes = read_table(store_directory, "envelopes", ENVELOPE_COLUMNS)
+        envelopes = _best_rows(
+            _concat([envelopes, _envelope_candidates(activity_curve, as_of)], ENVELOPE_COLUMNS)
+        )
+        envelopes = _refresh_expired(envelopes, curves, as_of)
+
+        write_parquet_atomically(curves, table_path(store_directory, "curves"))
+        write_parquet_atomically(envelopes, table_path(store_directory, "envelopes"))
+    logger.info(f"added '{path_to_file}' to the best effort store as {activity_id}")
+    return activity_id
+
+
+def season_best_curve(
+    signal="power_watts",
+    envelope="all_time",
+    sport=None,
+    store_directory=DEFAULT_BEST_EFFORTS_DIRECTORY,
+    as_of=None,
+):
+    """
+    this function will read the best effort curve
+    of a signal from the store
+    options:
+        signal: str
+            column such as power_watts or speed_m/s
+        envelope: str
+            all_time, 42d, 90d or 365d
+        sport: str
+            sport such as running, None for every sport
+        store_directory: str
+            directory of the best effort store
+        as_of: timestamp
+            date the envelope looks back from, None for now,
+            other dates are worked out from the activity curves
+    returns:
+        best_effort_curve: dataframe
+            best value for each duration with the activity
+            and the time of the window that set it
+    """
+    if envelope not in ENVELOPE_WINDOWS:
+        raise ValueError(f"envelope must be one of {list(ENVELOPE_WINDOWS)}, got '{envelope}'")
+    if as_of is None:
+        envelopes = read_table(store_directory, "envelopes", ENVELOPE_COLUMNS)
+        curves = read_table(store_directory, "curves", CURVE_COLUMNS)
+        envelopes = _refresh_expired(envelopes, curves, pd.Timestamp.now(tz="UTC"))
+    else:
+        as_of = pd.Timestamp(as_of)
+        if as_of.tzinfo is None:
+            as_of = as_of.tz_localize("US/Eastern")
+        curves = read_table(store_directory, "curves", CURVE_COLUMNS)
+        envelopes = _best_rows(_envelope_candidates(curves, as_of, [envelope]))
+    best_effort_curve = envelopes[
+        (envelopes["envelope"] == envelope)
+        & (envelopes["sport"] == (ALL_SPORTS if sport is None else sport))
+        & (envelopes["signal"] == signal)
+    ]
+    best_effort_curve = best_effort_curve[
+        ["duration", "value", "activity_id", "activity_start", "timestamp"]
+    ].sort_values("duration", ignore_index=True)
+    return best_effort_curve
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+# narrowest dtype that holds every value of the known fit fields
+COMPACT_DTYPES = {
+    "heart_rate_bpm": "uint8",
+    "cadence_rpm": "uint8",
+    "power_watts": "uint16",
+    "accumulated_power_watts": "uint32",
+    "temperature_C": "int8",
+    "calories_kcal": "uint16",
+    "position_lat_semicircles": "int32",
+    "position_long_semicircles": "int32",
+    "speed_m/s": "float32",
+    "enhanced_speed_m/s": "float32",
+    "altitude_m": "float32",
+    "enhanced_altitude_m": "float32",
+    "grade_%": "float32",
+    "vertical_oscillation_mm": "float32",
+    "stance_time_ms": "float32",
+    "step_length_mm": "float32",
+}
+
+# pandas dtypes that keep missing values for integer columns
+NULLABLE_INTEGER_DTYPES = {
+    "uint8": "UInt8",
+    "uint16": "UInt16",
+    "uint32": "UInt32",
+    "int8": "Int8",
+    "int16": "Int16",
+    "int32": "Int32",
+}
+
+
+def _compact_numeric_column(column, dtype):
+    """
+    this function will convert a column to a narrower
+    numeric dtype if every value fits in it
+    options:
+        column: series
+            column of the parsed fit file data
+        dtype: str
+            narrower numpy dtype for the column
+    returns:
+        compact_column: series
+            converted column, or the original column when
+            the values do not fit in the dtype
+    """
+    numeric_column = pd.to_numeric(column, errors="coerce")
+    if (numeric_column.isna() & column.notna()).any():
+        return column  # not every value is a number
+    if dtype in NULLABLE_INTEGER_DTYPES:
+        values = numeric_column.dropna()
+        limits = np.iinfo(dtype)
+        if not ((values % 1 == 0).all() and values.between(limits.min, limits.max).all()):
+            return column
+        if numeric_column.isna().any():
+            return numeric_column.astype(NULLABLE_INTEGER_DTYPES[dtype])
+    return numeric_column.astype(dtype)
+
+
+def _is_enum_like(column):
+    """
+    this function will check if an object column
+    holds a small set of repeated strings
+    options:
+        column: series
+            column of the parsed fit file data
+    returns:
+        is_enum_like: bool
+            True if the column should be categorical
+    """
+    values = column.dropna()
+    if values.empty or not values.map(lambda value: isinstance(value, str)).all():
+        return False
+    return values.nunique() <= max(1, len(values) // 2)
+
+
+def compact_fit_file_dataframe(fit_file_dataframe):
+    """
+    this function will give each column of the parsed
+    fit file data the narrowest dtype that holds its values
+    such as uint8 for heart rate, uint16 for power, float32
+    for speed and altitude, int32 for positions and
+    categorical for enum like strings
+    options:
+        fit_file_dataframe: dataframe
+            dataframe of parsed fit file data
+    returns:
+        compact_dataframe: dataframe
+            dataframe with the compact dtypes
+    """
+    compact_dataframe = fit_file_dataframe.copy()
+    for column_label in compact_dataframe.columns:
+        column = compact_dataframe[column_label]
+        if column_label in COMPACT_DTYPES:
+            column = _compact_numeric_column(column, COMPACT_DTYPES[column_label])
+        elif column.dtype == object:
+            if _is_enum_like(column):
+                column = column.astype("category")
+            else:
+                column = column.infer_objects()
+        compact_dataframe[column_label] = column
+    return compact_dataframe
+
+
+def memory_usage_report(fit_file_dataframe, compact_dataframe=None):
+    """
+    this function will report the memory used by each
+    column before and after making the dtypes compact
+    options:
+        fit_file_dataframe: dataframe
+            dataframe of parsed fit file data
+        compact_dataframe: dataframe
+            compact version of the dataframe, made with
+            compact_fit_file_dataframe if not given
+    returns:
+        memory_report: dataframe
+            dtypes and bytes per column before and after,
+            with a total row at the bottom
+    """
+    if compact_dataframe is None:
+        compact_dataframe = compact_fit_file_dataframe(fit_file_dataframe)
+    memory_report = pd.DataFrame(
+        {
+            "dtype_before": fit_file_dataframe.dtypes.astype(str),
+            "dtype_after": compact_dataframe.dtypes.astype(str),
+            "bytes_before": fit_file_dataframe.memory_usage(index=False, deep=True),
+            "bytes_after": compact_dataframe.memory_usage(index=False, deep=True),
+        }
+    )
+    memory_report.loc["total"] = [
+        "",
+        "",
+        memory_report["bytes_before"].sum(),
+        memory_report["bytes_after"].sum(),
+    ]
+    memory_report["percent_saved"] = (
+        100 * (1 - memory_report["bytes_after"] / memory_report["bytes_before"])
+    ).round(1)
+    return memory_report
@@ -0,0 +1,179 @@
+"""
+shape preserving downsampling of signals for plotting
+
+long activities have far more samples than a plot has pixels,
+these functions pick the samples worth drawing with the
+largest triangle three buckets method or a min max envelope
+"""
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+# points drawn per trace by the plotting functions
+DEFAULT_MAX_POINTS = 2000
+
+
+def _as_float(values):
+    """
+    this function will give numbers, dates or times as floats
+    options:
+        values: array like
+            values of a signal or its time axis
+    returns:
+        float_values: array
+            values as floats, nan where missing
+    """
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_localize(None)
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        float_values = values.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        float_values[values.isna().to_numpy()] = np.nan
+        return float_values
+    float_values = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return float_values
+
+
+def lttb_indices(x, y, number_of_points):
+    """
+    this function will pick the samples to keep with the
+    largest triangle three buckets method, which keeps the
+    first and last samples and from every bucket between them
+    the sample making the largest triangle with its neighbours
+    options:
+        x: array
+            sorted sample times as floats
+        y: array
+            sample values as floats with no missing values
+        number_of_points: int
+            number of samples to keep, at least 3
+    returns:
+        indices: array
+            positions of the kept samples
+    """
+    number_of_samples = len(y)
+    if number_of_points >= number_of_samples or number_of_points < 3:
+        return np.arange(number_of_samples)
+    bucket_edges = np.linspace(1, number_of_samples - 1, number_of_points - 1).astype(np.int64)
+    indices = np.empty(number_of_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, number_of_samples - 1
+    previous = 0
+    for bucket in range(number_of_points - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_end = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else number_of_samples
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # twice the triangle area, the factor makes no difference to the largest
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def min_max_indices(y, number_of_points):
+    """
+    this function will pick the lowest and highest
+    sample of every bucket so the envelope of the
+    signal is kept exactly
+    options:
+        y: array
+            sample values as floats, nan where missing
+        number_of_points: int
+            number of samples to keep, two per bucket
+    returns:
+        indices: array
+            sorted positions of the kept samples
+    """
+    number_of_samples = len(y)
+    number_of_buckets = max(1, number_of_points // 2)
+    if number_of_points >= number_of_samples:
+        return np.arange(number_of_samples)
+    bucket_size = -(-number_of_samples // number_of_buckets)
+    padding = bucket_size * number_of_buckets - number_of_samples
+    buckets = np.concatenate((y, np.full(padding, np.nan))).reshape(number_of_buckets, bucket_size)
+    is_empty = np.isnan(buckets).all(axis=1)
+    offsets = np.arange(number_of_buckets)[~is_empty] * bucket_size
+    filled_buckets = buckets[~is_empty]
+    indices = np.unique(
+        np.concatenate(
+            (
+                offsets + np.nanargmin(filled_buckets, axis=1),
+                offsets + np.nanargmax(filled_buckets, axis=1),
+            )
+        )
+    )
+    return indices
+
+
+def downsample_indices(x, y, number_of_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """
+    this function will pick about number_of_points samples
+    that keep the shape of a signal, always keeping its
+    lowest and highest sample
+    options:
+        x: array like
+            sample times, numbers or dates
+        y: array like
+            sample values
+        number_of_points: int
+            number of samples wanted, None to keep every sample
+        method: str
+            lttb for largest triangle three buckets, which
+            leaves out missing samples, or minmax for the
+            lowest and highest sample of each bucket
+    returns:
+        indices: array
+            sorted positions of the kept samples
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {DOWNSAMPLE_METHODS}, got '{method}'")
+    y = _as_float(y)
+    if number_of_points is None or len(y) <= number_of_points:
+        return np.arange(len(y))
+    present = np.flatnonzero(~np.isnan(y))
+    if len(present) == 0:
+        return np.arange(len(y))  # not a numeric signal
+    if method == "lttb":
+        x = _as_float(x)
+        indices = present[lttb_indices(x[present], y[present], number_of_points)]
+    else:
+        indices = min_max_indices(y, number_of_points)
+    extremes = present[[np.argmin(y[present]), np.argmax(y[present])]]
+    indices = np.union1d(indices, extremes)
+    return indices
+
+
+def downsample_dataframe(
+    dataframe,
+    signal,
+    number_of_points=DEFAULT_MAX_POINTS,
+    method="lttb",
+    time_column="timestamp_None",
+):
+    """
+    this function will keep the rows of a dataframe
+    needed to draw one signal against time
+    options:
+        dataframe: dataframe
+            parsed fit file data
+        signal: str
+            column to draw
+        number_of_points: int
+            number of rows wanted, None to keep every row
+        method: str
+            lttb or minmax
+        time_column: str
+            column of the sample times
+    returns:
+        downsampled_dataframe: dataframe
+            kept rows in their original order
+    """
+    indices = downsample_indices(
+        dataframe[time_column], dataframe[signal], number_of_points, method
+    )
+    downsampled_dataframe = dataframe.iloc[indices]
+    return downsampled_dataframe
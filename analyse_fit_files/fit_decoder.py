@@ -0,0 +1,998 @@
+"""
+native fit file decoder
+
+reads the fit header, definition messages and data messages straight
+from a memory mapped file. every run of consecutive data messages that
+share a local message type is viewed as a numpy record array without
+copying, and the scale, offset and invalid value handling is applied
+per column. the field names, units and values follow the fitparse
+profile so the columns line up with the fitparse engine. the file
+crc is not checked, a file or message cut short raises FitEOFError
+"""
+import datetime
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from fitparse.processors import UTC_REFERENCE
+from fitparse.profile import FIELD_TYPE_TIMESTAMP, MESSAGE_TYPES
+from fitparse.records import BASE_TYPE_BYTE, BASE_TYPES, DevField
+from fitparse.utils import FitEOFError, FitHeaderError
+
+from analyse_fit_files.instrumentation import count, stage
+
+# numpy type code and invalid value for each fit base type
+NUMPY_BASE_TYPES = {
+    "enum": ("u1", 0xFF),
+    "sint8": ("i1", 0x7F),
+    "uint8": ("u1", 0xFF),
+    "sint16": ("i2", 0x7FFF),
+    "uint16": ("u2", 0xFFFF),
+    "sint32": ("i4", 0x7FFFFFFF),
+    "uint32": ("u4", 0xFFFFFFFF),
+    "string": ("S", None),
+    "float32": ("f4", None),
+    "float64": ("f8", None),
+    "uint8z": ("u1", 0x0),
+    "uint16z": ("u2", 0x0),
+    "uint32z": ("u4", 0x0),
+    "byte": ("u1", None),
+    "sint64": ("i8", 0x7FFFFFFFFFFFFFFF),
+    "uint64": ("u8", 0xFFFFFFFFFFFFFFFF),
+    "uint64z": ("u8", 0x0),
+}
+
+# date_time values below this are relative seconds, not timestamps
+MINIMUM_DATE_TIME = 0x10000000
+
+
+class _FieldDefinition:
+    """field of a definition message and where it sits in the data message"""
+
+    __slots__ = ("def_num", "size", "base_type", "field", "offset", "is_dev")
+
+    def __init__(self, def_num, size, base_type, field, offset, is_dev=False):
+        self.def_num = def_num
+        self.size = size
+        self.base_type = base_type
+        self.field = field
+        self.offset = offset
+        self.is_dev = is_dev
+
+    @property
+    def kind(self):
+        if self.base_type.name == "byte":
+            return "byte"
+        if self.base_type.name == "string":
+            return "string"
+        if self.size > self.base_type.size:
+            return "array"
+        return "scalar"
+
+    @property
+    def numpy_format(self):
+        code = NUMPY_BASE_TYPES[self.base_type.name][0]
+        if code == "S":
+            return f"S{self.size}"
+        count = self.size // self.base_type.size
+        return code if count == 1 and self.base_type.name != "byte" else (code, count)
+
+
+class _Definition:
+    """local message definition with the structured dtype of its data messages"""
+
+    __slots__ = ("mesg_num", "mesg_type", "endian", "field_defs", "size", "dtype", "selected")
+
+    def __init__(self, mesg_num, endian, field_defs, size):
+        self.selected = [True] * len(field_defs)
+        self.mesg_num = mesg_num
+        self.mesg_type = MESSAGE_TYPES.get(mesg_num)
+        self.endian = endian
+        self.field_defs = field_defs
+        self.size = size
+        self.dtype = np.dtype(
+            {
+                "names": ["header"] + [f"f{i}" for i in range(len(field_defs))],
+                "formats": ["u1"]
+                + [self._endian_format(field_def) for field_def in field_defs],
+                "offsets": [0] + [1 + field_def.offset for field_def in field_defs],
+                "itemsize": 1 + size,
+            }
+        )
+
+    def _endian_format(self, field_def):
+        numpy_format = field_def.numpy_format
+        if isinstance(numpy_format, tuple):
+            return (self.endian + numpy_format[0], numpy_format[1])
+        return self.endian + numpy_format
+
+    @property
+    def name(self):
+        return self.mesg_type.name if self.mesg_type else f"unknown_{self.mesg_num}"
+
+
+def _read_fit_bytes(path_to_file):
+    """
+    this function will memory map a fit file
+    or read the bytes of a file like object
+    options:
+        path_to_file: str or file like object
+            file path for fit file or an open fit file
+    returns:
+        fit_bytes: numpy array
+            uint8 array over the bytes of the fit file
+    """
+    if hasattr(path_to_file, "read"):
+        fit_bytes = np.frombuffer(path_to_file.read(), dtype=np.uint8)
+        if hasattr(path_to_file, "seek"):
+            path_to_file.seek(0)
+        return fit_bytes
+    if os.path.getsize(path_to_file) == 0:
+        # an empty file cannot be memory mapped, it is reported as too short instead
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path_to_file, dtype=np.uint8, mode="r")
+
+
+def _fill_value(values):
+    """
+    this function will give the value used
+    for rows where a column has no data
+    options:
+        values: numpy array
+            column values
+    returns:
+        fill_value: object
+            NaT for datetimes and NaN otherwise
+    """
+    if values.dtype.kind == "M":
+        return np.datetime64("NaT")
+    return np.nan
+
+
+def _static_label(field):
+    """
+    this function will give the column label of a profile
+    field without looking at its values
+    options:
+        field: field
+            profile field or subfield
+    returns:
+        label: str
+            column label as name_units
+    """
+    if field.type.name in ("date_time", "local_date_time", "localtime_into_day"):
+        return f"{field.name}_None"
+    return f"{field.name}_{field.units}"
+
+
+def _with_missing(values, missing):
+    """
+    this function will blank out rows of a column
+    promoting integers so they can hold NaN
+    options:
+        values: numpy array
+            column values
+        missing: numpy array
+            boolean mask of rows without data
+    returns:
+        values: numpy array
+            column values with the missing rows blanked
+    """
+    if not missing.any():
+        return values
+    if values.dtype.kind in "iub":
+        values = values.astype(np.float64)
+    else:
+        values = values.copy()
+    values[missing] = _fill_value(values)
+    return values
+
+
+def _parse_string(raw_bytes):
+    """
+    this function will decode a fit string the way fitparse does
+    options:
+        raw_bytes: bytes
+            raw bytes of the string field
+    returns:
+        string: str
+            decoded string or None when empty
+    """
+    return raw_bytes.split(b"\x00", 1)[0].decode("utf-8", errors="replace") or None
+
+
+def _scale_offset_value(field, value):
+    """
+    this function will apply scale and offset to a single value
+    options:
+        field: field
+            profile field or component
+        value: object
+            rendered value
+    returns:
+        value: object
+            value with scale and offset applied
+    """
+    if isinstance(value, tuple):
+        return tuple(_scale_offset_value(field, element) for element in value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if field.scale:
+            value = float(value) / field.scale
+        if field.offset:
+            value = value - field.offset
+    return value
+
+
+class _NativeFitDecoder:
+    """walks a fit file run by run and collects decoded columns"""
+
+    def __init__(self, fit_bytes, message_names, max_run_length=None, field_names=None):
+        self.data = fit_bytes
+        self.message_names = tuple(message_names)
+        self.field_names = None if field_names is None else frozenset(field_names)
+        self.max_run_length = max_run_length
+        self.schemas = {}
+        self.definitions = {}
+        self.developer_fields = {}
+        self.accumulators = {}
+        self.timestamp_accumulator = 0
+        self.segments = {}
+        self.row_counts = {}
+        self.label_order = {}
+
+    ##########
+    # file structure
+
+    def decode(self):
+        for _ in self.iter_decode():
+            pass
+
+    def iter_decode(self):
+        """decode the file one run at a time, yielding after each run"""
+        if len(self.data) < 12:
+            raise FitEOFError(f"Tried to read 12 bytes from .FIT file but got {len(self.data)}")
+        position = 0
+        while position + 12 <= len(self.data):
+            header_size, data_size = self._read_file_header(position)
+            position += header_size
+            end = position + data_size
+            if end > len(self.data):
+                raise FitEOFError(
+                    f"Tried to read {data_size} bytes of data from .FIT file "
+                    f"but got {len(self.data) - position}"
+                )
+            while position < end:
+                position = self._decode_at(position, end)
+                yield position
+            position = end + 2  # crc
+
+    def take(self, name):
+        """assemble the rows decoded so far for a message and clear them"""
+        taken_dataframe = _assemble_segments(
+            self.segments.pop(name, {}),
+            self.row_counts.pop(name, 0),
+            self.label_order.pop(name, {}),
+        )
+        return taken_dataframe
+
+    def _read_file_header(self, position):
+        header = bytes(self.data[position : position + 12])
+        if header[8:12] != b".FIT":
+            raise FitHeaderError("Invalid .FIT File Header")
+        header_size, _, _, data_size = struct.unpack("<2BHI", header[:8])
+        return header_size, data_size
+
+    def _decode_at(self, position, end):
+        header = int(self.data[position])
+        if header & 0x80:
+            local_mesg_num = (header >> 5) & 0x3
+        elif header & 0x40:
+            return self._read_definition(position)
+        else:
+            local_mesg_num = header & 0xF
+        definition = self.definitions.get(local_mesg_num)
+        if definition is None:
+            raise ValueError(
+                f"Got data message with invalid local message type {local_mesg_num}"
+            )
+        count = self._run_length(position, end, header, definition.dtype.itemsize)
+        if count == 0:
+            raise FitEOFError(
+                f"Tried to read {definition.dtype.itemsize} bytes from .FIT file "
+                f"but got {end - position}"
+            )
+        if self.max_run_length:
+            count = min(count, self.max_run_length)
+        messages = np.ndarray(
+            shape=(count,),
+            dtype=definition.dtype,
+            buffer=self.data,
+            offset=position,
+            strides=(definition.dtype.itemsize,),
+        )
+        self._decode_run(definition, messages, compressed=bool(header & 0x80))
+        return position + count * definition.dtype.itemsize
+
+    def _run_length(self, position, end, header, stride):
+        """count the consecutive data messages sharing this header, 0 if the first is cut short"""
+        mask = 0xE0 if header & 0x80 else 0xFF
+        maximum = (end - position) // stride
+        count, step = 0, 64
+        while count < maximum:
+            stop = min(maximum, count + step)
+            headers = self.data[position + count * stride : position + stop * stride : stride]
+            matches = (headers & mask) == (header & mask)
+            if not matches.all():
+                return count + int(np.argmin(matches))
+            count, step = stop, step * 4
+        return count
+
+    def _read_definition(self, position):
+        header = int(self.data[position])
+        endian = ">" if self.data[position + 2] else "<"
+        mesg_num, num_fields = struct.unpack(
+            endian + "HB", bytes(self.data[position + 3 : position + 6])
+        )
+        mesg_type = MESSAGE_TYPES.get(mesg_num)
+        position += 6
+        field_defs, offset = [], 0
+        for def_num, size, base_type_num in np.asarray(
+            self.data[position : position + 3 * num_fields]
+        ).reshape(-1, 3).tolist():
+            field = mesg_type.fields.get(def_num) if mesg_type else None
+            base_type = BASE_TYPES.get(base_type_num, BASE_TYPE_BYTE)
+            if size % base_type.size:
+                raise ValueError(
+                    f"Invalid field size {size} for type '{base_type.name}' "
+                    f"(expected a multiple of {base_type.size})"
+                )
+            if field and field.components:
+                for component in field.components:
+                    if component.accumulate:
+                        self.accumulators[(mesg_num, component.def_num)] = 0
+            field_defs.append(_FieldDefinition(def_num, size, base_type, field, offset))
+            offset += size
+        position += 3 * num_fields
+        if header & 0x20:
+            num_dev_fields = int(self.data[position])
+            position += 1
+            for def_num, size, dev_data_index in np.asarray(
+                self.data[position : position + 3 * num_dev_fields]
+            ).reshape(-1, 3).tolist():
+                field = self.developer_fields.get((dev_data_index, def_num))
+                if field is None:
+                    base_type, field = BASE_TYPE_BYTE, None
+                else:
+                    base_type = field.type
+                if size % base_type.size:
+                    base_type = BASE_TYPE_BYTE
+                field_defs.append(
+                    _FieldDefinition(def_num, size, base_type, field, offset, is_dev=True)
+                )
+                offset += size
+            position += 3 * num_dev_fields
+        definition = _Definition(mesg_num, endian, field_defs, offset)
+        if self.field_names is not None:
+            definition.selected = self._select_field_defs(definition)
+        self.definitions[header & 0xF] = definition
+        schema = self.schemas.setdefault(definition.name, {})
+        for field_def in field_defs:
+            schema.update(dict.fromkeys(self._field_labels(definition, field_def)))
+        return position
+
+    def _is_selected(self, field, parent_field=None):
+        """check a field, or the field it is a subfield of, was asked for"""
+        return (
+            self.field_names is None
+            or field.name in self.field_names
+            or (parent_field is not None and parent_field.name in self.field_names)
+        )
+
+    def _field_labels(self, definition, field_def):
+        """selected column labels a field definition can produce, in emit order"""
+        field = field_def.field
+        if field is None:
+            if self.field_names is None or f"unknown_{field_def.def_num}" in self.field_names:
+                return [f"unknown_{field_def.def_num}_None"]
+            return []
+        labels = []
+        for resolved_field in list(field.subfields or ()) + [field]:
+            for component in resolved_field.components or ():
+                component_field = definition.mesg_type.fields[component.def_num]
+                labels += [
+                    _static_label(component_field_option)
+                    for component_field_option in list(component_field.subfields or ())
+                    + [component_field]
+                    if self._is_selected(component_field_option, component_field)
+                ]
+            if self._is_selected(resolved_field, field):
+                labels.append(_static_label(resolved_field))
+        return labels
+
+    def _select_field_defs(self, definition):
+        """flag the field definitions that have to be decoded for the selected fields"""
+        selected = [bool(self._field_labels(definition, field_def)) for field_def in definition.field_defs]
+        reference_numbers = {
+            ref_field.def_num
+            for field_def, is_selected in zip(definition.field_defs, selected)
+            if is_selected and field_def.field is not None
+            for sub_field in field_def.field.subfields or ()
+            for ref_field in sub_field.ref_fields
+        }
+        return [
+            is_selected or (field_def.def_num in reference_numbers and not field_def.is_dev)
+            for field_def, is_selected in zip(definition.field_defs, selected)
+        ]
+
+    ##########
+    # data messages
+
+    def _skip_run(self, definition, messages, compressed):
+        """step over a run of messages that were not asked for, keeping only the timestamp"""
+        for i, field_def in enumerate(definition.field_defs):
+            if (
+                field_def.def_num == FIELD_TYPE_TIMESTAMP.def_num
+                and not field_def.is_dev
+                and field_def.kind == "scalar"
+            ):
+                # only the last valid timestamp carries over to later messages
+                tail = messages[f"f{i}"]
+                invalid_value = NUMPY_BASE_TYPES[field_def.base_type.name][1]
+                last_value = tail[-1]
+                if last_value == invalid_value:
+                    raw, invalid = self._raw_column(field_def, tail)
+                    if not invalid.all():
+                        self.timestamp_accumulator = int(raw[~invalid][-1])
+                else:
+                    self.timestamp_accumulator = int(last_value)
+        if compressed:
+            self._compressed_timestamps(messages["header"])
+
+    def _decode_run(self, definition, messages, compressed):
+        name = definition.name
+        decode_all = name in self.message_names or name == "field_description"
+        if not decode_all:
+            self._skip_run(definition, messages, compressed)
+            return
+        if name == "field_description":
+            selected = [True] * len(definition.field_defs)
+        else:
+            selected = definition.selected
+        raw_columns = [
+            self._raw_column(field_def, messages[f"f{i}"])
+            if is_selected or field_def.def_num == FIELD_TYPE_TIMESTAMP.def_num
+            else None
+            for i, (field_def, is_selected) in enumerate(zip(definition.field_defs, selected))
+        ]
+        timestamps = None
+        for field_def, raw_column in zip(definition.field_defs, raw_columns):
+            if field_def.def_num == FIELD_TYPE_TIMESTAMP.def_num and not field_def.is_dev:
+                raw, invalid = raw_column
+                if field_def.kind == "scalar" and not invalid.all():
+                    self.timestamp_accumulator = int(raw[~invalid][-1])
+        if compressed:
+            timestamps = self._compressed_timestamps(messages["header"])
+
+        if name == "field_description":
+            self._register_developer_fields(definition, raw_columns)
+        if name not in self.message_names:
+            return
+
+        columns = {}
+        raw_by_num = {
+            field_def.def_num: raw_column
+            for field_def, raw_column in zip(definition.field_defs, raw_columns)
+            if raw_column is not None and field_def.kind == "scalar" and not field_def.is_dev
+        }
+        for field_def, raw_column, is_selected in zip(
+            definition.field_defs, raw_columns, selected
+        ):
+            if is_selected:
+                raw, invalid = raw_column
+                self._emit_field(columns, definition, field_def, raw, invalid, raw_by_num)
+        if timestamps is not None and self._is_selected(FIELD_TYPE_TIMESTAMP):
+            no_rows = np.zeros(len(timestamps), dtype=bool)
+            for label, values in self._render(
+                FIELD_TYPE_TIMESTAMP, timestamps, no_rows
+            ):
+                self._add_column(columns, label, values, None)
+        self._store_run(name, columns, len(messages))
+
+    def _raw_column(self, field_def, view):
+        """parse the raw view of a field and flag invalid values"""
+        kind = field_def.kind
+        invalid_value = NUMPY_BASE_TYPES[field_def.base_type.name][1]
+        if kind == "scalar":
+            raw = np.asarray(view)
+            if raw.dtype.kind == "f":
+                invalid = np.isnan(raw)
+            else:
+                invalid = raw == invalid_value
+            return raw, invalid
+        if kind == "string":
+            raw = np.array([_parse_string(value) for value in view.tolist()], dtype=object)
+            return raw, np.equal(raw, None)
+        if kind == "byte":
+            raw = np.asarray(view)
+            return raw, (raw == 0xFF).all(axis=1)
+        raw = np.asarray(view)
+        if raw.dtype.kind == "f":
+            element_invalid = np.isnan(raw)
+        else:
+            element_invalid = raw == invalid_value
+        values = np.empty(len(raw), dtype=object)
+        values[:] = [
+            tuple(None if bad else element for element, bad in zip(row, bad_row))
+            for row, bad_row in zip(raw.tolist(), element_invalid.tolist())
+        ]
+        return values, np.zeros(len(raw), dtype=bool)
+
+    def _compressed_timestamps(self, headers):
+        """rebuild compressed timestamps from the 5 bit header offsets"""
+        offsets = (headers & 0x1F).astype(np.int64)
+        steps = np.empty(len(offsets), dtype=np.int64)
+        steps[0] = (offsets[0] - (self.timestamp_accumulator & 0x1F)) % 32
+        steps[1:] = (offsets[1:] - offsets[:-1]) % 32
+        timestamps = self.timestamp_accumulator + np.cumsum(steps)
+        self.timestamp_accumulator = int(timestamps[-1])
+        return timestamps
+
+    def _register_developer_fields(self, definition, raw_columns):
+        """keep developer field descriptions so later definitions can use them"""
+        raw_by_name = {
+            field_def.field.name: raw
+            for field_def, (raw, _) in zip(definition.field_defs, raw_columns)
+            if field_def.field is not None
+        }
+        for row in range(len(raw_columns[0][0]) if raw_columns else 0):
+            description = {name: raw[row] for name, raw in raw_by_name.items()}
+            base_type_id = description.get("fit_base_type_id")
+            if base_type_id is None or int(base_type_id) not in BASE_TYPES:
+                continue
+            def_num = int(description["field_definition_number"])
+            dev_data_index = int(description["developer_data_index"])
+            self.developer_fields[(dev_data_index, def_num)] = DevField(
+                dev_data_index=dev_data_index,
+                def_num=def_num,
+                type=BASE_TYPES[int(base_type_id)],
+                name=description.get("field_name") or f"unnamed_dev_field_{def_num}",
+                units=description.get("units"),
+                native_field_num=description.get("native_field_num"),
+            )
+
+    def _resolve_subfields(self, field, raw_by_num, rows):
+        """split the rows of a field between its subfields"""
+        remaining = rows.copy()
+        groups = []
+        for sub_field in field.subfields or ():
+            matches = np.zeros(len(rows), dtype=bool)
+            for ref_field in sub_field.ref_fields:
+                if ref_field.def_num in raw_by_num:
+                    raw, invalid = raw_by_num[ref_field.def_num]
+                    matches |= (raw == ref_field.raw_value) & ~invalid
+            matches &= remaining
+            if matches.any():
+                groups.append((sub_field, matches))
+                remaining &= ~matches
+        if remaining.any():
+            groups.append((field, remaining))
+        return groups
+
+    def _emit_field(self, columns, definition, field_def, raw, invalid, raw_by_num):
+        field = field_def.field
+        if field is None:
+            if not self._field_labels(definition, field_def):
+                return
+            if field_def.kind == "byte":
+                raw = self._byte_tuples(raw, invalid)
+            values = raw if field_def.kind != "scalar" else _with_missing(raw, invalid)
+            label = f"unknown_{field_def.def_num}_None"
+            self._add_column(columns, label, values, None)
+            return
+        all_rows = np.ones(len(raw), dtype=bool)
+        for resolved_field, rows in self._resolve_subfields(field, raw_by_num, all_rows):
+            for component in resolved_field.components or ():
+                self._emit_component(
+                    columns, definition, field_def, component, raw, invalid, rows, raw_by_num
+                )
+            if not self._is_selected(resolved_field, field):
+                continue
+            if field_def.kind == "byte":
+                values = self._byte_tuples(raw, invalid)
+            else:
+                values = raw
+            for label, rendered in self._render(resolved_field, values, invalid):
+                self._add_column(columns, label, rendered, rows)
+
+    def _emit_component(
+        self, columns, definition, field_def, component, raw, invalid, rows, raw_by_num
+    ):
+        component_field = definition.mesg_type.fields[component.def_num]
+        if not any(
+            self._is_selected(component_field_option, component_field)
+            for component_field_option in list(component_field.subfields or ())
+            + [component_field]
+        ):
+            return
+        if field_def.kind == "byte":
+            if component.bit_offset and component.bit_offset >= field_def.size << 3:
+                return
+            first_byte = component.bit_offset // 8
+            last_byte = min((component.bit_offset + component.bits - 1) // 8, field_def.size - 1)
+            packed = np.zeros(len(raw), dtype=np.uint64)
+            for byte in range(last_byte, first_byte - 1, -1):
+                packed = (packed << np.uint64(8)) | raw[:, byte].astype(np.uint64)
+            shift = component.bit_offset - first_byte * 8
+        elif field_def.kind == "scalar" and raw.dtype.kind in "iu":
+            packed, shift = raw.astype(np.uint64), component.bit_offset
+        else:
+            return
+        component_raw = (
+            (packed >> np.uint64(shift)) & np.uint64((1 << component.bits) - 1)
+        ).astype(np.int64)
+        present = rows & ~invalid
+        if component.accumulate and present.any():
+            key = (definition.mesg_num, component.def_num)
+            accumulation = self.accumulators.get(key, 0)
+            maximum = 1 << component.bits
+            values = component_raw[present]
+            steps = np.empty(len(values), dtype=np.int64)
+            steps[0] = (values[0] - (accumulation & (maximum - 1))) % maximum
+            steps[1:] = (values[1:] - values[:-1]) % maximum
+            component_raw[present] = accumulation + np.cumsum(steps)
+            self.accumulators[key] = int(component_raw[present][-1])
+        if component.scale or component.offset:
+            component_raw = component_raw.astype(np.float64)
+            if component.scale:
+                component_raw = component_raw / component.scale
+            if component.offset:
+                component_raw = component_raw - component.offset
+        for resolved_field, field_rows in self._resolve_subfields(
+            component_field, raw_by_num, rows
+        ):
+            if not self._is_selected(resolved_field, component_field):
+                continue
+            for label, rendered in self._render(
+                resolved_field, component_raw, invalid, apply_scale=False
+            ):
+                self._add_column(columns, label, rendered, field_rows)
+
+    @staticmethod
+    def _byte_tuples(raw, invalid):
+        values = np.empty(len(raw), dtype=object)
+        values[:] = [
+            None if bad else tuple(row)
+            for row, bad in zip(raw.tolist(), invalid.tolist())
+        ]
+        return values
+
+    @staticmethod
+    def _render(field, raw, invalid, apply_scale=True):
+        """
+        render enum names, apply scale and offset and the type processors
+        yielding (label, values) pairs since relative date_time values
+        keep their seconds units
+        """
+        units = field.units
+        field_type = field.type
+        type_name = field_type.name
+        type_values = getattr(field_type, "values", None)
+        if type_name in ("date_time", "local_date_time"):
+            type_values = None
+        if raw.dtype == object or type_values:
+            if type_values:
+                values = np.empty(len(raw), dtype=object)
+                values[:] = [
+                    None if bad else type_values.get(value, value)
+                    for value, bad in zip(raw.tolist(), invalid.tolist())
+                ]
+            else:
+                values = raw.copy()
+                values[invalid] = None
+            if apply_scale and (field.scale or field.offset):
+                values[:] = [_scale_offset_value(field, value) for value in values]
+        else:
+            values = raw
+            if apply_scale and field.scale:
+                values = values.astype(np.float64) / field.scale
+            if apply_scale and field.offset:
+                values = values - field.offset
+            values = _with_missing(values, invalid)
+
+        if type_name in ("date_time", "local_date_time") and values.dtype != object:
+            present = ~invalid
+            if type_name == "date_time":
+                relative = present & (values < MINIMUM_DATE_TIME)
+                present &= ~relative
+                if relative.any():
+                    yield f"{field.name}_{units}", _with_missing(values, ~relative)
+                if not present.any():
+                    return
+            seconds = np.where(present, values, 0).astype(np.int64) + UTC_REFERENCE
+            timestamps = seconds.astype("datetime64[s]").astype("datetime64[ns]")
+            timestamps[~present] = np.datetime64("NaT")
+            yield f"{field.name}_None", timestamps
+            return
+        if type_name == "localtime_into_day":
+            times = np.empty(len(values), dtype=object)
+            times[:] = [
+                None
+                if value is None or value != value
+                else datetime.time(int(value) // 3600, int(value) // 60 % 60, int(value) % 60)
+                for value in values.tolist()
+            ]
+            yield f"{field.name}_None", times
+            return
+        if type_name == "bool":
+            flags = np.empty(len(values), dtype=object)
+            flags[:] = [
+                None if value is None or value != value else bool(value)
+                for value in values.tolist()
+            ]
+            values = flags
+        yield f"{field.name}_{units}", values
+
+    @staticmethod
+    def _add_column(columns, label, values, rows):
+        """add a column to the run, later fields overwrite earlier ones"""
+        if rows is not None and not rows.all():
+            values = _with_missing(values, ~rows)
+        if label in columns:
+            previous, previous_rows = columns[label]
+            rows = np.ones(len(values), dtype=bool) if rows is None else rows
+            merged = previous.astype(object) if previous.dtype != values.dtype else previous.copy()
+            merged[rows] = values[rows]
+            columns[label] = (merged, previous_rows | rows if previous_rows is not None else None)
+            return
+        columns[label] = (values, rows)
+
+    def _store_run(self, name, columns, count):
+        row_start = self.row_counts.get(name, 0)
+        segments = self.segments.setdefault(name, {})
+        label_order = self.label_order.setdefault(name, {})
+        for position, (label, (values, rows)) in enumerate(columns.items()):
+            if label not in label_order:
+                first_row = 0 if rows is None else int(np.argmax(rows))
+                label_order[label] = (row_start + first_row, position)
+            segments.setdefault(label, []).append((row_start, values))
+        self.row_counts[name] = row_start + count
+
+
+class _FieldValuesDecoder(_NativeFitDecoder):
+    """collects every value of one field of one message as a flat array"""
+
+    def __init__(self, fit_bytes, message_name, field_name):
+        super().__init__(fit_bytes, (), field_names=(field_name,))
+        self.message_name = message_name
+        self.field_name = field_name
+        self.blocks = []
+
+    def _decode_run(self, definition, messages, compressed):
+        if definition.name == "field_description":
+            super()._decode_run(definition, messages, compressed)
+            return
+        if definition.name == self.message_name:
+            for i, field_def in enumerate(definition.field_defs):
+                if (
+                    field_def.field is not None
+                    and field_def.field.name == self.field_name
+                    and field_def.kind in ("scalar", "array")
+                ):
+                    self.blocks.append(self._field_values(field_def, messages[f"f{i}"]))
+        self._skip_run(definition, messages, compressed)
+
+    @staticmethod
+    def _field_values(field_def, view):
+        """scale the values of a run, message by message, leaving out invalid ones"""
+        raw = np.asarray(view).reshape(len(view), -1)
+        invalid_value = NUMPY_BASE_TYPES[field_def.base_type.name][1]
+        is_valid = ~np.isnan(raw) if raw.dtype.kind == "f" else raw != invalid_value
+        values = raw[is_valid].astype(np.float64)
+        if field_def.field.scale:
+            values /= field_def.field.scale
+        if field_def.field.offset:
+            values -= field_def.field.offset
+        return values
+
+
+def _assemble_segments(segments, number_of_rows, label_order):
+    """
+    this function will join the decoded runs of each
+    column into one dataframe, blanking rows where a
+    column was not in the message definition
+    options:
+        segments: dict
+            dictionary of column label to list of (row start, values)
+        number_of_rows: int
+            number of rows in the dataframe
+        label_order: dict
+            dictionary of column label to its first appearance
+    returns:
+        assembled_dataframe: dataframe
+            dataframe of the decoded columns
+    """
+    columns = {}
+    for label in sorted(segments, key=label_order.get):
+        pieces = segments[label]
+        covered = sum(len(values) for _, values in pieces)
+        if covered == number_of_rows:
+            kinds = {values.dtype.kind for _, values in pieces}
+            if len(kinds) > 1 and "M" in kinds:
+                pieces = [(start, values.astype(object)) for start, values in pieces]
+            columns[label] = np.concatenate([values for _, values in pieces])
+            continue
+        sample = pieces[0][1]
+        if sample.dtype.kind == "M" and all(
+            values.dtype.kind == "M" for _, values in pieces
+        ):
+            column = np.full(number_of_rows, np.datetime64("NaT"), dtype=sample.dtype)
+        elif all(values.dtype.kind in "iufb" for _, values in pieces):
+            column = np.full(number_of_rows, np.nan)
+        else:
+            column = np.full(number_of_rows, np.nan, dtype=object)
+        for start, values in pieces:
+            column[start : start + len(values)] = values
+        columns[label] = column
+    return pd.DataFrame(
+        columns,
+        index=pd.RangeIndex(number_of_rows),
+        columns=pd.Index(list(columns), dtype=object),
+    )
+
+
+def read_fit_messages(path_to_file, message_names=("record",), fields=None):
+    """
+    this function will decode a fit file with the native
+    numpy decoder and make a dataframe per message type
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        message_names: iterable
+            names of the fit messages to decode, defaults to record
+        fields: iterable
+            names of the fields to decode, None for every field,
+            the other fields are skipped without being decoded
+    returns:
+        fit_messages: dict
+            dictionary of message name to dataframe of its fields
+    """
+    fit_bytes = _read_fit_bytes(path_to_file)
+    count("bytes", len(fit_bytes))
+    decoder = _NativeFitDecoder(fit_bytes, message_names, field_names=fields)
+    with stage("decode"):
+        decoder.decode()
+    count("messages", sum(decoder.row_counts.values()))
+    fit_messages = {}
+    with stage("assemble"):
+        for name in decoder.message_names:
+            fit_messages[name] = _assemble_segments(
+                decoder.segments.get(name, {}),
+                decoder.row_counts.get(name, 0),
+                decoder.label_order.get(name, {}),
+            )
+    return fit_messages
+
+
+def read_fit_field_values(path_to_file, message_name, field_name):
+    """
+    this function will read every value of one field of a
+    message into a flat array in file order, an array field
+    such as the hrv time adds all of its valid elements, and
+    the other messages are stepped over without being decoded
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        message_name: str
+            name of the fit message such as hrv
+        field_name: str
+            name of the numeric field such as time
+    returns:
+        values: array
+            float64 values with scale and offset applied
+    """
+    fit_bytes = _read_fit_bytes(path_to_file)
+    count("bytes", len(fit_bytes))
+    decoder = _FieldValuesDecoder(fit_bytes, message_name, field_name)
+    with stage("decode"):
+        decoder.decode()
+    values = np.concatenate(decoder.blocks) if decoder.blocks else np.array([], dtype=np.float64)
+    count("values", len(values))
+    return values
+
+
+def fit_message_schema(path_to_file, message_name="record", fields=None):
+    """
+    this function will read the definition messages of a fit
+    file and list every column a message can produce
+    without decoding the message data
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        message_name: str
+            name of the fit message
+        fields: iterable
+            names of the fields to keep, None for every field
+    returns:
+        column_labels: list
+            column labels in the order they are defined
+    """
+    decoder = _NativeFitDecoder(_read_fit_bytes(path_to_file), (), field_names=fields)
+    decoder.decode()
+    column_labels = list(decoder.schemas.get(message_name, {}))
+    if (
+        message_name == "record"
+        and column_labels
+        and "timestamp_None" not in column_labels
+        and decoder._is_selected(FIELD_TYPE_TIMESTAMP)
+    ):
+        # compressed timestamp headers add a timestamp to records
+        column_labels.append("timestamp_None")
+    return column_labels
+
+
+def iter_fit_message_batches(
+    path_to_file, message_name="record", batch_size=10000, fields=None
+):
+    """
+    this function will decode a fit file with the native
+    decoder and yield dataframes of at most batch_size rows
+    so only one batch is held in memory at a time
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        message_name: str
+            name of the fit message to decode, defaults to record
+        batch_size: int
+            maximum number of rows in each batch
+        fields: iterable
+            names of the fields to decode, None for every field
+    yields:
+        batch_dataframe: dataframe
+            dataframe of the next batch of messages
+    """
+    fit_bytes = _read_fit_bytes(path_to_file)
+    count("bytes", len(fit_bytes))
+    decoder = _NativeFitDecoder(
+        fit_bytes,
+        [message_name],
+        max_run_length=batch_size,
+        field_names=fields,
+    )
+    runs = decoder.iter_decode()
+    carried_dataframe = None
+    is_decoded = False
+    while not is_decoded:
+        # the stages end before each yield so the time spent writing a batch is not counted
+        with stage("decode"):
+            is_decoded = True
+            for _ in runs:
+                if decoder.row_counts.get(message_name, 0) >= batch_size:
+                    is_decoded = False
+                    break
+        with stage("assemble"):
+            count("messages", decoder.row_counts.get(message_name, 0))
+            carried_dataframe = _concat_batches(carried_dataframe, decoder.take(message_name))
+        while len(carried_dataframe) >= batch_size or (is_decoded and len(carried_dataframe)):
+            yield carried_dataframe.iloc[:batch_size].reset_index(drop=True)
+            carried_dataframe = carried_dataframe.iloc[batch_size:]
+
+
+def _concat_batches(carried_dataframe, decoded_dataframe):
+    """
+    this function will join the rows carried over from
+    the last batch onto the newly decoded rows
+    options:
+        carried_dataframe: dataframe
+            rows left over from the last batch or None
+        decoded_dataframe: dataframe
+            newly decoded rows
+    returns:
+        joined_dataframe: dataframe
+            carried rows followed by the decoded rows
+    """
+    if carried_dataframe is None or not len(carried_dataframe):
+        return decoded_dataframe
+    joined_dataframe = pd.concat([carried_dataframe, decoded_dataframe])
+    return joined_dataframe
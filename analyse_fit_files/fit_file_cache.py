@@ -0,0 +1,332 @@
+"""
+content addressed on disk cache of parsed fit files
+
+parsed dataframes are saved as parquet files named by a hash of the
+fit file contents, the parser version and the parse options, so the
+same activity is only decoded once however often it is loaded
+"""
+import hashlib
+import json
+import logging
+import os
+
+from importlib.metadata import PackageNotFoundError, version
+
+import pandas as pd
+
+from analyse_fit_files import __version__
+from analyse_fit_files.atomic_files import write_parquet_atomically
+from analyse_fit_files.parse_fit_file import get_fit_file_messages
+
+logger = logging.getLogger(__name__)
+
+# bump when the cached dataframe layout changes
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIRECTORY = os.environ.get(
+    "ANALYSE_FIT_FILES_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "analyse_fit_files"),
+)
+
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+CACHE_FILE_EXTENSION = ".parquet"
+
+
+def _parser_version(engine):
+    """
+    this function will describe the version of the code
+    that parsed a cached dataframe
+    options:
+        engine: str
+            fit file engine used to parse
+    returns:
+        parser_version: str
+            package, cache format and fitparse versions
+    """
+    try:
+        fitparse_version = version("fitparse")
+    except PackageNotFoundError:
+        fitparse_version = "unknown"
+    parser_version = f"{__version__}/{CACHE_FORMAT_VERSION}/{engine}/{fitparse_version}"
+    return parser_version
+
+
+def hash_fit_file(path_to_file):
+    """
+    this function will hash the contents of a fit file
+    options:
+        path_to_file: str or file like object
+            file path for fit file or an open fit file
+    returns:
+        content_hash: str
+            hex digest of the file contents
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if hasattr(path_to_file, "read"):
+        for chunk in iter(lambda: path_to_file.read(1 << 20), b""):
+            digest.update(chunk)
+        path_to_file.seek(0)
+    else:
+        with open(path_to_file, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    content_hash = digest.hexdigest()
+    return content_hash
+
+
+def fit_file_cache_key(
+    path_to_file, engine="fitparse", fields=None, compact=False, message="record", content_hash=None
+):
+    """
+    this function will make the cache key of a fit file
+    from its contents, the parser version and the options
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        engine: str
+            fit file engine used to parse
+        fields: list
+            names of the record fields to keep, None for every field
+        compact: bool
+            True if the dataframe uses compact dtypes
+        message: str
+            name of the fit message the dataframe holds
+        content_hash: str
+            hash_fit_file of the fit file when it is already known
+    returns:
+        cache_key: str
+            hex digest naming the cached dataframe
+    """
+    options = json.dumps(
+        {
+            "parser": _parser_version(engine),
+            "fields": None if fields is None else sorted(fields),
+            "compact": bool(compact),
+            "message": message,
+        },
+        sort_keys=True,
+    )
+    content_hash = hash_fit_file(path_to_file) if content_hash is None else content_hash
+    cache_key = hashlib.blake2b(f"{content_hash}:{options}".encode(), digest_size=20).hexdigest()
+    return cache_key
+
+
+def _cache_path(cache_directory, cache_key):
+    """
+    this function will give the file path of a cached dataframe
+    options:
+        cache_directory: str
+            directory of the cache
+        cache_key: str
+            hex digest naming the cached dataframe
+    returns:
+        cache_path: str
+            path to the parquet file
+    """
+    cache_path = os.path.join(cache_directory, cache_key[:2], cache_key + CACHE_FILE_EXTENSION)
+    return cache_path
+
+
+def list_fit_file_cache(cache_directory=DEFAULT_CACHE_DIRECTORY):
+    """
+    this function will list the cached dataframes
+    from least to most recently used
+    options:
+        cache_directory: str
+            directory of the cache
+    returns:
+        cache_entries: list
+            list of (last used time, bytes, path) tuples
+    """
+    cache_entries = []
+    if not os.path.isdir(cache_directory):
+        return cache_entries
+    for shard in os.scandir(cache_directory):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if not entry.name.endswith(CACHE_FILE_EXTENSION):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            cache_entries.append((stat.st_mtime, stat.st_size, entry.path))
+    cache_entries.sort()
+    return cache_entries
+
+
+def evict_fit_file_cache(
+    cache_directory=DEFAULT_CACHE_DIRECTORY,
+    max_cache_bytes=DEFAULT_MAX_CACHE_BYTES,
+):
+    """
+    this function will remove the least recently used
+    cached dataframes until the cache fits in max_cache_bytes
+    options:
+        cache_directory: str
+            directory of the cache
+        max_cache_bytes: int
+            largest size of the cache in bytes
+    returns:
+        evicted: int
+            number of cached dataframes removed
+    """
+    cache_entries = list_fit_file_cache(cache_directory)
+    total_bytes = sum(size for _, size, _ in cache_entries)
+    evicted = 0
+    for _, size, path in cache_entries:
+        if total_bytes <= max_cache_bytes:
+            break
+        try:
+            os.remove(path)
+            evicted += 1
+        except FileNotFoundError:
+            pass  # evicted by another process
+        total_bytes -= size
+    return evicted
+
+
+def _read_cached(cache_path):
+    """
+    this function will read a cached dataframe, removing
+    it if it cannot be read so it is parsed again
+    options:
+        cache_path: str
+            path to the parquet file
+    returns:
+        fit_file_dataframe: dataframe
+            cached dataframe, None on a miss
+    """
+    try:
+        fit_file_dataframe = pd.read_parquet(cache_path)
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        logger.warning(f"removing unreadable cache entry '{cache_path}': {error}")
+        try:
+            os.remove(cache_path)
+        except FileNotFoundError:
+            pass  # evicted by another process
+        return None
+    try:
+        os.utime(cache_path)  # mark as recently used
+    except FileNotFoundError:
+        pass  # evicted by another process after the read
+    logger.debug(f"cache hit '{cache_path}'")
+    return fit_file_dataframe
+
+
+def get_cached_fit_file_messages(
+    path_to_file,
+    messages=("record",),
+    fields=None,
+    engine="fitparse",
+    compact=False,
+    cache_directory=DEFAULT_CACHE_DIRECTORY,
+    max_cache_bytes=DEFAULT_MAX_CACHE_BYTES,
+):
+    """
+    this function will load the dataframes of the selected
+    message types from the cache, parsing only the messages
+    that are not cached yet in one pass over the fit file
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        messages: list
+            names of the fit messages to read such as record or session
+        fields: list
+            names of the fields to keep, None for every field
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        compact: bool
+            True to give each column the narrowest dtype
+        cache_directory: str
+            directory of the cache, defaults to the
+            ANALYSE_FIT_FILES_CACHE environment variable
+            or ~/.cache/analyse_fit_files
+        max_cache_bytes: int
+            largest size of the cache in bytes, the least
+            recently used dataframes are removed past this
+    returns:
+        fit_messages: dict
+            dictionary of message name to dataframe of parsed fit file data
+    """
+    content_hash = hash_fit_file(path_to_file)
+    cache_paths = {
+        name: _cache_path(
+            cache_directory,
+            fit_file_cache_key(path_to_file, engine, fields, compact, name, content_hash),
+        )
+        for name in messages
+    }
+    fit_messages = {name: _read_cached(cache_path) for name, cache_path in cache_paths.items()}
+    missing_messages = [name for name, dataframe in fit_messages.items() if dataframe is None]
+    if not missing_messages:
+        return fit_messages
+
+    parsed_messages = get_fit_file_messages(
+        path_to_file=path_to_file,
+        messages=missing_messages,
+        fields=fields,
+        engine=engine,
+        compact=compact,
+    )
+    is_cached = False
+    for name, message_dataframe in parsed_messages.items():
+        # infer the object columns so a miss returns the same dtypes as a hit
+        fit_messages[name] = message_dataframe.infer_objects()
+        try:
+            write_parquet_atomically(fit_messages[name], cache_paths[name])
+            is_cached = True
+        except (OSError, ValueError, TypeError) as error:
+            logger.warning(f"could not cache parsed {name} messages: {error}")
+    if is_cached:
+        evict_fit_file_cache(cache_directory, max_cache_bytes)
+    return fit_messages
+
+
+def get_cached_fit_file_data(
+    path_to_file,
+    engine="fitparse",
+    fields=None,
+    compact=False,
+    cache_directory=DEFAULT_CACHE_DIRECTORY,
+    max_cache_bytes=DEFAULT_MAX_CACHE_BYTES,
+):
+    """
+    this function will load the parsed fit file data
+    from the cache, parsing and caching it on a miss
+    options:
+        path_to_file: str or file like object
+            file path for fit file
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        fields: list
+            names of the record fields to keep, None for every field
+        compact: bool
+            True to give each column the narrowest dtype
+        cache_directory: str
+            directory of the cache, defaults to the
+            ANALYSE_FIT_FILES_CACHE environment variable
+            or ~/.cache/analyse_fit_files
+        max_cache_bytes: int
+            largest size of the cache in bytes, the least
+            recently used dataframes are removed past this
+    returns:
+        fit_file_dataframe: dataframe
+            dataframe of parsed fit file data
+    """
+    fit_file_dataframe = get_cached_fit_file_messages(
+        path_to_file=path_to_file,
+        messages=["record"],
+        fields=fields,
+        engine=engine,
+        compact=compact,
+        cache_directory=cache_directory,
+        max_cache_bytes=max_cache_bytes,
+    )["record"]
+    return fit_file_dataframe
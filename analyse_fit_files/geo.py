@@ -0,0 +1,474 @@
+"""
+gps track processing
+
+positions are converted from semicircles to degrees, and the
+distance, grade and elevation gain of a track are worked out on
+whole arrays at once, tracks are simplified with ramer douglas
+peucker or visvalingam to a tolerance in meters so a map of a long
+ride needs thousands of points instead of tens of thousands
+"""
+import heapq
+
+import numpy as np
+import pandas as pd
+
+SIMPLIFY_METHODS = ("rdp", "visvalingam")
+
+SEMICIRCLES_TO_DEGREES = 180 / 2**31
+
+# mean radius of the earth
+EARTH_RADIUS_M = 6371008.8
+
+# samples in the rolling mean of the altitude before gains and grades
+DEFAULT_ELEVATION_SMOOTHING_SAMPLES = 5
+
+# distance on each side of a sample the grade is measured over
+DEFAULT_GRADE_DISTANCE_M = 20.0
+
+# farthest a dropped point may be from the simplified track
+DEFAULT_SIMPLIFY_TOLERANCE_M = 5.0
+
+
+def _as_float(values):
+    """
+    this function will give values as floats
+    options:
+        values: array like
+            values of a column
+    returns:
+        float_values: array
+            values as floats, nan where missing
+    """
+    float_values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    return float_values
+
+
+def semicircles_to_degrees(semicircles):
+    """
+    this function will convert positions from semicircles to degrees
+    options:
+        semicircles: array like
+            latitudes or longitudes in semicircles
+    returns:
+        degrees: array
+            latitudes or longitudes in degrees, nan where missing
+    """
+    degrees = _as_float(semicircles) * SEMICIRCLES_TO_DEGREES
+    return degrees
+
+
+def track_degrees(fit_file_dataframe):
+    """
+    this function will give the track of an activity in degrees
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+    returns:
+        latitude: array
+            latitudes in degrees, nan where missing
+        longitude: array
+            longitudes in degrees, nan where missing
+    """
+    if "position_lat_semicircles" not in fit_file_dataframe.columns:
+        missing = np.full(len(fit_file_dataframe), np.nan)
+        return missing, missing.copy()
+    latitude = semicircles_to_degrees(fit_file_dataframe["position_lat_semicircles"])
+    longitude = semicircles_to_degrees(fit_file_dataframe["position_long_semicircles"])
+    return latitude, longitude
+
+
+def haversine_distances(latitude, longitude):
+    """
+    this function will find the great circle distance
+    between each position and the one before it
+    options:
+        latitude: array
+            latitudes in degrees
+        longitude: array
+            longitudes in degrees
+    returns:
+        step_distances: array
+            meters from the previous position, 0 for the first
+            position and nan next to a missing position
+    """
+    latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+    longitude = np.radians(np.asarray(longitude, dtype=np.float64))
+    if len(latitude) == 0:
+        return np.array([], dtype=np.float64)
+    half_chord = (
+        np.sin(np.diff(latitude) / 2) ** 2
+        + np.cos(latitude[:-1]) * np.cos(latitude[1:]) * np.sin(np.diff(longitude) / 2) ** 2
+    )
+    step_distances = np.concatenate(
+        [[0.0], 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(half_chord, 1.0)))]
+    )
+    return step_distances
+
+
+def track_distance(fit_file_dataframe):
+    """
+    this function will find the distance covered by the gps
+    track at every sample, steps next to a missing position
+    add nothing
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+    returns:
+        distance: array
+            meters from the start of the track
+    """
+    latitude, longitude = track_degrees(fit_file_dataframe)
+    is_present = ~np.isnan(latitude) & ~np.isnan(longitude)
+    step_distances = np.zeros(len(latitude))
+    # missing positions are stepped over so the track joins up across them
+    step_distances[is_present] = haversine_distances(latitude[is_present], longitude[is_present])
+    distance = np.cumsum(step_distances)
+    return distance
+
+
+def smooth_altitude(altitude, smoothing_samples=DEFAULT_ELEVATION_SMOOTHING_SAMPLES):
+    """
+    this function will smooth the altitude with a centred rolling mean
+    options:
+        altitude: array like
+            altitude in meters
+        smoothing_samples: int
+            samples in the rolling mean, 1 for no smoothing
+    returns:
+        smoothed_altitude: array
+            altitude in meters, nan where missing
+    """
+    smoothed_altitude = (
+        pd.Series(_as_float(altitude))
+        .rolling(smoothing_samples, center=True, min_periods=1)
+        .mean()
+        .to_numpy()
+    )
+    smoothed_altitude[np.isnan(_as_float(altitude))] = np.nan
+    return smoothed_altitude
+
+
+def elevation_gain(altitude, smoothing_samples=DEFAULT_ELEVATION_SMOOTHING_SAMPLES):
+    """
+    this function will find the total climb and descent of
+    the smoothed altitude, stepping over missing altitudes
+    options:
+        altitude: array like
+            altitude in meters
+        smoothing_samples: int
+            samples in the rolling mean, 1 for no smoothing
+    returns:
+        gain: float
+            meters climbed
+        loss: float
+            meters descended
+    """
+    smoothed_altitude = smooth_altitude(altitude, smoothing_samples)
+    steps = np.diff(smoothed_altitude[~np.isnan(smoothed_altitude)])
+    gain = float(steps[steps > 0].sum())
+    loss = float(-steps[steps < 0].sum())
+    return gain, loss
+
+
+def grade(
+    distance,
+    altitude,
+    grade_distance_m=DEFAULT_GRADE_DISTANCE_M,
+    smoothing_samples=DEFAULT_ELEVATION_SMOOTHING_SAMPLES,
+):
+    """
+    this function will find the grade at every sample from
+    the climb between the samples grade_distance_m before and after it
+    options:
+        distance: array like
+            meters from the start such as distance_m or track_distance
+        altitude: array like
+            altitude in meters
+        grade_distance_m: float
+            distance on each side of a sample the grade is measured over
+        smoothing_samples: int
+            samples in the rolling mean of the altitude
+    returns:
+        grades: array
+            grade in percent, nan where the distance or altitude
+            is missing or the track did not move
+    """
+    distance = _as_float(distance)
+    smoothed_altitude = smooth_altitude(altitude, smoothing_samples)
+    grades = np.full(len(distance), np.nan)
+    is_present = ~np.isnan(distance) & ~np.isnan(smoothed_altitude)
+    present_distance = distance[is_present]
+    if len(present_distance):
+        # searchsorted needs the distance to never go down
+        present_distance = np.maximum.accumulate(present_distance)
+    present_altitude = smoothed_altitude[is_present]
+    before = np.searchsorted(present_distance, present_distance - grade_distance_m, side="left")
+    after = np.minimum(
+        np.searchsorted(present_distance, present_distance + grade_distance_m, side="right") - 1,
+        len(present_distance) - 1,
+    )
+    run = present_distance[after] - present_distance[before]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        present_grades = np.where(
+            run > 0, (present_altitude[after] - present_altitude[before]) / run * 100, np.nan
+        )
+    grades[is_present] = present_grades
+    return grades
+
+
+def _project(latitude, longitude):
+    """
+    this function will project positions onto a flat plane in
+    meters around their mean, close enough for a single activity
+    options:
+        latitude: array
+            latitudes in degrees
+        longitude: array
+            longitudes in degrees
+    returns:
+        x: array
+            meters east of the mean position
+        y: array
+            meters north of the mean position
+    """
+    mean_latitude = np.radians(np.mean(latitude))
+    x = EARTH_RADIUS_M * np.radians(longitude - np.mean(longitude)) * np.cos(mean_latitude)
+    y = EARTH_RADIUS_M * np.radians(latitude - np.mean(latitude))
+    return x, y
+
+
+def _segment_distances(x, y, start, end):
+    """
+    this function will find how far the points between two
+    points are from the segment joining them
+    options:
+        x: array
+            meters east
+        y: array
+            meters north
+        start: int
+            first point of the segment
+        end: int
+            last point of the segment
+    returns:
+        distances: array
+            meters from the segment of the points start + 1 to end - 1
+    """
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    px, py = x[start + 1 : end] - x[start], y[start + 1 : end] - y[start]
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return np.hypot(px, py)
+    # the nearest point is clipped to the segment so a loop back to its start is measured right
+    fraction = np.clip((px * dx + py * dy) / length_squared, 0.0, 1.0)
+    distances = np.hypot(px - fraction * dx, py - fraction * dy)
+    return distances
+
+
+def rdp_indices(x, y, tolerance):
+    """
+    this function will simplify a line with the ramer douglas
+    peucker method, keeping the point farthest from each
+    segment until every dropped point is within the tolerance
+    options:
+        x: array
+            meters east
+        y: array
+            meters north
+        tolerance: float
+            farthest a dropped point may be from the simplified line
+    returns:
+        indices: array
+            sorted positions of the kept points
+    """
+    number_of_points = len(x)
+    if number_of_points < 3:
+        return np.arange(number_of_points)
+    is_kept = np.zeros(number_of_points, dtype=bool)
+    is_kept[[0, -1]] = True
+    segments = [(0, number_of_points - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(x, y, start, end)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            is_kept[split] = True
+            segments.append((start, split))
+            segments.append((split, end))
+    indices = np.flatnonzero(is_kept)
+    return indices
+
+
+def _triangle_areas(x, y, previous, current, following):
+    """
+    this function will find the area of the triangles
+    made by each point and its neighbours
+    options:
+        x: array
+            meters east
+        y: array
+            meters north
+        previous: array
+            positions of the points before
+        current: array
+            positions of the points
+        following: array
+            positions of the points after
+    returns:
+        areas: array
+            square meters
+    """
+    areas = 0.5 * np.abs(
+        (x[previous] - x[following]) * (y[current] - y[previous])
+        - (x[previous] - x[current]) * (y[following] - y[previous])
+    )
+    return areas
+
+
+def visvalingam_indices(x, y, min_area, number_of_points=None):
+    """
+    this function will simplify a line with the visvalingam
+    whyatt method, dropping the point making the smallest
+    triangle with its neighbours until every triangle is at
+    least min_area or number_of_points are left
+    options:
+        x: array
+            meters east
+        y: array
+            meters north
+        min_area: float
+            smallest triangle in square meters a kept point makes
+        number_of_points: int
+            stop once this many points are left, None for no limit
+    returns:
+        indices: array
+            sorted positions of the kept points
+    """
+    total_points = len(x)
+    if total_points < 3:
+        return np.arange(total_points)
+    previous = np.arange(-1, total_points - 1)
+    following = np.arange(1, total_points + 1)
+    areas = np.full(total_points, np.inf)
+    interior = np.arange(1, total_points - 1)
+    areas[interior] = _triangle_areas(x, y, interior - 1, interior, interior + 1)
+    heap = [(area, point) for point, area in zip(interior.tolist(), areas[interior].tolist())]
+    heapq.heapify(heap)
+    is_kept = np.ones(total_points, dtype=bool)
+    remaining = total_points
+    while heap:
+        area, point = heapq.heappop(heap)
+        if not is_kept[point] or area != areas[point]:
+            continue  # a neighbour was dropped since this area was pushed
+        if number_of_points is not None:
+            if remaining <= number_of_points:
+                break
+        elif area >= min_area:
+            break
+        is_kept[point] = False
+        remaining -= 1
+        before, after = previous[point], following[point]
+        following[before], previous[after] = after, before
+        for neighbour in (before, after):
+            if 0 < neighbour < total_points - 1:
+                # an area never drops below the one just removed so points go in order
+                new_area = max(
+                    area,
+                    float(
+                        _triangle_areas(
+                            x, y, previous[neighbour], neighbour, following[neighbour]
+                        )
+                    ),
+                )
+                areas[neighbour] = new_area
+                heapq.heappush(heap, (new_area, neighbour))
+    indices = np.flatnonzero(is_kept)
+    return indices
+
+
+def simplify_track(
+    fit_file_dataframe,
+    tolerance_m=DEFAULT_SIMPLIFY_TOLERANCE_M,
+    method="rdp",
+    number_of_points=None,
+):
+    """
+    this function will keep the rows of an activity needed
+    to draw its gps track within a tolerance
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+        tolerance_m: float
+            for rdp the farthest a dropped point may be from the
+            track, for visvalingam the side of a square with the
+            area of the smallest triangle a kept point makes
+        method: str
+            rdp or visvalingam
+        number_of_points: int
+            visvalingam only, stop once this many points are left
+    returns:
+        simplified_dataframe: dataframe
+            kept rows with a latitude_degrees and a longitude_degrees column
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError(f"method must be one of {list(SIMPLIFY_METHODS)}, got '{method}'")
+    latitude, longitude = track_degrees(fit_file_dataframe)
+    present_rows = np.flatnonzero(~np.isnan(latitude) & ~np.isnan(longitude))
+    if len(present_rows):
+        x, y = _project(latitude[present_rows], longitude[present_rows])
+        if method == "rdp":
+            kept = rdp_indices(x, y, tolerance_m)
+        else:
+            kept = visvalingam_indices(x, y, tolerance_m**2, number_of_points)
+        present_rows = present_rows[kept]
+    simplified_dataframe = fit_file_dataframe.iloc[present_rows].assign(
+        latitude_degrees=latitude[present_rows],
+        longitude_degrees=longitude[present_rows],
+    )
+    return simplified_dataframe
+
+
+def compare_track_distance(fit_file_dataframe):
+    """
+    this function will compare the distance of the gps track
+    with the distance_m recorded by the device
+    options:
+        fit_file_dataframe: dataframe
+            parsed fit file data
+    returns:
+        comparison: dict
+            track and device distance in meters, their difference
+            in meters and percent of the device distance, and the
+            largest gap between them along the way
+    """
+    computed_distance = track_distance(fit_file_dataframe)
+    if "distance_m" in fit_file_dataframe.columns:
+        device_distance = _as_float(fit_file_dataframe["distance_m"])
+    else:
+        device_distance = np.full(len(fit_file_dataframe), np.nan)
+    is_present = ~np.isnan(device_distance)
+    device_total = (
+        float(device_distance[is_present][-1] - device_distance[is_present][0])
+        if is_present.any()
+        else np.nan
+    )
+    computed_total = float(computed_distance[-1]) if len(computed_distance) else 0.0
+    # both distances start from zero at the first sample the device has a distance for
+    differences = (computed_distance[is_present] - computed_distance[is_present][:1]) - (
+        device_distance[is_present] - device_distance[is_present][:1]
+    )
+    comparison = {
+        "track_distance_m": computed_total,
+        "device_distance_m": device_total,
+        "difference_m": computed_total - device_total,
+        "difference_percent": (computed_total - device_total) / device_total * 100
+        if device_total
+        else np.nan,
+        "max_abs_difference_m": float(np.abs(differences).max()) if is_present.any() else np.nan,
+    }
+    return comparison
@@ -0,0 +1,285 @@
+"""
+heart rate variability from beat to beat intervals
+
+the intervals of a whole activity are corrected for artifacts and
+turned into rolling rmssd, sdnn and dfa alpha 1 with cumulative
+sums and strided windows, so hundreds of thousands of beats are
+analysed without a python loop over the beats, and every result
+is lined up with the record timestamps
+"""
+import numpy as np
+import pandas as pd
+
+# shortest and longest believable interval, 240 and 30 bpm
+MIN_RR_SECONDS = 0.25
+MAX_RR_SECONDS = 2.0
+
+# largest change from the local median, as a fraction, before a beat is an artifact
+DEFAULT_ARTIFACT_THRESHOLD = 0.2
+
+# beats in the rolling median the intervals are checked against
+DEFAULT_ARTIFACT_WINDOW_BEATS = 11
+
+# trailing time window of the rmssd and sdnn
+DEFAULT_HRV_WINDOW_SECONDS = 120
+
+# fewest beats in a window for it to have a value
+DEFAULT_MIN_WINDOW_BEATS = 30
+
+# beats in each dfa window and beats between the windows
+DEFAULT_DFA_WINDOW_BEATS = 200
+DEFAULT_DFA_STEP_BEATS = 10
+
+# box sizes in beats of the short term scaling exponent alpha 1
+DFA_ALPHA1_SCALES = np.arange(4, 17)
+
+# dfa windows worked out together, bounding the memory used
+DFA_CHUNK_WINDOWS = 4096
+
+
+def correct_artifacts(
+    rr_intervals,
+    threshold=DEFAULT_ARTIFACT_THRESHOLD,
+    window_beats=DEFAULT_ARTIFACT_WINDOW_BEATS,
+):
+    """
+    this function will find intervals that are out of range or
+    too far from their rolling median, such as missed or extra
+    beats, and replace them by interpolating their neighbours
+    options:
+        rr_intervals: array
+            seconds between beats
+        threshold: float
+            largest change from the local median as a fraction
+        window_beats: int
+            beats in the centred rolling median
+    returns:
+        corrected_intervals: array
+            seconds between beats with the artifacts replaced
+        is_artifact: array
+            True for each replaced interval
+    """
+    rr_intervals = np.asarray(rr_intervals, dtype=np.float64)
+    local_median = (
+        pd.Series(rr_intervals)
+        .rolling(window_beats, center=True, min_periods=1)
+        .median()
+        .to_numpy()
+    )
+    with np.errstate(invalid="ignore"):
+        is_artifact = (
+            np.isnan(rr_intervals)
+            | (rr_intervals < MIN_RR_SECONDS)
+            | (rr_intervals > MAX_RR_SECONDS)
+            | (np.abs(rr_intervals - local_median) > threshold * local_median)
+        )
+    corrected_intervals = rr_intervals.copy()
+    good_beats = np.flatnonzero(~is_artifact)
+    if len(good_beats):
+        corrected_intervals[is_artifact] = np.interp(
+            np.flatnonzero(is_artifact), good_beats, rr_intervals[good_beats]
+        )
+    return corrected_intervals, is_artifact
+
+
+def beat_seconds(rr_intervals):
+    """
+    this function will find when each beat happened, the
+    uncorrected intervals are used so missed beats keep the time
+    options:
+        rr_intervals: array
+            seconds between beats
+    returns:
+        seconds: array
+            seconds from the start of the recording to each beat
+    """
+    seconds = np.cumsum(np.nan_to_num(np.asarray(rr_intervals, dtype=np.float64)))
+    return seconds
+
+
+def rolling_rmssd_sdnn(
+    seconds,
+    rr_intervals,
+    at_seconds,
+    window_seconds=DEFAULT_HRV_WINDOW_SECONDS,
+    min_beats=DEFAULT_MIN_WINDOW_BEATS,
+):
+    """
+    this function will find the rmssd and sdnn of the beats in
+    the window_seconds before each of the given times from
+    cumulative sums, so every window costs the same
+    options:
+        seconds: array
+            time of each beat in seconds
+        rr_intervals: array
+            corrected seconds between beats
+        at_seconds: array
+            times to find the rmssd and sdnn at
+        window_seconds: float
+            length of the trailing window
+        min_beats: int
+            fewest beats in a window for it to have a value
+    returns:
+        rmssd: array
+            root mean square of successive differences in ms
+        sdnn: array
+            standard deviation of the intervals in ms
+    """
+    rr_intervals = np.asarray(rr_intervals, dtype=np.float64)
+    at_seconds = np.asarray(at_seconds, dtype=np.float64)
+    ends = np.searchsorted(seconds, at_seconds, side="right")
+    starts = np.searchsorted(seconds, at_seconds - window_seconds, side="right")
+    number_of_beats = ends - starts
+    # centring first keeps the variance from losing precision in long sums
+    centred = rr_intervals - (rr_intervals.mean() if len(rr_intervals) else 0.0)
+    sums = np.concatenate([[0.0], np.cumsum(centred)])
+    square_sums = np.concatenate([[0.0], np.cumsum(centred**2)])
+    # the squared difference of each beat with the one before it
+    difference_sums = np.concatenate([[0.0, 0.0], np.cumsum(np.diff(rr_intervals) ** 2)])
+    has_value = number_of_beats >= max(min_beats, 2)
+    beats = np.where(has_value, number_of_beats, 2).astype(np.float64)
+    means = (sums[ends] - sums[starts]) / beats
+    variances = ((square_sums[ends] - square_sums[starts]) / beats - means**2) * beats / (beats - 1)
+    difference_means = (
+        difference_sums[ends] - difference_sums[np.minimum(starts + 1, ends)]
+    ) / (beats - 1)
+    rmssd = np.where(has_value, np.sqrt(np.maximum(difference_means, 0.0)) * 1000, np.nan)
+    sdnn = np.where(has_value, np.sqrt(np.maximum(variances, 0.0)) * 1000, np.nan)
+    return rmssd, sdnn
+
+
+def dfa_alpha1(
+    rr_intervals,
+    window_beats=DEFAULT_DFA_WINDOW_BEATS,
+    step_beats=DEFAULT_DFA_STEP_BEATS,
+    scales=DFA_ALPHA1_SCALES,
+):
+    """
+    this function will find the short term scaling exponent
+    of detrended fluctuation analysis over sliding windows of
+    beats, detrending the boxes of every window and scale at once
+    options:
+        rr_intervals: array
+            corrected seconds between beats
+        window_beats: int
+            beats in each window
+        step_beats: int
+            beats between the starts of the windows
+        scales: list
+            box sizes in beats the fluctuation is measured at
+    returns:
+        window_ends: array
+            position of the last beat of each window
+        alpha1: array
+            slope of the log fluctuation against the log box size
+    """
+    rr_intervals = np.asarray(rr_intervals, dtype=np.float64)
+    scales = np.asarray(scales, dtype=np.int64)
+    window_ends = np.arange(window_beats - 1, len(rr_intervals), step_beats)
+    alpha1 = np.full(len(window_ends), np.nan)
+    log_scales = np.log(scales)
+    centred_log_scales = log_scales - log_scales.mean()
+    for chunk_start in range(0, len(window_ends), DFA_CHUNK_WINDOWS):
+        chunk_ends = window_ends[chunk_start : chunk_start + DFA_CHUNK_WINDOWS]
+        windows = rr_intervals[chunk_ends[:, None] - window_beats + 1 + np.arange(window_beats)]
+        profiles = np.cumsum(windows - windows.mean(axis=1, keepdims=True), axis=1)
+        log_fluctuations = np.empty((len(chunk_ends), len(scales)))
+        for position, scale in enumerate(scales.tolist()):
+            number_of_boxes = window_beats // scale
+            boxes = profiles[:, : number_of_boxes * scale].reshape(
+                len(chunk_ends), number_of_boxes, scale
+            )
+            # least squares line through each box, solved in closed form
+            box_time = np.arange(scale) - (scale - 1) / 2
+            boxes = boxes - boxes.mean(axis=2, keepdims=True)
+            slopes = (boxes * box_time).sum(axis=2, keepdims=True) / (box_time**2).sum()
+            residuals = boxes - slopes * box_time
+            with np.errstate(divide="ignore"):
+                log_fluctuations[:, position] = 0.5 * np.log((residuals**2).mean(axis=(1, 2)))
+        alpha1[chunk_start : chunk_start + len(chunk_ends)] = (
+            log_fluctuations @ centred_log_scales
+        ) / (centred_log_scales**2).sum()
+    alpha1[~np.isfinite(alpha1)] = np.nan
+    return window_ends, alpha1
+
+
+def hrv_on_records(
+    fit_file_dataframe,
+    rr_intervals,
+    start_time=None,
+    window_seconds=DEFAULT_HRV_WINDOW_SECONDS,
+    min_beats=DEFAULT_MIN_WINDOW_BEATS,
+    dfa_window_beats=DEFAULT_DFA_WINDOW_BEATS,
+    dfa_step_beats=DEFAULT_DFA_STEP_BEATS,
+    artifact_threshold=DEFAULT_ARTIFACT_THRESHOLD,
+):
+    """
+    this function will correct the beat to beat intervals of an
+    activity and give the rolling rmssd, sdnn, dfa alpha 1 and
+    share of artifacts at every record
+    options:
+        fit_file_dataframe: dataframe
+            parsed records of the activity
+        rr_intervals: array
+            seconds between beats from get_rr_intervals
+        start_time: timestamp
+            time of the first beat, None for the first record
+        window_seconds: float
+            trailing window of the rmssd, sdnn and artifacts
+        min_beats: int
+            fewest beats in a window for it to have a value
+        dfa_window_beats: int
+            beats in each dfa window
+        dfa_step_beats: int
+            beats between the dfa windows
+        artifact_threshold: float
+            largest change from the local median as a fraction
+    returns:
+        hrv_dataframe: dataframe
+            timestamp_None of each record with rr_ms, rmssd_ms,
+            sdnn_ms, dfa_alpha1 and artifact_percent
+    """
+    timestamps = fit_file_dataframe["timestamp_None"].reset_index(drop=True)
+    start_time = timestamps.min() if start_time is None else pd.Timestamp(start_time)
+    record_seconds = (timestamps - start_time).dt.total_seconds().to_numpy(dtype=np.float64)
+    corrected_intervals, is_artifact = correct_artifacts(rr_intervals, artifact_threshold)
+    seconds = beat_seconds(rr_intervals)
+    rmssd, sdnn = rolling_rmssd_sdnn(
+        seconds, corrected_intervals, record_seconds, window_seconds, min_beats
+    )
+
+    ends = np.searchsorted(seconds, record_seconds, side="right")
+    starts = np.searchsorted(seconds, record_seconds - window_seconds, side="right")
+    number_of_beats = ends - starts
+    artifact_sums = np.concatenate([[0], np.cumsum(is_artifact)])
+    mean_sums = np.concatenate([[0.0], np.cumsum(corrected_intervals)])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        artifact_percent = np.where(
+            number_of_beats > 0,
+            (artifact_sums[ends] - artifact_sums[starts]) / number_of_beats * 100,
+            np.nan,
+        )
+        rr_ms = np.where(
+            number_of_beats > 0,
+            (mean_sums[ends] - mean_sums[starts]) / number_of_beats * 1000,
+            np.nan,
+        )
+
+    # each record takes the latest dfa window that ended by its time
+    window_ends, alpha1 = dfa_alpha1(corrected_intervals, dfa_window_beats, dfa_step_beats)
+    latest_window = np.searchsorted(seconds[window_ends], record_seconds, side="right") - 1
+    record_alpha1 = np.full(len(record_seconds), np.nan)
+    has_window = latest_window >= 0
+    record_alpha1[has_window] = alpha1[latest_window[has_window]]
+
+    hrv_dataframe = pd.DataFrame(
+        {
+            "timestamp_None": timestamps,
+            "rr_ms": rr_ms,
+            "rmssd_ms": rmssd,
+            "sdnn_ms": sdnn,
+            "dfa_alpha1": record_alpha1,
+            "artifact_percent": artifact_percent,
+        }
+    )
+    return hrv_dataframe
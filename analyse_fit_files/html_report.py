@@ -0,0 +1,396 @@
+"""
+static html activity reports
+
+one or many parsed activities are turned into a single html file
+that opens in a browser with no python running, the traces are
+downsampled and the peak curves and zone tables are worked out
+once when the report is made, and every array is embedded as a
+base64 typed array drawn with webgl instead of a json list of floats
+"""
+import html
+import logging
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from analyse_fit_files.atomic_files import replace_atomically
+from analyse_fit_files.downsample import downsample_dataframe
+from analyse_fit_files.peak_curves import hold_on_second_grid, log_spaced_durations, mean_max
+from analyse_fit_files.zones import heart_rate_zone_edges, power_zone_edges, time_in_zones
+
+logger = logging.getLogger(__name__)
+
+# signals given a peak curve when the activities have them
+DEFAULT_PEAK_CURVE_SIGNALS = ("power_watts", "heart_rate_bpm", "speed_m/s")
+
+# points embedded per activity and signal, more than a chart is wide in pixels
+DEFAULT_REPORT_MAX_POINTS = 1000
+
+# columns never drawn as traces
+SKIPPED_SIGNALS = ("timestamp_None", "position_lat_semicircles", "position_long_semicircles")
+
+# where plotly.js comes from, cdn keeps the report small and True embeds it
+PLOTLYJS_SOURCES = ("cdn", True)
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{font-family: sans-serif; margin: 2em;}}
+table {{border-collapse: collapse; margin-bottom: 2em;}}
+th, td {{border: 1px solid #ccc; padding: 0.3em 0.6em; text-align: right;}}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+# a light layout written into every figure, much smaller than the plotly templates
+FIGURE_LAYOUT = {
+    "template": "none",
+    "height": 350,
+    "margin": {"l": 60, "r": 20, "t": 50, "b": 50},
+    "xaxis": {"gridcolor": "#eee"},
+    "yaxis": {"gridcolor": "#eee"},
+}
+
+
+def _elapsed_minutes(timestamps, origin):
+    """
+    this function will give the minutes of each sample since
+    a shared origin so activities recorded together stay lined up
+    options:
+        timestamps: series
+            sample times
+        origin: timestamp
+            earliest start of the activities in the report
+    returns:
+        minutes: array
+            float32 minutes since the origin
+    """
+    minutes = ((timestamps - origin).dt.total_seconds() / 60).to_numpy(dtype=np.float32)
+    return minutes
+
+
+def _as_float32(values):
+    """
+    this function will give values as a compact float32
+    array with nan for missing values
+    options:
+        values: series
+            values to embed
+    returns:
+        float32_values: array
+    """
+    float32_values = pd.to_numeric(values, errors="coerce").to_numpy(
+        dtype=np.float32, na_value=np.nan
+    )
+    return float32_values
+
+
+def _as_numeric(dataframe):
+    """
+    this function will turn the object columns holding
+    numbers, such as those fitparse gives, into floats
+    options:
+        dataframe: dataframe
+            parsed fit file data
+    returns:
+        numeric_dataframe: dataframe
+            the same data with numeric signal columns
+    """
+    numeric_columns = {}
+    for column in dataframe.columns:
+        if dataframe[column].dtype != object:
+            continue
+        values = pd.to_numeric(dataframe[column], errors="coerce")
+        if values.notna().any():
+            numeric_columns[column] = values.astype(np.float64)
+    numeric_dataframe = dataframe.assign(**numeric_columns) if numeric_columns else dataframe
+    return numeric_dataframe
+
+
+def report_signals(dataframes):
+    """
+    this function will find the numeric signals of the
+    activities in the order they first appear
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+    returns:
+        signals: list
+            columns to draw
+    """
+    signals = []
+    for dataframe in dataframes.values():
+        for signal in dataframe.columns:
+            if (
+                signal not in signals
+                and signal not in SKIPPED_SIGNALS
+                and not pd.api.types.is_datetime64_any_dtype(dataframe[signal])
+                and pd.to_numeric(dataframe[signal], errors="coerce").notna().any()
+            ):
+                signals.append(signal)
+    return signals
+
+
+def report_origin(dataframes):
+    """
+    this function will find the earliest start of the activities
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+    returns:
+        origin: timestamp
+            time the elapsed minutes of the report count from
+    """
+    origin = min(dataframe["timestamp_None"].min() for dataframe in dataframes.values())
+    return origin
+
+
+def signal_figure(
+    dataframes,
+    signal,
+    max_points=DEFAULT_REPORT_MAX_POINTS,
+    downsample_method="lttb",
+    origin=None,
+):
+    """
+    this function will draw one signal of every activity
+    on the same axis with webgl
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+        signal: str
+            column to draw
+        max_points: int
+            number of points embedded per activity, None for every sample
+        downsample_method: str
+            lttb or minmax, how the embedded points are picked
+        origin: timestamp
+            time the minutes count from, None for the earliest start
+    returns:
+        fig: figure
+            plotly figure
+    """
+    origin = report_origin(dataframes) if origin is None else origin
+    fig = go.Figure()
+    for name, dataframe in dataframes.items():
+        if signal not in dataframe.columns:
+            continue
+        samples = dataframe[["timestamp_None", signal]].dropna()
+        if samples.empty:
+            continue
+        points_to_plot = downsample_dataframe(samples, signal, max_points, downsample_method)
+        fig.add_trace(
+            go.Scattergl(
+                x=_elapsed_minutes(points_to_plot["timestamp_None"], origin),
+                y=_as_float32(points_to_plot[signal]),
+                mode="lines",
+                name=f"{name} {samples[signal].mean():.1f} mean",
+            )
+        )
+    fig.update_layout(FIGURE_LAYOUT)
+    fig.update_layout(
+        title=signal.replace("_", " ").title(),
+        xaxis_title=f"Minutes since {origin:%Y-%m-%d %H:%M}",
+        yaxis_title=signal.split("_")[-1].title(),
+        hovermode="x unified",
+    )
+    return fig
+
+
+def peak_curve_figure(dataframes, signal):
+    """
+    this function will draw the mean max curve of one
+    signal of every activity against a log time axis
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+        signal: str
+            column to find the best efforts of
+    returns:
+        fig: figure
+            plotly figure
+    """
+    fig = go.Figure()
+    for name, dataframe in dataframes.items():
+        if signal not in dataframe.columns or "timestamp_None" not in dataframe.columns:
+            continue
+        records = dataframe.dropna(subset=["timestamp_None"]).sort_values("timestamp_None")
+        values = _as_float32(records[signal])
+        if not np.isfinite(values).any():
+            continue
+        timestamps = records["timestamp_None"]
+        seconds = (timestamps - timestamps.iloc[0]).dt.total_seconds().to_numpy()
+        # windows are counted in seconds, not samples, for smart recording and pauses
+        _, grid_values = hold_on_second_grid(seconds, values)
+        durations = log_spaced_durations(len(grid_values))
+        best_averages = mean_max(grid_values, durations)
+        is_present = ~np.isnan(best_averages)
+        fig.add_trace(
+            go.Scattergl(
+                x=durations[is_present].astype(np.int32),
+                y=best_averages[is_present].astype(np.float32),
+                mode="lines",
+                name=name,
+            )
+        )
+    fig.update_layout(FIGURE_LAYOUT)
+    fig.update_layout(
+        title=f"Peak {signal.replace('_', ' ').title()} Curve",
+        xaxis={"type": "log", "title": "Duration (s)"},
+        yaxis_title=signal.split("_")[-1].title(),
+    )
+    return fig
+
+
+def summary_table(dataframes):
+    """
+    this function will summarise each activity
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+    returns:
+        summary_dataframe: dataframe
+            start, duration and mean of the main signals per activity
+    """
+    rows = []
+    for name, dataframe in dataframes.items():
+        timestamps = dataframe["timestamp_None"]
+        row = {
+            "activity": name,
+            "start": timestamps.min(),
+            "duration": (timestamps.max() - timestamps.min()).round("1s"),
+        }
+        for signal in DEFAULT_PEAK_CURVE_SIGNALS:
+            if signal in dataframe.columns:
+                row[f"mean {signal}"] = round(float(dataframe[signal].mean()), 1)
+        rows.append(row)
+    summary_dataframe = pd.DataFrame(rows).set_index("activity")
+    return summary_dataframe
+
+
+def zone_tables(dataframes, max_heart_rate=None, functional_threshold_power=None):
+    """
+    this function will find the minutes each activity spent
+    in heart rate and power zones
+    options:
+        dataframes: dict
+            parsed fit file data keyed by activity name
+        max_heart_rate: float
+            maximum heart rate in bpm, None for no heart rate zones
+        functional_threshold_power: float
+            functional threshold power in watts, None for no power zones
+    returns:
+        tables: dict
+            minutes in each zone keyed by signal
+    """
+    zone_edges = {}
+    if max_heart_rate:
+        zone_edges["heart_rate_bpm"] = heart_rate_zone_edges(max_heart_rate)
+    if functional_threshold_power:
+        zone_edges["power_watts"] = power_zone_edges(functional_threshold_power)
+    tables = {
+        signal: (
+            time_in_zones(list(dataframes.values()), signal, edges, activity_ids=list(dataframes))
+            / 60
+        ).round(1)
+        for signal, edges in zone_edges.items()
+    }
+    return tables
+
+
+def activity_report_html(
+    dataframes,
+    title="Activity Report",
+    signals=None,
+    peak_curve_signals=DEFAULT_PEAK_CURVE_SIGNALS,
+    max_heart_rate=None,
+    functional_threshold_power=None,
+    max_points=DEFAULT_REPORT_MAX_POINTS,
+    include_plotlyjs="cdn",
+):
+    """
+    this function will make a static html report of one or
+    many activities with their traces, peak curves and zone tables
+    options:
+        dataframes: dict or dataframe
+            parsed fit file data keyed by activity or device name
+        title: str
+            title of the report
+        signals: list
+            columns to draw, None for every numeric signal
+        peak_curve_signals: list
+            columns given a peak curve, missing columns are left out
+        max_heart_rate: float
+            maximum heart rate in bpm for the heart rate zone table
+        functional_threshold_power: float
+            functional threshold power in watts for the power zone table
+        max_points: int
+            number of points embedded per activity and signal
+        include_plotlyjs: str or bool
+            cdn to load plotly.js from the web, True to embed it
+            so the report works offline at about 4.6 MB more
+    returns:
+        report_html: str
+            the whole html page
+    """
+    if isinstance(dataframes, pd.DataFrame):
+        dataframes = {title: dataframes}
+    if include_plotlyjs not in PLOTLYJS_SOURCES:
+        raise ValueError(f"include_plotlyjs must be one of {list(PLOTLYJS_SOURCES)}")
+    dataframes = {name: _as_numeric(dataframe) for name, dataframe in dataframes.items()}
+    signals = report_signals(dataframes) if signals is None else list(signals)
+    peak_curve_signals = [
+        signal
+        for signal in peak_curve_signals
+        if any(signal in dataframe.columns for dataframe in dataframes.values())
+    ]
+    origin = report_origin(dataframes)
+    figures = [signal_figure(dataframes, signal, max_points, origin=origin) for signal in signals]
+    figures += [peak_curve_figure(dataframes, signal) for signal in peak_curve_signals]
+
+    sections = ["<h2>Summary</h2>", summary_table(dataframes).to_html()]
+    for signal, table in zone_tables(dataframes, max_heart_rate, functional_threshold_power).items():
+        sections.append(f"<h2>Minutes in {html.escape(signal.rsplit('_', 1)[0].replace('_', ' ').title())} Zones</h2>")
+        sections.append(table.to_html())
+    for index, fig in enumerate(figures):
+        # plotly.js is only written once, before the first figure
+        sections.append(
+            fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs if index == 0 else False)
+        )
+    report_html = REPORT_TEMPLATE.format(title=html.escape(title), body="\n".join(sections))
+    return report_html
+
+
+def save_activity_report(dataframes, save_path, **options):
+    """
+    this function will atomically save a static html report
+    options:
+        dataframes: dict or dataframe
+            parsed fit file data keyed by activity or device name
+        save_path: str
+            path of the html file
+        options: dict
+            options of activity_report_html
+    returns:
+        save_path: str
+            path of the html file
+    """
+    report_html = activity_report_html(dataframes, **options)
+
+    def write(temporary_path):
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(report_html)
+
+    replace_atomically(save_path, write)
+    logger.info(f"report of {len(report_html) / 1024:.0f} KB saved to '{save_path}'")
+    return save_path
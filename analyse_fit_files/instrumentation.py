@@ -0,0 +1,267 @@
+"""
+instrumentation of parsing and analysing fit files
+
+the parsers and curve functions report what they do as events,
+the time spent in each stage, counters of messages, bytes, records
+and fields, and progress through long loops, to the registered
+observers, which can draw progress bars, write structured logs or
+collect a metrics dictionary, with nothing registered the events
+cost next to nothing
+"""
+import contextlib
+import logging
+import time
+import tracemalloc
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# callables given every event
+_observers = []
+
+# running peak memory of each open stage, innermost last
+_open_stage_peaks = []
+
+# items between progress events
+PROGRESS_EVERY = 1000
+
+
+def add_observer(observer):
+    """
+    this function will register an observer of the events
+    options:
+        observer: callable
+            called with each event dictionary, which has an
+            event key of stage_start, stage, count or progress
+    returns:
+        observer: callable
+            the registered observer
+    """
+    _observers.append(observer)
+    return observer
+
+
+def remove_observer(observer):
+    """
+    this function will stop an observer getting events
+    options:
+        observer: callable
+            observer given to add_observer
+    returns:
+        None
+    """
+    if observer in _observers:
+        _observers.remove(observer)
+        if hasattr(observer, "close"):
+            observer.close()
+
+
+def is_observed():
+    """
+    this function will check if any observer is registered
+    options:
+        None
+    returns:
+        is_observed: bool
+            True if events are being sent anywhere
+    """
+    return bool(_observers)
+
+
+def emit(event):
+    """
+    this function will send an event to every observer
+    options:
+        event: dict
+            event with an event key naming its kind
+    returns:
+        None
+    """
+    for observer in list(_observers):
+        observer(event)
+
+
+def count(counter, value=1):
+    """
+    this function will add to a counter such as
+    messages, bytes, records or fields
+    options:
+        counter: str
+            name of the counter
+        value: int
+            amount to add
+    returns:
+        None
+    """
+    if _observers:
+        emit({"event": "count", "counter": counter, "value": value})
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    this function will time a stage of the work such as
+    decode, assemble, timezone_conversion or curve_computation,
+    with the peak memory it allocated when tracemalloc is tracing
+    options:
+        name: str
+            name of the stage
+    yields:
+        None
+    """
+    if not _observers:
+        yield
+        return
+    emit({"event": "stage_start", "stage": name})
+    is_tracing = tracemalloc.is_tracing()
+    if is_tracing:
+        # fold the peak so far into the open stages before resetting it
+        current_peak = tracemalloc.get_traced_memory()[1]
+        _open_stage_peaks[:] = [max(peak, current_peak) for peak in _open_stage_peaks]
+        tracemalloc.reset_peak()
+        _open_stage_peaks.append(0)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        event = {"event": "stage", "stage": name, "seconds": time.perf_counter() - start_time}
+        if is_tracing and tracemalloc.is_tracing():
+            stage_peak = max(_open_stage_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if _open_stage_peaks:
+                _open_stage_peaks[-1] = max(_open_stage_peaks[-1], stage_peak)
+            event["peak_memory_bytes"] = stage_peak
+        emit(event)
+
+
+def progress(iterable, counter, total=None, every=PROGRESS_EVERY):
+    """
+    this function will pass through the items of a long loop,
+    reporting how many have gone by every few items
+    options:
+        iterable: iterable
+            items of the loop
+        counter: str
+            name of what is counted such as records or messages
+        total: int
+            number of items expected, None if not known
+        every: int
+            items between progress events
+    yields:
+        item: object
+            the next item
+    """
+    if not _observers:
+        yield from iterable
+        return
+    emit({"event": "progress", "counter": counter, "value": 0, "total": total})
+    pending = 0
+    for item in iterable:
+        yield item
+        pending += 1
+        if pending == every:
+            emit({"event": "progress", "counter": counter, "value": pending, "total": total})
+            pending = 0
+    emit(
+        {"event": "progress", "counter": counter, "value": pending, "total": total, "done": True}
+    )
+
+
+class TqdmObserver:
+    """draws a tqdm progress bar for every counter in progress"""
+
+    def __init__(self, **tqdm_options):
+        self.tqdm_options = tqdm_options
+        self.bars = {}
+
+    def __call__(self, event):
+        if event["event"] != "progress":
+            return
+        counter = event["counter"]
+        if counter not in self.bars:
+            self.bars[counter] = tqdm(
+                total=event.get("total"), unit=counter, **self.tqdm_options
+            )
+        self.bars[counter].update(event["value"])
+        if event.get("done"):
+            self.bars.pop(counter).close()
+
+    def close(self):
+        for bar in self.bars.values():
+            bar.close()
+        self.bars = {}
+
+
+class LoggingObserver:
+    """writes each finished stage and counter as a structured log record"""
+
+    def __init__(self, log=logger, level=logging.INFO):
+        self.log = log
+        self.level = level
+
+    def __call__(self, event):
+        if event["event"] not in ("stage", "count"):
+            return
+        fields = " ".join(f"{key}={value}" for key, value in event.items())
+        self.log.log(self.level, fields, extra={"instrumentation": event})
+
+
+class MetricsObserver:
+    """collects the events into a metrics dictionary"""
+
+    def __init__(self):
+        self.metrics = {
+            "timings": {},
+            "calls": {},
+            "counters": {},
+            "peak_memory_bytes": {},
+        }
+
+    def __call__(self, event):
+        kind = event["event"]
+        if kind == "stage":
+            name = event["stage"]
+            timings = self.metrics["timings"]
+            timings[name] = timings.get(name, 0.0) + event["seconds"]
+            self.metrics["calls"][name] = self.metrics["calls"].get(name, 0) + 1
+            if "peak_memory_bytes" in event:
+                peaks = self.metrics["peak_memory_bytes"]
+                peaks[name] = max(peaks.get(name, 0), event["peak_memory_bytes"])
+        elif kind in ("count", "progress"):
+            counters = self.metrics["counters"]
+            counters[event["counter"]] = counters.get(event["counter"], 0) + event["value"]
+
+
+@contextlib.contextmanager
+def collect_metrics(track_memory=False):
+    """
+    this function will collect the timings, counters and
+    peak memory of everything run inside it
+    options:
+        track_memory: bool
+            True to trace memory with tracemalloc, which
+            slows the work down, for the peak memory of
+            each stage and of the whole block
+    yields:
+        metrics: dict
+            timings and calls per stage, counters, peak memory
+            per stage and, once the block ends, total_seconds
+            and peak_memory_bytes_total
+    """
+    metrics_observer = add_observer(MetricsObserver())
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        yield metrics_observer.metrics
+    finally:
+        metrics_observer.metrics["total_seconds"] = time.perf_counter() - start_time
+        if track_memory and tracemalloc.is_tracing():
+            stage_peaks = metrics_observer.metrics["peak_memory_bytes"].values()
+            metrics_observer.metrics["peak_memory_bytes_total"] = max(
+                [tracemalloc.get_traced_memory()[1], *stage_peaks]
+            )
+        if started_tracing:
+            tracemalloc.stop()
+        remove_observer(metrics_observer)
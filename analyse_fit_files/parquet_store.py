@@ -0,0 +1,46 @@
+"""
+tables of the parquet stores
+
+each table of a store such as the best effort or training load
+store is a parquet file named after it in the store directory
+"""
+import os
+
+import pandas as pd
+
+
+def table_path(store_directory, table):
+    """
+    this function will give the file path of a table of a store
+    options:
+        store_directory: str
+            directory of the store
+        table: str
+            name of the table such as curves or daily
+    returns:
+        table_path: str
+            path to the parquet file
+    """
+    table_path = os.path.join(store_directory, f"{table}.parquet")
+    return table_path
+
+
+def read_table(store_directory, table, columns):
+    """
+    this function will read a table of a store
+    options:
+        store_directory: str
+            directory of the store
+        table: str
+            name of the table such as curves or daily
+        columns: list
+            columns of an empty table
+    returns:
+        table_dataframe: dataframe
+            the table, empty if it was never written
+    """
+    try:
+        table_dataframe = pd.read_parquet(table_path(store_directory, table))
+    except FileNotFoundError:
+        table_dataframe = pd.DataFrame(columns=columns)
+    return table_dataframe
@@ -1,43 +1,419 @@
-import pandas as pd
+import datetime
+import glob
+import logging
+import os
+import time
 
-from tqdm import tqdm
+import numpy as np
+import pandas as pd
 
 from fitparse import FitFile as ffp
 
+from analyse_fit_files.compact_dtypes import compact_fit_file_dataframe
+from analyse_fit_files.fit_decoder import (
+    fit_message_schema,
+    iter_fit_message_batches,
+    read_fit_field_values,
+    read_fit_messages,
+)
+from analyse_fit_files.instrumentation import count, progress, stage
+from analyse_fit_files.peak_curves import mean_extreme_over_time, mean_max
+
+FIT_FILE_ENGINES = ("fitparse", "native")
+
+logger = logging.getLogger(__name__)
+
+
+def _column_label(field_data):
+    """
+    this function will build the column label
+    for a fit file field as name_units
+    options:
+        field_data: FieldData
+            field of a fitparse message
+    returns:
+        column_label: str
+            column label for the field
+    """
+    column_label = f"{field_data.name}_{field_data.units}"
+    return column_label
+
+
+def _is_selected_field(field_data, fields):
+    """
+    this function will check if a field was asked for
+    by its name or the name of the field it is a subfield of
+    options:
+        field_data: FieldData
+            field of a fitparse message
+        fields: set
+            names of the fields to keep, None for every field
+    returns:
+        is_selected: bool
+            True if the field should be kept
+    """
+    if fields is None or field_data.name in fields:
+        return True
+    parent_field = field_data.parent_field
+    return parent_field is not None and parent_field.name in fields
+
+
+def _append_fields(column_buffers, number_of_rows, message, fields=None):
+    """
+    this function will append the field values of a
+    fitparse message into per column buffers
+    options:
+        column_buffers: dict
+            dictionary of column label to list of values
+        number_of_rows: int
+            number of messages already in the buffers
+        message: DataMessage
+            fitparse message to append
+        fields: set
+            names of the fields to keep, None for every field
+    returns:
+        None
+    """
+    for field_data in message.fields:
+        if not _is_selected_field(field_data, fields):
+            continue
+        values = column_buffers.setdefault(_column_label(field_data), [])
+        if len(values) < number_of_rows:
+            # field showed up partway through the file
+            values.extend([np.nan] * (number_of_rows - len(values)))
+        if len(values) > number_of_rows:
+            # label repeated within the message, keep the last value
+            values[-1] = field_data.value
+        else:
+            values.append(field_data.value)
+
 
-def get_fit_file_data(path_to_file):
+def _assemble_columns(column_buffers, number_of_rows):
+    """
+    this function will pad the per column buffers
+    to the same length and make them into a dataframe
+    options:
+        column_buffers: dict
+            dictionary of column label to list of values
+        number_of_rows: int
+            number of rows in the dataframe
+    returns:
+        assembled_dataframe: dataframe
+            dataframe of the column buffers
+    """
+    columns = {}
+    for column_label, values in column_buffers.items():
+        values.extend([np.nan] * (number_of_rows - len(values)))
+        # filled in place so equal length tuples such as hrv times stay one value per row
+        columns[column_label] = np.empty(number_of_rows, dtype=object)
+        columns[column_label][:] = values
+    assembled_dataframe = pd.DataFrame(
+        columns,
+        index=pd.RangeIndex(number_of_rows),
+        columns=pd.Index(list(column_buffers), dtype=object),
+    )
+    return assembled_dataframe
+
+
+def _is_date_time_column(column_label, values):
+    """
+    this function will check if a column holds utc date_time
+    values such as timestamp, start_time or time_created
+    options:
+        column_label: str
+            column label as name_units
+        values: series
+            values of the column
+    returns:
+        is_date_time: bool
+            True if the column should be converted to us eastern
+    """
+    if column_label == "timestamp_None":
+        return True
+    if column_label.startswith("local_"):
+        # local_date_time fields are already in the time zone of the device
+        return False
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        return True
+    if values.dtype != object:
+        return False
+    present_values = values.dropna()
+    # relative date_time values are left as seconds by the decoders
+    is_date_time = len(present_values) > 0 and all(
+        isinstance(value, datetime.datetime) for value in present_values
+    )
+    return is_date_time
+
+
+def _convert_timestamps(fit_file_dataframe):
+    """
+    this function will convert every date_time column
+    from utc to us eastern in one step each
+    options:
+        fit_file_dataframe: dataframe
+            dataframe of a fit message
+    returns:
+        fit_file_dataframe: dataframe
+            dataframe with the converted date_time columns
+    """
+    for column_label in fit_file_dataframe.columns:
+        if _is_date_time_column(column_label, fit_file_dataframe[column_label]):
+            fit_file_dataframe[column_label] = (
+                pd.to_datetime(fit_file_dataframe[column_label])
+                .dt.tz_localize("UTC")
+                .dt.tz_convert("US/Eastern")
+            )
+    return fit_file_dataframe
+
+
+def _fit_file_size(path_to_file):
+    """
+    this function will find the size of a fit file
+    options:
+        path_to_file: str or file like object
+            file path for fit file or an open fit file
+    returns:
+        number_of_bytes: int
+            size of the fit file in bytes
+    """
+    if hasattr(path_to_file, "seek"):
+        position = path_to_file.tell()
+        number_of_bytes = path_to_file.seek(0, os.SEEK_END) - position
+        path_to_file.seek(position)
+        return number_of_bytes
+    return os.path.getsize(path_to_file)
+
+
+def _read_messages_fitparse(path_to_file, messages, fields=None):
+    """
+    this function will read the selected message types
+    with fitparse in one pass over the file
+    options:
+        path_to_file: str
+            file path for fit file
+        messages: iterable
+            names of the fit messages to read
+        fields: iterable
+            names of the fields to keep, None for every field
+    returns:
+        fit_messages: dict
+            dictionary of message name to dataframe of its fields
+    """
+    count("bytes", _fit_file_size(path_to_file))
+    file = ffp(path_to_file)
+    fields = None if fields is None else set(fields)
+    column_buffers = {name: {} for name in messages}
+    number_of_messages = dict.fromkeys(messages, 0)
+
+    with stage("decode"):
+        for message in progress(file.get_messages(list(messages)), "messages"):
+            _append_fields(
+                column_buffers[message.name],
+                number_of_messages[message.name],
+                message,
+                fields,
+            )
+            number_of_messages[message.name] += 1
+
+    with stage("assemble"):
+        fit_messages = {
+            name: _assemble_columns(column_buffers[name], number_of_messages[name])
+            for name in messages
+        }
+    return fit_messages
+
+
+def get_fit_file_data(path_to_file, engine="fitparse", fields=None, compact=False):
     """
     this function will read in a fit file
     get the data and make it into a dataframe
+    the field values are appended into per column
+    buffers and assembled once at the end
     options:
         path_to_file: str
             file path for fit file
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        fields: list
+            names of the record fields to keep such as
+            ["timestamp", "heart_rate"], None for every field
+        compact: bool
+            True to give each column the narrowest dtype that
+            holds its values, see compact_fit_file_dataframe
     returns:
         ff_data: dataframe
             dataframe of parsed fit file data
     """
-    file = ffp(path_to_file)
-    recordings = []
-
-    for record in tqdm(file.get_messages("record")):
-        temporary_dataframe = pd.DataFrame(record.as_dict()["fields"])
-        temporary_dataframe["column_label"] = (
-            temporary_dataframe["name"].astype(str)
-            + "_"
-            + temporary_dataframe["units"].astype(str)
-        )
-        column_names = temporary_dataframe["column_label"].to_list()
-        temporary_dataframe = temporary_dataframe[["value"]].transpose()
-        temporary_dataframe.columns = column_names
-        temporary_dataframe["timestamp_None"] = pd.to_datetime(
-            temporary_dataframe["timestamp_None"]
-        ).dt.tz_localize("UTC").dt.tz_convert("US/Eastern")
-        recordings.append(temporary_dataframe)
-
-    fit_file_dataframe = pd.concat(recordings).reset_index(drop=True)
+    fit_file_dataframe = get_fit_file_messages(
+        path_to_file=path_to_file,
+        messages=["record"],
+        fields=fields,
+        engine=engine,
+        compact=compact,
+    )["record"]
     return fit_file_dataframe
 
 
+def get_fit_file_messages(
+    path_to_file, messages=("record",), fields=None, engine="fitparse", compact=False
+):
+    """
+    this function will read in a fit file and make
+    a dataframe for each of the selected message types
+    options:
+        path_to_file: str
+            file path for fit file
+        messages: list
+            names of the fit messages to read such as
+            record, lap, session, length or hrv
+        fields: list
+            names of the fields to keep, None for every field,
+            with the native engine the other fields are never decoded
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        compact: bool
+            True to give each column the narrowest dtype that
+            holds its values, see compact_fit_file_dataframe
+    returns:
+        fit_messages: dict
+            dictionary of message name to dataframe of parsed fit file data
+    """
+    if engine not in FIT_FILE_ENGINES:
+        raise ValueError(f"engine must be one of {FIT_FILE_ENGINES}, got '{engine}'")
+    start_time = time.perf_counter()
+    if engine == "native":
+        fit_messages = read_fit_messages(path_to_file, messages, fields)
+    else:
+        fit_messages = _read_messages_fitparse(path_to_file, messages, fields)
+    for name, message_dataframe in fit_messages.items():
+        with stage("timezone_conversion"):
+            fit_messages[name] = _convert_timestamps(message_dataframe)
+        if compact:
+            with stage("compact"):
+                fit_messages[name] = compact_fit_file_dataframe(fit_messages[name])
+        count("fields", fit_messages[name].shape[1])
+    if "record" in fit_messages:
+        count("records", len(fit_messages["record"]))
+    number_of_messages = sum(len(message_dataframe) for message_dataframe in fit_messages.values())
+    unit = "records" if list(fit_messages) == ["record"] else "messages"
+    elapsed_seconds = time.perf_counter() - start_time
+    logger.info(
+        f"parsed {number_of_messages} {unit} in {elapsed_seconds:.2f}s "
+        f"({number_of_messages / max(elapsed_seconds, 1e-9):.0f} {unit}/s)"
+    )
+    return fit_messages
+
+
+def get_rr_intervals(path_to_file, engine="fitparse"):
+    """
+    this function will read the beat to beat intervals a chest
+    strap writes into hrv messages as one flat array, each hrv
+    message holds a tuple of up to five intervals
+    options:
+        path_to_file: str
+            file path for fit file
+        engine: str
+            fitparse to decode with fitparse or native to read
+            the hrv times straight into a numpy array
+    returns:
+        rr_intervals: array
+            seconds between beats in the order they were recorded,
+            empty when the fit file has no hrv messages
+    """
+    if engine not in FIT_FILE_ENGINES:
+        raise ValueError(f"engine must be one of {FIT_FILE_ENGINES}, got '{engine}'")
+    if engine == "native":
+        rr_intervals = read_fit_field_values(path_to_file, "hrv", "time")
+    else:
+        hrv_dataframe = _read_messages_fitparse(path_to_file, ["hrv"], ["time"])["hrv"]
+        hrv_times = hrv_dataframe.get("time_s", pd.Series(dtype=object))
+        rr_intervals = pd.to_numeric(hrv_times.explode().dropna()).to_numpy(dtype=np.float64)
+    count("beats", len(rr_intervals))
+    logger.info(f"read {len(rr_intervals)} beat to beat intervals")
+    return rr_intervals
+
+
+def iter_fit_record_batches(path_to_file, batch_size=10000, engine="native", fields=None):
+    """
+    this function will read in a fit file and yield
+    the record data in dataframes of at most batch_size
+    rows, every batch has the same columns so they can
+    be written out one after another
+    options:
+        path_to_file: str
+            file path for fit file
+        batch_size: int
+            maximum number of records in each batch
+        engine: str
+            native to decode with the built in numpy decoder,
+            which keeps memory flat for long files, or fitparse
+            to decode with fitparse, which reads every record in
+            one pass and splits them
+        fields: list
+            names of the record fields to keep, None for every field
+    yields:
+        batch_dataframe: dataframe
+            dataframe of the next batch of parsed fit file data
+    """
+    if engine not in FIT_FILE_ENGINES:
+        raise ValueError(f"engine must be one of {FIT_FILE_ENGINES}, got '{engine}'")
+    if engine == "native":
+        column_labels = fit_message_schema(path_to_file, "record", fields)
+        batches = iter_fit_message_batches(path_to_file, "record", batch_size, fields)
+    else:
+        # fitparse cannot list the columns without reading every record, so
+        # the records are read once and split, every batch then has them all
+        record_dataframe = _read_messages_fitparse(path_to_file, ["record"], fields)["record"]
+        column_labels = list(record_dataframe.columns)
+        batches = (
+            record_dataframe.iloc[start : start + batch_size].reset_index(drop=True)
+            for start in range(0, len(record_dataframe), batch_size)
+        )
+    for batch_dataframe in batches:
+        extra_labels = [
+            label for label in batch_dataframe.columns if label not in column_labels
+        ]
+        column_labels += extra_labels
+        batch_dataframe = batch_dataframe.reindex(columns=column_labels)
+        count("records", len(batch_dataframe))
+        with stage("timezone_conversion"):
+            batch_dataframe = _convert_timestamps(batch_dataframe)
+        yield batch_dataframe
+
+
+def find_fit_files(path_pattern):
+    """
+    this function will find fit files from a file
+    path, a folder or a glob pattern
+    options:
+        path_pattern: str or list
+            fit file, folder searched recursively for fit
+            files, glob pattern or list of fit file paths
+    returns:
+        fit_file_paths: list
+            sorted fit file paths
+    """
+    if not isinstance(path_pattern, str):
+        return list(path_pattern)
+    if os.path.isfile(path_pattern):
+        return [path_pattern]
+    if os.path.isdir(path_pattern):
+        # devices write .fit or .FIT so the extension is matched in any case
+        fit_file_paths = sorted(
+            os.path.join(directory, file_name)
+            for directory, _, file_names in os.walk(path_pattern)
+            for file_name in file_names
+            if file_name.lower().endswith(".fit")
+        )
+        return fit_file_paths
+    fit_file_paths = sorted(
+        path for path in glob.glob(path_pattern, recursive=True) if os.path.isfile(path)
+    )
+    return fit_file_paths
+
+
 def get_latest_minimum_timestamp(list_of_fit_file_dataframes):
     """
     this function will go through the dataframe
@@ -137,38 +513,62 @@ def compare_fit_file_dataframes(fit_file_dataframe_list):
     return fit_file_dataframe_list_to_compare
 
 
-def top_average_over_time(fit_file_dataframe, signal):
+def top_average_over_time(
+    fit_file_dataframe,
+    signal,
+    durations=None,
+    objective="min",
+    gap_policy="hold",
+    max_gap_seconds=5.0,
+):
     """
     this function will find the top average for the signal
-    over the time in seconds for the duration of the fit file
+    over the time in seconds for the duration of the fit file,
+    weighting each sample by the time until the next one so
+    smart recording and auto pause gaps are handled, only
+    windows that fit inside the activity are scored, unlike the
+    old rolling mean that also scored the partial windows at the
+    start, so results differ from it even on 1 Hz data
     options:
         fit_file_dataframe: dataframe
             dataframe to find top average over time
+        signal: str
+            column to average such as speed_m/s
+        durations: list
+            window lengths in seconds, defaults to every
+            second up to the duration of the fit file
+        objective: str
+            min for the lowest average or max for the highest
+        gap_policy: str
+            hold keeps the last value through a gap, zero counts
+            the time past max_gap_seconds as zero and break
+            leaves out windows that cross such a gap
+        max_gap_seconds: float
+            longest time a sample is trusted for with the
+            zero and break gap policies
     returns:
         top_average_over_time_dataframe: dataframe
             top average over time dataframe
     """
-    duration_in_seconds = int(
-        (
-            fit_file_dataframe["timestamp_None"].max()
-            - fit_file_dataframe["timestamp_None"].min()
-        ).total_seconds()
-    )
-    top_average = []
-    for second in range(1, duration_in_seconds + 1):
-        top = (
-            fit_file_dataframe.rolling(window=f"{second}s", on="timestamp_None")[signal]
-            .mean()
-            .min()
+    timestamps = fit_file_dataframe["timestamp_None"]
+    seconds = (timestamps - timestamps.min()).dt.total_seconds().to_numpy()
+    if durations is None:
+        durations = np.arange(1, int(np.nanmax(seconds, initial=0)) + 1)
+    with stage("curve_computation"):
+        top_average = mean_extreme_over_time(
+            seconds=seconds,
+            values=fit_file_dataframe[signal].to_numpy(dtype=np.float64, na_value=np.nan),
+            durations=durations,
+            objective=objective,
+            gap_policy=gap_policy,
+            max_gap_seconds=max_gap_seconds,
         )
-        top_average.append(
-            {
-                "timestamp_None": second,
-                signal: top,
-            }
-        )
-
-    top_average_over_time_dataframe = pd.DataFrame(top_average)
+    top_average_over_time_dataframe = pd.DataFrame(
+        {
+            "timestamp_None": np.asarray(durations),
+            signal: top_average,
+        }
+    )
     return top_average_over_time_dataframe
 
 
@@ -222,34 +622,40 @@ def mins_per_mile_or_km(meters_per_second, unit):
         return mins_per_kilometer
 
 
-def sport_peak_curve(fit_file_dataframe, sport="running"):
+def sport_peak_curve(fit_file_dataframe, sport="running", durations=None):
     """this function will find the top average for the signal
     over the time in seconds for the duration of the fit file
 
     Args:
         fit_file_dataframe (dataframe): dataframe to find top average over time
         sport (str, optional): sport to plot peak curve. Defaults to "running".
+        durations (list, optional): window lengths in samples, such as the ones from
+            log_spaced_durations. Defaults to every length up to the duration of the fit file.
 
     Returns:
         sport_peak_curve (dataframe): dataframe of the peak sports metric curve over time
     """
-    duration_in_seconds = int(fit_file_dataframe.index.max())
-    peak_average = []
-    for second in tqdm(range(1, duration_in_seconds + 1)):
-        temp = fit_file_dataframe.rolling(window=second)[
-            fit_file_dataframe.columns[1:]
-        ].mean()
-        peak_sport_metric = mins_per_mile_or_km(temp["speed_m/s"].max(), "km")
-        if sport == "cycling":
-            peak_sport_metric = temp["power_watts"].max()
-        peak_bpm = temp["heart_rate_bpm"].max()
-        peak_average.append(
-            {
-                "timestamp_None": second,
-                "sport_metric": peak_sport_metric,
-                "heart_rate": peak_bpm,
-            }
-        )
+    if durations is None:
+        durations = np.arange(1, int(fit_file_dataframe.index.max()) + 1)
+    sport_signal = "power_watts" if sport == "cycling" else "speed_m/s"
+    values = np.column_stack(
+        [
+            fit_file_dataframe[signal].to_numpy(dtype=np.float64, na_value=np.nan)
+            for signal in (sport_signal, "heart_rate_bpm")
+        ]
+    )
+    with stage("curve_computation"):
+        best_averages = mean_max(values, durations)
+    peak_sport_metric = best_averages[:, 0]
+    if sport != "cycling":
+        with np.errstate(divide="ignore"):
+            peak_sport_metric = mins_per_mile_or_km(peak_sport_metric, "km")
 
-    sport_peak_curve = pd.DataFrame(peak_average)
+    sport_peak_curve = pd.DataFrame(
+        {
+            "timestamp_None": np.asarray(durations),
+            "sport_metric": peak_sport_metric,
+            "heart_rate": best_averages[:, 1],
+        }
+    )
     return sport_peak_curve
@@ -0,0 +1,268 @@
+"""
+mean max curves of fit file signals
+
+the best average over every window length is found from
+cumulative sums, so each duration costs one vectorized
+subtraction instead of a pandas rolling pass, irregularly
+sampled signals use the running integral over time instead
+"""
+import numpy as np
+
+GAP_POLICIES = ("hold", "zero", "break")
+
+PEAK_OBJECTIVES = ("max", "min")
+
+
+def log_spaced_durations(max_duration, number_of_durations=100):
+    """
+    this function will make a log spaced set of
+    whole second durations from 1 to max_duration
+    options:
+        max_duration: int
+            longest duration in seconds
+        number_of_durations: int
+            number of durations wanted, fewer are given
+            when short durations round to the same second
+    returns:
+        durations: array
+            sorted unique durations in seconds
+    """
+    if max_duration < 1:
+        return np.array([], dtype=np.int64)
+    durations = np.unique(
+        np.geomspace(1, max_duration, num=number_of_durations).round().astype(np.int64)
+    )
+    return durations
+
+
+def hold_on_second_grid(seconds, values, max_gap_seconds=5.0):
+    """
+    this function will resample signals onto a one second
+    grid, holding each sample until the next one, so mean_max
+    windows in samples are windows in seconds even for smart
+    recording, time past max_gap_seconds such as a pause is
+    missing so no window spans it
+    options:
+        seconds: array
+            sorted sample times in seconds
+        values: array
+            samples with one column per signal, or a single signal
+        max_gap_seconds: float
+            longest time a sample is held for
+    returns:
+        grid_seconds: array
+            whole seconds from the first sample
+        grid_values: array
+            held samples at each grid second
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(seconds) == 0:
+        return np.array([], dtype=np.int64), values[:0]
+    seconds = seconds - seconds[0]
+    grid_seconds = np.arange(int(np.floor(seconds[-1])) + 1, dtype=np.int64)
+    held = np.searchsorted(seconds, grid_seconds, side="right") - 1
+    grid_values = values[held]
+    is_recording = grid_seconds - seconds[held] < max_gap_seconds
+    grid_values[~is_recording] = np.nan
+    return grid_seconds, grid_values
+
+
+def mean_max(values, durations, return_starts=False):
+    """
+    this function will find the best average of each
+    signal over every window of each duration in samples,
+    a window holding a missing value has no average
+    options:
+        values: array
+            samples with one column per signal, or a single signal
+        durations: list
+            window lengths in samples
+        return_starts: bool
+            True to also give the sample each best window starts at
+    returns:
+        best_averages: array
+            best average with one row per duration and one
+            column per signal, nan when no window fits
+        best_starts: array
+            only when return_starts is True, first sample of
+            each best window, -1 when no window fits
+    """
+    values = np.asarray(values, dtype=np.float64)
+    is_single_signal = values.ndim == 1
+    # one contiguous row per signal keeps each subtraction a single pass
+    signals = values[np.newaxis, :] if is_single_signal else np.ascontiguousarray(values.T)
+    number_of_signals, number_of_samples = signals.shape
+    is_missing = np.isnan(signals)
+    cumulative_sums = np.zeros((number_of_signals, number_of_samples + 1))
+    np.cumsum(np.where(is_missing, 0.0, signals), axis=1, out=cumulative_sums[:, 1:])
+    missing_counts = None
+    if is_missing.any():
+        missing_counts = np.zeros((number_of_signals, number_of_samples + 1), dtype=np.int64)
+        np.cumsum(is_missing, axis=1, out=missing_counts[:, 1:])
+
+    durations = np.asarray(durations, dtype=np.int64)
+    best_averages = np.full((len(durations), number_of_signals), np.nan)
+    best_starts = np.full((len(durations), number_of_signals), -1, dtype=np.int64)
+    window_sums = np.empty((number_of_signals, number_of_samples))
+    for row, duration in enumerate(durations):
+        if duration < 1 or duration > number_of_samples:
+            continue
+        number_of_windows = number_of_samples - duration + 1
+        sums = window_sums[:, :number_of_windows]
+        np.subtract(cumulative_sums[:, duration:], cumulative_sums[:, :number_of_windows], out=sums)
+        if missing_counts is not None:
+            has_missing = missing_counts[:, duration:] != missing_counts[:, :number_of_windows]
+            sums[has_missing] = -np.inf
+        if return_starts:
+            starts = sums.argmax(axis=1)
+            best_sums = sums[np.arange(number_of_signals), starts]
+            best_starts[row] = np.where(np.isneginf(best_sums), -1, starts)
+        else:
+            best_sums = sums.max(axis=1)
+        best_sums[np.isneginf(best_sums)] = np.nan
+        best_averages[row] = best_sums / duration
+    if is_single_signal:
+        best_averages, best_starts = best_averages[:, 0], best_starts[:, 0]
+    if return_starts:
+        return best_averages, best_starts
+    return best_averages
+
+
+def _integral_knots(seconds, values, gap_policy, max_gap_seconds):
+    """
+    this function will make the knots of the running
+    integral of a signal held from each sample to the next
+    options:
+        seconds: array
+            sorted sample times in seconds
+        values: array
+            sample values
+        gap_policy: str
+            hold to keep the last value through gaps, zero or
+            break to let a sample last at most max_gap_seconds
+        max_gap_seconds: float
+            longest time a sample is trusted for
+    returns:
+        knot_seconds: array
+            times where the integral changes slope
+        signal_integral: array
+            integral of the signal at each knot
+        gap_integral: array
+            seconds spent in gaps up to each knot
+    """
+    intervals = np.diff(seconds)
+    # the last sample lasts one typical sample interval
+    last_interval = np.median(intervals) if len(intervals) else 1.0
+    intervals = np.append(intervals, last_interval)
+    if gap_policy == "hold":
+        covered = intervals
+    else:
+        covered = np.minimum(intervals, max_gap_seconds)
+    start_integral = np.concatenate(([0.0], np.cumsum(values * covered)))
+    start_gap = np.concatenate(([0.0], np.cumsum(intervals - covered)))
+    knot_seconds = np.empty(2 * len(seconds) + 1)
+    knot_seconds[0:-1:2] = seconds
+    knot_seconds[1:-1:2] = seconds + covered
+    knot_seconds[-1] = seconds[-1] + intervals[-1]
+    signal_integral = np.empty_like(knot_seconds)
+    signal_integral[0:-1:2] = start_integral[:-1]
+    signal_integral[1:-1:2] = start_integral[1:]
+    signal_integral[-1] = start_integral[-1]
+    gap_integral = np.empty_like(knot_seconds)
+    gap_integral[0:-1:2] = start_gap[:-1]
+    gap_integral[1:-1:2] = start_gap[:-1]
+    gap_integral[-1] = start_gap[-1]
+    return knot_seconds, signal_integral, gap_integral
+
+
+def mean_extreme_over_time(
+    seconds,
+    values,
+    durations,
+    objective="max",
+    gap_policy="hold",
+    max_gap_seconds=5.0,
+):
+    """
+    this function will find the best time weighted average
+    of an irregularly sampled signal over every window of
+    each duration in seconds, each sample is held until the
+    next one and gaps follow the gap policy
+    options:
+        seconds: array
+            sample times in seconds
+        values: array
+            sample values, missing values are dropped
+        durations: list
+            window lengths in seconds
+        objective: str
+            max for the highest average or min for the lowest
+        gap_policy: str
+            hold keeps the last value through a gap, zero counts
+            the time past max_gap_seconds as zero and break
+            leaves out windows that cross such a gap
+        max_gap_seconds: float
+            longest time a sample is trusted for with the
+            zero and break gap policies
+    returns:
+        best_averages: array
+            best average for each duration, nan when no window fits
+    """
+    if objective not in PEAK_OBJECTIVES:
+        raise ValueError(f"objective must be one of {PEAK_OBJECTIVES}, got '{objective}'")
+    if gap_policy not in GAP_POLICIES:
+        raise ValueError(f"gap_policy must be one of {GAP_POLICIES}, got '{gap_policy}'")
+    seconds = np.asarray(seconds, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    is_present = ~(np.isnan(seconds) | np.isnan(values))
+    order = np.argsort(seconds[is_present], kind="stable")
+    seconds = seconds[is_present][order]
+    values = values[is_present][order]
+    durations = np.asarray(durations, dtype=np.float64)
+    best_averages = np.full(len(durations), np.nan)
+    if len(seconds) == 0:
+        return best_averages
+
+    knot_seconds, signal_integral, gap_integral = _integral_knots(
+        seconds, values, gap_policy, max_gap_seconds
+    )
+    # the integrals are continuous so repeated knots can be dropped
+    is_last_repeat = np.diff(knot_seconds, append=np.inf) > 0
+    knot_seconds = knot_seconds[is_last_repeat]
+    signal_integral = signal_integral[is_last_repeat]
+    gap_integral = gap_integral[is_last_repeat]
+    first_second, last_second = knot_seconds[0], knot_seconds[-1]
+    tolerance = 1e-9 * max(1.0, last_second - first_second)
+    for row, duration in enumerate(durations):
+        if duration <= 0 or duration > last_second - first_second + tolerance:
+            continue
+        # the integral is piecewise linear so the best window
+        # starts or ends on a knot
+        last_start = np.searchsorted(knot_seconds, last_second - duration + tolerance, "right")
+        first_end = np.searchsorted(knot_seconds, first_second + duration - tolerance, "left")
+        window_ends = knot_seconds[:last_start] + duration
+        window_starts = knot_seconds[first_end:] - duration
+        window_integrals = np.concatenate(
+            (
+                np.interp(window_ends, knot_seconds, signal_integral)
+                - signal_integral[:last_start],
+                signal_integral[first_end:]
+                - np.interp(window_starts, knot_seconds, signal_integral),
+            )
+        )
+        if gap_policy == "break":
+            gap_seconds = np.concatenate(
+                (
+                    np.interp(window_ends, knot_seconds, gap_integral) - gap_integral[:last_start],
+                    gap_integral[first_end:] - np.interp(window_starts, knot_seconds, gap_integral),
+                )
+            )
+            window_integrals = window_integrals[gap_seconds <= tolerance]
+            if len(window_integrals) == 0:
+                continue
+        if objective == "max":
+            best_averages[row] = window_integrals.max() / duration
+        else:
+            best_averages[row] = window_integrals.min() / duration
+    return best_averages
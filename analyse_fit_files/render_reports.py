@@ -0,0 +1,235 @@
+"""
+headless activity reports
+
+every signal of an activity is drawn as a subplot of one figure
+that never touches pyplot, so no display is needed and nothing is
+kept after it is saved, and reports of many activities are rendered
+in worker processes that are replaced after a number of reports so
+their memory stays flat
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from analyse_fit_files.atomic_files import replace_atomically
+from analyse_fit_files.downsample import DEFAULT_MAX_POINTS
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_data
+from analyse_fit_files.parse_fit_file import find_fit_files
+from analyse_fit_files.visualize_fit_files import draw_fit_file_data
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("png", "svg")
+
+DEFAULT_REPORT_DPI = 100
+
+# reports a worker process renders before it is replaced
+MAX_REPORTS_PER_WORKER = 50
+
+
+def _search_directory(path_pattern, fit_file_paths):
+    """
+    this function will give the folder the fit files were
+    found under, so their reports keep their place under it
+    options:
+        path_pattern: str or list
+            fit file, folder, glob pattern or list of fit files
+        fit_file_paths: list
+            fit file paths found from the path_pattern
+    returns:
+        root_directory: str
+            searched folder, the deepest folder holding every
+            fit file for a glob pattern or list, None if
+            nothing was found
+    """
+    if isinstance(path_pattern, str) and os.path.isdir(path_pattern):
+        return path_pattern
+    if not fit_file_paths:
+        return None
+    root_directory = os.path.commonpath(
+        [os.path.dirname(os.path.abspath(path_to_file)) for path_to_file in fit_file_paths]
+    )
+    return root_directory
+
+
+def report_path(path_to_file, output_directory=None, image_format="png", root_directory=None):
+    """
+    this function will give the path a report is saved to
+    options:
+        path_to_file: str
+            file path for fit file
+        output_directory: str
+            folder to save to, None to save next to the fit file
+        image_format: str
+            png or svg
+        root_directory: str
+            searched folder, the report keeps the fit file's
+            place under it in the output_directory, None to
+            save every report at the top of the output_directory
+    returns:
+        save_path: str
+            path of the report
+    """
+    base_path = os.path.splitext(path_to_file)[0]
+    if output_directory is not None:
+        if root_directory is None:
+            relative_path = os.path.basename(base_path)
+        else:
+            relative_path = os.path.relpath(base_path, root_directory)
+        base_path = os.path.join(output_directory, relative_path)
+    save_path = f"{base_path}_report.{image_format}"
+    return save_path
+
+
+def save_figure(figure, save_path, image_format="png", dpi=DEFAULT_REPORT_DPI):
+    """
+    this function will atomically save a figure and clear it
+    so its drawing is freed straight away
+    options:
+        figure: figure
+            matplotlib figure
+        save_path: str
+            path of the image
+        image_format: str
+            png or svg
+        dpi: int
+            resolution of png images
+    returns:
+        None
+    """
+    if image_format not in REPORT_FORMATS:
+        raise ValueError(f"image_format must be one of {list(REPORT_FORMATS)}, got '{image_format}'")
+    try:
+        replace_atomically(
+            save_path,
+            lambda temporary_path: figure.savefig(temporary_path, format=image_format, dpi=dpi),
+        )
+    finally:
+        figure.clear()
+
+
+def render_activity_report(
+    path_to_file,
+    output_directory=None,
+    image_format="png",
+    engine="native",
+    max_points=DEFAULT_MAX_POINTS,
+    dpi=DEFAULT_REPORT_DPI,
+    root_directory=None,
+):
+    """
+    this function will save a report of every signal of a fit file
+    options:
+        path_to_file: str
+            file path for fit file
+        output_directory: str
+            folder to save to, None to save next to the fit file
+        image_format: str
+            png or svg
+        engine: str
+            fitparse or native
+        max_points: int
+            number of points drawn per signal, None to draw every sample
+        dpi: int
+            resolution of png images
+        root_directory: str
+            searched folder the report keeps its place under
+    returns:
+        save_path: str
+            path of the report
+    """
+    fit_file_dataframe = get_cached_fit_file_data(path_to_file, engine=engine)
+    figure = draw_fit_file_data(
+        fit_file_dataframe, os.path.basename(path_to_file), max_points=max_points
+    )
+    save_path = report_path(path_to_file, output_directory, image_format, root_directory)
+    save_figure(figure, save_path, image_format, dpi)
+    return save_path
+
+
+def _report_or_error(path_to_file, options):
+    """
+    this function will render a report and give the error
+    instead of raising so one bad file does not stop a batch
+    options:
+        path_to_file: str
+            file path for fit file
+        options: dict
+            options of render_activity_report
+    returns:
+        result: dict
+            path, report_path and error, None unless the
+            report could not be rendered
+    """
+    try:
+        result = {"path": path_to_file, "report_path": render_activity_report(path_to_file, **options)}
+        result["error"] = None
+    except Exception as error:
+        result = {"path": path_to_file, "report_path": None, "error": f"{type(error).__name__}: {error}"}
+    return result
+
+
+def render_reports(
+    path_pattern,
+    output_directory=None,
+    image_format="png",
+    engine="native",
+    workers=os.cpu_count(),
+    max_points=DEFAULT_MAX_POINTS,
+    dpi=DEFAULT_REPORT_DPI,
+):
+    """
+    this function will render the reports of many fit files
+    in parallel worker processes
+    options:
+        path_pattern: str or list
+            fit file, folder searched recursively for fit
+            files, glob pattern or list of fit file paths
+        output_directory: str
+            folder to save to, None to save next to each fit file
+        image_format: str
+            png or svg
+        engine: str
+            fitparse or native
+        workers: int
+            number of processes rendering reports, 1 to
+            render them one after another in this process
+        max_points: int
+            number of points drawn per signal
+        dpi: int
+            resolution of png images
+    returns:
+        report_dataframe: dataframe
+            one row per fit file with the report path and an
+            error column for files that could not be rendered,
+            with an output_directory each report keeps the fit
+            file's place under the searched folder
+    """
+    fit_file_paths = find_fit_files(path_pattern)
+    options = {
+        "root_directory": _search_directory(path_pattern, fit_file_paths),
+        "output_directory": output_directory,
+        "image_format": image_format,
+        "engine": engine,
+        "max_points": max_points,
+        "dpi": dpi,
+    }
+    workers = max(1, min(workers or 1, len(fit_file_paths)))
+    if workers == 1:
+        results = [_report_or_error(path_to_file, options) for path_to_file in fit_file_paths]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, max_tasks_per_child=MAX_REPORTS_PER_WORKER
+        ) as executor:
+            results = list(
+                executor.map(_report_or_error, fit_file_paths, [options] * len(fit_file_paths))
+            )
+    report_dataframe = pd.DataFrame(results, columns=["path", "report_path", "error"])
+    number_of_errors = report_dataframe["error"].notna().sum()
+    logger.info(
+        f"rendered {len(report_dataframe) - number_of_errors} reports "
+        f"({number_of_errors} could not be rendered)"
+    )
+    return report_dataframe
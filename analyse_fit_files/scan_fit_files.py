@@ -0,0 +1,128 @@
+"""
+fast summary scan of fit files
+
+only the file_id, session and lap messages are decoded, every
+other run of data messages, the records among them, is stepped
+over by the size of its definition, so a folder of fit files is
+summarised in a fraction of the time it takes to parse the records
+"""
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from analyse_fit_files.parse_fit_file import find_fit_files, get_fit_file_messages
+from analyse_fit_files.summaries import SUMMARY_MESSAGES, activity_summary, local_start_times
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLUMNS = [
+    "path",
+    "file_size",
+    "modified_time",
+    "sport",
+    "sub_sport",
+    "start_time",
+    "duration_s",
+    "timer_time_s",
+    "distance_m",
+    "number_of_laps",
+    "manufacturer",
+    "product",
+    "serial_number",
+]
+
+
+def fit_file_summary(path_to_file, engine="native"):
+    """
+    this function will summarise one fit file from
+    its file_id, session and lap messages
+    options:
+        path_to_file: str
+            file path for fit file
+        engine: str
+            native or fitparse
+    returns:
+        summary: dict
+            path, size and modification time of the file and
+            the activity summary, start_time as utc text
+    """
+    # the native engine steps over the records without decoding them
+    fit_messages = get_fit_file_messages(
+        path_to_file, messages=list(SUMMARY_MESSAGES), engine=engine
+    )
+    summary = {
+        "path": path_to_file,
+        "file_size": os.path.getsize(path_to_file),
+        "modified_time": os.path.getmtime(path_to_file),
+        **activity_summary(fit_messages),
+    }
+    return summary
+
+
+def _summary_or_error(path_to_file, engine):
+    """
+    this function will summarise a fit file and report an
+    error instead of raising so one bad file in a folder
+    does not stop the scan
+    options:
+        path_to_file: str
+            file path for fit file
+        engine: str
+            native or fitparse
+    returns:
+        summary: dict
+            summary of the fit file with an error entry,
+            None unless the file could not be read
+    """
+    try:
+        summary = fit_file_summary(path_to_file, engine)
+        summary["error"] = None
+    except Exception as error:
+        summary = {"path": path_to_file, "error": f"{type(error).__name__}: {error}"}
+    return summary
+
+
+def scan_fit_files(path_pattern, workers=os.cpu_count(), engine="native"):
+    """
+    this function will summarise every fit file of a folder
+    in parallel reading only the file_id, session and lap messages
+    options:
+        path_pattern: str or list
+            fit file, folder searched recursively for fit
+            files, glob pattern or list of fit file paths
+        workers: int
+            number of processes reading fit files, 1 to
+            read them one after another in this process
+        engine: str
+            native to step over the records or fitparse
+    returns:
+        summary_dataframe: dataframe
+            one row per fit file sorted by start time with
+            start_time in the local time zone and an error
+            column for files that could not be read
+    """
+    fit_file_paths = find_fit_files(path_pattern)
+    workers = max(1, min(workers or 1, len(fit_file_paths)))
+    engines = [engine] * len(fit_file_paths)
+    if workers == 1:
+        summaries = list(map(_summary_or_error, fit_file_paths, engines))
+    else:
+        # small files are handed out in chunks so the processes are not kept waiting
+        chunksize = max(1, len(fit_file_paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            summaries = list(
+                executor.map(_summary_or_error, fit_file_paths, engines, chunksize=chunksize)
+            )
+    summary_dataframe = pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS + ["error"])
+    summary_dataframe["start_time"] = local_start_times(summary_dataframe["start_time"])
+    summary_dataframe = summary_dataframe.sort_values(
+        "start_time", kind="stable", ignore_index=True
+    )
+    number_of_errors = summary_dataframe["error"].notna().sum()
+    logger.info(
+        f"scanned {len(summary_dataframe)} fit files ({number_of_errors} could not be read)"
+    )
+    return summary_dataframe
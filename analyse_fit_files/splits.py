@@ -0,0 +1,360 @@
+"""
+splits and best distance efforts from the cumulative distance
+
+split boundaries are found with one searchsorted over the
+cumulative distance_m of every activity at once, and the fastest
+segment of each distance is found with a monotonic two pointer
+scan done as a single searchsorted, the start of every window is
+interpolated so efforts do not depend on where the samples fall
+"""
+import numpy as np
+import pandas as pd
+
+# meters in each pace unit, the mile matches mins_per_mile_or_km
+UNIT_METERS = {"km": 1000.0, "mile": 1609.34}
+
+# 1 km, 1 mile, 5 km, 10 km, half marathon and marathon
+DEFAULT_BEST_DISTANCES = (1000.0, 1609.34, 5000.0, 10000.0, 21097.5, 42195.0)
+
+
+def pace_from_speed(meters_per_second, unit="km"):
+    """
+    this function will convert speeds to paces for
+    a whole column at once
+    options:
+        meters_per_second: array like
+            speeds in meters per second
+        unit: str
+            km or mile
+    returns:
+        pace: array
+            minutes per km or mile, nan when not moving
+    """
+    if unit not in UNIT_METERS:
+        raise ValueError(f"unit must be one of {tuple(UNIT_METERS)}, got '{unit}'")
+    speed = np.asarray(meters_per_second, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pace = np.where(speed > 0, UNIT_METERS[unit] / 60 / speed, np.nan)
+    return pace
+
+
+def pace_clock_time(pace):
+    """
+    this function will write paces in minutes as
+    minutes and seconds like decimal_time2clock_time
+    for a whole column at once
+    options:
+        pace: array like
+            paces in decimal minutes
+    returns:
+        clock_times: series
+            paces such as 4:35, empty where the pace is missing
+    """
+    total_seconds = pd.Series(np.round(np.asarray(pace, dtype=np.float64) * 60))
+    is_present = np.isfinite(total_seconds)
+    whole_seconds = total_seconds.where(is_present, 0).astype(np.int64)
+    clock_times = (
+        (whole_seconds // 60).astype(str) + ":" + (whole_seconds % 60).astype(str).str.zfill(2)
+    ).where(is_present, "")
+    return clock_times
+
+
+def _as_dataframe_list(fit_file_dataframes, activity_ids):
+    """
+    this function will accept one dataframe or many
+    options:
+        fit_file_dataframes: dataframe or list
+            parsed fit file data of one or many activities
+        activity_ids: list
+            name of each activity, defaults to their position
+    returns:
+        fit_file_dataframe_list: list
+            list of dataframes
+        activity_ids: list
+            name of each activity
+    """
+    if isinstance(fit_file_dataframes, pd.DataFrame):
+        fit_file_dataframes = [fit_file_dataframes]
+    fit_file_dataframe_list = list(fit_file_dataframes)
+    if activity_ids is None:
+        activity_ids = list(range(len(fit_file_dataframe_list)))
+    if len(activity_ids) != len(fit_file_dataframe_list):
+        raise ValueError("every dataframe needs an activity id")
+    return fit_file_dataframe_list, list(activity_ids)
+
+
+def _stacked_distance(fit_file_dataframe_list, signals=()):
+    """
+    this function will put the distance of every activity
+    end to end on one non decreasing axis, each activity
+    starting 1 m past the end of the one before, so one
+    searchsorted covers them all
+    options:
+        fit_file_dataframe_list: list
+            parsed fit file data with timestamp_None and distance_m
+        signals: iterable
+            other columns to stack alongside
+    returns:
+        stacked: dict
+            seconds from the start of each activity, distance
+            from its start, stacked distance, the activity of
+            every sample, the first sample and distance of each
+            activity, its position in the list and each signal
+    """
+    seconds, distance, positions = [], [], []
+    stacked_signals = {signal: [] for signal in signals}
+    for position, fit_file_dataframe in enumerate(fit_file_dataframe_list):
+        if not {"timestamp_None", "distance_m"} <= set(fit_file_dataframe.columns):
+            continue
+        activity_distance = pd.to_numeric(fit_file_dataframe["distance_m"], errors="coerce")
+        timestamps = fit_file_dataframe["timestamp_None"]
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps)
+        is_present = (activity_distance.notna() & timestamps.notna()).to_numpy()
+        if not is_present.any():
+            continue
+        activity_seconds = (timestamps - timestamps[is_present].min()).dt.total_seconds()
+        activity_distance = activity_distance.to_numpy(dtype=np.float64)[is_present]
+        # odometers can step back a little, the distance never decreases here
+        activity_distance = np.maximum.accumulate(activity_distance - activity_distance[0])
+        seconds.append(activity_seconds.to_numpy(dtype=np.float64)[is_present])
+        distance.append(activity_distance)
+        positions.append(position)
+        for signal in signals:
+            values = (
+                pd.to_numeric(fit_file_dataframe[signal], errors="coerce")
+                if signal in fit_file_dataframe.columns
+                else pd.Series(np.nan, index=fit_file_dataframe.index)
+            )
+            stacked_signals[signal].append(values.to_numpy(dtype=np.float64)[is_present])
+    if not distance:
+        empty = np.array([], dtype=np.float64)
+        return {
+            "seconds": empty,
+            "distance": empty,
+            "stacked_distance": empty,
+            "activity": np.array([], dtype=np.int64),
+            "starts": np.array([], dtype=np.int64),
+            "totals": empty,
+            "offsets": empty,
+            "positions": np.array([], dtype=np.int64),
+            "signals": {signal: empty for signal in signals},
+        }
+    totals = np.array([activity_distance[-1] for activity_distance in distance])
+    offsets = np.concatenate(([0.0], np.cumsum(totals + 1.0)[:-1]))
+    lengths = np.array([len(activity_distance) for activity_distance in distance])
+    stacked = {
+        "seconds": np.concatenate(seconds),
+        "distance": np.concatenate(distance),
+        "stacked_distance": np.concatenate(distance) + np.repeat(offsets, lengths),
+        "activity": np.repeat(np.arange(len(lengths)), lengths),
+        "starts": np.concatenate(([0], np.cumsum(lengths)[:-1])),
+        "totals": totals,
+        "offsets": offsets,
+        "positions": np.array(positions),
+        "signals": {signal: np.concatenate(values) for signal, values in stacked_signals.items()},
+    }
+    return stacked
+
+
+def _seconds_at_distance(stacked_distance, seconds, targets):
+    """
+    this function will find when each target distance was
+    reached, interpolating between the samples either side
+    options:
+        stacked_distance: array
+            non decreasing distance
+        seconds: array
+            time of each sample
+        targets: array
+            distances on the same axis, each inside an activity
+    returns:
+        target_seconds: array
+            time each target was reached
+        after: array
+            first sample at or past each target
+    """
+    after = np.searchsorted(stacked_distance, targets, side="left")
+    after = np.minimum(after, len(stacked_distance) - 1)
+    before = np.maximum(after - 1, 0)
+    span = stacked_distance[after] - stacked_distance[before]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(span > 0, (targets - stacked_distance[before]) / span, 1.0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    target_seconds = seconds[before] + fraction * (seconds[after] - seconds[before])
+    return target_seconds, after
+
+
+def activity_splits(
+    fit_file_dataframes,
+    unit="km",
+    split_distance=None,
+    activity_ids=None,
+    signals=("heart_rate_bpm",),
+):
+    """
+    this function will split one or many activities into
+    every km or mile, or any other distance, in one
+    vectorized pass, the last split is the distance left over
+    options:
+        fit_file_dataframes: dataframe or list
+            parsed fit file data of one or many activities
+        unit: str
+            km or mile for the splits and paces
+        split_distance: float
+            length of each split in meters, defaults to the unit
+        activity_ids: list
+            name of each activity, defaults to their position
+        signals: iterable
+            columns averaged over each split
+    returns:
+        splits_dataframe: dataframe
+            one row per split with the activity, split number,
+            distance_m, time_s, elapsed_s at its end, pace in
+            minutes per unit, pace as clock time and the
+            average of each signal
+    """
+    if unit not in UNIT_METERS:
+        raise ValueError(f"unit must be one of {tuple(UNIT_METERS)}, got '{unit}'")
+    fit_file_dataframe_list, activity_ids = _as_dataframe_list(fit_file_dataframes, activity_ids)
+    split_distance = float(split_distance or UNIT_METERS[unit])
+    signals = list(signals)
+    stacked = _stacked_distance(fit_file_dataframe_list, signals)
+    split_counts = np.ceil(stacked["totals"] / split_distance).astype(np.int64)
+    split_counts = np.maximum(split_counts, (stacked["totals"] > 0).astype(np.int64))
+    split_activity = np.repeat(np.arange(len(split_counts)), split_counts)
+    split_starts = np.concatenate(([0], np.cumsum(split_counts)[:-1])) if len(split_counts) else []
+    split_number = np.arange(len(split_activity)) - np.repeat(split_starts, split_counts)
+    split_end = np.minimum((split_number + 1) * split_distance, stacked["totals"][split_activity])
+    boundaries = split_end + stacked["offsets"][split_activity]
+
+    end_seconds, _ = _seconds_at_distance(
+        stacked["stacked_distance"], stacked["seconds"], boundaries
+    )
+    is_first = split_number == 0
+    start_seconds = np.where(is_first, 0.0, np.roll(end_seconds, 1))
+    split_length = split_end - np.where(is_first, 0.0, np.roll(split_end, 1))
+    split_time = end_seconds - start_seconds
+
+    split_activity_ids = np.empty(len(split_activity), dtype=object)
+    split_activity_ids[:] = [activity_ids[stacked["positions"][i]] for i in split_activity]
+    splits_dataframe = pd.DataFrame(
+        {
+            "activity": split_activity_ids,
+            "split": split_number + 1,
+            "distance_m": split_length,
+            "time_s": split_time,
+            "elapsed_s": end_seconds,
+        }
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pace = np.where(
+            split_length > 0, split_time / 60 / (split_length / UNIT_METERS[unit]), np.nan
+        )
+    splits_dataframe[f"pace_min_per_{unit}"] = pace
+    splits_dataframe["pace"] = pace_clock_time(pace)
+
+    # every sample belongs to the first split ending at or past it
+    sample_split = np.searchsorted(boundaries, stacked["stacked_distance"], side="left")
+    sample_split = np.minimum(sample_split, max(len(boundaries) - 1, 0))
+    for signal in signals:
+        values = stacked["signals"][signal]
+        is_present = ~np.isnan(values)
+        sums = np.bincount(
+            sample_split[is_present], weights=values[is_present], minlength=len(boundaries)
+        )
+        counts = np.bincount(sample_split[is_present], minlength=len(boundaries))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            splits_dataframe[signal] = np.where(counts > 0, sums / counts, np.nan)
+    return splits_dataframe
+
+
+def best_segments(
+    fit_file_dataframes,
+    distances=DEFAULT_BEST_DISTANCES,
+    activity_ids=None,
+    unit="km",
+):
+    """
+    this function will find the fastest segment of each
+    distance in one or many activities, for each sample the
+    start of the shortest window covering the distance is
+    found with a two pointer scan over the non decreasing
+    distance, done for every sample at once with searchsorted
+    options:
+        fit_file_dataframes: dataframe or list
+            parsed fit file data of one or many activities
+        distances: list
+            segment lengths in meters
+        activity_ids: list
+            name of each activity, defaults to their position
+        unit: str
+            km or mile for the paces
+    returns:
+        best_segments_dataframe: dataframe
+            one row per activity and distance covered with the
+            fastest time_s, its pace and the seconds from the
+            start of the activity the segment starts and ends at
+    """
+    if unit not in UNIT_METERS:
+        raise ValueError(f"unit must be one of {tuple(UNIT_METERS)}, got '{unit}'")
+    fit_file_dataframe_list, activity_ids = _as_dataframe_list(fit_file_dataframes, activity_ids)
+    stacked = _stacked_distance(fit_file_dataframe_list)
+    stacked_distance, seconds = stacked["stacked_distance"], stacked["seconds"]
+    sample_start = stacked["starts"][stacked["activity"]]
+    rows = []
+    for distance in np.asarray(distances, dtype=np.float64):
+        start_targets = stacked_distance - distance
+        # the last sample at or before the start of the window
+        before = np.searchsorted(stacked_distance, start_targets, side="right") - 1
+        is_valid = before >= sample_start
+        if not is_valid.any():
+            continue
+        before = np.where(is_valid, before, sample_start)
+        after = np.minimum(before + 1, len(stacked_distance) - 1)
+        span = stacked_distance[after] - stacked_distance[before]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(span > 0, (start_targets - stacked_distance[before]) / span, 0.0)
+        start_seconds = seconds[before] + np.clip(fraction, 0.0, 1.0) * (
+            seconds[after] - seconds[before]
+        )
+        segment_seconds = np.where(is_valid, seconds - start_seconds, np.inf)
+        # fastest window per activity
+        activity_best = np.minimum.reduceat(segment_seconds, stacked["starts"])
+        sample_ends = np.append(stacked["starts"][1:], len(seconds))
+        for stacked_position, best_seconds in enumerate(activity_best):
+            if not np.isfinite(best_seconds):
+                continue
+            start = stacked["starts"][stacked_position]
+            end = start + int(np.argmin(segment_seconds[start : sample_ends[stacked_position]]))
+            rows.append(
+                {
+                    "position": stacked["positions"][stacked_position],
+                    "activity": activity_ids[stacked["positions"][stacked_position]],
+                    "distance_m": distance,
+                    "time_s": best_seconds,
+                    f"pace_min_per_{unit}": best_seconds / 60 / (distance / UNIT_METERS[unit]),
+                    "start_s": start_seconds[end],
+                    "end_s": seconds[end],
+                }
+            )
+    best_segments_dataframe = (
+        pd.DataFrame(
+            rows,
+            columns=[
+                "position",
+                "activity",
+                "distance_m",
+                "time_s",
+                f"pace_min_per_{unit}",
+                "start_s",
+                "end_s",
+            ],
+        )
+        .sort_values(["position", "distance_m"], kind="stable", ignore_index=True)
+        .drop(columns="position")
+    )
+    best_segments_dataframe["pace"] = pace_clock_time(
+        best_segments_dataframe[f"pace_min_per_{unit}"]
+    )
+    return best_segments_dataframe
@@ -0,0 +1,167 @@
+"""
+summaries of activities
+
+an activity is summarised from its file_id, session and lap
+messages alone, its sport, start time, duration, distance and
+device, with times kept as utc text so they sort as dates
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# fit messages an activity is summarised from
+SUMMARY_MESSAGES = ("file_id", "session", "lap")
+
+# time zone the start times are given in
+LOCAL_TIMEZONE = "US/Eastern"
+
+# times are written as utc text in this format so they sort as dates
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def utc_text(timestamp):
+    """
+    this function will write a time as utc text
+    options:
+        timestamp: timestamp
+            time from a fit file, naive times are utc
+    returns:
+        utc_text: str
+            utc time as text, None if the time is missing
+    """
+    if timestamp is None or pd.isna(timestamp):
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    utc_text = timestamp.strftime(_TIME_FORMAT)
+    return utc_text
+
+
+def json_value(value):
+    """
+    this function will make a field value json serialisable
+    options:
+        value: object
+            value of a summary field
+    returns:
+        json_value: object
+            value as a number, text, list or None
+    """
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime)):
+        return utc_text(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _first_value(message_dataframe, column):
+    """
+    this function will give the first value of a column
+    options:
+        message_dataframe: dataframe
+            dataframe of a fit message
+        column: str
+            column label
+    returns:
+        value: object
+            first value that is not missing, None if there is none
+    """
+    if column not in message_dataframe.columns:
+        return None
+    values = message_dataframe[column].dropna()
+    value = json_value(values.iloc[0]) if len(values) else None
+    return value
+
+
+def _column_total(message_dataframe, column):
+    """
+    this function will add up a column of the session messages
+    options:
+        message_dataframe: dataframe
+            dataframe of the session messages
+        column: str
+            column label
+    returns:
+        total: float
+            sum of the column, None if it is missing
+    """
+    if column not in message_dataframe.columns:
+        return None
+    values = pd.to_numeric(message_dataframe[column], errors="coerce")
+    total = float(values.sum()) if values.notna().any() else None
+    return total
+
+
+def activity_summary(fit_messages):
+    """
+    this function will summarise an activity from
+    its file_id, session and lap messages, adding up
+    the sessions of a multisport activity
+    options:
+        fit_messages: dict
+            dictionary of message name to dataframe with
+            the file_id, session and lap messages
+    returns:
+        summary: dict
+            sport, start time, duration, distance and device
+    """
+    file_id = fit_messages.get("file_id", pd.DataFrame())
+    sessions = fit_messages.get("session", pd.DataFrame())
+    laps = fit_messages.get("lap", pd.DataFrame())
+    sports = (
+        sessions["sport_None"].dropna().unique() if "sport_None" in sessions.columns else []
+    )
+    if len(sports) > 1:
+        sport = "multisport"
+    elif len(sports) == 1:
+        sport = str(sports[0])
+    else:
+        sport = _first_value(laps, "sport_None") or "generic"
+    start_times = []
+    for message_dataframe in (sessions, laps):
+        if "start_time_None" in message_dataframe.columns:
+            start_times.extend(message_dataframe["start_time_None"].dropna())
+    start_time = min(start_times) if start_times else _first_value(file_id, "time_created_None")
+    summary = {
+        "sport": sport,
+        "sub_sport": _first_value(sessions, "sub_sport_None"),
+        "start_time": utc_text(start_time),
+        "duration_s": _column_total(sessions, "total_elapsed_time_s"),
+        "timer_time_s": _column_total(sessions, "total_timer_time_s"),
+        "distance_m": _column_total(sessions, "total_distance_m"),
+        "number_of_laps": len(laps),
+        "manufacturer": _first_value(file_id, "manufacturer_None"),
+        "product": _first_value(file_id, "product_name_None")
+        or _first_value(file_id, "product_None"),
+        "serial_number": _first_value(file_id, "serial_number_None"),
+    }
+    for key in ("manufacturer", "product", "serial_number"):
+        if summary[key] is not None:
+            summary[key] = str(summary[key])
+    return summary
+
+
+def local_start_times(utc_texts):
+    """
+    this function will read start times saved as utc text
+    options:
+        utc_texts: series
+            times as utc text
+    returns:
+        start_times: series
+            times in the local time zone
+    """
+    start_times = (
+        pd.to_datetime(utc_texts, format=_TIME_FORMAT)
+        .dt.tz_localize("UTC")
+        .dt.tz_convert(LOCAL_TIMEZONE)
+    )
+    return start_times
@@ -0,0 +1,448 @@
+"""
+writer of synthetic fit files
+
+makes valid fit activities of any length recorded every second,
+with a chosen set of record fields and developer fields, to
+benchmark and check the parsers on more data than a real file has
+"""
+import datetime
+import struct
+
+import numpy as np
+
+from fitparse.profile import FIELD_TYPES
+
+# seconds between the unix epoch and the fit epoch of 1989-12-31
+FIT_EPOCH_OFFSET = 631065600
+
+PROFILE_VERSION = 2132
+
+# base type numbers of the fit protocol
+BASE_TYPE_ENUM = 0x00
+BASE_TYPE_SINT8 = 0x01
+BASE_TYPE_UINT8 = 0x02
+BASE_TYPE_STRING = 0x07
+BASE_TYPE_SINT16 = 0x83
+BASE_TYPE_UINT16 = 0x84
+BASE_TYPE_SINT32 = 0x85
+BASE_TYPE_UINT32 = 0x86
+BASE_TYPE_FLOAT32 = 0x88
+BASE_TYPE_UINT32Z = 0x8C
+
+# record field name: (field number, numpy dtype, base type)
+SYNTHETIC_RECORD_FIELDS = {
+    "position_lat": (0, "<i4", BASE_TYPE_SINT32),
+    "position_long": (1, "<i4", BASE_TYPE_SINT32),
+    "altitude": (2, "<u2", BASE_TYPE_UINT16),
+    "heart_rate": (3, "u1", BASE_TYPE_UINT8),
+    "cadence": (4, "u1", BASE_TYPE_UINT8),
+    "distance": (5, "<u4", BASE_TYPE_UINT32),
+    "speed": (6, "<u2", BASE_TYPE_UINT16),
+    "power": (7, "<u2", BASE_TYPE_UINT16),
+    "temperature": (13, "i1", BASE_TYPE_SINT8),
+}
+
+TIMESTAMP_FIELD = (253, "<u4", BASE_TYPE_UINT32)
+
+# time field of the hrv message, five beat to beat intervals in ms
+HRV_TIME_FIELD = (0, "(5,)<u2", BASE_TYPE_UINT16)
+
+# share of beats a synthetic chest strap misses, merging two intervals
+SYNTHETIC_MISSED_BEAT_FRACTION = 0.002
+
+DEVELOPER_FIELD_NAME_SIZE = 32
+
+DEVELOPER_FIELD_UNITS_SIZE = 8
+
+
+def _crc_table():
+    """
+    this function will make the lookup table of the
+    crc used by fit files, one entry per byte value
+    options:
+        None
+    returns:
+        crc_table: list
+            crc of every byte value
+    """
+    crc_table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        crc_table.append(crc)
+    return crc_table
+
+
+CRC_TABLE = _crc_table()
+
+
+def fit_crc(data, crc=0):
+    """
+    this function will work out the crc of fit file bytes
+    options:
+        data: bytes
+            bytes to check
+        crc: int
+            crc of the bytes before these ones
+    returns:
+        crc: int
+            16 bit crc
+    """
+    for byte in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _definition_message(local_message_type, global_message_number, fields, developer_fields=()):
+    """
+    this function will encode a definition message
+    options:
+        local_message_type: int
+            local message type the definition is for
+        global_message_number: int
+            profile message number such as 20 for record
+        fields: list
+            (field number, numpy dtype, base type) of each field
+        developer_fields: list
+            (field number, size, developer data index) of each
+            developer field
+    returns:
+        definition_message: bytes
+            encoded definition message
+    """
+    header = 0x40 | local_message_type | (0x20 if developer_fields else 0)
+    definition_message = struct.pack("<BBBHB", header, 0, 0, global_message_number, len(fields))
+    for field_number, dtype, base_type in fields:
+        definition_message += struct.pack("BBB", field_number, np.dtype(dtype).itemsize, base_type)
+    if developer_fields:
+        definition_message += struct.pack("B", len(developer_fields))
+        for developer_field in developer_fields:
+            definition_message += struct.pack("BBB", *developer_field)
+    return definition_message
+
+
+def _data_messages(local_message_type, fields, columns):
+    """
+    this function will encode many data messages at once
+    from one column of raw values per field
+    options:
+        local_message_type: int
+            local message type of the definition
+        fields: list
+            numpy dtype of each field in definition order
+        columns: list
+            raw values of each field
+    returns:
+        data_messages: bytes
+            encoded data messages
+    """
+    number_of_rows = len(columns[0]) if columns else 1
+    rows = np.zeros(
+        number_of_rows,
+        dtype=[("header", "u1")] + [(f"f{position}", dtype) for position, dtype in enumerate(fields)],
+    )
+    rows["header"] = local_message_type
+    for position, column in enumerate(columns):
+        rows[f"f{position}"] = column
+    data_messages = rows.tobytes()
+    return data_messages
+
+
+def _message(local_message_type, global_message_number, values):
+    """
+    this function will encode a definition and a single data message
+    options:
+        local_message_type: int
+            local message type to use
+        global_message_number: int
+            profile message number
+        values: list
+            (field number, numpy dtype, base type, value) of each field
+    returns:
+        message: bytes
+            encoded definition and data message
+    """
+    fields = [(number, dtype, base_type) for number, dtype, base_type, _ in values]
+    message = _definition_message(local_message_type, global_message_number, fields)
+    message += _data_messages(
+        local_message_type, [dtype for _, dtype, _, _ in values], [[value] for *_, value in values]
+    )
+    return message
+
+
+def synthetic_signals(number_of_records, seed=0):
+    """
+    this function will make smooth, noisy signals
+    that look like an endurance activity
+    options:
+        number_of_records: int
+            number of seconds of data
+        seed: int
+            seed of the random noise
+    returns:
+        signals: dict
+            values of each record field in their units
+    """
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(number_of_records, dtype=np.float64)
+    speed = np.clip(
+        3.5 + 1.5 * np.sin(2 * np.pi * seconds / 1800) + rng.normal(0, 0.3, number_of_records),
+        0.5,
+        15,
+    )
+    distance = np.cumsum(speed)
+    heading = np.cumsum(rng.normal(0, 0.05, number_of_records))
+    metres_per_degree = 111320.0
+    latitude = 51.5 + np.cumsum(speed * np.cos(heading)) / metres_per_degree
+    longitude = -0.12 + np.cumsum(speed * np.sin(heading)) / (
+        metres_per_degree * np.cos(np.radians(51.5))
+    )
+    signals = {
+        "position_lat": latitude,
+        "position_long": longitude,
+        "altitude": 100 + 50 * np.sin(2 * np.pi * seconds / 3600),
+        "heart_rate": np.clip(
+            110
+            + 40 * (1 - np.exp(-seconds / 600))
+            + 10 * np.sin(seconds / 700)
+            + rng.normal(0, 2, number_of_records),
+            50,
+            220,
+        ),
+        "cadence": np.clip(85 + rng.normal(0, 3, number_of_records), 0, 250),
+        "distance": distance,
+        "speed": speed,
+        "power": np.clip(
+            200 + 80 * np.sin(seconds / 300) + rng.normal(0, 30, number_of_records), 0, 2000
+        ),
+        "temperature": 20 + 5 * np.sin(seconds / 7200),
+    }
+    return signals
+
+
+def synthetic_rr_intervals(heart_rate, seed=0):
+    """
+    this function will make the beat to beat intervals of a
+    heart rate recorded every second, with a few missed beats
+    options:
+        heart_rate: array
+            heart rate in bpm for every second
+        seed: int
+            seed of the random noise
+    returns:
+        rr_intervals: array
+            seconds between beats
+    """
+    rng = np.random.default_rng(seed + 2)
+    seconds = np.arange(len(heart_rate) + 1, dtype=np.float64)
+    cumulative_beats = np.concatenate([[0.0], np.cumsum(np.asarray(heart_rate) / 60)])
+    beat_times = np.interp(np.arange(np.floor(cumulative_beats[-1])), cumulative_beats, seconds)
+    rr_intervals = np.diff(beat_times) * (1 + rng.normal(0, 0.02, len(beat_times) - 1))
+    is_missed = rng.random(len(rr_intervals)) < SYNTHETIC_MISSED_BEAT_FRACTION
+    is_missed[-1] = False
+    # a missed beat adds its interval to the next one
+    rr_intervals[np.flatnonzero(is_missed) + 1] += rr_intervals[is_missed]
+    rr_intervals = rr_intervals[~is_missed]
+    return rr_intervals
+
+
+def _raw_record_values(field_name, values):
+    """
+    this function will scale record values to the raw
+    integers stored in the fit file
+    options:
+        field_name: str
+            record field name
+        values: array
+            values in their units
+    returns:
+        raw_values: array
+            rounded raw values
+    """
+    if field_name in ("position_lat", "position_long"):
+        raw_values = values * (2**31 / 180)
+    elif field_name == "altitude":
+        raw_values = (values + 500) * 5
+    elif field_name == "distance":
+        raw_values = values * 100
+    elif field_name == "speed":
+        raw_values = values * 1000
+    else:
+        raw_values = values
+    raw_values = np.rint(raw_values)
+    return raw_values
+
+
+def synthetic_fit_file_bytes(
+    hours=1.0,
+    fields=None,
+    developer_fields=(),
+    start_time=None,
+    sport="running",
+    seed=0,
+    hrv=False,
+):
+    """
+    this function will make the bytes of a valid fit
+    activity recorded every second
+    options:
+        hours: float
+            length of the activity
+        fields: list
+            record fields to write from SYNTHETIC_RECORD_FIELDS,
+            None for every one
+        developer_fields: list
+            (name, units) of float developer fields to add to
+            every record
+        start_time: datetime
+            start of the activity, defaults to 2024-01-01 06:00 utc
+        sport: str
+            sport of the session such as running or cycling
+        seed: int
+            seed of the random noise
+        hrv: bool
+            True to add hrv messages with the beat to beat
+            intervals of the heart rate after the records
+    returns:
+        fit_file_bytes: bytes
+            contents of the fit file
+    """
+    if fields is None:
+        fields = list(SYNTHETIC_RECORD_FIELDS)
+    unknown_fields = set(fields) - set(SYNTHETIC_RECORD_FIELDS)
+    if unknown_fields:
+        raise ValueError(f"unknown record fields {sorted(unknown_fields)}")
+    if start_time is None:
+        start_time = datetime.datetime(2024, 1, 1, 6, tzinfo=datetime.timezone.utc)
+    number_of_records = max(1, int(round(hours * 3600)))
+    start = int(start_time.timestamp()) - FIT_EPOCH_OFFSET
+    end = start + number_of_records - 1
+    elapsed_time = number_of_records * 1000
+    sport_numbers = {name: number for number, name in FIELD_TYPES["sport"].values.items()}
+
+    data = _message(
+        0,
+        0,
+        [
+            (0, "u1", BASE_TYPE_ENUM, 4),  # activity file
+            (1, "<u2", BASE_TYPE_UINT16, 255),  # development manufacturer
+            (2, "<u2", BASE_TYPE_UINT16, 0),
+            (3, "<u4", BASE_TYPE_UINT32Z, 12345),
+            (4, "<u4", BASE_TYPE_UINT32, start),
+        ],
+    )
+    developer_definitions = []
+    if developer_fields:
+        data += _message(
+            1,
+            207,
+            [
+                (3, "u1", BASE_TYPE_UINT8, 0),
+                (4, "<u4", BASE_TYPE_UINT32, 1),
+            ],
+        )
+        description_fields = [
+            (0, "u1", BASE_TYPE_UINT8),
+            (1, "u1", BASE_TYPE_UINT8),
+            (2, "u1", BASE_TYPE_UINT8),
+            (3, f"S{DEVELOPER_FIELD_NAME_SIZE}", BASE_TYPE_STRING),
+            (8, f"S{DEVELOPER_FIELD_UNITS_SIZE}", BASE_TYPE_STRING),
+        ]
+        data += _definition_message(2, 206, description_fields)
+        for field_number, (name, units) in enumerate(developer_fields):
+            data += _data_messages(
+                2,
+                [dtype for _, dtype, _ in description_fields],
+                [
+                    [0],
+                    [field_number],
+                    [BASE_TYPE_FLOAT32],
+                    [name.encode()[: DEVELOPER_FIELD_NAME_SIZE - 1]],
+                    [units.encode()[: DEVELOPER_FIELD_UNITS_SIZE - 1]],
+                ],
+            )
+            developer_definitions.append((field_number, 4, 0))
+
+    record_fields = [TIMESTAMP_FIELD] + [SYNTHETIC_RECORD_FIELDS[name] for name in fields]
+    data += _definition_message(3, 20, record_fields, developer_definitions)
+    signals = synthetic_signals(number_of_records, seed)
+    columns = [np.arange(start, end + 1, dtype=np.uint32)]
+    columns += [_raw_record_values(name, signals[name]) for name in fields]
+    rng = np.random.default_rng(seed + 1)
+    for field_number, _ in enumerate(developer_fields):
+        phase = rng.uniform(0, 2 * np.pi)
+        columns.append(
+            37 + np.sin(np.arange(number_of_records) / 900 + phase) + rng.normal(0, 0.05, number_of_records)
+        )
+    dtypes = [dtype for _, dtype, _ in record_fields] + ["<f4"] * len(developer_fields)
+    data += _data_messages(3, dtypes, columns)
+    if hrv:
+        rr_milliseconds = np.rint(synthetic_rr_intervals(signals["heart_rate"], seed) * 1000)
+        # the last message is padded with invalid intervals
+        hrv_times = np.full(-(-len(rr_milliseconds) // 5) * 5, 0xFFFF, dtype=np.uint16)
+        hrv_times[: len(rr_milliseconds)] = rr_milliseconds
+        data += _definition_message(7, 78, [HRV_TIME_FIELD])
+        data += _data_messages(7, [HRV_TIME_FIELD[1]], [hrv_times.reshape(-1, 5)])
+
+    total_distance = int(round(signals["distance"][-1] * 100))
+    summary = [
+        (253, "<u4", BASE_TYPE_UINT32, end),
+        (2, "<u4", BASE_TYPE_UINT32, start),
+        (7, "<u4", BASE_TYPE_UINT32, elapsed_time),
+        (8, "<u4", BASE_TYPE_UINT32, elapsed_time),
+        (9, "<u4", BASE_TYPE_UINT32, total_distance),
+    ]
+    data += _message(4, 19, summary)
+    data += _message(
+        5,
+        18,
+        summary
+        + [
+            (5, "u1", BASE_TYPE_ENUM, sport_numbers.get(sport, 0)),
+            (6, "u1", BASE_TYPE_ENUM, 0),
+        ],
+    )
+    data += _message(
+        6,
+        34,
+        [
+            (253, "<u4", BASE_TYPE_UINT32, end),
+            (0, "<u4", BASE_TYPE_UINT32, elapsed_time),
+            (1, "<u2", BASE_TYPE_UINT16, 1),
+            (2, "u1", BASE_TYPE_ENUM, 0),
+        ],
+    )
+
+    header = struct.pack("<BBHI4s", 14, 0x20, PROFILE_VERSION, len(data), b".FIT")
+    header += struct.pack("<H", fit_crc(header))
+    fit_file_bytes = header + data
+    fit_file_bytes += struct.pack("<H", fit_crc(fit_file_bytes))
+    return fit_file_bytes
+
+
+def write_synthetic_fit_file(path_to_file, hours=1.0, fields=None, developer_fields=(), **options):
+    """
+    this function will write a synthetic fit activity
+    options:
+        path_to_file: str
+            file path to write the fit file to
+        hours: float
+            length of the activity
+        fields: list
+            record fields to write, None for every one
+        developer_fields: list
+            (name, units) of float developer fields
+        options: dict
+            start_time, sport and seed passed to
+            synthetic_fit_file_bytes
+    returns:
+        number_of_bytes: int
+            size of the written fit file
+    """
+    fit_file_bytes = synthetic_fit_file_bytes(
+        hours=hours, fields=fields, developer_fields=developer_fields, **options
+    )
+    with open(path_to_file, "wb") as file:
+        file.write(fit_file_bytes)
+    return len(fit_file_bytes)
@@ -0,0 +1,544 @@
+"""
+persistent store of training load
+
+each activity's normalized power, training stress score and
+heart rate trimp are computed once on numpy arrays when it is
+added, and the daily chronic and acute training load (ctl and
+atl) and the training stress balance (tsb) are carried forward
+from the last stored day, only days from the earliest new
+activity on are worked out again
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.atomic_files import locked_directory, write_parquet_atomically
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_messages, hash_fit_file
+from analyse_fit_files.parquet_store import read_table, table_path
+from analyse_fit_files.parse_fit_file import find_fit_files
+from analyse_fit_files.zones import DEFAULT_MAX_GAP_SECONDS, sample_durations
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRAINING_LOAD_DIRECTORY = os.environ.get(
+    "ANALYSE_FIT_FILES_TRAINING_LOAD",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "analyse_fit_files", "training_load"),
+)
+
+# rolling window of the normalized power
+NORMALIZED_POWER_WINDOW_SECONDS = 30
+
+# time constants in days of the chronic and acute training load
+CHRONIC_TRAINING_LOAD_DAYS = 42
+ACUTE_TRAINING_LOAD_DAYS = 7
+
+# weighting of the heart rate reserve in the trimp as (factor, exponent)
+TRIMP_COEFFICIENTS = {"male": (0.64, 1.92), "female": (0.86, 1.67)}
+
+# activities of one sport starting this close are one session recorded by two devices
+DUPLICATE_START_SECONDS = 60
+
+ACTIVITY_COLUMNS = [
+    "activity_id",
+    "sport",
+    "activity_start",
+    "date",
+    "duration_s",
+    "average_power_watts",
+    "normalized_power_watts",
+    "intensity_factor",
+    "tss",
+    "trimp",
+    "load",
+]
+
+DAILY_COLUMNS = ["date", "load", "ctl", "atl", "tsb"]
+
+
+def _elapsed_seconds(timestamps):
+    """
+    this function will give the seconds since the first sample
+    options:
+        timestamps: series
+            sample times
+    returns:
+        seconds: array
+            seconds since the first sample, nan where the time is missing
+    """
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    seconds = (timestamps - timestamps.min()).dt.total_seconds().to_numpy(dtype=np.float64)
+    return seconds
+
+
+def normalized_power(
+    timestamps,
+    power,
+    window_seconds=NORMALIZED_POWER_WINDOW_SECONDS,
+    max_gap_seconds=DEFAULT_MAX_GAP_SECONDS,
+):
+    """
+    this function will find the normalized power, the fourth
+    root of the mean fourth power of the 30 s rolling average
+    power, holding each sample until the next one on a one
+    second grid and leaving out pauses
+    options:
+        timestamps: series
+            sample times
+        power: series
+            power in watts
+        window_seconds: int
+            length of the rolling average
+        max_gap_seconds: float
+            longest time a sample is held for, longer gaps are pauses
+    returns:
+        normalized_power_watts: float
+            nan when there is less than one window of power
+    """
+    seconds = _elapsed_seconds(timestamps)
+    watts = pd.to_numeric(pd.Series(power), errors="coerce").to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    is_present = ~np.isnan(seconds) & ~np.isnan(watts)
+    seconds, watts = seconds[is_present], watts[is_present]
+    if len(seconds) == 0:
+        return np.nan
+    order = np.argsort(seconds, kind="stable")
+    seconds, watts = seconds[order], watts[order]
+    grid = np.arange(np.floor(seconds[-1]) + 1)
+    held = np.searchsorted(seconds, grid, side="right") - 1
+    is_recording = (held >= 0) & (grid - seconds[np.maximum(held, 0)] < max_gap_seconds)
+    grid_watts = watts[held[is_recording]]
+    if len(grid_watts) < window_seconds:
+        return np.nan
+    cumulative_watts = np.concatenate([[0.0], np.cumsum(grid_watts)])
+    rolling_watts = (cumulative_watts[window_seconds:] - cumulative_watts[:-window_seconds]) / (
+        window_seconds
+    )
+    normalized_power_watts = float(np.mean(rolling_watts**4) ** 0.25)
+    return normalized_power_watts
+
+
+def training_stress_score(duration_seconds, normalized_power_watts, functional_threshold_power):
+    """
+    this function will find the training stress score,
+    100 for an hour at the functional threshold power
+    options:
+        duration_seconds: float
+            duration of the activity
+        normalized_power_watts: float
+            normalized power of the activity
+        functional_threshold_power: float
+            functional threshold power in watts
+    returns:
+        tss: float
+        intensity_factor: float
+            normalized power over functional threshold power
+    """
+    intensity_factor = normalized_power_watts / float(functional_threshold_power)
+    tss = duration_seconds / 3600 * intensity_factor**2 * 100
+    return tss, intensity_factor
+
+
+def trimp(
+    timestamps,
+    heart_rate,
+    resting_heart_rate,
+    max_heart_rate,
+    sex="male",
+    max_gap_seconds=DEFAULT_MAX_GAP_SECONDS,
+):
+    """
+    this function will find banister's heart rate trimp, the
+    minutes of each sample weighted by its heart rate reserve
+    options:
+        timestamps: series
+            sample times
+        heart_rate: series
+            heart rate in bpm
+        resting_heart_rate: float
+            resting heart rate in bpm
+        max_heart_rate: float
+            maximum heart rate in bpm
+        sex: str
+            male or female, picks the weighting of the heart rate reserve
+        max_gap_seconds: float
+            longest time a sample counts for
+    returns:
+        trimp: float
+            nan when there is no heart rate
+    """
+    if sex not in TRIMP_COEFFICIENTS:
+        raise ValueError(f"sex must be one of {list(TRIMP_COEFFICIENTS)}, got '{sex}'")
+    factor, exponent = TRIMP_COEFFICIENTS[sex]
+    beats = pd.to_numeric(pd.Series(heart_rate), errors="coerce").to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    minutes = sample_durations(pd.Series(timestamps), max_gap_seconds) / 60
+    is_present = ~np.isnan(beats)
+    if not is_present.any():
+        return np.nan
+    reserve = (beats[is_present] - resting_heart_rate) / float(max_heart_rate - resting_heart_rate)
+    reserve = np.clip(reserve, 0.0, 1.0)
+    trimp_score = float(np.sum(minutes[is_present] * reserve * factor * np.exp(exponent * reserve)))
+    return trimp_score
+
+
+def activity_training_load(
+    fit_file_dataframe,
+    activity_id,
+    sport,
+    functional_threshold_power=None,
+    resting_heart_rate=None,
+    max_heart_rate=None,
+    sex="male",
+):
+    """
+    this function will find the load metrics of one activity,
+    its load is the tss when there is power and a functional
+    threshold power, the trimp otherwise and missing when
+    neither can be worked out
+    options:
+        fit_file_dataframe: dataframe
+            parsed records of the activity
+        activity_id: str
+            name of the activity in the store
+        sport: str
+            sport of the activity such as running or cycling
+        functional_threshold_power: float
+            functional threshold power in watts, None for no tss
+        resting_heart_rate: float
+            resting heart rate in bpm, None for no trimp
+        max_heart_rate: float
+            maximum heart rate in bpm, None for no trimp
+        sex: str
+            male or female for the trimp
+    returns:
+        activity_load: dataframe
+            one row with the ACTIVITY_COLUMNS
+    """
+    timestamps = fit_file_dataframe["timestamp_None"].reset_index(drop=True)
+    activity_start = timestamps.min()
+    duration_s = float(sample_durations(timestamps).sum()) if not timestamps.empty else 0.0
+    average_power_watts = normalized_power_watts = intensity_factor = tss = trimp_score = np.nan
+    if "power_watts" in fit_file_dataframe.columns and not timestamps.empty:
+        power = fit_file_dataframe["power_watts"].reset_index(drop=True)
+        average_power_watts = pd.to_numeric(power, errors="coerce").mean()
+        normalized_power_watts = normalized_power(timestamps, power)
+        if functional_threshold_power and not np.isnan(normalized_power_watts):
+            tss, intensity_factor = training_stress_score(
+                duration_s, normalized_power_watts, functional_threshold_power
+            )
+    if (
+        "heart_rate_bpm" in fit_file_dataframe.columns
+        and resting_heart_rate is not None
+        and max_heart_rate is not None
+        and not timestamps.empty
+    ):
+        trimp_score = trimp(
+            timestamps,
+            fit_file_dataframe["heart_rate_bpm"].reset_index(drop=True),
+            resting_heart_rate,
+            max_heart_rate,
+            sex,
+        )
+    load = tss if not np.isnan(tss) else trimp_score
+    activity_load = pd.DataFrame(
+        {
+            "activity_id": [activity_id],
+            "sport": sport,
+            "activity_start": activity_start,
+            "date": activity_start.tz_localize(None).normalize()
+            if activity_start.tzinfo is not None
+            else activity_start.normalize(),
+            "duration_s": duration_s,
+            "average_power_watts": average_power_watts,
+            "normalized_power_watts": normalized_power_watts,
+            "intensity_factor": intensity_factor,
+            "tss": tss,
+            "trimp": trimp_score,
+            "load": load,
+        }
+    )
+    return activity_load
+
+
+def _decay(days):
+    """
+    this function will give the weight of a day's load
+    in a training load with the given time constant
+    options:
+        days: int
+            time constant in days
+    returns:
+        weight: float
+    """
+    weight = 1 - np.exp(-1 / days)
+    return weight
+
+
+def _duplicate_of(activities, activity_load):
+    """
+    this function will find a stored activity that is the
+    same session as a new one recorded by another device
+    options:
+        activities: dataframe
+            stored activity rows
+        activity_load: dataframe
+            one row of the new activity
+    returns:
+        activity_id: str
+            content hash of the stored session, None if it is new
+    """
+    if activities.empty:
+        return None
+    new_activity = activity_load.iloc[0]
+    start_gaps = (activities["activity_start"] - new_activity["activity_start"]).abs()
+    is_same_session = (activities["sport"] == new_activity["sport"]) & (
+        start_gaps <= pd.Timedelta(seconds=DUPLICATE_START_SECONDS)
+    )
+    if not is_same_session.any():
+        return None
+    activity_id = activities.loc[is_same_session, "activity_id"].iloc[0]
+    return activity_id
+
+
+def update_daily_training_load(daily, new_activities):
+    """
+    this function will add the load of new activities to the
+    daily training load, carrying ctl and atl forward from the
+    day before the earliest new activity so the days before it
+    are never worked out again, a day with only missing loads
+    keeps a missing load and holds the ctl and atl of the day before
+    options:
+        daily: dataframe
+            stored daily training load with the DAILY_COLUMNS
+        new_activities: dataframe
+            new activity rows with a date and a load
+    returns:
+        daily: dataframe
+            daily training load up to the last activity
+    """
+    # a day whose activities all have a missing load is missing, not zero
+    new_loads = new_activities.groupby("date")["load"].sum(min_count=1)
+    if new_loads.empty:
+        return daily
+    daily = daily[DAILY_COLUMNS].copy()
+    daily["date"] = pd.to_datetime(daily["date"])
+    first_new_date = new_loads.index.min()
+    earlier = daily[daily["date"] < first_new_date]
+    later = daily[daily["date"] >= first_new_date]
+    if earlier.empty:
+        ctl = atl = 0.0
+        start_date = first_new_date
+    else:
+        ctl, atl = float(earlier["ctl"].iloc[-1]), float(earlier["atl"].iloc[-1])
+        start_date = earlier["date"].iloc[-1] + pd.Timedelta(days=1)
+    end_date = max([new_loads.index.max()] + list(later["date"]))
+    days = pd.date_range(start_date, end_date, freq="D")
+    loads = (
+        pd.concat([later.set_index("date")["load"].astype(float), new_loads])
+        .groupby(level=0)
+        .sum(min_count=1)
+        .reindex(days, fill_value=0.0)
+    )
+    # an exponential moving average starting from the stored day before,
+    # ctl and atl are held over the days with a missing load
+    ctl_series = (
+        pd.Series(np.concatenate([[ctl], loads.to_numpy()]))
+        .ewm(alpha=_decay(CHRONIC_TRAINING_LOAD_DAYS), adjust=False, ignore_na=True)
+        .mean()
+        .to_numpy()
+    )
+    atl_series = (
+        pd.Series(np.concatenate([[atl], loads.to_numpy()]))
+        .ewm(alpha=_decay(ACUTE_TRAINING_LOAD_DAYS), adjust=False, ignore_na=True)
+        .mean()
+        .to_numpy()
+    )
+    updated_days = pd.DataFrame(
+        {
+            "date": days,
+            "load": loads.to_numpy(),
+            "ctl": ctl_series[1:],
+            "atl": atl_series[1:],
+            # form on a day is the fitness minus the fatigue of the day before
+            "tsb": ctl_series[:-1] - atl_series[:-1],
+        }
+    )
+    daily = pd.concat(
+        [dataframe for dataframe in (earlier, updated_days) if not dataframe.empty],
+        ignore_index=True,
+    )
+    return daily
+
+
+def add_fit_files_to_training_load(
+    path_pattern,
+    store_directory=DEFAULT_TRAINING_LOAD_DIRECTORY,
+    engine="native",
+    functional_threshold_power=None,
+    resting_heart_rate=None,
+    max_heart_rate=None,
+    sex="male",
+):
+    """
+    this function will add activities to the training load
+    store, parsing only the fit files not in it yet and
+    updating the daily training load from the earliest new
+    activity on, adding the same fit file again does nothing,
+    and a session already stored from another device, the
+    same sport starting within DUPLICATE_START_SECONDS, is
+    not counted twice
+    options:
+        path_pattern: str or list
+            fit file, folder, glob pattern or list of fit files
+        store_directory: str
+            directory of the training load store, defaults to the
+            ANALYSE_FIT_FILES_TRAINING_LOAD environment variable
+            or ~/.local/share/analyse_fit_files/training_load
+        engine: str
+            fitparse to decode with fitparse or native to
+            decode with the built in numpy decoder
+        functional_threshold_power: float
+            functional threshold power in watts for the tss
+        resting_heart_rate: float
+            resting heart rate in bpm for the trimp
+        max_heart_rate: float
+            maximum heart rate in bpm for the trimp
+        sex: str
+            male or female for the trimp
+    returns:
+        activity_ids: list
+            content hash naming each activity in the store,
+            the stored session for a second recording of it
+            and None for fit files that could not be read
+    """
+    activities = read_table(store_directory, "activities", ACTIVITY_COLUMNS)
+    known_activity_ids = set(activities["activity_id"])
+    activity_ids, new_activities = [], {}
+    for position, path_to_file in enumerate(find_fit_files(path_pattern)):
+        activity_id = hash_fit_file(path_to_file)
+        activity_ids.append(activity_id)
+        if activity_id in known_activity_ids:
+            logger.debug(f"'{path_to_file}' is already in the training load store")
+            continue
+        try:
+            fit_messages = get_cached_fit_file_messages(
+                path_to_file=path_to_file,
+                messages=["record", "session"],
+                engine=engine,
+            )
+        except Exception as error:
+            logger.warning(f"could not read '{path_to_file}': {error}")
+            activity_ids[-1] = None
+            continue
+        if fit_messages["record"].empty:
+            logger.warning(f"'{path_to_file}' has no records")
+            activity_ids[-1] = None
+            continue
+        session_sports = fit_messages["session"].get("sport_None", pd.Series(dtype=object))
+        sport = session_sports.dropna().iloc[0] if session_sports.notna().any() else "generic"
+        new_activities[position] = (
+            path_to_file,
+            activity_training_load(
+                fit_messages["record"],
+                activity_id,
+                str(sport),
+                functional_threshold_power,
+                resting_heart_rate,
+                max_heart_rate,
+                sex,
+            ),
+        )
+        known_activity_ids.add(activity_id)
+    if not new_activities:
+        return activity_ids
+
+    # the tables are read again under the lock so concurrent adds are all kept
+    with locked_directory(store_directory):
+        activities = read_table(store_directory, "activities", ACTIVITY_COLUMNS)
+        added_activities = []
+        for position, (path_to_file, activity_load) in new_activities.items():
+            if activity_ids[position] in set(activities["activity_id"]):
+                continue
+            duplicate_activity_id = _duplicate_of(activities, activity_load)
+            if duplicate_activity_id is not None:
+                logger.info(
+                    f"'{path_to_file}' is the session {duplicate_activity_id} "
+                    "recorded by another device, it is not counted again"
+                )
+                activity_ids[position] = duplicate_activity_id
+                continue
+            added_activities.append(activity_load)
+            activities = pd.concat(
+                [dataframe for dataframe in (activities, activity_load) if not dataframe.empty],
+                ignore_index=True,
+            )[ACTIVITY_COLUMNS]
+        if not added_activities:
+            return activity_ids
+
+        daily = update_daily_training_load(
+            read_table(store_directory, "daily", DAILY_COLUMNS),
+            pd.concat(added_activities, ignore_index=True),
+        )
+        write_parquet_atomically(activities, table_path(store_directory, "activities"))
+        write_parquet_atomically(daily, table_path(store_directory, "daily"))
+    logger.info(f"added {len(added_activities)} activities to the training load store")
+    return activity_ids
+
+
+def training_load_series(store_directory=DEFAULT_TRAINING_LOAD_DIRECTORY, as_of=None):
+    """
+    this function will read the daily ctl, atl and tsb,
+    letting them decay over the rest days up to as_of
+    options:
+        store_directory: str
+            directory of the training load store
+        as_of: str or timestamp
+            last day of the series, None for the last activity
+    returns:
+        daily: dataframe
+            one row per day with the load, ctl, atl and tsb
+    """
+    daily = read_table(store_directory, "daily", DAILY_COLUMNS)
+    if as_of is None or daily.empty:
+        return daily
+    as_of = pd.Timestamp(as_of).normalize()
+    if as_of.tzinfo is not None:
+        as_of = as_of.tz_localize(None)
+    last_date = daily["date"].iloc[-1]
+    if as_of <= last_date:
+        return daily[daily["date"] <= as_of].reset_index(drop=True)
+    rest_days = np.arange(1, (as_of - last_date).days + 1)
+    ctl = daily["ctl"].iloc[-1] * (1 - _decay(CHRONIC_TRAINING_LOAD_DAYS)) ** rest_days
+    atl = daily["atl"].iloc[-1] * (1 - _decay(ACUTE_TRAINING_LOAD_DAYS)) ** rest_days
+    rest = pd.DataFrame(
+        {
+            "date": last_date + pd.to_timedelta(rest_days, unit="D"),
+            "load": 0.0,
+            "ctl": ctl,
+            "atl": atl,
+            "tsb": np.concatenate([[daily["ctl"].iloc[-1] - daily["atl"].iloc[-1]], (ctl - atl)[:-1]]),
+        }
+    )
+    daily = pd.concat([daily, rest], ignore_index=True)
+    return daily
+
+
+def activity_training_loads(store_directory=DEFAULT_TRAINING_LOAD_DIRECTORY):
+    """
+    this function will read the load metrics of every
+    activity in the store
+    options:
+        store_directory: str
+            directory of the training load store
+    returns:
+        activities: dataframe
+            one row per activity sorted by start time
+    """
+    activities = read_table(store_directory, "activities", ACTIVITY_COLUMNS)
+    activities = activities.sort_values("activity_start", ignore_index=True)
+    return activities
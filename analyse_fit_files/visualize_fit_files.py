@@ -1,6 +1,10 @@
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
+import pandas as pd
 
+from analyse_fit_files.align_fit_files import align_fit_file_dataframes
+from analyse_fit_files.downsample import DEFAULT_MAX_POINTS, downsample_dataframe
 from analyse_fit_files.parse_fit_file import (
     compare_fit_file_dataframes,
     decimal_time2clock_time,
@@ -11,12 +15,18 @@ from analyse_fit_files.parse_fit_file import (
 def plot_fit_file_data(
     dataframe_to_plot,
     datasource,
+    max_points=DEFAULT_MAX_POINTS,
+    downsample_method="lttb",
 ):
     """
     this function will plot fit file data
     options:
         dataframe_to_plot: dataframe
             dataframe to plot
+        max_points: int
+            number of points drawn per signal, None to draw every sample
+        downsample_method: str
+            lttb or minmax, how the drawn points are picked
     returns:
         None
     """
@@ -29,9 +39,12 @@ def plot_fit_file_data(
                 dataframe_to_plot["timestamp_None"].min(),
                 dataframe_to_plot["timestamp_None"].max(),
             )
+            points_to_plot = downsample_dataframe(
+                dataframe_to_plot, signal, max_points, downsample_method
+            )
             plt.plot(
-                dataframe_to_plot["timestamp_None"],
-                dataframe_to_plot[signal],
+                points_to_plot["timestamp_None"],
+                points_to_plot[signal],
                 label=f"{datasource} {dataframe_to_plot[signal].mean()}",
             )
             plt.legend(loc="upper right")
@@ -39,10 +52,122 @@ def plot_fit_file_data(
             pass
 
 
+def draw_fit_file_data(
+    dataframe_to_plot,
+    datasource,
+    max_points=DEFAULT_MAX_POINTS,
+    downsample_method="lttb",
+):
+    """
+    this function will draw every signal of fit file data as
+    subplots of one figure that is not registered with pyplot,
+    so it needs no display and is freed as soon as it is dropped
+    options:
+        dataframe_to_plot: dataframe
+            dataframe to plot
+        datasource: str
+            name of the data in the legends
+        max_points: int
+            number of points drawn per signal, None to draw every sample
+        downsample_method: str
+            lttb or minmax, how the drawn points are picked
+    returns:
+        figure: figure
+            matplotlib figure to save with figure.savefig
+    """
+    # fitparse gives object columns, so every signal is coerced rather than filtered by dtype
+    numeric_columns = {
+        signal: pd.to_numeric(dataframe_to_plot[signal], errors="coerce")
+        for signal in dataframe_to_plot.columns
+        if signal != "timestamp_None"
+        and not pd.api.types.is_datetime64_any_dtype(dataframe_to_plot[signal])
+    }
+    signals = [signal for signal, values in numeric_columns.items() if values.notna().any()]
+    dataframe_to_plot = pd.DataFrame(
+        {
+            "timestamp_None": dataframe_to_plot["timestamp_None"],
+            **{signal: numeric_columns[signal].astype(np.float64) for signal in signals},
+        }
+    )
+    figure = Figure(figsize=(20, 3 * max(len(signals), 1)))
+    axes = figure.subplots(max(len(signals), 1), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, signal in zip(axes, signals):
+        points_to_plot = downsample_dataframe(
+            dataframe_to_plot, signal, max_points, downsample_method
+        )
+        ax.plot(
+            points_to_plot["timestamp_None"],
+            points_to_plot[signal],
+            label=f"{datasource} {dataframe_to_plot[signal].mean():.1f} mean",
+        )
+        ax.set_title(signal.replace("_", " ").title())
+        ax.set_ylabel(signal.split("_")[-1])
+        ax.legend(loc="upper right")
+    if signals:
+        axes[0].set_xlim(
+            dataframe_to_plot["timestamp_None"].min(),
+            dataframe_to_plot["timestamp_None"].max(),
+        )
+    axes[-1].set_xlabel("timestamp")
+    figure.tight_layout()
+    return figure
+
+
+def _dataframes_to_compare(
+    dataframe_list_to_compare,
+    datasource_list,
+    signal,
+    align,
+    lag_signal,
+):
+    """
+    this function will give the dataframes to compare, either
+    trimmed to the time every device recorded or resampled
+    onto one shared time grid
+    options:
+        dataframe_list_to_compare: list
+            list of the dataframe objects to compare
+        datasource_list: list
+            list of the device name or name of the source of the data
+        signal: str
+            signal to compare
+        align: bool
+            True to resample every dataframe onto one time grid
+        lag_signal: str
+            signal used to correct each device clock when aligning,
+            None to keep the recorded clocks
+    returns:
+        dataframe_list: list
+            list of dataframes with timestamp_None and the signal
+    """
+    if not align:
+        return compare_fit_file_dataframes(dataframe_list_to_compare)
+    aligned_dataframe, _ = align_fit_file_dataframes(
+        dataframe_list_to_compare,
+        datasource_list,
+        signals=[signal],
+        lag_signal=lag_signal,
+    )
+    dataframe_list = [
+        pd.DataFrame(
+            {
+                "timestamp_None": aligned_dataframe.index,
+                signal: aligned_dataframe[(datasource, signal)].to_numpy(),
+            }
+        )
+        for datasource in datasource_list
+    ]
+    return dataframe_list
+
+
 def line_plot_compare(
     dataframe_list_to_compare,
     datasource_list,
     signal,
+    align=True,
+    lag_signal=None,
+    max_points=DEFAULT_MAX_POINTS,
+    downsample_method="lttb",
 ):
     """
     this function will produce a line plot
@@ -55,17 +180,29 @@ def line_plot_compare(
             list of the device name or name of the source of the data 
         signal: str
             signal to compare and plot
+        align: bool
+            True to resample every device onto one 1 second grid
+            so the same instants are compared
+        lag_signal: str
+            signal used to correct each device clock when aligning
+            such as heart_rate_bpm, None to keep the recorded clocks
+        max_points: int
+            number of points drawn per device, None to draw every
+            sample, the max annotation always uses every sample
+        downsample_method: str
+            lttb or minmax, how the drawn points are picked
     returns:
         None
     """
-    dataframe_list = compare_fit_file_dataframes(
-        dataframe_list_to_compare,
+    dataframe_list = _dataframes_to_compare(
+        dataframe_list_to_compare, datasource_list, signal, align, lag_signal
     )
     plt.figure(figsize=(40, 10))
     for loc, df in enumerate(dataframe_list):
+        points_to_plot = downsample_dataframe(df, signal, max_points, downsample_method)
         plt.plot(
-            df["timestamp_None"],
-            df[signal],
+            points_to_plot["timestamp_None"],
+            points_to_plot[signal],
             label=f"{datasource_list[loc]} {round(df[signal].mean(), 2)} avg",
             alpha=0.5,
         )
@@ -83,6 +220,8 @@ def histogram_compare(
     dataframe_list_to_compare,
     datasource_list,
     signal,
+    align=True,
+    lag_signal=None,
 ):
     """
     this function will produce a histogram
@@ -91,17 +230,30 @@ def histogram_compare(
     options:
         dataframe_to_plot: dataframe
             dataframe to plot
+        align: bool
+            True to resample every device onto one 1 second grid
+            so the same instants are compared
+        lag_signal: str
+            signal used to correct each device clock when aligning
+            such as heart_rate_bpm, None to keep the recorded clocks
     returns:
         None
     """
-    dataframe_list = compare_fit_file_dataframes(
-        dataframe_list_to_compare,
+    dataframe_list = _dataframes_to_compare(
+        dataframe_list_to_compare, datasource_list, signal, align, lag_signal
     )
+    # every device shares the same bins so the bars line up
+    signal_values = [
+        pd.to_numeric(df[signal], errors="coerce").dropna().to_numpy(dtype=np.float64)
+        for df in dataframe_list
+    ]
+    bins = np.histogram_bin_edges(np.concatenate(signal_values), bins="auto")
     plt.figure(figsize=(20, 5))
-    for loc, df in enumerate(dataframe_list):
+    for loc, values in enumerate(signal_values):
         plt.hist(
-            x=df[signal],
-            label=f"{datasource_list[loc]} {df[signal].mean()}",
+            x=values,
+            bins=bins,
+            label=f"{datasource_list[loc]} {values.mean()}",
             alpha=0.5,
         )
     plt.title(signal.replace("_", " ").title())
@@ -109,12 +261,35 @@ def histogram_compare(
     plt.xlabel(signal.split("_")[-1:][0])
 
 
+def plot_time_in_zones(zone_seconds, title="Time in Zones"):
+    """
+    this function will plot the time in each zone of
+    every activity or month as stacked bars in hours
+    options:
+        zone_seconds: dataframe
+            seconds in each zone from time_in_zones or
+            monthly_time_in_zones
+        title: str
+            title of the plot
+    returns:
+        None
+    """
+    zone_hours = zone_seconds / 3600
+    colors = plt.cm.RdYlGn_r(np.linspace(0.05, 0.95, zone_hours.shape[1]))
+    ax = zone_hours.plot.bar(stacked=True, figsize=(20, 5), color=colors, width=0.8)
+    ax.set_title(title)
+    ax.set_ylabel("hours")
+    ax.set_xlabel(zone_hours.index.name or "")
+    ax.legend(loc="upper right")
+
+
 def plot_sport_peak_curve(
     primary_fitfile_dataframe,
     primary_sport_peak_curve,
     secondary_fitfile_dataframe=None,
     secondary_sport_peak_curve=None,
     sport="running",
+    save_path=None,
 ):
     """function to plot the peak average over time for running pace or power and heart rate
     with the ability to compare past activities
@@ -125,6 +300,7 @@ def plot_sport_peak_curve(
         secondary_fitfile_dataframe (dataframe, optional): parsed fit file data from the device. Defaults to None.
         secondary_sport_peak_curve (dataframe, optional): dataframe of the peak sports metric curve over time. Defaults to None.
         sport (str, optional): sport to plot peak curve. Defaults to "running".
+        save_path (str, optional): file to save the plot to, the figure is closed instead of shown. Defaults to None.
     """
     # set the metric
     metric = "Pace"
@@ -277,4 +453,8 @@ def plot_sport_peak_curve(
 
     # show the plot
     fig.tight_layout()  # otherwise the right y-label is slightly clipped
-    plt.show()  # show the plot
+    if save_path is not None:
+        fig.savefig(save_path)  # save the plot
+        plt.close(fig)  # free the figure so unattended runs do not pile them up
+    else:
+        plt.show()  # show the plot
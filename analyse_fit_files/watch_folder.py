@@ -0,0 +1,566 @@
+"""
+ingestion service watching folders for new fit files
+
+an asyncio event loop polls the watched folders, waits until a
+new fit file has stopped growing and holds the data size its
+header promises, then queues it for a bounded process pool that
+parses it and atomically writes its records and summary, the
+queue blocks the watcher when the pool falls behind and the
+queue depth, throughput and failures are published to a status
+file and a small local http endpoint
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import struct
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from analyse_fit_files.atomic_files import replace_atomically
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+from analyse_fit_files.scan_fit_files import fit_file_summary
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("csv", "csv.gz", "parquet")
+
+# seconds a fit file must stay the same size before it is ingested
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# seconds between scans of the watched folders
+DEFAULT_POLL_SECONDS = 1.0
+
+# seconds between writes of the status file
+DEFAULT_STATUS_SECONDS = 5.0
+
+# failures kept in the status
+MAX_RECENT_FAILURES = 20
+
+
+def _write_json(data, save_path):
+    """
+    this function will atomically write a json file
+    options:
+        data: dict
+            data to write
+        save_path: str
+            path of the json file
+    returns:
+        None
+    """
+
+    def write(temporary_path):
+        with open(temporary_path, "w") as file:
+            json.dump(data, file, indent=2, default=str)
+
+    replace_atomically(save_path, write)
+
+
+def output_paths(path_to_file, watch_directory, output_directory=None, output_format="parquet"):
+    """
+    this function will give the paths a fit file is ingested
+    to, keeping its place under the watched folder
+    options:
+        path_to_file: str
+            file path for fit file
+        watch_directory: str
+            watched folder the fit file was found in
+        output_directory: str
+            folder to write to, None to write next to the fit file
+        output_format: str
+            csv, csv.gz or parquet
+    returns:
+        record_path: str
+            path of the record data
+        summary_path: str
+            path of the json summary
+    """
+    if output_directory is None:
+        base_path = os.path.splitext(path_to_file)[0]
+    else:
+        relative_path = os.path.relpath(path_to_file, watch_directory)
+        base_path = os.path.join(output_directory, os.path.splitext(relative_path)[0])
+    record_path = f"{base_path}.{output_format}"
+    summary_path = f"{base_path}_summary.json"
+    return record_path, summary_path
+
+
+def is_complete_fit_file(path_to_file):
+    """
+    this function will check a fit file holds at least
+    the data size its header promises and the two crc
+    bytes after it, the crc itself is left to the parser
+    options:
+        path_to_file: str
+            file path for fit file
+    returns:
+        is_complete: bool
+            False while the fit file is still being written
+    """
+    try:
+        with open(path_to_file, "rb") as file:
+            header = file.read(12)
+            file_size = os.fstat(file.fileno()).st_size
+    except OSError:
+        return False
+    if len(header) < 12:
+        # the header is still being written
+        return False
+    if header[8:12] != b".FIT":
+        # not a fit file header, left for the parser to report
+        return True
+    header_size, _, _, data_size = struct.unpack("<2BHI", header[:8])
+    is_complete = file_size >= header_size + data_size + 2
+    return is_complete
+
+
+def ingest_fit_file(path_to_file, record_path, summary_path, output_format="parquet", engine="native"):
+    """
+    this function will parse a fit file and atomically
+    write its record data and its summary
+    options:
+        path_to_file: str
+            file path for fit file
+        record_path: str
+            path of the record data
+        summary_path: str
+            path of the json summary
+        output_format: str
+            csv, csv.gz or parquet
+        engine: str
+            fitparse or native
+    returns:
+        number_of_records: int
+            number of records written
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got '{output_format}'")
+    fit_file_dataframe = get_fit_file_data(path_to_file=path_to_file, engine=engine)
+
+    def write_records(temporary_path):
+        if output_format == "parquet":
+            fit_file_dataframe.infer_objects().to_parquet(temporary_path, index=False)
+        else:
+            fit_file_dataframe.to_csv(
+                temporary_path,
+                index=0,
+                compression="gzip" if output_format == "csv.gz" else None,
+            )
+
+    replace_atomically(record_path, write_records)
+    summary = fit_file_summary(path_to_file, engine=engine)
+    summary["records"] = len(fit_file_dataframe)
+    _write_json(summary, summary_path)
+    return len(fit_file_dataframe)
+
+
+def _is_up_to_date(path_to_file, saved_paths):
+    """
+    this function will check if every output of a fit
+    file is newer than it so restarts skip finished files
+    options:
+        path_to_file: str
+            file path for fit file
+        saved_paths: tuple
+            paths of the outputs
+    returns:
+        up_to_date: bool
+            True if the fit file does not need ingesting
+    """
+    read_time = os.path.getmtime(path_to_file)
+    up_to_date = all(
+        os.path.exists(saved_path) and os.path.getmtime(saved_path) >= read_time
+        for saved_path in saved_paths
+    )
+    return up_to_date
+
+
+def new_status(watch_directories, workers, queue_size):
+    """
+    this function will make the status of a fresh service
+    options:
+        watch_directories: list
+            watched folders
+        workers: int
+            number of processes parsing fit files
+        queue_size: int
+            most fit files waiting for a process
+    returns:
+        status: dict
+            counters of the service
+    """
+    status = {
+        "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "watch_directories": list(watch_directories),
+        "workers": workers,
+        "queue_size": queue_size,
+        "queue_depth": 0,
+        "settling": 0,
+        "in_progress": 0,
+        "processed": 0,
+        "failed": 0,
+        "records": 0,
+        "files_per_second": 0.0,
+        "records_per_second": 0.0,
+        "recent_failures": [],
+    }
+    return status
+
+
+def _update_rates(status, start_time):
+    """
+    this function will work out the throughput since the service started
+    options:
+        status: dict
+            counters of the service
+        start_time: float
+            perf_counter when the service started
+    returns:
+        status: dict
+            counters with the rates and time updated
+    """
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    status["files_per_second"] = round(status["processed"] / elapsed, 3)
+    status["records_per_second"] = round(status["records"] / elapsed, 1)
+    status["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    return status
+
+
+async def _watch(watch_directories, queue, queued, status, options, stop_event):
+    """
+    this function will poll the watched folders and queue
+    each new or changed fit file once it has settled
+    options:
+        watch_directories: list
+            watched folders
+        queue: asyncio queue
+            fit files waiting for a process, putting waits
+            while it is full
+        queued: dict
+            path to (size, modification time) of the fit files
+            already queued or skipped, so they are not queued
+            again until they change
+        status: dict
+            counters of the service
+        options: dict
+            output_directory, output_format, settle_seconds
+            and poll_seconds
+        stop_event: asyncio event
+            set to stop watching
+    returns:
+        None
+    """
+    settling = {}
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        found = await loop.run_in_executor(None, _find_candidates, watch_directories)
+        now = time.monotonic()
+        for path_to_file, (watch_directory, signature) in found.items():
+            if queued.get(path_to_file) == signature:
+                continue
+            first_seen = settling.get(path_to_file)
+            if first_seen is None or first_seen[0] != signature:
+                settling[path_to_file] = (signature, now)
+                continue
+            if now - first_seen[1] < options["settle_seconds"]:
+                continue
+            if not is_complete_fit_file(path_to_file):
+                continue
+            del settling[path_to_file]
+            queued[path_to_file] = signature
+            saved_paths = output_paths(
+                path_to_file,
+                watch_directory,
+                options["output_directory"],
+                options["output_format"],
+            )
+            try:
+                if _is_up_to_date(path_to_file, saved_paths):
+                    continue
+            except OSError:
+                # deleted or moved away since it was found
+                del queued[path_to_file]
+                continue
+            status["settling"] = len(settling)
+            await queue.put((path_to_file, saved_paths))
+            status["queue_depth"] = queue.qsize()
+        for path_to_file in set(settling) - set(found):
+            del settling[path_to_file]
+        for path_to_file in set(queued) - set(found):
+            del queued[path_to_file]  # deleted or moved away
+        status["settling"] = len(settling)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=options["poll_seconds"])
+        except asyncio.TimeoutError:
+            pass
+
+
+def _find_candidates(watch_directories):
+    """
+    this function will list the fit files under the
+    watched folders with their size and modification time
+    options:
+        watch_directories: list
+            watched folders
+    returns:
+        found: dict
+            path of each fit file to its watched folder
+            and (size, modification time)
+    """
+    found = {}
+    for watch_directory in watch_directories:
+        for directory, _, file_names in os.walk(watch_directory):
+            for file_name in file_names:
+                if not file_name.lower().endswith(".fit"):
+                    continue
+                path_to_file = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path_to_file)
+                except OSError:
+                    continue
+                found[path_to_file] = (watch_directory, (stat.st_size, stat.st_mtime))
+    return found
+
+
+async def _ingest(queue, queued, executor, status, options, start_time):
+    """
+    this function will take fit files off the queue and
+    ingest them one at a time in the process pool
+    options:
+        queue: asyncio queue
+            fit files waiting for a process
+        queued: dict
+            fit files already queued, an ingested fit file is
+            removed since its outputs are now up to date
+        executor: ProcessPoolExecutor
+            process pool parsing the fit files
+        status: dict
+            counters of the service
+        options: dict
+            output_format and engine
+        start_time: float
+            perf_counter when the service started
+    returns:
+        None
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        path_to_file, (record_path, summary_path) = await queue.get()
+        status["queue_depth"] = queue.qsize()
+        status["in_progress"] += 1
+        try:
+            number_of_records = await loop.run_in_executor(
+                executor,
+                ingest_fit_file,
+                path_to_file,
+                record_path,
+                summary_path,
+                options["output_format"],
+                options["engine"],
+            )
+        except Exception as error:
+            status["failed"] += 1
+            failure = {
+                "path": path_to_file,
+                "error": f"{type(error).__name__}: {error}",
+                "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            }
+            status["recent_failures"] = (status["recent_failures"] + [failure])[
+                -MAX_RECENT_FAILURES:
+            ]
+            logger.error(f"could not ingest '{path_to_file}': {failure['error']}")
+        else:
+            queued.pop(path_to_file, None)
+            status["processed"] += 1
+            status["records"] += number_of_records
+            logger.info(f"ingested '{path_to_file}' ({number_of_records} records)")
+        finally:
+            status["in_progress"] -= 1
+            _update_rates(status, start_time)
+            queue.task_done()
+
+
+async def _publish_status(status, status_file, status_seconds, start_time, stop_event):
+    """
+    this function will atomically rewrite the status file
+    every few seconds until the service stops
+    options:
+        status: dict
+            counters of the service
+        status_file: str
+            path of the json status file
+        status_seconds: float
+            seconds between writes
+        start_time: float
+            perf_counter when the service started
+        stop_event: asyncio event
+            set to stop publishing
+    returns:
+        None
+    """
+    while True:
+        _write_json(_update_rates(status, start_time), status_file)
+        if stop_event.is_set():
+            return
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=status_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _serve_status(status, start_time, host, port):
+    """
+    this function will answer http get requests for /status
+    with the status as json, a stand in for a real endpoint
+    options:
+        status: dict
+            counters of the service
+        start_time: float
+            perf_counter when the service started
+        host: str
+            address to listen on
+        port: int
+            port to listen on, 0 for any free port
+    returns:
+        server: asyncio server
+            listening server, its port is in status["status_port"]
+    """
+
+    async def answer(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not used
+            if len(request_line) >= 2 and request_line[0] == "GET" and request_line[1] in (
+                "/",
+                "/status",
+            ):
+                code, body = "200 OK", json.dumps(_update_rates(status, start_time), default=str)
+            else:
+                code, body = "404 Not Found", json.dumps({"error": "not found"})
+            body = body.encode()
+            writer.write(
+                f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(answer, host, port)
+    status["status_port"] = server.sockets[0].getsockname()[1]
+    logger.info(f"status served at http://{host}:{status['status_port']}/status")
+    return server
+
+
+async def watch_folders(
+    watch_directories,
+    output_directory=None,
+    output_format="parquet",
+    engine="native",
+    workers=os.cpu_count(),
+    queue_size=None,
+    settle_seconds=DEFAULT_SETTLE_SECONDS,
+    poll_seconds=DEFAULT_POLL_SECONDS,
+    status_file=None,
+    status_seconds=DEFAULT_STATUS_SECONDS,
+    status_host="127.0.0.1",
+    status_port=None,
+    stop_event=None,
+    status=None,
+):
+    """
+    this function will watch folders and ingest every new
+    or changed fit file until the stop event is set, fit
+    files whose outputs are newer than them are skipped
+    options:
+        watch_directories: list
+            folders searched recursively for fit files
+        output_directory: str
+            folder the outputs are written to under the same
+            relative paths, None to write next to each fit file
+        output_format: str
+            csv, csv.gz or parquet for the record data
+        engine: str
+            fitparse or native
+        workers: int
+            number of processes parsing fit files
+        queue_size: int
+            most settled fit files waiting for a process before
+            the watcher waits too, defaults to twice the workers
+        settle_seconds: float
+            seconds a fit file must stay the same size
+        poll_seconds: float
+            seconds between scans of the watched folders
+        status_file: str
+            json file the status is written to, None for no file
+        status_seconds: float
+            seconds between writes of the status file
+        status_host: str
+            address the status endpoint listens on
+        status_port: int
+            port of the status endpoint, 0 for any free port,
+            None for no endpoint
+        stop_event: asyncio event
+            set to stop the service, the queued fit files
+            are finished first
+        status: dict
+            dictionary filled with the status so callers can
+            read it while the service runs
+    returns:
+        status: dict
+            final counters of the service
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got '{output_format}'")
+    workers = max(1, workers or 1)
+    queue_size = queue_size or 2 * workers
+    stop_event = stop_event or asyncio.Event()
+    status = status if status is not None else {}
+    status.update(new_status(watch_directories, workers, queue_size))
+    options = {
+        "output_directory": output_directory,
+        "output_format": output_format,
+        "engine": engine,
+        "settle_seconds": settle_seconds,
+        "poll_seconds": poll_seconds,
+    }
+    start_time = time.perf_counter()
+    queue = asyncio.Queue(maxsize=queue_size)
+    queued = {}
+    server = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        ingest_tasks = [
+            asyncio.create_task(_ingest(queue, queued, executor, status, options, start_time))
+            for _ in range(workers)
+        ]
+        background_tasks = []
+        if status_file is not None:
+            background_tasks.append(
+                asyncio.create_task(
+                    _publish_status(status, status_file, status_seconds, start_time, stop_event)
+                )
+            )
+        if status_port is not None:
+            server = await _serve_status(status, start_time, status_host, status_port)
+        logger.info(f"watching {', '.join(watch_directories)} for fit files")
+        try:
+            await _watch(watch_directories, queue, queued, status, options, stop_event)
+            await queue.join()
+        finally:
+            stop_event.set()
+            for task in ingest_tasks:
+                task.cancel()
+            await asyncio.gather(*ingest_tasks, return_exceptions=True)
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+    _update_rates(status, start_time)
+    if status_file is not None:
+        _write_json(status, status_file)
+    return status
@@ -0,0 +1,282 @@
+"""
+time in heart rate, power and pace zones
+
+every sample counts for the time until the next one, so smart
+recording and pauses are weighted correctly, and the samples of
+every activity are put into zones with one digitize over shared
+zone edges and summed with one bincount, so the zone times of
+hundreds of activities, or of every month, come from a single pass
+"""
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.splits import UNIT_METERS
+
+# upper edges of heart rate zones 1 to 4 as fractions of the maximum heart rate
+DEFAULT_HEART_RATE_ZONE_FRACTIONS = (0.6, 0.7, 0.8, 0.9)
+
+# upper edges of power zones 1 to 6 as fractions of the functional threshold power
+DEFAULT_POWER_ZONE_FRACTIONS = (0.55, 0.75, 0.9, 1.05, 1.2, 1.5)
+
+# upper edges of pace zones 1 to 4 as fractions of the threshold speed
+DEFAULT_PACE_ZONE_FRACTIONS = (0.78, 0.88, 0.95, 1.03)
+
+# longest time a sample counts for, longer gaps are pauses
+DEFAULT_MAX_GAP_SECONDS = 5.0
+
+
+def zone_edges(threshold, fractions):
+    """
+    this function will make zone edges from a threshold
+    such as the maximum heart rate or the functional
+    threshold power
+    options:
+        threshold: float
+            value the fractions are taken of
+        fractions: list
+            upper edge of every zone but the last as a
+            fraction of the threshold
+    returns:
+        edges: array
+            ascending zone edges
+    """
+    edges = float(threshold) * np.asarray(fractions, dtype=np.float64)
+    return edges
+
+
+def heart_rate_zone_edges(max_heart_rate, fractions=DEFAULT_HEART_RATE_ZONE_FRACTIONS):
+    """
+    this function will make heart rate zone edges
+    options:
+        max_heart_rate: float
+            maximum heart rate in bpm
+        fractions: list
+            upper edge of every zone but the last as a
+            fraction of the maximum heart rate
+    returns:
+        edges: array
+            ascending zone edges in bpm
+    """
+    return zone_edges(max_heart_rate, fractions)
+
+
+def power_zone_edges(functional_threshold_power, fractions=DEFAULT_POWER_ZONE_FRACTIONS):
+    """
+    this function will make power zone edges
+    options:
+        functional_threshold_power: float
+            functional threshold power in watts
+        fractions: list
+            upper edge of every zone but the last as a
+            fraction of the functional threshold power
+    returns:
+        edges: array
+            ascending zone edges in watts
+    """
+    return zone_edges(functional_threshold_power, fractions)
+
+
+def pace_zone_edges(threshold_pace, fractions=DEFAULT_PACE_ZONE_FRACTIONS, unit="km"):
+    """
+    this function will make pace zone edges as speeds so
+    the zones go from the slowest to the fastest
+    options:
+        threshold_pace: float
+            threshold pace in minutes per km or mile
+        fractions: list
+            upper edge of every zone but the last as a
+            fraction of the threshold speed
+        unit: str
+            km or mile
+    returns:
+        edges: array
+            ascending zone edges in meters per second
+            for binning the speed_m/s signal
+    """
+    if unit not in UNIT_METERS:
+        raise ValueError(f"unit must be one of {tuple(UNIT_METERS)}, got '{unit}'")
+    threshold_speed = UNIT_METERS[unit] / 60 / float(threshold_pace)
+    return zone_edges(threshold_speed, fractions)
+
+
+def sample_durations(timestamps, max_gap_seconds=DEFAULT_MAX_GAP_SECONDS):
+    """
+    this function will find how long each sample lasts,
+    the time until the next sample up to max_gap_seconds,
+    the last sample lasts as long as the typical sample
+    options:
+        timestamps: series
+            sample times
+        max_gap_seconds: float
+            longest time a sample counts for, None for no limit
+    returns:
+        durations: array
+            seconds each sample counts for, 0 where the time is missing
+    """
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps)
+    seconds = (timestamps - timestamps.min()).dt.total_seconds().to_numpy(dtype=np.float64)
+    durations = np.zeros(len(seconds))
+    is_present = ~np.isnan(seconds)
+    present_seconds = seconds[is_present]
+    if len(present_seconds) == 0:
+        return durations
+    steps = np.diff(present_seconds)
+    typical_step = np.median(steps[steps > 0]) if (steps > 0).any() else 1.0
+    present_durations = np.append(np.maximum(steps, 0.0), typical_step)
+    if max_gap_seconds is not None:
+        present_durations = np.minimum(present_durations, max_gap_seconds)
+    durations[is_present] = present_durations
+    return durations
+
+
+def zone_names(edges, signal=None):
+    """
+    this function will name the zones made by the edges
+    options:
+        edges: list
+            ascending zone edges
+        signal: str
+            signal the edges are for, only used in the names
+    returns:
+        names: list
+            zone names such as z1 <120 and z2 120-140
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    unit = "" if signal is None else f" {signal.split('_')[-1]}"
+    labels = [f"{edge:g}" for edge in edges]
+    names = [f"z1 <{labels[0]}{unit}"] if len(labels) else ["z1"]
+    names += [
+        f"z{zone + 2} {labels[zone]}-{labels[zone + 1]}{unit}" for zone in range(len(labels) - 1)
+    ]
+    if len(labels):
+        names.append(f"z{len(labels) + 1} >={labels[-1]}{unit}")
+    return names
+
+
+def time_in_zones(
+    fit_file_dataframes,
+    signal,
+    edges,
+    activity_ids=None,
+    groups=None,
+    names=None,
+    max_gap_seconds=DEFAULT_MAX_GAP_SECONDS,
+):
+    """
+    this function will find the time one or many activities
+    spent in each zone of a signal in one vectorized pass,
+    weighting every sample by how long it lasts
+    options:
+        fit_file_dataframes: dataframe or list
+            parsed fit file data of one or many activities
+        signal: str
+            column to put into zones such as heart_rate_bpm,
+            power_watts or speed_m/s
+        edges: list
+            ascending edges between the zones, n edges make
+            n + 1 zones, the same edges are used for every activity
+        activity_ids: list
+            name of each activity, defaults to their position
+        groups: list
+            label of each activity such as its month, the
+            times are added up per label instead of per activity
+        names: list
+            name of each zone, defaults to the zone_names
+        max_gap_seconds: float
+            longest time a sample counts for
+    returns:
+        zone_seconds: dataframe
+            seconds in each zone with one row per activity or
+            group and one column per zone
+    """
+    if isinstance(fit_file_dataframes, pd.DataFrame):
+        fit_file_dataframes = [fit_file_dataframes]
+    fit_file_dataframe_list = list(fit_file_dataframes)
+    edges = np.asarray(edges, dtype=np.float64)
+    if np.any(np.diff(edges) <= 0):
+        raise ValueError("zone edges must be strictly ascending")
+    names = list(names) if names is not None else zone_names(edges, signal)
+    number_of_zones = len(edges) + 1
+    if len(names) != number_of_zones:
+        raise ValueError(f"{len(edges)} zone edges make {number_of_zones} zones")
+    if activity_ids is None:
+        activity_ids = list(range(len(fit_file_dataframe_list)))
+    row_labels = list(activity_ids) if groups is None else list(groups)
+    if len(row_labels) != len(fit_file_dataframe_list):
+        raise ValueError("every dataframe needs an activity id or group")
+    row_codes, row_index = pd.factorize(pd.Series(row_labels, dtype=object), sort=groups is not None)
+
+    values, durations, rows = [], [], []
+    for row_code, fit_file_dataframe in zip(row_codes, fit_file_dataframe_list):
+        if signal not in fit_file_dataframe.columns or fit_file_dataframe.empty:
+            continue
+        values.append(
+            pd.to_numeric(fit_file_dataframe[signal], errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+        )
+        durations.append(sample_durations(fit_file_dataframe["timestamp_None"], max_gap_seconds))
+        rows.append(np.full(len(fit_file_dataframe), row_code))
+    if values:
+        values, durations, rows = map(np.concatenate, (values, durations, rows))
+    else:
+        values = durations = np.array([], dtype=np.float64)
+        rows = np.array([], dtype=np.int64)
+    is_present = ~np.isnan(values)
+    zones = np.digitize(values[is_present], edges)
+    seconds = np.bincount(
+        rows[is_present] * number_of_zones + zones,
+        weights=durations[is_present],
+        minlength=len(row_index) * number_of_zones,
+    ).reshape(len(row_index), number_of_zones)
+    zone_seconds = pd.DataFrame(
+        seconds,
+        index=pd.Index(row_index, name="activity" if groups is None else "group"),
+        columns=names,
+    )
+    return zone_seconds
+
+
+def monthly_time_in_zones(
+    fit_file_dataframes,
+    signal,
+    edges,
+    names=None,
+    max_gap_seconds=DEFAULT_MAX_GAP_SECONDS,
+):
+    """
+    this function will add up the time in each zone of
+    many activities by the month they started in
+    options:
+        fit_file_dataframes: list
+            parsed fit file data of many activities
+        signal: str
+            column to put into zones
+        edges: list
+            ascending edges between the zones
+        names: list
+            name of each zone, defaults to the zone_names
+        max_gap_seconds: float
+            longest time a sample counts for
+    returns:
+        zone_seconds: dataframe
+            seconds in each zone with one row per month
+    """
+    fit_file_dataframe_list = list(fit_file_dataframes)
+    start_times = [
+        fit_file_dataframe["timestamp_None"].min() for fit_file_dataframe in fit_file_dataframe_list
+    ]
+    months = [
+        "unknown" if pd.isna(start_time) else start_time.strftime("%Y-%m")
+        for start_time in start_times
+    ]
+    zone_seconds = time_in_zones(
+        fit_file_dataframe_list,
+        signal,
+        edges,
+        groups=months,
+        names=names,
+        max_gap_seconds=max_gap_seconds,
+    )
+    return zone_seconds
@@ -0,0 +1,155 @@
+"""
+this script will add fit files to the activity catalog
+and list the activities matching a query such as all runs
+over 20 km in 2025
+"""
+import click
+import logging
+import os
+
+import pandas as pd
+
+from analyse_fit_files.activity_catalog import (
+    DEFAULT_CATALOG_PATH,
+    add_fit_files_to_catalog,
+    query_activities,
+    remove_missing_activities,
+)
+from analyse_fit_files.parse_fit_file import FIT_FILE_ENGINES
+from analyse_fit_files.scan_fit_files import scan_fit_files
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+# columns printed for each activity
+QUERY_COLUMNS = ["start_time", "sport", "distance_km", "duration", "number_of_laps", "path"]
+
+
+@click.group(help="Add fit files to the activity catalog and query it")
+@click.option(
+    "--catalog_path",
+    "-catalog",
+    type=str,
+    default=DEFAULT_CATALOG_PATH,
+    show_default=True,
+    help="Sqlite database of the catalog",
+)
+@click.pass_context
+def main(context, catalog_path):
+    context.obj = {"catalog_path": catalog_path}
+
+
+@main.command(help="Add fit files to the catalog, unchanged files are skipped")
+@click.option(
+    "--path_to_fit_file",
+    "-path",
+    type=str,
+    required=True,
+    prompt=True,
+    help="Path to a fit file, a folder of fit files or a glob pattern such as data/*.fit",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(FIT_FILE_ENGINES),
+    default="native",
+    show_default=True,
+    help="Decoder used to read the fit files, native steps over the records",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of fit files read at the same time",
+)
+@click.option(
+    "--prune",
+    is_flag=True,
+    help="Remove activities whose fit file no longer exists",
+)
+@click.pass_context
+def add(context, path_to_fit_file, engine, workers, prune):
+    catalog_path = context.obj["catalog_path"]
+    activity_ids = add_fit_files_to_catalog(path_to_fit_file, catalog_path, engine, workers)
+    if prune:
+        removed_activity_ids = remove_missing_activities(catalog_path)
+        logging.info(f"removed {len(removed_activity_ids)} activities with missing fit files")
+    if None in activity_ids:
+        raise click.ClickException(f"{activity_ids.count(None)} fit files could not be added")
+
+
+@main.command(help="Summarise fit files without adding them to the catalog")
+@click.option(
+    "--path_to_fit_file",
+    "-path",
+    type=str,
+    required=True,
+    prompt=True,
+    help="Path to a fit file, a folder of fit files or a glob pattern such as data/*.fit",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of fit files read at the same time",
+)
+@click.option("--output_csv", type=str, default=None, help="Csv file to save the summaries to")
+def scan(path_to_fit_file, workers, output_csv):
+    summary_dataframe = scan_fit_files(path_to_fit_file, workers=workers)
+    if output_csv:
+        summary_dataframe.to_csv(output_csv, index=False)
+        logging.info(f"file saved to '{output_csv}'")
+    else:
+        print(summary_dataframe.to_string(index=False))
+
+
+@main.command(help="List the activities matching every given filter")
+@click.option("--sport", type=str, default=None, help="Sport such as running or cycling")
+@click.option("--year", type=int, default=None, help="Year the activities started in")
+@click.option("--start", type=str, default=None, help="Earliest start date such as 2025-03-01")
+@click.option("--end", type=str, default=None, help="Start dates from this date on are left out")
+@click.option("--min_distance_km", type=float, default=None, help="Shortest distance in km")
+@click.option("--max_distance_km", type=float, default=None, help="Longest distance in km")
+@click.option("--min_duration_min", type=float, default=None, help="Shortest elapsed time in minutes")
+@click.option("--max_duration_min", type=float, default=None, help="Longest elapsed time in minutes")
+@click.option("--output_csv", type=str, default=None, help="Csv file to save the activities to")
+@click.pass_context
+def query(
+    context,
+    sport,
+    year,
+    start,
+    end,
+    min_distance_km,
+    max_distance_km,
+    min_duration_min,
+    max_duration_min,
+    output_csv,
+):
+    if year is not None:
+        start = start or f"{year}-01-01"
+        end = end or f"{year + 1}-01-01"
+    activities = query_activities(
+        sport=sport,
+        start=start,
+        end=end,
+        min_distance_m=None if min_distance_km is None else min_distance_km * 1000,
+        max_distance_m=None if max_distance_km is None else max_distance_km * 1000,
+        min_duration_s=None if min_duration_min is None else min_duration_min * 60,
+        max_duration_s=None if max_duration_min is None else max_duration_min * 60,
+        catalog_path=context.obj["catalog_path"],
+    )
+    if output_csv:
+        activities.to_csv(output_csv, index=False)
+        logging.info(f"file saved to '{output_csv}'")
+    if activities.empty:
+        logging.info("0 activities found")
+        return
+    activities["distance_km"] = (activities["distance_m"] / 1000).round(2)
+    activities["duration"] = pd.to_timedelta(activities["duration_s"], unit="s").dt.round("1s")
+    print(activities[QUERY_COLUMNS].to_string(index=False))
+    logging.info(f"{len(activities)} activities found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+this script will time parsing and analysing fit files on every
+file in a directory and on synthetic activities, saving the wall
+time, peak memory and throughput of each run to a json history
+"""
+import click
+import datetime
+import glob
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from analyse_fit_files import __version__
+from analyse_fit_files.parse_fit_file import (
+    FIT_FILE_ENGINES,
+    compare_fit_file_dataframes,
+    get_fit_file_data,
+    sport_peak_curve,
+    top_average_over_time,
+)
+from analyse_fit_files.peak_curves import log_spaced_durations
+from analyse_fit_files.synthetic_fit_file import write_synthetic_fit_file
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+
+def measure(function, repeat=1, memory=True):
+    """
+    this function will time a function and find
+    the peak memory it allocates
+    options:
+        function: callable
+            function to measure, called with no arguments
+        repeat: int
+            number of timed calls, the fastest is kept
+        memory: bool
+            True to call the function once more under
+            tracemalloc to find its peak memory
+    returns:
+        result: object
+            what the function returned
+        seconds: float
+            wall time of the fastest call
+        peak_memory_mb: float
+            peak memory allocated in megabytes, None if not measured
+    """
+    timings = []
+    for _ in range(max(1, repeat)):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    peak_memory_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_memory_mb = peak_memory / 1e6
+    return result, min(timings), peak_memory_mb
+
+
+def benchmark_result(benchmark, file_name, seconds, peak_memory_mb, records, number_of_bytes=None):
+    """
+    this function will make one row of the benchmark results
+    options:
+        benchmark: str
+            name of what was measured
+        file_name: str
+            fit file it was measured on
+        seconds: float
+            wall time
+        peak_memory_mb: float
+            peak memory allocated in megabytes
+        records: int
+            number of records handled
+        number_of_bytes: int
+            size of the fit file for parsing benchmarks
+    returns:
+        result: dict
+            benchmark result
+    """
+    result = {
+        "benchmark": benchmark,
+        "file": file_name,
+        "seconds": round(seconds, 6),
+        "peak_memory_mb": None if peak_memory_mb is None else round(peak_memory_mb, 3),
+        "records": records,
+        "records_per_second": round(records / seconds, 1) if seconds > 0 else None,
+    }
+    if number_of_bytes is not None:
+        result["megabytes_per_second"] = round(number_of_bytes / 1e6 / seconds, 3) if seconds > 0 else None
+    return result
+
+
+def benchmark_fit_file(path_to_file, engines, durations, repeat, memory):
+    """
+    this function will benchmark parsing and the peak
+    curves of one fit file
+    options:
+        path_to_file: str
+            file path for fit file
+        engines: list
+            fit file engines to time
+        durations: str
+            log for log spaced peak curve durations or all
+            for every second
+        repeat: int
+            number of timed calls of each benchmark
+        memory: bool
+            True to measure peak memory
+    returns:
+        results: list
+            benchmark results
+        fit_file_dataframe: dataframe
+            parsed fit file data
+    """
+    file_name = os.path.basename(path_to_file)
+    number_of_bytes = os.path.getsize(path_to_file)
+    results = []
+    fit_file_dataframe = None
+    for engine in engines:
+        fit_file_dataframe, seconds, peak_memory_mb = measure(
+            lambda: get_fit_file_data(path_to_file=path_to_file, engine=engine), repeat, memory
+        )
+        results.append(
+            benchmark_result(
+                f"get_fit_file_data[{engine}]",
+                file_name,
+                seconds,
+                peak_memory_mb,
+                len(fit_file_dataframe),
+                number_of_bytes,
+            )
+        )
+    fit_file_dataframe = fit_file_dataframe.infer_objects()
+    number_of_records = len(fit_file_dataframe)
+    curve_durations = None
+    if durations == "log":
+        curve_durations = log_spaced_durations(max(number_of_records - 1, 1))
+
+    sport = "cycling" if "power_watts" in fit_file_dataframe.columns else "running"
+    sport_signal = "power_watts" if sport == "cycling" else "speed_m/s"
+    if {sport_signal, "heart_rate_bpm"} <= set(fit_file_dataframe.columns):
+        _, seconds, peak_memory_mb = measure(
+            lambda: sport_peak_curve(fit_file_dataframe, sport, durations=curve_durations),
+            repeat,
+            memory,
+        )
+        results.append(
+            benchmark_result("sport_peak_curve", file_name, seconds, peak_memory_mb, number_of_records)
+        )
+    if "heart_rate_bpm" in fit_file_dataframe.columns:
+        _, seconds, peak_memory_mb = measure(
+            lambda: top_average_over_time(
+                fit_file_dataframe, "heart_rate_bpm", durations=curve_durations
+            ),
+            repeat,
+            memory,
+        )
+        results.append(
+            benchmark_result(
+                "top_average_over_time", file_name, seconds, peak_memory_mb, number_of_records
+            )
+        )
+    return results, fit_file_dataframe
+
+
+def machine_description():
+    """
+    this function will describe the machine and code a
+    run was measured on so only like runs are compared
+    options:
+        None
+    returns:
+        description: dict
+            machine name, processor, python, package version and git commit
+    """
+    try:
+        git_commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_commit = None
+    description = {
+        "machine": platform.node(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "version": __version__,
+        "git_commit": git_commit,
+    }
+    return description
+
+
+def compare_with_previous_run(results, history, machine):
+    """
+    this function will compare the results with the
+    last run on the same machine in the history
+    options:
+        results: list
+            benchmark results of this run
+        history: list
+            earlier runs
+        machine: str
+            name of this machine
+    returns:
+        comparison: dataframe
+            seconds of both runs and their ratio, None when
+            there is no earlier run on this machine
+    """
+    previous_runs = [run for run in history if run["machine"]["machine"] == machine]
+    if not previous_runs:
+        return None
+    keys = ["benchmark", "file"]
+    previous = pd.DataFrame(previous_runs[-1]["results"])[keys + ["seconds"]]
+    comparison = pd.DataFrame(results)[keys + ["seconds"]].merge(
+        previous, on=keys, how="left", suffixes=("", "_previous")
+    )
+    comparison["ratio"] = (comparison["seconds"] / comparison["seconds_previous"]).round(2)
+    return comparison
+
+
+@click.command(help="Benchmark parsing and analysing fit files")
+@click.option(
+    "--directory",
+    "-dir",
+    type=str,
+    default="publicdata",
+    show_default=True,
+    help="Directory of fit files to benchmark",
+)
+@click.option(
+    "--synthetic_hours",
+    type=str,
+    default="1,4",
+    show_default=True,
+    help="Comma separated lengths in hours of synthetic activities to benchmark, empty for none",
+)
+@click.option(
+    "--engines",
+    type=str,
+    default=",".join(FIT_FILE_ENGINES),
+    show_default=True,
+    help="Comma separated fit file engines to time",
+)
+@click.option(
+    "--durations",
+    type=click.Choice(["log", "all"]),
+    default="log",
+    show_default=True,
+    help="Peak curve durations, log spaced or every second",
+)
+@click.option(
+    "--repeat",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of timed calls of each benchmark, the fastest is kept",
+)
+@click.option(
+    "--memory/--no_memory",
+    default=True,
+    show_default=True,
+    help="Measure peak memory with one more call under tracemalloc",
+)
+@click.option(
+    "--history",
+    type=str,
+    default="benchmark_history.json",
+    show_default=True,
+    help="Json file the results are added to",
+)
+def main(directory, synthetic_hours, engines, durations, repeat, memory, history):
+    engine_list = [engine.strip() for engine in engines.split(",") if engine.strip()]
+    unknown_engines = set(engine_list) - set(FIT_FILE_ENGINES)
+    if not engine_list or unknown_engines:
+        raise click.BadParameter(f"engines must be from {FIT_FILE_ENGINES}", param_hint="--engines")
+    results = []
+    dataframes = []
+    with tempfile.TemporaryDirectory() as synthetic_directory:
+        fit_file_paths = sorted(glob.glob(os.path.join(directory, "*.fit")))
+        for hours in [float(hours) for hours in synthetic_hours.split(",") if hours.strip()]:
+            synthetic_path = os.path.join(synthetic_directory, f"synthetic_{hours:g}h.fit")
+            write_synthetic_fit_file(
+                synthetic_path, hours=hours, developer_fields=[("core_temperature", "C")]
+            )
+            fit_file_paths.append(synthetic_path)
+        for path_to_file in fit_file_paths:
+            logging.info(f"benchmarking '{path_to_file}'")
+            file_results, fit_file_dataframe = benchmark_fit_file(
+                path_to_file, engine_list, durations, repeat, memory
+            )
+            results.extend(file_results)
+            if os.path.dirname(path_to_file) != synthetic_directory:
+                dataframes.append(fit_file_dataframe)
+
+    if dataframes:
+        compared_dataframes, seconds, peak_memory_mb = measure(
+            lambda: compare_fit_file_dataframes(dataframes), repeat, memory
+        )
+        results.append(
+            benchmark_result(
+                "compare_fit_file_dataframes",
+                directory,
+                seconds,
+                peak_memory_mb,
+                sum(len(dataframe) for dataframe in dataframes),
+            )
+        )
+
+    try:
+        with open(history) as file:
+            previous_runs = json.load(file)
+    except FileNotFoundError:
+        previous_runs = []
+    machine = machine_description()
+    comparison = compare_with_previous_run(results, previous_runs, machine["machine"])
+    run = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine,
+        "options": {"durations": durations, "repeat": repeat, "engines": engine_list},
+        "results": results,
+    }
+    with open(history, "w") as file:
+        json.dump(previous_runs + [run], file, indent=2)
+
+    print(pd.DataFrame(results).to_string(index=False))
+    if comparison is not None:
+        print("\ncompared with the previous run on this machine")
+        print(comparison.to_string(index=False))
+    logging.info(f"results added to '{history}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+this script will parse every fit file in a directory with
+both the fitparse and native engines and check the dataframes match
+"""
+import click
+import glob
+import logging
+import os
+import time
+
+import pandas as pd
+
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+
+def compare_engines(path_to_file):
+    """
+    this function will parse a fit file with both
+    engines and compare the dataframes
+    options:
+        path_to_file: str
+            file path for fit file
+    returns:
+        mismatch: str
+            description of the mismatch or None if they match
+    """
+    fitparse_dataframe = get_fit_file_data(path_to_file=path_to_file, engine="fitparse")
+    native_dataframe = get_fit_file_data(path_to_file=path_to_file, engine="native")
+    if list(fitparse_dataframe.columns) != list(native_dataframe.columns):
+        return (
+            f"columns differ {list(fitparse_dataframe.columns)} "
+            f"!= {list(native_dataframe.columns)}"
+        )
+    try:
+        pd.testing.assert_frame_equal(
+            fitparse_dataframe.infer_objects(),
+            native_dataframe,
+            check_dtype=False,
+        )
+    except AssertionError as error:
+        return str(error)
+    return None
+
+
+@click.command(help="Check the native fit decoder against fitparse")
+@click.option(
+    "--directory",
+    "-dir",
+    type=str,
+    default="publicdata",
+    show_default=True,
+    help="Directory of fit files to compare",
+)
+def main(directory):
+    mismatches = 0
+    for path_to_file in sorted(glob.glob(os.path.join(directory, "*.fit"))):
+        start_time = time.perf_counter()
+        mismatch = compare_engines(path_to_file=path_to_file)
+        if mismatch:
+            mismatches += 1
+            logging.error(f"'{path_to_file}' engines differ: {mismatch}")
+        else:
+            logging.info(
+                f"'{path_to_file}' engines match ({time.perf_counter() - start_time:.2f}s)"
+            )
+    if mismatches:
+        raise SystemExit(f"{mismatches} file(s) differ between engines")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,36 @@
 """
-this script will take a fit file and convert it to a csv file
+this script will take a fit file, a folder of fit files
+or a glob pattern and convert each fit file to a csv file
 """
 import click
+import gzip
 import logging
+import os
+import sys
+import time
 
-from analyse_fit_files.parse_fit_file import get_fit_file_data
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyse_fit_files.atomic_files import replace_atomically
+from analyse_fit_files.instrumentation import (
+    TqdmObserver,
+    add_observer,
+    collect_metrics,
+    remove_observer,
+)
+from analyse_fit_files.parse_fit_file import (
+    FIT_FILE_ENGINES,
+    find_fit_files,
+    get_fit_file_messages,
+    iter_fit_record_batches,
+)
 
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
+OUTPUT_FORMATS = ("csv", "csv.gz", "parquet")
+
 
 def format_read_path(file_path):
     """
@@ -25,38 +48,325 @@ def format_read_path(file_path):
     return formatted_path
 
 
-def generate_save_path(file_path):
+def generate_save_path(file_path, message="record", output_format="csv"):
     """
     this function will generate the
     file path to save the csv file
     options:
         file_path: str
             fit file read path
+        message: str
+            fit message saved in the csv file, messages
+            other than record get their name added
+        output_format: str
+            csv, csv.gz or parquet
     returns:
         save_path: str
             generated save path
     """
-    save_path = file_path.replace(".fit", ".csv")
+    suffix = f".{output_format}" if message == "record" else f"_{message}.{output_format}"
+    # only the extension is replaced, in any case, so the fit file is never the output
+    save_path = os.path.splitext(file_path)[0] + suffix
     return save_path
 
 
-@click.command(help="Convert fit file to csv file")
+def split_names(names):
+    """
+    this function will split a comma separated
+    list of names from the command line
+    options:
+        names: str
+            comma separated names
+    returns:
+        name_list: list
+            list of names or None if no names were given
+    """
+    name_list = [name.strip() for name in names.split(",") if name.strip()]
+    return name_list or None
+
+
+def is_up_to_date(read_file_path, save_file_paths):
+    """
+    this function will check if every output of
+    a fit file is newer than the fit file
+    options:
+        read_file_path: str
+            fit file read path
+        save_file_paths: list
+            paths of the converted files
+    returns:
+        up_to_date: bool
+            True if the fit file does not need converting
+    """
+    read_time = os.path.getmtime(read_file_path)
+    up_to_date = all(
+        os.path.exists(save_file_path) and os.path.getmtime(save_file_path) >= read_time
+        for save_file_path in save_file_paths
+    )
+    return up_to_date
+
+
+def _write_dataframe(dataframe, save_file_path, output_format):
+    """
+    this function will atomically write a whole dataframe
+    so a failed conversion never leaves a partly written
+    file that looks up to date
+    options:
+        dataframe: dataframe
+            parsed fit messages
+        save_file_path: str
+            path of the converted file
+        output_format: str
+            csv, csv.gz or parquet
+    returns:
+        None
+    """
+
+    def write(temporary_path):
+        if output_format == "parquet":
+            dataframe.infer_objects().to_parquet(temporary_path, index=False)
+        else:
+            dataframe.to_csv(
+                path_or_buf=temporary_path,
+                index=0,
+                compression="gzip" if output_format == "csv.gz" else None,
+            )
+
+    replace_atomically(save_file_path, write)
+
+
+def _write_record_batches(batches, save_file_path, output_format):
+    """
+    this function will atomically write the record batches
+    one at a time so csv output keeps memory flat
+    options:
+        batches: iterator
+            dataframes of parsed records
+        save_file_path: str
+            path of the converted file
+        output_format: str
+            csv, csv.gz or parquet
+    returns:
+        number_of_records: int
+            number of records written
+    """
+    if output_format == "parquet":
+        # parquet needs one schema for the whole file so the batches are joined
+        dataframe = pd.concat(list(batches), ignore_index=True)
+        _write_dataframe(dataframe, save_file_path, output_format)
+        return len(dataframe)
+
+    def write(temporary_path):
+        number_of_records = 0
+        if output_format == "csv.gz":
+            file = gzip.open(temporary_path, "wt", newline="")
+        else:
+            file = open(temporary_path, "w", newline="")
+        with file:
+            for batch_number, batch_dataframe in enumerate(batches):
+                batch_dataframe.to_csv(path_or_buf=file, header=batch_number == 0, index=0)
+                number_of_records += len(batch_dataframe)
+        return number_of_records
+
+    number_of_records = replace_atomically(save_file_path, write)
+    return number_of_records
+
+
+def convert_fit_file(
+    read_file_path,
+    engine="native",
+    batch_size=10000,
+    fields=None,
+    messages=("record",),
+    output_format="csv",
+    skip_up_to_date=False,
+):
+    """
+    this function will convert one fit file, saving
+    each fit message to its own file
+    options:
+        read_file_path: str
+            fit file read path
+        engine: str
+            fit file engine used to parse
+        batch_size: int
+            number of records parsed and written at a time
+        fields: list
+            names of the fields to keep, None for every field
+        messages: list
+            fit messages to save
+        output_format: str
+            csv, csv.gz or parquet
+        skip_up_to_date: bool
+            True to leave fit files with newer outputs alone
+    returns:
+        number_of_records: int
+            number of records written, None if skipped
+    """
+    save_file_paths = {
+        message: generate_save_path(read_file_path, message, output_format)
+        for message in messages
+    }
+    if skip_up_to_date and is_up_to_date(read_file_path, save_file_paths.values()):
+        return None
+    number_of_records = 0
+    if "record" in messages:
+        batches = iter_fit_record_batches(
+            path_to_file=read_file_path,
+            batch_size=batch_size,
+            engine=engine,
+            fields=fields,
+        )
+        number_of_records = _write_record_batches(
+            batches, save_file_paths["record"], output_format
+        )
+        logging.info(f"file saved to '{save_file_paths['record']}'")
+    other_messages = [message for message in messages if message != "record"]
+    if other_messages:
+        fit_messages = get_fit_file_messages(
+            path_to_file=read_file_path,
+            messages=other_messages,
+            fields=fields,
+            engine=engine,
+        )
+        for message, message_dataframe in fit_messages.items():
+            _write_dataframe(message_dataframe, save_file_paths[message], output_format)
+            logging.info(f"file saved to '{save_file_paths[message]}'")
+    return number_of_records
+
+
+def _convert_or_report(read_file_path, **convert_options):
+    """
+    this function will convert one fit file, returning
+    the error instead of raising it so one corrupt
+    fit file does not stop a batch
+    options:
+        read_file_path: str
+            fit file read path
+        convert_options: dict
+            options passed to convert_fit_file
+    returns:
+        number_of_records: int
+            number of records written, None if skipped
+        error: str
+            description of the error, None if converted
+    """
+    try:
+        return convert_fit_file(read_file_path, **convert_options), None
+    except Exception as error:
+        return None, f"{type(error).__name__}: {error}"
+
+
+@click.command(help="Convert fit files to csv files")
 @click.option(
     "--path_to_fit_file",
     "-path",
     type=str,
     required=True,
     prompt=True,
-    help="Path to fit file to convert",
-)
-def main(path_to_fit_file):
-    read_file_path = format_read_path(file_path=path_to_fit_file)
-    save_file_path = generate_save_path(file_path=read_file_path)
-    get_fit_file_data(path_to_file=read_file_path).to_csv(
-        path_or_buf=save_file_path,
-        index=0,
+    help="Path to a fit file, a folder of fit files or a glob pattern such as data/*.fit",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(FIT_FILE_ENGINES),
+    default="native",
+    show_default=True,
+    help="Decoder used to read the fit file, only native keeps memory flat for long files",
+)
+@click.option(
+    "--batch_size",
+    type=int,
+    default=10000,
+    show_default=True,
+    help="Number of records parsed and written at a time",
+)
+@click.option(
+    "--fields",
+    type=str,
+    default="",
+    help="Comma separated fields to keep such as timestamp,heart_rate, defaults to every field",
+)
+@click.option(
+    "--messages",
+    type=str,
+    default="record",
+    show_default=True,
+    help="Comma separated fit messages to save such as record,lap,session,length,hrv",
+)
+@click.option(
+    "--output_format",
+    "-format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="csv",
+    show_default=True,
+    help="File format to save",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of fit files converted at the same time",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Convert every fit file even when its outputs are newer than it",
+)
+def main(path_to_fit_file, engine, batch_size, fields, messages, output_format, workers, force):
+    path_pattern = format_read_path(file_path=path_to_fit_file)
+    fit_file_paths = find_fit_files(path_pattern=path_pattern)
+    if not fit_file_paths:
+        raise click.ClickException(f"no fit files found at '{path_pattern}'")
+    # a single named fit file is always converted
+    is_batch = len(fit_file_paths) > 1 or not os.path.isfile(path_pattern)
+    convert_options = {
+        "engine": engine,
+        "batch_size": batch_size,
+        "fields": split_names(names=fields),
+        "messages": split_names(names=messages) or ["record"],
+        "output_format": output_format,
+        "skip_up_to_date": is_batch and not force,
+    }
+    if not is_batch:
+        progress_bar = add_observer(TqdmObserver())
+        try:
+            with collect_metrics() as metrics:
+                convert_fit_file(fit_file_paths[0], **convert_options)
+        finally:
+            remove_observer(progress_bar)
+        stage_timings = ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in metrics["timings"].items()
+        )
+        logging.info(f"stage timings: {stage_timings}")
+        return
+
+    start_time = time.perf_counter()
+    converted, skipped, total_records, failures = 0, 0, 0, []
+    workers = max(1, min(workers or 1, len(fit_file_paths)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_convert_or_report, read_file_path, **convert_options): read_file_path
+            for read_file_path in fit_file_paths
+        }
+        for future in as_completed(futures):
+            number_of_records, error = future.result()
+            if error is not None:
+                failures.append(futures[future])
+                logging.error(f"could not convert '{futures[future]}': {error}")
+            elif number_of_records is None:
+                skipped += 1
+            else:
+                converted += 1
+                total_records += number_of_records
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    logging.info(
+        f"converted {converted} files ({skipped} up to date, {len(failures)} failed) "
+        f"in {elapsed:.1f}s: {converted / elapsed:.2f} files/s, "
+        f"{total_records / elapsed:.0f} records/s"
     )
-    logging.info(f"file saved to '{save_file_path}'")
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+"""
+this script will save a static html report of one or more
+fit files, such as the same activity recorded by several devices
+"""
+import click
+import logging
+import os
+
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_data
+from analyse_fit_files.html_report import save_activity_report
+from analyse_fit_files.parse_fit_file import FIT_FILE_ENGINES
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+
+@click.command(help="Save a static html report of fit files")
+@click.option(
+    "--path_to_fit_file",
+    "-path",
+    type=str,
+    multiple=True,
+    required=True,
+    help="Path to a fit file, can be given more than once to compare activities",
+)
+@click.option(
+    "--save_path",
+    "-out",
+    type=str,
+    default="activity_report.html",
+    show_default=True,
+    help="Html file to save the report to",
+)
+@click.option("--title", type=str, default="Activity Report", show_default=True, help="Title of the report")
+@click.option("--max_heart_rate", type=float, default=None, help="Maximum heart rate for the zone table")
+@click.option("--ftp", type=float, default=None, help="Functional threshold power for the zone table")
+@click.option(
+    "--embed_plotlyjs",
+    is_flag=True,
+    help="Embed plotly.js so the report opens offline, adds about 4.6 MB",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(FIT_FILE_ENGINES),
+    default="native",
+    show_default=True,
+    help="Decoder used to read the fit files",
+)
+def main(path_to_fit_file, save_path, title, max_heart_rate, ftp, embed_plotlyjs, engine):
+    dataframes = {
+        os.path.splitext(os.path.basename(path))[0]: get_cached_fit_file_data(path, engine=engine)
+        for path in path_to_fit_file
+    }
+    save_activity_report(
+        dataframes,
+        save_path,
+        title=title,
+        max_heart_rate=max_heart_rate,
+        functional_threshold_power=ftp,
+        include_plotlyjs=True if embed_plotlyjs else "cdn",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+this script will save an image of every signal of each fit
+file without a display, rendering many fit files in parallel
+"""
+import click
+import logging
+import os
+
+from analyse_fit_files.parse_fit_file import FIT_FILE_ENGINES
+from analyse_fit_files.render_reports import DEFAULT_REPORT_DPI, REPORT_FORMATS, render_reports
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+
+@click.command(help="Render headless reports of fit files")
+@click.option(
+    "--path_to_fit_file",
+    "-path",
+    type=str,
+    required=True,
+    prompt=True,
+    help="Path to a fit file, a folder of fit files or a glob pattern such as data/*.fit",
+)
+@click.option(
+    "--output_directory",
+    "-out",
+    type=str,
+    default=None,
+    help="Folder to save the reports to, defaults to next to each fit file",
+)
+@click.option(
+    "--image_format",
+    "-format",
+    type=click.Choice(REPORT_FORMATS),
+    default="png",
+    show_default=True,
+    help="File format of the reports",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(FIT_FILE_ENGINES),
+    default="native",
+    show_default=True,
+    help="Decoder used to read the fit files",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of reports rendered at the same time",
+)
+@click.option(
+    "--dpi",
+    type=int,
+    default=DEFAULT_REPORT_DPI,
+    show_default=True,
+    help="Resolution of png reports",
+)
+def main(path_to_fit_file, output_directory, image_format, engine, workers, dpi):
+    report_dataframe = render_reports(
+        path_to_fit_file,
+        output_directory=output_directory,
+        image_format=image_format,
+        engine=engine,
+        workers=workers,
+        dpi=dpi,
+    )
+    for failed_report in report_dataframe.dropna(subset=["error"]).itertuples():
+        logging.warning(f"'{failed_report.path}': {failed_report.error}")
+    if report_dataframe["error"].notna().any():
+        raise click.ClickException(
+            f"{report_dataframe['error'].notna().sum()} reports could not be rendered"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+this script will watch folders for new fit files and ingest
+each one once it is fully written, until it is stopped with ctrl c
+"""
+import asyncio
+import click
+import logging
+import os
+import signal
+
+from analyse_fit_files.parse_fit_file import FIT_FILE_ENGINES
+from analyse_fit_files.watch_folder import (
+    DEFAULT_POLL_SECONDS,
+    DEFAULT_SETTLE_SECONDS,
+    OUTPUT_FORMATS,
+    watch_folders,
+)
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+
+async def run_until_stopped(**options):
+    """
+    this function will run the ingestion service and stop
+    it cleanly on ctrl c or a terminate signal
+    options:
+        options: dict
+            options of watch_folders
+    returns:
+        status: dict
+            final counters of the service
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop_event.set)
+        except NotImplementedError:
+            pass  # windows stops on KeyboardInterrupt instead
+    status = await watch_folders(stop_event=stop_event, **options)
+    return status
+
+
+@click.command(help="Watch folders and ingest new fit files as they arrive")
+@click.option(
+    "--directory",
+    "-dir",
+    type=str,
+    multiple=True,
+    required=True,
+    help="Folder to watch for fit files, can be given more than once",
+)
+@click.option(
+    "--output_directory",
+    "-out",
+    type=str,
+    default=None,
+    help="Folder to write the outputs to, defaults to next to each fit file",
+)
+@click.option(
+    "--output_format",
+    "-format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="parquet",
+    show_default=True,
+    help="File format of the record data",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(FIT_FILE_ENGINES),
+    default="native",
+    show_default=True,
+    help="Decoder used to read the fit files",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of fit files parsed at the same time",
+)
+@click.option(
+    "--queue_size",
+    type=int,
+    default=None,
+    help="Most fit files waiting to be parsed, defaults to twice the workers",
+)
+@click.option(
+    "--settle_seconds",
+    type=float,
+    default=DEFAULT_SETTLE_SECONDS,
+    show_default=True,
+    help="Seconds a fit file must stop growing before it is ingested",
+)
+@click.option(
+    "--poll_seconds",
+    type=float,
+    default=DEFAULT_POLL_SECONDS,
+    show_default=True,
+    help="Seconds between scans of the watched folders",
+)
+@click.option(
+    "--status_file",
+    type=str,
+    default="watch_folder_status.json",
+    show_default=True,
+    help="Json file the queue depth, throughput and failures are written to",
+)
+@click.option(
+    "--status_port",
+    type=int,
+    default=None,
+    help="Port of a local http endpoint serving the status at /status",
+)
+def main(
+    directory,
+    output_directory,
+    output_format,
+    engine,
+    workers,
+    queue_size,
+    settle_seconds,
+    poll_seconds,
+    status_file,
+    status_port,
+):
+    status = asyncio.run(
+        run_until_stopped(
+            watch_directories=list(directory),
+            output_directory=output_directory,
+            output_format=output_format,
+            engine=engine,
+            workers=workers,
+            queue_size=queue_size,
+            settle_seconds=settle_seconds,
+            poll_seconds=poll_seconds,
+            status_file=status_file,
+            status_port=status_port,
+        )
+    )
+    logging.info(
+        f"ingested {status['processed']} fit files ({status['failed']} failed), "
+        f"{status['records_per_second']:.0f} records/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
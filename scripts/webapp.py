@@ -1,11 +1,25 @@
 import streamlit as st
 import pandas as pd
 
+import io
+import multiprocessing
 import os
+import threading
 
 import plotly.graph_objects as go
 
-from analyse_fit_files.parse_fit_file import get_fit_file_data
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+
+from analyse_fit_files.downsample import DEFAULT_MAX_POINTS, downsample_dataframe
+from analyse_fit_files.fit_file_cache import get_cached_fit_file_data, hash_fit_file
+from analyse_fit_files.geo import simplify_track
+
+# parsed uploads kept in memory across reruns and sessions
+MAX_CACHED_UPLOADS = 32
+
+# uploads parsed at the same time
+MAX_PARSE_WORKERS = min(4, os.cpu_count() or 1)
 
 # Title
 st.title("Fit File Data Analysis and Comparison Tool")
@@ -38,15 +52,151 @@ uploaded_file = st.file_uploader(
 )
 
 
-def interactive_compare(dataframes, signal):
+@st.cache_resource
+def parsed_upload_cache():
+    """
+    this function will make the store of parsed uploads
+    shared by every rerun and session of the app
+    options:
+        None
+    returns:
+        parsed_uploads: ordereddict
+            parsed dataframes, or the error of uploads that
+            could not be parsed, keyed by upload content
+            hash, least recently used first
+        lock: lock
+            guards the store between sessions
+    """
+    return OrderedDict(), threading.Lock()
+
+
+@st.cache_resource
+def parse_worker_pool():
+    """
+    this function will start the worker processes
+    that parse uploads, once for the whole app
+    options:
+        None
+    returns:
+        worker_pool: processpoolexecutor
+            pool of parsing processes
+    """
+    return ProcessPoolExecutor(
+        max_workers=MAX_PARSE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def parse_uploads(uploaded_files):
+    """
+    this function will parse the uploaded fit files,
+    reusing uploads already parsed or already failed in
+    an earlier rerun and parsing new ones in the worker
+    pool with a progress bar for each file
+    options:
+        uploaded_files: list
+            uploaded fit files
+    returns:
+        dataframes: dict
+            parsed dataframes keyed by file name, uploads
+            that could not be parsed are left out
+    """
+    parsed_uploads, lock = parsed_upload_cache()
+    # uploads are known by their contents, the file name is only shown
+    uploads = [(hash_fit_file(file), file) for file in uploaded_files]
+    with lock:
+        missing_files = {
+            content_hash: file
+            for content_hash, file in uploads
+            if content_hash not in parsed_uploads
+        }
+    if missing_files:
+        worker_pool = parse_worker_pool()
+        progress_bars = {
+            content_hash: st.progress(0, text=f"Parsing {file.name}")
+            for content_hash, file in missing_files.items()
+        }
+        futures = {
+            worker_pool.submit(get_cached_fit_file_data, io.BytesIO(file.getvalue())): content_hash
+            for content_hash, file in missing_files.items()
+        }
+        for future in as_completed(futures):
+            content_hash = futures[future]
+            file_name = missing_files[content_hash].name
+            try:
+                parsed_upload = future.result()
+            except BrokenExecutor as error:
+                # the pool failed rather than the upload, so it is tried again next rerun
+                st.error(f"Could not parse {file_name}: {error}")
+                continue
+            except Exception as error:
+                # the failure is kept so later reruns do not parse the upload again
+                parsed_upload = f"Could not parse {file_name}: {error}"
+                st.error(parsed_upload)
+            with lock:
+                parsed_uploads[content_hash] = parsed_upload
+            progress_bars[content_hash].progress(100, text=f"Parsed {file_name}")
+        for progress_bar in progress_bars.values():
+            progress_bar.empty()
+
+    dataframes = {}
+    with lock:
+        for content_hash, file in uploads:
+            if content_hash not in parsed_uploads:
+                continue  # evicted by another session while parsing
+            parsed_uploads.move_to_end(content_hash)
+            parsed_upload = parsed_uploads[content_hash]
+            if isinstance(parsed_upload, str):
+                continue  # the upload could not be parsed
+            name = file.name
+            if name in dataframes:
+                name = f"{file.name} ({content_hash[:8]})"
+            dataframes[name] = parsed_upload
+        while len(parsed_uploads) > max(MAX_CACHED_UPLOADS, len(uploads)):
+            parsed_uploads.popitem(last=False)
+    return dataframes
+
+
+def shared_signals(dataframes):
+    """
+    this function will give the signals recorded by every
+    upload, in the column order of the first upload
+    options:
+        dataframes: dict
+            dictionary of the dataframe objects to compare {dataframe_name(str): dataframe(object)}
+    returns:
+        signals: list
+            columns every dataframe has, other than the timestamp
+    """
+    shared_columns = set.intersection(*[set(data.columns) for data in dataframes.values()])
+    signals = [
+        column
+        for column in next(iter(dataframes.values())).columns
+        if column in shared_columns and column != "timestamp_None"
+    ]
+    return signals
+
+
+def interactive_compare(
+    dataframes,
+    signal,
+    max_points=DEFAULT_MAX_POINTS,
+    downsample_method="lttb",
+):
     """
     this function will take a dictionary of dataframes
-    and plot it on the same axis with an interactive plot
+    and plot it on the same axis with an interactive plot,
+    dataframes without the signal are left out
     options:
         dataframes: dict
             dictionary of the dataframe objects to compare and plot {dataframe_name(str): dataframe(object)}
         signal: str
             signal or column to compare and plot
+        max_points: int
+            number of points sent to the browser per device, None to
+            send every sample, the max annotation always uses every sample
+        downsample_method: str
+            lttb or minmax, how the drawn points are picked
     returns:
         None
     """
@@ -57,7 +207,12 @@ def interactive_compare(dataframes, signal):
     ) in (
         dataframes.items()
     ):  # iterate over the dictionary of data frame objects to plot
-        fig.add_trace(go.Scatter(x=data["timestamp_None"], y=data[signal], name=device))
+        if signal not in data.columns or data[signal].isna().all():
+            continue  # the device did not record the signal
+        points_to_plot = downsample_dataframe(data, signal, max_points, downsample_method)
+        fig.add_trace(
+            go.Scatter(x=points_to_plot["timestamp_None"], y=points_to_plot[signal], name=device)
+        )
         ymax = data[signal].max()
         xpos = data.loc[data[signal] == ymax, "timestamp_None"].index[0]
         xmax = data["timestamp_None"][xpos]
@@ -77,15 +232,39 @@ def interactive_compare(dataframes, signal):
     st.plotly_chart(fig)
 
 
+def track_map(dataframes):
+    """
+    this function will draw the simplified gps track of
+    every upload on a map
+    options:
+        dataframes: dict
+            dictionary of the dataframe objects to draw {dataframe_name(str): dataframe(object)}
+    returns:
+        None
+    """
+    tracks = [
+        simplify_track(data)[["latitude_degrees", "longitude_degrees"]]
+        for data in dataframes.values()
+    ]
+    tracks = pd.concat(tracks, ignore_index=True)
+    if tracks.empty:
+        return  # indoor activities have no track
+    st.map(tracks, latitude="latitude_degrees", longitude="longitude_degrees", size=2)
+
+
 if uploaded_file:
-    dataframe_list = {}
-    # Read the uploaded file into a DataFrame
-    for file in uploaded_file:
-        temp_df = get_fit_file_data(file)
-        dataframe_list[file.name] = temp_df
-    # Create radio buttons for selection
-    option = st.radio("Chose a signal", temp_df.columns)
+    # Read the uploaded files into DataFrames, parsing only new uploads
+    dataframe_list = parse_uploads(uploaded_file)
+    if not dataframe_list:
+        st.stop()
+    signals = shared_signals(dataframe_list)
+    if not signals:
+        st.error("The uploads have no signal in common")
+        st.stop()
+    # Create radio buttons for selection from the signals every upload has
+    option = st.radio("Chose a signal", signals)
 
     # Display the selected option
     st.write("You selected:", option)
     interactive_compare(dataframes=dataframe_list, signal=option)
+    track_map(dataframes=dataframe_list)
@@ -0,0 +1,53 @@
+"""
+shared fixtures of the tests
+"""
+import glob
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PUBLIC_DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "publicdata")
+
+PUBLIC_FIT_FILES = sorted(glob.glob(os.path.join(PUBLIC_DATA_DIRECTORY, "*.fit")))
+
+# the parsed file cache and the stores are kept out of the home directory,
+# set before analyse_fit_files reads it on import
+TEST_DATA_DIRECTORY = tempfile.mkdtemp(prefix="analyse_fit_files_tests_")
+for variable, name in (
+    ("ANALYSE_FIT_FILES_CACHE", "cache"),
+    ("ANALYSE_FIT_FILES_BEST_EFFORTS", "best_efforts"),
+    ("ANALYSE_FIT_FILES_CATALOG", "catalog.sqlite"),
+    ("ANALYSE_FIT_FILES_TRAINING_LOAD", "training_load"),
+):
+    os.environ[variable] = os.path.join(TEST_DATA_DIRECTORY, name)
+
+# plots are drawn without a display
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+SCRIPTS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts")
+
+
+def load_script(name):
+    """
+    this function will import a script of the scripts folder so
+    its functions and click command can be called in the tests
+    """
+    if SCRIPTS_DIRECTORY not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIRECTORY)
+    return importlib.import_module(name)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DATA_DIRECTORY, ignore_errors=True)
+
+
+@pytest.fixture(params=PUBLIC_FIT_FILES, ids=os.path.basename)
+def public_fit_file(request):
+    """
+    this function will give each fit file of publicdata in turn
+    """
+    return request.param
@@ -0,0 +1,137 @@
+"""
+the sqlite activity catalog
+"""
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from analyse_fit_files import activity_catalog
+from analyse_fit_files.activity_catalog import (
+    activity_messages,
+    add_fit_files_to_catalog,
+    iter_activity_records,
+    query_activities,
+    remove_missing_activities,
+)
+from analyse_fit_files.fit_file_cache import hash_fit_file
+
+from conftest import PUBLIC_DATA_DIRECTORY, PUBLIC_FIT_FILES, load_script
+
+
+@pytest.fixture(scope="module")
+def catalog_path(tmp_path_factory):
+    catalog_path = str(tmp_path_factory.mktemp("catalog") / "catalog.sqlite")
+    add_fit_files_to_catalog(PUBLIC_DATA_DIRECTORY, catalog_path, workers=2)
+    return catalog_path
+
+
+def test_every_file_is_catalogued_in_start_time_order(catalog_path):
+    activities = query_activities(catalog_path=catalog_path)
+    assert sorted(activities["path"]) == sorted(PUBLIC_FIT_FILES)
+    assert list(activities["activity_id"]) == [
+        hash_fit_file(path_to_file) for path_to_file in activities["path"]
+    ]
+    assert activities["start_time"].is_monotonic_increasing
+    assert str(activities["start_time"].dt.tz) == "US/Eastern"
+
+
+def test_queries_keep_the_activities_matching_every_filter(catalog_path):
+    activities = query_activities(catalog_path=catalog_path)
+    long_runs = query_activities(
+        "running", "2024-10-06", "2024-10-12", min_distance_m=15000, catalog_path=catalog_path
+    )
+    expected = activities[
+        (activities["sport"] == "running")
+        & (activities["start_time"] >= pd.Timestamp("2024-10-06", tz="US/Eastern"))
+        & (activities["start_time"] < pd.Timestamp("2024-10-12", tz="US/Eastern"))
+        & (activities["distance_m"] >= 15000)
+    ]
+    assert len(long_runs) == 4
+    assert list(long_runs["activity_id"]) == list(expected["activity_id"])
+    rides_and_runs = query_activities(["cycling", "running"], catalog_path=catalog_path)
+    assert set(rides_and_runs["sport"]) == {"cycling", "running"}
+
+
+def test_a_query_matching_nothing_keeps_the_column_types(catalog_path):
+    activities = query_activities("swimming", catalog_path=catalog_path)
+    assert activities.empty
+    assert activities["distance_m"].dtype == "float64"
+    assert (activities["distance_m"] / 1000).round(2).empty
+
+
+def test_the_saved_laps_and_records_of_an_activity(catalog_path):
+    run = query_activities("running", catalog_path=catalog_path).iloc[0]
+    laps = activity_messages(run["activity_id"], "lap", catalog_path=catalog_path)
+    assert len(laps) == run["number_of_laps"]
+    ((activity_id, fit_file_dataframe),) = iter_activity_records(
+        query_activities("running", catalog_path=catalog_path).iloc[:1],
+        fields=["timestamp", "heart_rate"],
+    )
+    assert activity_id == run["activity_id"]
+    assert list(fit_file_dataframe.columns) == ["timestamp_None", "heart_rate_bpm"]
+
+
+def test_catalogued_files_are_not_read_again(tmp_path, monkeypatch):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    fit_file_paths = PUBLIC_FIT_FILES[:2]
+    first_ids = add_fit_files_to_catalog(fit_file_paths, catalog_path, workers=1)
+
+    def read_again(*args, **kwargs):
+        raise AssertionError("a catalogued file was read again")
+
+    monkeypatch.setattr(activity_catalog, "get_fit_file_messages", read_again)
+    monkeypatch.setattr(activity_catalog, "hash_fit_file", read_again)
+    assert add_fit_files_to_catalog(fit_file_paths, catalog_path, workers=1) == first_ids
+
+
+def test_a_moved_file_keeps_one_entry_and_a_deleted_one_is_pruned(tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    first_path = str(tmp_path / "first.fit")
+    shutil.copy(PUBLIC_FIT_FILES[0], first_path)
+    (activity_id,) = add_fit_files_to_catalog([first_path], catalog_path, workers=1)
+    moved_path = str(tmp_path / "moved.fit")
+    os.replace(first_path, moved_path)
+    assert add_fit_files_to_catalog([moved_path], catalog_path, workers=1) == [activity_id]
+    assert list(query_activities(catalog_path=catalog_path)["path"]) == [moved_path]
+    os.remove(moved_path)
+    assert remove_missing_activities(catalog_path) == [activity_id]
+    assert query_activities(catalog_path=catalog_path).empty
+
+
+def test_a_copy_and_a_bad_file_in_one_batch(tmp_path, caplog):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    copy_path = str(tmp_path / "copy.fit")
+    shutil.copy(PUBLIC_FIT_FILES[0], copy_path)
+    bad_path = str(tmp_path / "bad.fit")
+    with open(bad_path, "wb") as file:
+        file.write(b"junk" * 10)
+    with caplog.at_level(logging.ERROR):
+        activity_ids = add_fit_files_to_catalog(
+            [PUBLIC_FIT_FILES[0], copy_path, bad_path], catalog_path, workers=2
+        )
+    assert activity_ids[0] == activity_ids[1] == hash_fit_file(copy_path)
+    assert activity_ids[2] is None
+    assert "bad.fit" in caplog.text
+    assert len(query_activities(catalog_path=catalog_path)) == 1
+
+
+def test_the_command_adds_and_queries(tmp_path):
+    script = load_script("activity_catalog")
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    runner = CliRunner()
+    added = runner.invoke(
+        script.main, ["-catalog", catalog_path, "add", "-path", PUBLIC_FIT_FILES[0]]
+    )
+    assert added.exit_code == 0, added.output
+    output_csv = str(tmp_path / "activities.csv")
+    queried = runner.invoke(
+        script.main, ["-catalog", catalog_path, "query", "--year", "2024", "--output_csv", output_csv]
+    )
+    assert queried.exit_code == 0, queried.output
+    assert len(pd.read_csv(output_csv)) == 1
+    nothing = runner.invoke(script.main, ["-catalog", catalog_path, "query", "--sport", "swimming"])
+    assert nothing.exit_code == 0, nothing.output
@@ -0,0 +1,90 @@
+"""
+devices on a common timeline
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.align_fit_files import (
+    align_fit_file_dataframes,
+    estimate_clock_lag,
+    resample_to_grid,
+)
+from analyse_fit_files.visualize_fit_files import histogram_compare, line_plot_compare
+
+START = pd.Timestamp("2025-01-01 06:00", tz="US/Eastern")
+
+
+def device_dataframe(seconds, heart_rate):
+    return pd.DataFrame(
+        {
+            "timestamp_None": START + pd.to_timedelta(seconds, unit="s"),
+            "heart_rate_bpm": heart_rate,
+        }
+    )
+
+
+def heart_rate_trace(number_of_seconds, seed=0):
+    random = np.random.default_rng(seed)
+    return 140 + np.cumsum(random.normal(0, 1, number_of_seconds))
+
+
+@pytest.mark.parametrize("lag_samples", [-17, 0, 9])
+def test_the_clock_lag_is_the_cross_correlation_peak(lag_samples):
+    trace = heart_rate_trace(700)
+    reference = trace[50:650]
+    ahead = trace[50 - lag_samples : 650 - lag_samples]
+    assert estimate_clock_lag(reference, ahead, max_lag_samples=60) == lag_samples
+
+
+def test_a_signal_with_too_few_samples_has_no_lag():
+    values = np.full(100, np.nan)
+    values[3] = 150.0
+    assert estimate_clock_lag(heart_rate_trace(100), values, max_lag_samples=10) == 0
+
+
+def test_a_device_running_ahead_is_moved_back_onto_the_reference():
+    trace = heart_rate_trace(700)
+    seconds = np.arange(600)
+    reference = device_dataframe(seconds, trace[50:650])
+    # the watch clock is 12 s ahead and it records every other second
+    watch = device_dataframe(seconds[::2] + 12, trace[50:650:2])
+    aligned_dataframe, clock_lags = align_fit_file_dataframes(
+        [reference, watch], ["strap", "watch"], lag_signal="heart_rate_bpm"
+    )
+    assert clock_lags == {"strap": pd.Timedelta(0), "watch": pd.Timedelta(seconds=12)}
+    assert list(aligned_dataframe.columns) == [
+        ("strap", "heart_rate_bpm"),
+        ("watch", "heart_rate_bpm"),
+    ]
+    assert (np.diff(aligned_dataframe.index) == pd.Timedelta(seconds=1)).all()
+    on_watch_samples = aligned_dataframe.iloc[::2]
+    np.testing.assert_allclose(
+        on_watch_samples[("watch", "heart_rate_bpm")], on_watch_samples[("strap", "heart_rate_bpm")]
+    )
+
+
+def test_grid_times_far_from_every_sample_are_missing():
+    dataframe = device_dataframe([0, 1, 10], [100.0, 110.0, 120.0])
+    grid = pd.date_range(START, periods=11, freq="1s", name="timestamp_None")
+    grid_dataframe = resample_to_grid(dataframe, grid, ["heart_rate_bpm"], tolerance="2s")
+    expected = [100.0, 110.0, 110.0, 110.0] + [np.nan] * 4 + [120.0] * 3
+    np.testing.assert_array_equal(grid_dataframe["heart_rate_bpm"], expected)
+
+
+def test_every_dataframe_needs_a_datasource():
+    with pytest.raises(ValueError):
+        align_fit_file_dataframes([device_dataframe([0, 1], [100.0, 101.0])], ["a", "b"])
+
+
+@pytest.mark.parametrize("plot_compare", [line_plot_compare, histogram_compare])
+@pytest.mark.parametrize("align", [True, False])
+def test_devices_are_compared_with_and_without_the_grid(plot_compare, align):
+    trace = heart_rate_trace(120)
+    dataframes = [
+        device_dataframe(np.arange(100), trace[:100]),
+        device_dataframe(np.arange(10, 110), trace[10:110]),
+    ]
+    plot_compare(dataframes, ["strap", "watch"], "heart_rate_bpm", align=align)
+    plt.close("all")
@@ -0,0 +1,71 @@
+"""
+atomic file writes
+"""
+import os
+import stat
+
+import pandas as pd
+import pytest
+
+from analyse_fit_files.atomic_files import (
+    LOCK_FILE_NAME,
+    locked_directory,
+    replace_atomically,
+    write_parquet_atomically,
+)
+
+
+def test_the_output_is_moved_into_place_readable(tmp_path):
+    save_path = tmp_path / "nested" / "output.txt"
+
+    def write(temporary_path):
+        assert not save_path.exists()
+        with open(temporary_path, "w") as file:
+            file.write("done")
+        return 4
+
+    assert replace_atomically(str(save_path), write) == 4
+    assert save_path.read_text() == "done"
+    assert stat.S_IMODE(os.stat(save_path).st_mode) == 0o644
+    assert os.listdir(save_path.parent) == ["output.txt"]
+
+
+def test_a_failed_write_keeps_the_old_file_and_no_temporary(tmp_path):
+    save_path = tmp_path / "output.txt"
+    save_path.write_text("old")
+
+    def write(temporary_path):
+        with open(temporary_path, "w") as file:
+            file.write("half")
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        replace_atomically(str(save_path), write)
+    assert save_path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["output.txt"]
+
+
+def test_parquet_round_trip(tmp_path):
+    dataframe = pd.DataFrame({"power_watts": [200.0, 250.0], "sport": ["cycling", "cycling"]})
+    save_path = str(tmp_path / "table.parquet")
+    write_parquet_atomically(dataframe, save_path)
+    pd.testing.assert_frame_equal(pd.read_parquet(save_path), dataframe)
+
+
+def test_a_locked_directory_waits_for_the_lock(tmp_path):
+    with locked_directory(str(tmp_path)):
+        assert os.path.exists(tmp_path / LOCK_FILE_NAME)
+        with pytest.raises(TimeoutError):
+            with locked_directory(str(tmp_path), timeout_seconds=0.1):
+                pass
+    assert not os.path.exists(tmp_path / LOCK_FILE_NAME)
+
+
+def test_a_stale_lock_is_taken_over(tmp_path):
+    lock_path = tmp_path / LOCK_FILE_NAME
+    lock_path.write_text("12345")
+    an_hour_ago = os.path.getmtime(lock_path) - 3600
+    os.utime(lock_path, (an_hour_ago, an_hour_ago))
+    with locked_directory(str(tmp_path), timeout_seconds=0.1):
+        assert lock_path.read_text() == str(os.getpid())
+    assert not lock_path.exists()
@@ -0,0 +1,117 @@
+"""
+the best effort store
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.best_efforts import (
+    activity_best_efforts,
+    add_activity_to_best_efforts,
+    season_best_curve,
+)
+
+from conftest import PUBLIC_FIT_FILES
+
+
+def activity_dataframe(seconds, power):
+    return pd.DataFrame(
+        {
+            "timestamp_None": pd.Timestamp("2025-01-01 06:00", tz="US/Eastern")
+            + pd.to_timedelta(seconds, unit="s"),
+            "power_watts": power,
+        }
+    )
+
+
+def test_smart_recording_gives_the_same_curve_as_every_second():
+    random = np.random.default_rng(0)
+    # power held for 1 to 3 seconds at a time
+    steps = random.integers(1, 4, size=300)
+    power = random.normal(250, 40, size=len(steps))
+    every_second = activity_dataframe(np.arange(steps.sum()), np.repeat(power, steps))
+    # the device writes the last second too when the activity stops
+    smart = activity_dataframe(
+        np.append(np.concatenate([[0], np.cumsum(steps)[:-1]]), steps.sum() - 1),
+        np.append(power, power[-1]),
+    )
+    durations = [1, 5, 30, 120, 300]
+    pd.testing.assert_frame_equal(
+        activity_best_efforts(smart, "a", "cycling", ["power_watts"], durations),
+        activity_best_efforts(every_second, "a", "cycling", ["power_watts"], durations),
+    )
+
+
+def test_no_window_spans_a_pause():
+    # two 10 s efforts at 300 W with a 10 minute pause between them
+    seconds = np.concatenate([np.arange(10), 610 + np.arange(10)])
+    curve = activity_best_efforts(
+        activity_dataframe(seconds, np.full(20, 300.0)), "a", "cycling", ["power_watts"], [10, 20]
+    )
+    assert list(curve["duration"]) == [10]
+    assert curve["value"].iloc[0] == 300.0
+
+
+def test_adding_an_activity_twice_keeps_one_curve(tmp_path):
+    store_directory = str(tmp_path)
+    first_id = add_activity_to_best_efforts(PUBLIC_FIT_FILES[0], store_directory=store_directory)
+    second_id = add_activity_to_best_efforts(PUBLIC_FIT_FILES[0], store_directory=store_directory)
+    assert first_id == second_id
+    curves = pd.read_parquet(tmp_path / "curves.parquet")
+    assert set(curves["activity_id"]) == {first_id}
+
+
+def test_concurrent_adds_keep_every_activity(tmp_path):
+    store_directory = str(tmp_path)
+    fit_files = PUBLIC_FIT_FILES[:4]
+    with ProcessPoolExecutor(max_workers=len(fit_files)) as executor:
+        activity_ids = list(
+            executor.map(
+                add_activity_to_best_efforts,
+                fit_files,
+                [None] * len(fit_files),
+                [store_directory] * len(fit_files),
+            )
+        )
+    curves = pd.read_parquet(tmp_path / "curves.parquet")
+    assert set(curves["activity_id"]) == set(activity_ids)
+    # the all time envelope holds the best of every activity curve
+    for signal, signal_curves in curves.groupby("signal"):
+        best_values = signal_curves.groupby("duration")["value"].max()
+        season_best = season_best_curve(signal, store_directory=store_directory)
+        np.testing.assert_allclose(
+            season_best.set_index("duration")["value"], best_values.loc[season_best["duration"]]
+        )
+
+
+def test_an_activity_without_the_signals_has_no_curve():
+    no_signals = activity_dataframe(np.arange(10), np.full(10, 200.0)).drop(columns="power_watts")
+    assert activity_best_efforts(no_signals, "a", "cycling").empty
+    assert activity_best_efforts(no_signals.iloc[:0], "a", "cycling", ["timestamp_None"]).empty
+
+
+def test_the_season_envelopes_only_look_back_their_window(tmp_path):
+    store_directory = str(tmp_path)
+    activity_id = add_activity_to_best_efforts(
+        PUBLIC_FIT_FILES[0], sport="running", store_directory=store_directory
+    )
+    curves = pd.read_parquet(tmp_path / "curves.parquet")
+    activity_start = curves["activity_start"].iloc[0]
+    signal = curves["signal"].iloc[0]
+    a_month_later = activity_start + pd.Timedelta(days=30)
+    recent_best = season_best_curve(
+        signal, "42d", "running", store_directory=store_directory, as_of=a_month_later
+    )
+    assert set(recent_best["activity_id"]) == {activity_id}
+    a_season_later = activity_start + pd.Timedelta(days=100)
+    assert season_best_curve(
+        signal, "90d", "running", store_directory=store_directory, as_of=a_season_later
+    ).empty
+    assert season_best_curve(signal, "90d", "cycling", store_directory=store_directory).empty
+
+
+def test_an_unknown_envelope_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        season_best_curve(envelope="7d", store_directory=str(tmp_path))
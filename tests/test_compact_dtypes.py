@@ -0,0 +1,87 @@
+"""
+compact dtypes of parsed fit file data
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.compact_dtypes import compact_fit_file_dataframe, memory_usage_report
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+from conftest import PUBLIC_FIT_FILES
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_compact_data_holds_the_same_values_in_less_memory(engine):
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0], engine=engine)
+    compact_dataframe = compact_fit_file_dataframe(fit_file_dataframe)
+    for column_label in fit_file_dataframe.columns:
+        before = fit_file_dataframe[column_label]
+        after = compact_dataframe[column_label]
+        if pd.api.types.is_numeric_dtype(after) and not pd.api.types.is_bool_dtype(after):
+            np.testing.assert_allclose(
+                pd.to_numeric(after).to_numpy(np.float64, na_value=np.nan),
+                pd.to_numeric(before).to_numpy(np.float64, na_value=np.nan),
+                rtol=1e-6,
+                equal_nan=True,
+            )
+        else:
+            assert after.astype(object).where(after.notna(), None).tolist() == (
+                before.astype(object).where(before.notna(), None).tolist()
+            )
+    memory_report = memory_usage_report(fit_file_dataframe, compact_dataframe)
+    assert memory_report.loc["total", "bytes_after"] < memory_report.loc["total", "bytes_before"]
+
+
+def test_known_fields_get_the_narrow_dtypes():
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "heart_rate_bpm": [120, 121, 122],
+            "power_watts": [250, None, 300],
+            "speed_m/s": [3.2, 3.3, 3.4],
+            "position_lat_semicircles": [494114004, 494114100, 494114200],
+        },
+        dtype=object,
+    )
+    compact_dataframe = compact_fit_file_dataframe(fit_file_dataframe)
+    assert compact_dataframe.dtypes.astype(str).to_dict() == {
+        "heart_rate_bpm": "uint8",
+        "power_watts": "UInt16",
+        "speed_m/s": "float32",
+        "position_lat_semicircles": "int32",
+    }
+    assert compact_dataframe["power_watts"].isna().tolist() == [False, True, False]
+
+
+def test_values_that_do_not_fit_keep_their_column():
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "heart_rate_bpm": [120, 300],
+            "cadence_rpm": [85.5, 86],
+            "power_watts": ["250", "high"],
+        },
+        dtype=object,
+    )
+    compact_dataframe = compact_fit_file_dataframe(fit_file_dataframe)
+    for column_label in fit_file_dataframe.columns:
+        assert compact_dataframe[column_label].tolist() == fit_file_dataframe[column_label].tolist()
+        assert compact_dataframe[column_label].dtype == np.dtype(object)
+
+
+def test_repeated_strings_become_categorical():
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "activity_type_None": ["running"] * 5 + ["walking"],
+            "name_None": list("abcdef"),
+        }
+    )
+    compact_dataframe = compact_fit_file_dataframe(fit_file_dataframe)
+    assert isinstance(compact_dataframe["activity_type_None"].dtype, pd.CategoricalDtype)
+    assert compact_dataframe["name_None"].dtype == np.dtype(object)
+
+
+def test_compact_option_of_the_parser():
+    pd.testing.assert_frame_equal(
+        get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native", compact=True),
+        compact_fit_file_dataframe(get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native")),
+    )
@@ -0,0 +1,100 @@
+"""
+shape preserving downsampling against plain python loops
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.downsample import (
+    downsample_dataframe,
+    downsample_indices,
+    lttb_indices,
+    min_max_indices,
+)
+
+
+def lttb_by_loops(x, y, number_of_points):
+    bucket_size = (len(y) - 2) / (number_of_points - 2)
+    indices = [0]
+    for bucket in range(number_of_points - 2):
+        start = int(np.floor(bucket * bucket_size)) + 1
+        end = int(np.floor((bucket + 1) * bucket_size)) + 1
+        next_end = min(int(np.floor((bucket + 2) * bucket_size)) + 1, len(y))
+        if bucket == number_of_points - 3:
+            next_end = len(y)
+        next_x = sum(x[end:next_end]) / (next_end - end)
+        next_y = sum(y[end:next_end]) / (next_end - end)
+        previous = indices[-1]
+        best_area, best_index = -1.0, start
+        for index in range(start, end):
+            area = abs(
+                (x[previous] - next_x) * (y[index] - y[previous])
+                - (x[previous] - x[index]) * (next_y - y[previous])
+            )
+            if area > best_area:
+                best_area, best_index = area, index
+        indices.append(best_index)
+    indices.append(len(y) - 1)
+    return indices
+
+
+@pytest.mark.parametrize("number_of_points", [3, 10, 99])
+def test_lttb_matches_loops(number_of_points):
+    random = np.random.default_rng(0)
+    x = np.cumsum(random.uniform(0.5, 2.0, size=1001))
+    y = np.cumsum(random.normal(size=1001))
+    np.testing.assert_array_equal(
+        lttb_indices(x, y, number_of_points), lttb_by_loops(x, y, number_of_points)
+    )
+
+
+def test_min_max_keeps_the_envelope_of_every_bucket():
+    random = np.random.default_rng(1)
+    y = random.normal(size=1000)
+    y[100:150] = np.nan
+    indices = min_max_indices(y, number_of_points=20)
+    for bucket in range(10):
+        values = y[bucket * 100 : (bucket + 1) * 100]
+        kept = y[indices[(indices >= bucket * 100) & (indices < (bucket + 1) * 100)]]
+        assert np.nanmin(values) in kept and np.nanmax(values) in kept
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_the_extremes_are_always_kept(method):
+    random = np.random.default_rng(2)
+    y = random.normal(size=5000)
+    y[random.random(5000) < 0.05] = np.nan
+    y[1234], y[4321] = 50.0, -50.0
+    indices = downsample_indices(np.arange(5000), y, number_of_points=200, method=method)
+    assert {1234, 4321} <= set(indices)
+    assert (np.diff(indices) > 0).all()
+    assert len(indices) <= 202
+
+
+def test_short_missing_or_text_signals_keep_every_sample():
+    assert list(downsample_indices(np.arange(5), np.arange(5.0), number_of_points=10)) == list(
+        range(5)
+    )
+    assert len(downsample_indices(np.arange(50), np.arange(50.0), number_of_points=None)) == 50
+    assert len(downsample_indices(np.arange(50), [np.nan] * 50, number_of_points=10)) == 50
+    assert len(downsample_indices(np.arange(50), ["a"] * 50, number_of_points=10)) == 50
+    assert len(downsample_indices([], [], number_of_points=10)) == 0
+
+
+def test_an_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        downsample_indices(np.arange(5), np.arange(5.0), method="every_other")
+
+
+def test_a_dataframe_is_downsampled_against_its_timestamps():
+    dataframe = pd.DataFrame(
+        {
+            "timestamp_None": pd.date_range("2025-01-01", periods=3000, freq="1s", tz="US/Eastern"),
+            "power_watts": np.sin(np.arange(3000) / 50.0) * 100 + 200,
+        }
+    )
+    downsampled_dataframe = downsample_dataframe(dataframe, "power_watts", number_of_points=300)
+    assert 300 <= len(downsampled_dataframe) <= 302
+    assert downsampled_dataframe.index.is_monotonic_increasing
+    assert downsampled_dataframe["power_watts"].max() == dataframe["power_watts"].max()
+    assert downsampled_dataframe["timestamp_None"].iloc[0] == dataframe["timestamp_None"].iloc[0]
@@ -0,0 +1,129 @@
+"""
+the native decoder against fitparse
+"""
+import functools
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fitparse.utils import FitCRCError, FitEOFError, FitHeaderError
+
+from analyse_fit_files.parse_fit_file import get_fit_file_data, get_fit_file_messages
+from analyse_fit_files.synthetic_fit_file import write_synthetic_fit_file
+
+from conftest import PUBLIC_FIT_FILES
+
+
+@functools.lru_cache(maxsize=None)
+def parsed(path_to_file, engine, fields=None):
+    return get_fit_file_data(path_to_file, engine=engine, fields=fields and list(fields))
+
+
+def _with_none_for_missing(dataframe):
+    dataframe = dataframe.infer_objects()
+    # fitparse keeps a field that is never set as None objects, the native engine as nan
+    empty_columns = dataframe.columns[dataframe.isna().all()]
+    dataframe[empty_columns] = dataframe[empty_columns].astype(np.float64)
+    text_columns = dataframe.columns[dataframe.dtypes == object]
+    dataframe[text_columns] = dataframe[text_columns].astype(object).where(
+        dataframe[text_columns].notna(), None
+    )
+    return dataframe
+
+
+def assert_engines_match(fitparse_dataframe, native_dataframe):
+    assert list(fitparse_dataframe.columns) == list(native_dataframe.columns)
+    pd.testing.assert_frame_equal(
+        _with_none_for_missing(fitparse_dataframe),
+        _with_none_for_missing(native_dataframe),
+        check_dtype=False,
+    )
+
+
+def test_records_match_fitparse(public_fit_file):
+    assert_engines_match(parsed(public_fit_file, "fitparse"), parsed(public_fit_file, "native"))
+
+
+def test_summary_messages_match_fitparse(public_fit_file):
+    messages = ["file_id", "session", "lap"]
+    fitparse_messages = get_fit_file_messages(public_fit_file, messages, engine="fitparse")
+    native_messages = get_fit_file_messages(public_fit_file, messages, engine="native")
+    for message in messages:
+        assert_engines_match(fitparse_messages[message], native_messages[message])
+
+
+def test_selected_fields_match_fitparse(public_fit_file):
+    fields = ("timestamp", "heart_rate", "power")
+    assert_engines_match(
+        parsed(public_fit_file, "fitparse", fields), parsed(public_fit_file, "native", fields)
+    )
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError, match="engine must be one of"):
+        get_fit_file_data(PUBLIC_FIT_FILES[0], engine="fastest")
+
+
+@pytest.mark.parametrize(
+    "contents, error",
+    [(b"", FitEOFError), (b"\x0e\x10", FitEOFError), (b"junk" * 10, FitHeaderError)],
+)
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_bad_files_raise_the_fitparse_errors(tmp_path, contents, error, engine):
+    path_to_file = tmp_path / "bad.fit"
+    path_to_file.write_bytes(contents)
+    with pytest.raises(error):
+        get_fit_file_data(str(path_to_file), engine=engine)
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_truncated_file_raises_eof(tmp_path, engine):
+    path_to_file = tmp_path / "truncated.fit"
+    with open(PUBLIC_FIT_FILES[0], "rb") as file:
+        path_to_file.write_bytes(file.read()[:5000])
+    with pytest.raises(FitEOFError):
+        get_fit_file_data(str(path_to_file), engine=engine)
+
+
+def test_a_message_cut_short_raises_eof(tmp_path):
+    path_to_file = str(tmp_path / "synthetic.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.01)
+    with open(path_to_file, "rb") as file:
+        contents = bytearray(file.read())
+    header_size, _, _, data_size = struct.unpack("<2BHI", bytes(contents[:8]))
+    # the data size of the header ends half way through the last message
+    data_size -= 3
+    contents[4:8] = struct.pack("<I", data_size)
+    path_to_cut_file = tmp_path / "cut.fit"
+    path_to_cut_file.write_bytes(bytes(contents[: header_size + data_size]) + b"\x00\x00")
+    with pytest.raises(FitEOFError):
+        get_fit_file_data(str(path_to_cut_file), engine="native")
+
+
+def test_a_corrupt_crc_is_not_checked_by_the_native_decoder(tmp_path):
+    path_to_file = tmp_path / "corrupt_crc.fit"
+    with open(PUBLIC_FIT_FILES[0], "rb") as file:
+        contents = bytearray(file.read())
+    contents[-1] ^= 0xFF
+    path_to_file.write_bytes(bytes(contents))
+    with pytest.raises(FitCRCError):
+        get_fit_file_data(str(path_to_file), engine="fitparse")
+    pd.testing.assert_frame_equal(
+        get_fit_file_data(str(path_to_file), engine="native"),
+        get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native"),
+    )
+
+
+@pytest.mark.parametrize(
+    "developer_fields", [(), [("core_temperature", "C"), ("skin_temperature", "C")]]
+)
+def test_synthetic_files_match_fitparse(tmp_path, developer_fields):
+    path_to_file = str(tmp_path / "synthetic.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.25, developer_fields=developer_fields)
+    fitparse_dataframe = get_fit_file_data(path_to_file, engine="fitparse")
+    assert len(fitparse_dataframe) == 900
+    for name, _ in developer_fields:
+        assert fitparse_dataframe[f"{name}_C"].notna().all()
+    assert_engines_match(fitparse_dataframe, get_fit_file_data(path_to_file, engine="native"))
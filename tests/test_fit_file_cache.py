@@ -0,0 +1,99 @@
+"""
+the content addressed cache of parsed fit files
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from analyse_fit_files import fit_file_cache
+from analyse_fit_files.fit_file_cache import (
+    evict_fit_file_cache,
+    fit_file_cache_key,
+    get_cached_fit_file_data,
+    get_cached_fit_file_messages,
+    list_fit_file_cache,
+)
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+from conftest import PUBLIC_FIT_FILES
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    parsed_messages = []
+    get_fit_file_messages = fit_file_cache.get_fit_file_messages
+
+    def counted_get_fit_file_messages(*args, **options):
+        parsed_messages.append(list(options["messages"]))
+        return get_fit_file_messages(*args, **options)
+
+    monkeypatch.setattr(fit_file_cache, "get_fit_file_messages", counted_get_fit_file_messages)
+    return parsed_messages
+
+
+def test_a_hit_gives_the_parsed_data_without_parsing(tmp_path, count_parses):
+    path_to_file = PUBLIC_FIT_FILES[0]
+    missed = get_cached_fit_file_data(path_to_file, engine="native", cache_directory=tmp_path)
+    hit = get_cached_fit_file_data(path_to_file, engine="native", cache_directory=tmp_path)
+    assert count_parses == [["record"]]
+    pd.testing.assert_frame_equal(hit, missed)
+    pd.testing.assert_frame_equal(
+        hit, get_fit_file_data(path_to_file, engine="native").infer_objects()
+    )
+
+
+def test_only_the_missing_messages_are_parsed(tmp_path, count_parses):
+    path_to_file = PUBLIC_FIT_FILES[0]
+    get_cached_fit_file_messages(path_to_file, ["session"], engine="native", cache_directory=tmp_path)
+    fit_messages = get_cached_fit_file_messages(
+        path_to_file, ["record", "session"], engine="native", cache_directory=tmp_path
+    )
+    assert count_parses == [["session"], ["record"]]
+    assert set(fit_messages) == {"record", "session"}
+    assert len(list_fit_file_cache(tmp_path)) == 2
+
+
+def test_the_key_follows_the_contents_and_the_options(tmp_path):
+    path_to_file = PUBLIC_FIT_FILES[0]
+    copied_path = shutil.copy(path_to_file, tmp_path / "copy.fit")
+    cache_key = fit_file_cache_key(path_to_file)
+    assert fit_file_cache_key(copied_path) == cache_key
+    assert fit_file_cache_key(PUBLIC_FIT_FILES[1]) != cache_key
+    assert fit_file_cache_key(path_to_file, engine="native") != cache_key
+    assert fit_file_cache_key(path_to_file, fields=["power", "timestamp"]) == fit_file_cache_key(
+        path_to_file, fields=["timestamp", "power"]
+    )
+    assert fit_file_cache_key(path_to_file, fields=["power"]) != cache_key
+    assert fit_file_cache_key(path_to_file, compact=True) != cache_key
+    assert fit_file_cache_key(path_to_file, message="session") != cache_key
+
+
+def test_an_unreadable_entry_is_parsed_again(tmp_path, count_parses):
+    path_to_file = PUBLIC_FIT_FILES[0]
+    get_cached_fit_file_data(path_to_file, engine="native", cache_directory=tmp_path)
+    [(_, _, cache_path)] = list_fit_file_cache(tmp_path)
+    with open(cache_path, "wb") as file:
+        file.write(b"not parquet")
+    fit_file_dataframe = get_cached_fit_file_data(
+        path_to_file, engine="native", cache_directory=tmp_path
+    )
+    assert count_parses == [["record"], ["record"]]
+    assert len(fit_file_dataframe) > 0
+    pd.read_parquet(cache_path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    get_cached_fit_file_data(PUBLIC_FIT_FILES[0], engine="native", cache_directory=tmp_path)
+    [(_, first_size, first_path)] = list_fit_file_cache(tmp_path)
+    os.utime(first_path, (1, 1))
+    get_cached_fit_file_data(PUBLIC_FIT_FILES[1], engine="native", cache_directory=tmp_path)
+    assert list_fit_file_cache(tmp_path)[0][2] == first_path
+    # a hit marks the first entry as used, so the second one goes first
+    get_cached_fit_file_data(PUBLIC_FIT_FILES[0], engine="native", cache_directory=tmp_path)
+    assert list_fit_file_cache(tmp_path)[-1][2] == first_path
+    assert evict_fit_file_cache(tmp_path, max_cache_bytes=first_size) == 1
+    assert [path for _, _, path in list_fit_file_cache(tmp_path)] == [first_path]
+    assert evict_fit_file_cache(tmp_path, max_cache_bytes=0) == 1
+    assert list_fit_file_cache(tmp_path) == []
@@ -0,0 +1,77 @@
+"""
+the batch mode of the fit file converter
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from click.testing import CliRunner
+
+from analyse_fit_files.parse_fit_file import find_fit_files
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+fit_file_to_csv = load_script("fit_file_to_csv")
+
+
+@pytest.mark.parametrize(
+    "file_path, message, output_format, save_path",
+    [
+        ("data/ride.fit", "record", "csv", "data/ride.csv"),
+        ("data/ride.FIT", "record", "csv", "data/ride.csv"),
+        ("data/old.fit_files/ride.fit", "lap", "csv.gz", "data/old.fit_files/ride_lap.csv.gz"),
+        ("data/ride.fit", "session", "parquet", "data/ride_session.parquet"),
+    ],
+)
+def test_only_the_extension_is_replaced(file_path, message, output_format, save_path):
+    assert fit_file_to_csv.generate_save_path(file_path, message, output_format) == save_path
+
+
+def test_fit_files_are_found_in_folders_globs_and_lists(tmp_path):
+    for relative_path in ("a.fit", "nested/b.FIT", "nested/deeper/c.fit", "notes.txt"):
+        os.makedirs(tmp_path / os.path.dirname(relative_path), exist_ok=True)
+        (tmp_path / relative_path).write_bytes(b"")
+    expected = [
+        str(tmp_path / "a.fit"),
+        str(tmp_path / "nested" / "b.FIT"),
+        str(tmp_path / "nested" / "deeper" / "c.fit"),
+    ]
+    assert find_fit_files(str(tmp_path)) == expected
+    assert find_fit_files(str(tmp_path / "**" / "*.fit")) == [expected[0], expected[2]]
+    assert find_fit_files(expected[1]) == [expected[1]]
+    assert find_fit_files(expected[::-1]) == expected[::-1]
+    assert find_fit_files(str(tmp_path / "missing")) == []
+
+
+def test_a_folder_is_converted_in_parallel_and_skipped_when_up_to_date(tmp_path):
+    for path_to_file in PUBLIC_FIT_FILES[-3:]:
+        shutil.copy(path_to_file, tmp_path)
+    arguments = ["-path", str(tmp_path), "--engine", "native", "--workers", "2"]
+    result = CliRunner().invoke(fit_file_to_csv.main, arguments + ["-format", "parquet"])
+    assert result.exit_code == 0, result.output
+    save_paths = sorted(str(path) for path in tmp_path.glob("*.parquet"))
+    assert [os.path.splitext(path)[0] for path in save_paths] == [
+        os.path.splitext(path)[0] for path in find_fit_files(str(tmp_path))
+    ]
+    for save_path in save_paths:
+        assert oct(os.stat(save_path).st_mode & 0o777) == oct(0o644)
+        assert len(pd.read_parquet(save_path)) > 0
+
+    modified_times = [os.path.getmtime(save_path) for save_path in save_paths]
+    result = CliRunner().invoke(fit_file_to_csv.main, arguments + ["-format", "parquet"])
+    assert result.exit_code == 0, result.output
+    assert [os.path.getmtime(save_path) for save_path in save_paths] == modified_times
+
+
+def test_a_corrupt_file_fails_the_batch_without_stopping_it(tmp_path):
+    shutil.copy(PUBLIC_FIT_FILES[-1], tmp_path / "good.fit")
+    (tmp_path / "corrupt.fit").write_bytes(b"junk" * 10)
+    result = CliRunner().invoke(
+        fit_file_to_csv.main, ["-path", str(tmp_path), "--engine", "native", "--workers", "1"]
+    )
+    assert result.exit_code == 1
+    assert (tmp_path / "good.csv").exists()
+    assert not (tmp_path / "corrupt.csv").exists()
+    assert sorted(os.listdir(tmp_path)) == ["corrupt.fit", "good.csv", "good.fit"]
@@ -0,0 +1,187 @@
+"""
+gps track processing against plain python loops
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.geo import (
+    EARTH_RADIUS_M,
+    SEMICIRCLES_TO_DEGREES,
+    compare_track_distance,
+    elevation_gain,
+    grade,
+    rdp_indices,
+    simplify_track,
+    track_distance,
+    visvalingam_indices,
+)
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+from conftest import PUBLIC_FIT_FILES
+
+
+def wandering_line(seed, number_of_points=300):
+    random = np.random.default_rng(seed)
+    heading = np.cumsum(random.normal(0, 0.3, size=number_of_points))
+    step = random.uniform(0, 10, size=number_of_points)
+    return np.cumsum(step * np.cos(heading)), np.cumsum(step * np.sin(heading))
+
+
+def distance_to_segment(x, y, start, end, point):
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    px, py = x[point] - x[start], y[point] - y[start]
+    length_squared = dx * dx + dy * dy
+    fraction = 0.0 if length_squared == 0 else (px * dx + py * dy) / length_squared
+    fraction = min(max(fraction, 0.0), 1.0)
+    return math.hypot(px - fraction * dx, py - fraction * dy)
+
+
+def rdp_by_recursion(x, y, start, end, tolerance):
+    farthest, farthest_distance = None, -1.0
+    for point in range(start + 1, end):
+        distance = distance_to_segment(x, y, start, end, point)
+        if distance > farthest_distance:
+            farthest, farthest_distance = point, distance
+    if farthest is None or farthest_distance <= tolerance:
+        return [start, end]
+    return rdp_by_recursion(x, y, start, farthest, tolerance)[:-1] + rdp_by_recursion(
+        x, y, farthest, end, tolerance
+    )
+
+
+def triangle_area(x, y, previous, current, following):
+    return 0.5 * abs(
+        (x[previous] - x[following]) * (y[current] - y[previous])
+        - (x[previous] - x[current]) * (y[following] - y[previous])
+    )
+
+
+def visvalingam_by_loops(x, y, min_area):
+    kept = list(range(len(x)))
+    areas = {
+        point: triangle_area(x, y, point - 1, point, point + 1) for point in range(1, len(x) - 1)
+    }
+    while len(kept) > 2:
+        position = min(range(1, len(kept) - 1), key=lambda index: (areas[kept[index]], kept[index]))
+        area = areas[kept[position]]
+        if area >= min_area:
+            break
+        del kept[position]
+        for index in (position - 1, position):
+            if 0 < index < len(kept) - 1:
+                areas[kept[index]] = max(
+                    area, triangle_area(x, y, kept[index - 1], kept[index], kept[index + 1])
+                )
+    return kept
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("tolerance", [1.0, 5.0, 20.0])
+def test_rdp_matches_recursion(seed, tolerance):
+    x, y = wandering_line(seed)
+    indices = rdp_indices(x, y, tolerance)
+    assert list(indices) == rdp_by_recursion(x, y, 0, len(x) - 1, tolerance)
+    # every dropped point is within the tolerance of the simplified line
+    for start, end in zip(indices, indices[1:]):
+        for point in range(start + 1, end):
+            assert distance_to_segment(x, y, start, end, point) <= tolerance
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("min_area", [1.0, 25.0, 400.0])
+def test_visvalingam_matches_loops(seed, min_area):
+    x, y = wandering_line(seed)
+    assert list(visvalingam_indices(x, y, min_area)) == visvalingam_by_loops(x, y, min_area)
+
+
+def test_visvalingam_keeps_the_number_of_points():
+    x, y = wandering_line(0)
+    indices = visvalingam_indices(x, y, np.inf, number_of_points=50)
+    assert len(indices) == 50 and indices[0] == 0 and indices[-1] == len(x) - 1
+
+
+def test_track_distance_matches_loops():
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native")
+    latitude = fit_file_dataframe["position_lat_semicircles"] * SEMICIRCLES_TO_DEGREES
+    longitude = fit_file_dataframe["position_long_semicircles"] * SEMICIRCLES_TO_DEGREES
+    expected, total, last = [], 0.0, None
+    for position in zip(latitude, longitude):
+        if not np.isnan(position).any():
+            if last is not None:
+                phi1, phi2 = math.radians(last[0]), math.radians(position[0])
+                half_chord = (
+                    math.sin((phi2 - phi1) / 2) ** 2
+                    + math.cos(phi1)
+                    * math.cos(phi2)
+                    * math.sin(math.radians(position[1] - last[1]) / 2) ** 2
+                )
+                total += 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(half_chord, 1.0)))
+            last = position
+        expected.append(total)
+    np.testing.assert_allclose(track_distance(fit_file_dataframe), expected)
+
+
+@pytest.mark.parametrize("method", ["rdp", "visvalingam"])
+def test_simplify_track_keeps_the_ends_of_a_real_track(method):
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native")
+    simplified = simplify_track(fit_file_dataframe, tolerance_m=5, method=method)
+    has_position = fit_file_dataframe["position_lat_semicircles"].notna()
+    assert 1 < len(simplified) < has_position.sum()
+    assert simplified.index[0] == has_position.idxmax()
+    assert simplified.index[-1] == has_position[::-1].idxmax()
+    assert simplified.index.is_monotonic_increasing
+
+
+def test_an_indoor_activity_has_no_track():
+    indoor = pd.DataFrame({"heart_rate_bpm": [120.0, 130.0, 140.0], "distance_m": [0.0, 5.0, 9.0]})
+    for method in ("rdp", "visvalingam"):
+        assert simplify_track(indoor, method=method).empty
+    np.testing.assert_array_equal(track_distance(indoor), [0.0, 0.0, 0.0])
+    comparison = compare_track_distance(indoor)
+    assert comparison["track_distance_m"] == 0.0
+    assert comparison["device_distance_m"] == 9.0
+
+
+def test_empty_input_gives_empty_results():
+    empty = pd.DataFrame(columns=["position_lat_semicircles", "position_long_semicircles"])
+    assert simplify_track(empty).empty
+    assert len(track_distance(empty)) == 0
+    assert len(grade([], [])) == 0
+    assert elevation_gain([]) == (0.0, 0.0)
+    assert np.isnan(compare_track_distance(empty)["device_distance_m"])
+
+
+def test_a_single_position_is_kept():
+    one_position = pd.DataFrame(
+        {"position_lat_semicircles": [500000000], "position_long_semicircles": [-900000000]}
+    )
+    simplified = simplify_track(one_position)
+    assert len(simplified) == 1
+    np.testing.assert_allclose(simplified["latitude_degrees"], 500000000 * SEMICIRCLES_TO_DEGREES)
+
+
+def test_an_unknown_method_is_refused():
+    with pytest.raises(ValueError, match="method must be one of"):
+        simplify_track(get_fit_file_data(PUBLIC_FIT_FILES[0]), method="douglas")
+
+
+def test_grade_and_elevation_of_a_steady_climb():
+    distance = np.arange(0.0, 500.0, 5.0)
+    altitude = 100 + distance * 0.06
+    altitude[40] = np.nan
+    grades = grade(distance, altitude, smoothing_samples=1)
+    assert np.isnan(grades[40])
+    np.testing.assert_allclose(np.delete(grades, 40), 6.0)
+    gain, loss = elevation_gain(np.concatenate([altitude, altitude[::-1]]), smoothing_samples=1)
+    np.testing.assert_allclose([gain, loss], [distance[-1] * 0.06] * 2)
+    # a track standing still has no grade
+    assert np.isnan(grade(np.zeros(10), np.arange(10.0))).all()
+
+
+def test_the_gps_and_device_distances_agree_on_a_real_ride():
+    comparison = compare_track_distance(get_fit_file_data(PUBLIC_FIT_FILES[0]))
+    assert comparison["device_distance_m"] > 1000
+    assert abs(comparison["difference_percent"]) < 1
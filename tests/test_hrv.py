@@ -0,0 +1,170 @@
+"""
+heart rate variability against plain python loops
+"""
+import statistics
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.hrv import (
+    MAX_RR_SECONDS,
+    MIN_RR_SECONDS,
+    beat_seconds,
+    correct_artifacts,
+    dfa_alpha1,
+    hrv_on_records,
+    rolling_rmssd_sdnn,
+)
+from analyse_fit_files.parse_fit_file import get_fit_file_data, get_rr_intervals
+from analyse_fit_files.synthetic_fit_file import (
+    synthetic_rr_intervals,
+    synthetic_signals,
+    write_synthetic_fit_file,
+)
+
+
+def rr_intervals_with_artifacts(seed, number_of_beats=2000):
+    random = np.random.default_rng(seed)
+    rr_intervals = 0.8 + 0.05 * np.sin(np.arange(number_of_beats) / 7)
+    rr_intervals += random.normal(0, 0.02, size=number_of_beats)
+    # a missed beat, an extra beat and a dropout
+    rr_intervals[100] *= 2
+    rr_intervals[500] *= 0.5
+    rr_intervals[900] = np.nan
+    return rr_intervals
+
+
+def test_correct_artifacts_matches_loops():
+    rr_intervals = rr_intervals_with_artifacts(0)
+    corrected, is_artifact = correct_artifacts(rr_intervals, threshold=0.2, window_beats=11)
+    expected_artifacts = []
+    for beat, rr_interval in enumerate(rr_intervals):
+        window = [
+            value
+            for value in rr_intervals[max(beat - 5, 0) : beat + 6]
+            if not np.isnan(value)
+        ]
+        local_median = statistics.median(window)
+        expected_artifacts.append(
+            bool(
+                np.isnan(rr_interval)
+                or not MIN_RR_SECONDS <= rr_interval <= MAX_RR_SECONDS
+                or abs(rr_interval - local_median) > 0.2 * local_median
+            )
+        )
+    assert list(is_artifact) == expected_artifacts
+    assert {100, 500, 900} <= set(np.flatnonzero(is_artifact))
+    for beat in np.flatnonzero(is_artifact):
+        before = max(index for index in range(beat) if not is_artifact[index])
+        after = min(index for index in range(beat, len(rr_intervals)) if not is_artifact[index])
+        fraction = (beat - before) / (after - before)
+        expected = rr_intervals[before] + fraction * (rr_intervals[after] - rr_intervals[before])
+        np.testing.assert_allclose(corrected[beat], expected)
+
+
+def test_rolling_rmssd_sdnn_match_loops():
+    rr_intervals, _ = correct_artifacts(rr_intervals_with_artifacts(1))
+    seconds = beat_seconds(rr_intervals)
+    at_seconds = np.arange(0, seconds[-1], 37.0)
+    rmssd, sdnn = rolling_rmssd_sdnn(seconds, rr_intervals, at_seconds, 120, min_beats=30)
+    for position, at_second in enumerate(at_seconds):
+        window = [
+            rr_interval
+            for beat_second, rr_interval in zip(seconds, rr_intervals)
+            if at_second - 120 < beat_second <= at_second
+        ]
+        if len(window) < 30:
+            assert np.isnan(rmssd[position]) and np.isnan(sdnn[position])
+            continue
+        differences = [(later - earlier) ** 2 for earlier, later in zip(window, window[1:])]
+        np.testing.assert_allclose(
+            rmssd[position], (sum(differences) / len(differences)) ** 0.5 * 1000
+        )
+        np.testing.assert_allclose(sdnn[position], statistics.stdev(window) * 1000)
+
+
+def dfa_alpha1_by_loops(window, scales):
+    mean = sum(window) / len(window)
+    profile, total = [], 0.0
+    for rr_interval in window:
+        total += rr_interval - mean
+        profile.append(total)
+    log_fluctuations = []
+    for scale in scales:
+        residuals = []
+        for box_start in range(0, len(window) // scale * scale, scale):
+            box = profile[box_start : box_start + scale]
+            slope, intercept = np.polyfit(np.arange(scale), box, 1)
+            residuals += [value - (slope * time + intercept) for time, value in enumerate(box)]
+        log_fluctuations.append(0.5 * np.log(sum(value**2 for value in residuals) / len(residuals)))
+    return np.polyfit(np.log(scales), log_fluctuations, 1)[0]
+
+
+@pytest.mark.parametrize("window_beats", [64, 200])
+def test_dfa_alpha1_matches_loops(window_beats):
+    rr_intervals = synthetic_rr_intervals(np.full(1000, 150.0), seed=2)
+    scales = np.arange(4, 17)
+    window_ends, alpha1 = dfa_alpha1(rr_intervals, window_beats, step_beats=97, scales=scales)
+    assert list(window_ends) == list(range(window_beats - 1, len(rr_intervals), 97))
+    for window_end, value in zip(window_ends, alpha1):
+        window = list(rr_intervals[window_end - window_beats + 1 : window_end + 1])
+        np.testing.assert_allclose(value, dfa_alpha1_by_loops(window, scales))
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_rr_intervals_are_read_from_the_hrv_messages(tmp_path, engine):
+    path_to_file = str(tmp_path / "strap.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.1, hrv=True)
+    heart_rate = synthetic_signals(360)["heart_rate"]
+    expected = np.rint(synthetic_rr_intervals(heart_rate) * 1000) / 1000
+    # the padding of the last hrv message is left out
+    np.testing.assert_allclose(get_rr_intervals(path_to_file, engine=engine), expected)
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_a_file_without_hrv_messages_has_no_beats(tmp_path, engine):
+    path_to_file = str(tmp_path / "watch.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.01)
+    assert len(get_rr_intervals(path_to_file, engine=engine)) == 0
+
+
+def test_an_unknown_engine_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="engine must be one of"):
+        get_rr_intervals(str(tmp_path / "strap.fit"), engine="garmin")
+
+
+def test_hrv_lines_up_with_the_records(tmp_path):
+    path_to_file = str(tmp_path / "strap.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.25, hrv=True)
+    fit_file_dataframe = get_fit_file_data(path_to_file, engine="native")
+    hrv_dataframe = hrv_on_records(
+        fit_file_dataframe, get_rr_intervals(path_to_file, engine="native")
+    )
+    assert list(hrv_dataframe.columns) == [
+        "timestamp_None",
+        "rr_ms",
+        "rmssd_ms",
+        "sdnn_ms",
+        "dfa_alpha1",
+        "artifact_percent",
+    ]
+    assert len(hrv_dataframe) == len(fit_file_dataframe)
+    later = hrv_dataframe.iloc[300:]
+    assert later[["rr_ms", "rmssd_ms", "sdnn_ms", "dfa_alpha1"]].notna().all().all()
+    # the mean interval follows the recorded heart rate
+    np.testing.assert_allclose(
+        60000 / later["rr_ms"], fit_file_dataframe["heart_rate_bpm"].iloc[300:], rtol=0.1
+    )
+    assert later["artifact_percent"].max() < 5
+
+
+def test_no_beats_leave_every_record_missing():
+    fit_file_dataframe = pd.DataFrame(
+        {"timestamp_None": pd.date_range("2025-01-01", periods=5, freq="1s")}
+    )
+    hrv_dataframe = hrv_on_records(fit_file_dataframe, np.array([]))
+    assert len(hrv_dataframe) == 5
+    assert hrv_dataframe.drop(columns="timestamp_None").isna().all().all()
+    corrected_intervals, is_artifact = correct_artifacts([])
+    assert len(corrected_intervals) == len(is_artifact) == 0
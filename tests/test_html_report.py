@@ -0,0 +1,102 @@
+"""
+static html activity reports
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from analyse_fit_files.html_report import (
+    activity_report_html,
+    peak_curve_figure,
+    report_signals,
+    save_activity_report,
+    signal_figure,
+    zone_tables,
+)
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+
+def test_fitparse_and_native_frames_give_the_same_traces():
+    native = get_fit_file_data(PUBLIC_FIT_FILES[0], engine="native")
+    fitparse = get_fit_file_data(PUBLIC_FIT_FILES[0], engine="fitparse")
+    assert report_signals({"a": fitparse}) == report_signals({"a": native})
+    assert "heart_rate_bpm" in report_signals({"a": fitparse})
+    for signal in report_signals({"a": native}):
+        fig = signal_figure({"fitparse": fitparse, "native": native}, signal)
+        assert [trace.name.split()[0] for trace in fig.data] == ["fitparse", "native"]
+    assert "Heart Rate Bpm" in activity_report_html({"fitparse": fitparse, "native": native})
+
+
+def test_traces_are_downsampled_float32_arrays():
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0])
+    fig = signal_figure({"device": fit_file_dataframe}, "heart_rate_bpm", max_points=300)
+    (trace,) = fig.data
+    assert trace.type == "scattergl"
+    assert trace.x.dtype == trace.y.dtype == np.float32
+    assert len(trace.y) < 350
+    assert trace.x[0] == 0
+
+
+def test_peak_curves_count_seconds_not_samples():
+    # one sample every 2 seconds for 10 minutes
+    timestamps = pd.Series(pd.date_range("2025-01-01", periods=300, freq="2s", tz="UTC"))
+    fit_file_dataframe = pd.DataFrame({"timestamp_None": timestamps, "power_watts": 200.0})
+    (trace,) = peak_curve_figure({"device": fit_file_dataframe}, "power_watts").data
+    assert trace.x[-1] == 599
+    np.testing.assert_allclose(trace.y, 200.0)
+
+
+def test_signals_with_no_values_are_left_out():
+    timestamps = pd.Series(pd.date_range("2025-01-01", periods=60, freq="1s", tz="UTC"))
+    fit_file_dataframe = pd.DataFrame(
+        {"timestamp_None": timestamps, "heart_rate_bpm": 150.0, "power_watts": np.nan}
+    )
+    assert report_signals({"device": fit_file_dataframe}) == ["heart_rate_bpm"]
+    assert len(signal_figure({"device": fit_file_dataframe}, "power_watts").data) == 0
+    assert len(peak_curve_figure({"device": fit_file_dataframe}, "power_watts").data) == 0
+
+
+def test_zone_tables_are_in_minutes():
+    timestamps = pd.Series(pd.date_range("2025-01-01", periods=600, freq="1s", tz="UTC"))
+    fit_file_dataframe = pd.DataFrame(
+        {"timestamp_None": timestamps, "heart_rate_bpm": 150.0, "power_watts": 200.0}
+    )
+    tables = zone_tables({"device": fit_file_dataframe}, max_heart_rate=200)
+    assert list(tables) == ["heart_rate_bpm"]
+    assert tables["heart_rate_bpm"].loc["device"].sum() == pytest.approx(10.0)
+    tables = zone_tables({"device": fit_file_dataframe}, 200, functional_threshold_power=250)
+    assert list(tables) == ["heart_rate_bpm", "power_watts"]
+    assert zone_tables({"device": fit_file_dataframe}) == {}
+
+
+def test_a_report_is_saved_atomically(tmp_path):
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0])
+    save_path = str(tmp_path / "report.html")
+    save_activity_report(fit_file_dataframe, save_path, title="Morning Ride", max_heart_rate=190)
+    with open(save_path, encoding="utf-8") as file:
+        report_html = file.read()
+    assert "<title>Morning Ride</title>" in report_html
+    assert "cdn.plot.ly" in report_html
+    assert os.stat(save_path).st_mode & 0o777 == 0o644
+    assert os.listdir(tmp_path) == ["report.html"]
+    with pytest.raises(ValueError, match="include_plotlyjs"):
+        activity_report_html(fit_file_dataframe, include_plotlyjs="inline")
+
+
+def test_the_report_command_compares_devices(tmp_path):
+    script = load_script("html_report")
+    save_path = str(tmp_path / "report.html")
+    result = CliRunner().invoke(
+        script.main,
+        ["-path", PUBLIC_FIT_FILES[0], "-path", PUBLIC_FIT_FILES[1], "-out", save_path],
+    )
+    assert result.exit_code == 0, result.output
+    with open(save_path, encoding="utf-8") as file:
+        report_html = file.read()
+    for path_to_file in PUBLIC_FIT_FILES[:2]:
+        assert os.path.splitext(os.path.basename(path_to_file))[0] in report_html
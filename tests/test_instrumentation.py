@@ -0,0 +1,124 @@
+"""
+stage timings, counters and progress events
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files import instrumentation
+from analyse_fit_files.instrumentation import (
+    LoggingObserver,
+    TqdmObserver,
+    add_observer,
+    collect_metrics,
+    count,
+    progress,
+    remove_observer,
+    stage,
+)
+from analyse_fit_files.parse_fit_file import (
+    get_fit_file_data,
+    iter_fit_record_batches,
+    sport_peak_curve,
+)
+
+from conftest import PUBLIC_FIT_FILES
+
+
+@pytest.fixture
+def events():
+    events = []
+    observer = add_observer(events.append)
+    yield events
+    remove_observer(observer)
+
+
+def test_with_no_observer_the_hooks_pass_straight_through():
+    assert not instrumentation.is_observed()
+    with stage("decode"):
+        count("records", 5)
+    assert list(progress(range(3), "records")) == [0, 1, 2]
+
+
+def test_progress_is_reported_every_few_items_and_when_done(events):
+    assert list(progress(range(25), "records", total=25, every=10)) == list(range(25))
+    assert [event["value"] for event in events] == [0, 10, 10, 5]
+    assert events[-1]["done"] and all(event["total"] == 25 for event in events)
+
+
+def test_nested_stages_are_timed_with_their_peak_memory():
+    with collect_metrics(track_memory=True) as metrics:
+        with stage("outer"):
+            with stage("inner"):
+                kept = np.ones(1_000_000)
+            del kept
+    assert metrics["calls"] == {"inner": 1, "outer": 1}
+    assert metrics["timings"]["outer"] >= metrics["timings"]["inner"]
+    assert metrics["peak_memory_bytes"]["inner"] >= 8_000_000
+    assert metrics["peak_memory_bytes"]["outer"] >= metrics["peak_memory_bytes"]["inner"]
+    assert metrics["peak_memory_bytes_total"] >= metrics["peak_memory_bytes"]["outer"]
+
+
+def test_the_metrics_observer_is_removed_when_the_block_fails():
+    with pytest.raises(RuntimeError):
+        with collect_metrics():
+            raise RuntimeError("stop")
+    assert not instrumentation.is_observed()
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_parsing_reports_its_stages_and_counters(engine):
+    path_to_file = PUBLIC_FIT_FILES[0]
+    with collect_metrics() as metrics:
+        fit_file_dataframe = get_fit_file_data(path_to_file, engine=engine)
+    assert {"decode", "assemble", "timezone_conversion"} <= set(metrics["timings"])
+    assert metrics["counters"]["records"] == len(fit_file_dataframe)
+    assert metrics["counters"]["fields"] == fit_file_dataframe.shape[1]
+    assert metrics["counters"]["bytes"] == os.path.getsize(path_to_file)
+
+
+def test_streamed_batches_report_decode_and_assemble():
+    with collect_metrics() as metrics:
+        batches = list(iter_fit_record_batches(PUBLIC_FIT_FILES[0], batch_size=500, engine="native"))
+    assert {"decode", "assemble", "timezone_conversion"} <= set(metrics["timings"])
+    assert metrics["calls"]["timezone_conversion"] == len(batches)
+    assert metrics["counters"]["records"] == sum(len(batch) for batch in batches)
+
+
+def test_the_peak_curve_reports_its_computation():
+    fit_file_dataframe = pd.DataFrame(
+        {"speed_m/s": np.full(60, 3.0), "heart_rate_bpm": np.full(60, 150.0)},
+        index=np.arange(1, 61),
+    )
+    with collect_metrics() as metrics:
+        sport_peak_curve(fit_file_dataframe)
+    assert metrics["calls"] == {"curve_computation": 1}
+
+
+def test_the_logging_observer_writes_key_value_records(caplog):
+    observer = add_observer(LoggingObserver())
+    try:
+        with caplog.at_level(logging.INFO, logger=instrumentation.logger.name):
+            count("records", 7)
+            list(progress(range(3), "records"))
+    finally:
+        remove_observer(observer)
+    assert [record.getMessage() for record in caplog.records] == [
+        "event=count counter=records value=7"
+    ]
+    assert caplog.records[0].instrumentation["value"] == 7
+
+
+def test_the_tqdm_observer_closes_finished_bars():
+    observer = add_observer(TqdmObserver(disable=True))
+    try:
+        iterator = progress(range(5), "records", every=2)
+        next(iterator)
+        assert set(observer.bars) == {"records"}
+        list(iterator)
+        assert observer.bars == {}
+    finally:
+        remove_observer(observer)
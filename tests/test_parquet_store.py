@@ -0,0 +1,20 @@
+"""
+tables of the parquet stores
+"""
+import pandas as pd
+
+from analyse_fit_files.atomic_files import write_parquet_atomically
+from analyse_fit_files.parquet_store import read_table, table_path
+
+
+def test_a_table_never_written_is_empty_with_its_columns(tmp_path):
+    table_dataframe = read_table(str(tmp_path), "daily", ["date", "load"])
+    assert table_dataframe.empty
+    assert list(table_dataframe.columns) == ["date", "load"]
+
+
+def test_a_written_table_is_read_back(tmp_path):
+    dataframe = pd.DataFrame({"date": ["2025-01-01"], "load": [80.0]})
+    write_parquet_atomically(dataframe, table_path(str(tmp_path), "daily"))
+    assert table_path(str(tmp_path), "daily") == str(tmp_path / "daily.parquet")
+    pd.testing.assert_frame_equal(read_table(str(tmp_path), "daily", ["date", "load"]), dataframe)
@@ -0,0 +1,101 @@
+"""
+the record columns assembled in buffers against one dataframe per record
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fitparse import FitFile
+
+from analyse_fit_files.parse_fit_file import (
+    _assemble_columns,
+    get_fit_file_data,
+    get_fit_file_messages,
+)
+
+from conftest import PUBLIC_DATA_DIRECTORY
+
+# the files with the fewest records keep the per record reference quick
+SMALL_FIT_FILES = [
+    os.path.join(PUBLIC_DATA_DIRECTORY, name) for name in ("weight1coros.fit", "weight1wahoo.fit")
+]
+
+
+def one_dataframe_per_record(path_to_file):
+    recordings = []
+    for record in FitFile(path_to_file).get_messages("record"):
+        fields = record.as_dict()["fields"]
+        recordings.append(
+            pd.DataFrame(
+                [[field["value"] for field in fields]],
+                columns=[f"{field['name']}_{field['units']}" for field in fields],
+            )
+        )
+    fit_file_dataframe = pd.concat(recordings).reset_index(drop=True)
+    fit_file_dataframe["timestamp_None"] = (
+        pd.to_datetime(fit_file_dataframe["timestamp_None"])
+        .dt.tz_localize("UTC")
+        .dt.tz_convert("US/Eastern")
+    )
+    return fit_file_dataframe
+
+
+@pytest.mark.parametrize("path_to_file", SMALL_FIT_FILES, ids=os.path.basename)
+def test_buffers_match_one_dataframe_per_record(path_to_file):
+    pd.testing.assert_frame_equal(
+        get_fit_file_data(path_to_file).infer_objects(),
+        one_dataframe_per_record(path_to_file).infer_objects(),
+        check_dtype=False,
+    )
+
+
+def test_columns_that_stop_early_are_padded():
+    column_buffers = {"timestamp_None": [1, 2, 3], "power_watts": [200], "heart_rate_bpm": []}
+    assembled_dataframe = _assemble_columns(column_buffers, 3)
+    assert list(assembled_dataframe.columns) == ["timestamp_None", "power_watts", "heart_rate_bpm"]
+    assert assembled_dataframe["power_watts"].tolist()[0] == 200
+    assert assembled_dataframe["power_watts"].iloc[1:].isna().all()
+    assert assembled_dataframe["heart_rate_bpm"].isna().all()
+
+
+def test_equal_length_tuples_stay_one_value_per_row():
+    column_buffers = {"time_s": [(0.8, 0.81), (0.79, 0.8)]}
+    assembled_dataframe = _assemble_columns(column_buffers, 2)
+    assert assembled_dataframe.shape == (2, 1)
+    assert assembled_dataframe["time_s"].tolist() == [(0.8, 0.81), (0.79, 0.8)]
+    assert assembled_dataframe["time_s"].dtype == np.dtype(object)
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_only_the_selected_fields_are_kept(engine):
+    path_to_file = SMALL_FIT_FILES[0]
+    every_field = get_fit_file_data(path_to_file, engine=engine)
+    selected = get_fit_file_data(path_to_file, engine=engine, fields=["timestamp", "heart_rate"])
+    assert set(selected.columns) == {"timestamp_None", "heart_rate_bpm"}
+    pd.testing.assert_frame_equal(
+        selected, every_field[list(selected.columns)], check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_date_time_fields_of_every_message_are_us_eastern(engine):
+    fit_messages = get_fit_file_messages(
+        SMALL_FIT_FILES[0], ["file_id", "session", "lap"], engine=engine
+    )
+    assert set(fit_messages) == {"file_id", "session", "lap"}
+    date_time_columns = {
+        "file_id": ["time_created_None"],
+        "session": ["timestamp_None", "start_time_None"],
+        "lap": ["timestamp_None", "start_time_None"],
+    }
+    for name, columns in date_time_columns.items():
+        for column in columns:
+            assert str(fit_messages[name][column].dt.tz) == "US/Eastern"
+
+
+def test_a_message_missing_from_the_file_is_empty():
+    fit_messages = get_fit_file_messages(SMALL_FIT_FILES[0], ["record", "length"], engine="native")
+    assert fit_messages["length"].empty
+    assert len(fit_messages["record"]) > 0
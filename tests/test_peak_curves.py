@@ -0,0 +1,175 @@
+"""
+mean max curves against plain python loops
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.parse_fit_file import sport_peak_curve, top_average_over_time
+from analyse_fit_files.peak_curves import (
+    hold_on_second_grid,
+    log_spaced_durations,
+    mean_extreme_over_time,
+    mean_max,
+)
+
+
+def mean_max_by_loops(signal, duration):
+    best_average, best_start = np.nan, -1
+    for start in range(len(signal) - duration + 1):
+        window = signal[start : start + duration]
+        if np.isnan(window).any():
+            continue
+        average = sum(window) / duration
+        if np.isnan(best_average) or average > best_average + 1e-9:
+            best_average, best_start = average, start
+    return best_average, best_start
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mean_max_matches_loops(seed):
+    random = np.random.default_rng(seed)
+    values = random.normal(200, 50, size=(300, 2))
+    values[random.random(values.shape) < 0.02] = np.nan
+    durations = [1, 2, 5, 17, 60, 299, 300, 301]
+    best_averages, best_starts = mean_max(values, durations, return_starts=True)
+    for column in range(values.shape[1]):
+        for row, duration in enumerate(durations):
+            expected_average, expected_start = mean_max_by_loops(values[:, column], duration)
+            np.testing.assert_allclose(best_averages[row, column], expected_average)
+            assert best_starts[row, column] == expected_start
+
+
+def test_mean_max_of_one_signal():
+    values = np.array([1.0, 5.0, 2.0, 8.0, 1.0])
+    np.testing.assert_allclose(mean_max(values, [1, 2, 5]), [8.0, 5.0, 3.4])
+
+
+def test_mean_max_of_no_samples_is_missing():
+    assert np.isnan(mean_max(np.array([]), [1, 2])).all()
+    assert mean_max(np.ones((10, 3)), []).shape == (0, 3)
+
+
+def test_log_spaced_durations():
+    durations = log_spaced_durations(3600, number_of_durations=50)
+    assert durations[0] == 1 and durations[-1] == 3600
+    assert (np.diff(durations) > 0).all()
+    assert len(log_spaced_durations(0)) == 0
+
+
+@pytest.mark.parametrize("sport", ["running", "cycling"])
+def test_sport_peak_curve_matches_rolling_means(sport):
+    random = np.random.default_rng(0)
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "timestamp_None": np.arange(120),
+            "speed_m/s": random.uniform(2, 5, 120),
+            "power_watts": random.uniform(100, 300, 120),
+            "heart_rate_bpm": random.uniform(120, 180, 120),
+        },
+        index=np.arange(1, 121),
+    )
+    curve = sport_peak_curve(fit_file_dataframe, sport=sport)
+    assert list(curve.columns) == ["timestamp_None", "sport_metric", "heart_rate"]
+    assert len(curve) == 120
+    for second in (1, 7, 60, 120):
+        rolling = fit_file_dataframe.rolling(window=second).mean()
+        row = curve.iloc[second - 1]
+        expected_sport_metric = rolling["power_watts"].max()
+        if sport == "running":
+            expected_sport_metric = 1000 / 60 / rolling["speed_m/s"].max()
+        assert row["timestamp_None"] == second
+        np.testing.assert_allclose(row["sport_metric"], expected_sport_metric)
+        np.testing.assert_allclose(row["heart_rate"], rolling["heart_rate_bpm"].max())
+
+
+def mean_extreme_by_loops(seconds, values, duration, objective, gap_policy, max_gap_seconds):
+    # spread each sample over the whole seconds it lasts, the last one a typical interval
+    intervals = list(np.diff(seconds)) + [np.median(np.diff(seconds))]
+    cells = []
+    for value, interval in zip(values, intervals):
+        for second in range(int(interval)):
+            if gap_policy == "hold" or second < max_gap_seconds:
+                cells.append(value)
+            else:
+                cells.append(0.0 if gap_policy == "zero" else None)
+    best_average = np.nan
+    for start in range(len(cells) - duration + 1):
+        window = cells[start : start + duration]
+        if None in window:
+            continue
+        average = sum(window) / duration
+        if np.isnan(best_average) or (
+            average > best_average if objective == "max" else average < best_average
+        ):
+            best_average = average
+    return best_average
+
+
+@pytest.mark.parametrize("objective", ["max", "min"])
+@pytest.mark.parametrize("gap_policy", ["hold", "zero", "break"])
+def test_mean_extreme_over_time_matches_loops(objective, gap_policy):
+    random = np.random.default_rng(1)
+    # mostly one second apart with smart recording steps and pauses
+    intervals = random.choice([1, 1, 1, 1, 1, 1, 2, 3, 12], size=200)
+    seconds = np.concatenate([[0], np.cumsum(intervals)])
+    values = random.normal(3.0, 0.5, size=len(seconds))
+    durations = [1, 3, 10, 30, 120, 400]
+    best_averages = mean_extreme_over_time(
+        seconds, values, durations, objective, gap_policy, max_gap_seconds=5
+    )
+    expected = [
+        mean_extreme_by_loops(seconds, values, duration, objective, gap_policy, 5)
+        for duration in durations
+    ]
+    np.testing.assert_allclose(best_averages, expected)
+
+
+def test_a_window_crossing_every_gap_has_no_average_when_breaking():
+    seconds = [0, 1, 2, 60, 61, 62]
+    values = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    best_averages = mean_extreme_over_time(
+        seconds, values, [2, 10], "max", "break", max_gap_seconds=5
+    )
+    np.testing.assert_allclose(best_averages[0], 5.5)
+    assert np.isnan(best_averages[1])
+
+
+def test_mean_extreme_over_time_of_no_samples_is_missing():
+    assert np.isnan(mean_extreme_over_time([], [], [1, 5])).all()
+    assert np.isnan(mean_extreme_over_time([0, 1, 2], [np.nan] * 3, [1])).all()
+
+
+@pytest.mark.parametrize(
+    "option",
+    [{"objective": "mean"}, {"gap_policy": "interpolate"}],
+)
+def test_unknown_objective_or_gap_policy_is_rejected(option):
+    with pytest.raises(ValueError):
+        mean_extreme_over_time([0, 1], [1.0, 2.0], [1], **option)
+
+
+def test_top_average_over_time_uses_seconds_since_the_start():
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "timestamp_None": pd.to_datetime("2024-01-01")
+            + pd.to_timedelta([0, 1, 2, 3, 4], unit="s"),
+            "speed_m/s": [3.0, 2.0, 4.0, 1.0, 5.0],
+        }
+    )
+    top_average = top_average_over_time(fit_file_dataframe, "speed_m/s")
+    assert list(top_average["timestamp_None"]) == [1, 2, 3, 4]
+    np.testing.assert_allclose(top_average["speed_m/s"], [1.0, 2.5, 7 / 3, 2.5])
+
+
+def test_hold_on_second_grid_matches_loops():
+    seconds = np.array([0.0, 1.0, 2.5, 4.0, 12.0, 13.2])
+    values = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+    grid_seconds, grid_values = hold_on_second_grid(seconds, values, max_gap_seconds=5)
+    assert list(grid_seconds) == list(range(14))
+    for second, grid_value in zip(grid_seconds, grid_values):
+        held = max(index for index in range(len(seconds)) if seconds[index] <= second)
+        if second - seconds[held] < 5:
+            assert grid_value == values[held]
+        else:
+            assert np.isnan(grid_value)
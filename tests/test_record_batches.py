@@ -0,0 +1,70 @@
+"""
+record batches and the csv written from them
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from click.testing import CliRunner
+
+from analyse_fit_files.parse_fit_file import get_fit_file_data, iter_fit_record_batches
+from analyse_fit_files.synthetic_fit_file import write_synthetic_fit_file
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+
+@pytest.mark.parametrize("path_to_file", PUBLIC_FIT_FILES[:2], ids=os.path.basename)
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+@pytest.mark.parametrize("batch_size", [1000, 100000])
+def test_batches_are_full_and_share_one_schema(path_to_file, engine, batch_size):
+    whole_file = get_fit_file_data(path_to_file, engine=engine)
+    batches = list(iter_fit_record_batches(path_to_file, batch_size=batch_size, engine=engine))
+    assert [len(batch) for batch in batches[:-1]] == [batch_size] * (len(batches) - 1)
+    assert 0 < len(batches[-1]) <= batch_size
+    for batch in batches:
+        assert list(batch.columns) == list(whole_file.columns)
+    pd.testing.assert_frame_equal(
+        pd.concat(batches, ignore_index=True).infer_objects(),
+        whole_file.infer_objects(),
+        check_dtype=False,
+    )
+
+
+def test_the_native_decoder_streams_batches_by_default(tmp_path):
+    path_to_file = str(tmp_path / "long.fit")
+    write_synthetic_fit_file(path_to_file, hours=1.0, developer_fields=[("core_temperature", "C")])
+    whole_file = get_fit_file_data(path_to_file, engine="native")
+    batches = iter_fit_record_batches(path_to_file, batch_size=500)
+    first_batch = next(batches)
+    assert len(first_batch) == 500
+    remaining = list(batches)
+    assert [len(batch) for batch in remaining] == [500] * 6 + [100]
+    for batch in remaining:
+        assert list(batch.columns) == list(first_batch.columns) == list(whole_file.columns)
+        assert list(batch.dtypes) == list(first_batch.dtypes)
+    assert "core_temperature_C" in first_batch.columns
+    pd.testing.assert_frame_equal(
+        pd.concat([first_batch] + remaining, ignore_index=True), whole_file, check_dtype=False
+    )
+
+
+def test_unknown_engine_is_rejected_before_reading():
+    with pytest.raises(ValueError, match="engine must be one of"):
+        next(iter_fit_record_batches(PUBLIC_FIT_FILES[0], engine="fastest"))
+
+
+def test_csv_is_written_in_batches_with_one_header(tmp_path):
+    path_to_file = tmp_path / "ride.fit"
+    with open(PUBLIC_FIT_FILES[0], "rb") as file:
+        path_to_file.write_bytes(file.read())
+    fit_file_to_csv = load_script("fit_file_to_csv")
+    result = CliRunner().invoke(
+        fit_file_to_csv.main,
+        ["-path", str(path_to_file), "--batch_size", "500"],
+    )
+    assert result.exit_code == 0, result.output
+    csv_dataframe = pd.read_csv(tmp_path / "ride.csv")
+    whole_file = get_fit_file_data(str(path_to_file), engine="native")
+    assert list(csv_dataframe.columns) == list(whole_file.columns)
+    assert len(csv_dataframe) == len(whole_file)
@@ -0,0 +1,98 @@
+"""
+headless reports of fit files
+"""
+import os
+import shutil
+
+import matplotlib.pyplot as plt
+import pytest
+from click.testing import CliRunner
+
+from analyse_fit_files.parse_fit_file import get_fit_file_data, sport_peak_curve
+from analyse_fit_files.render_reports import render_reports, report_path, save_figure
+from analyse_fit_files.visualize_fit_files import draw_fit_file_data, plot_sport_peak_curve
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+
+@pytest.mark.parametrize("engine", ["fitparse", "native"])
+def test_every_signal_is_drawn_without_pyplot(engine):
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0], engine=engine)
+    plt.close("all")
+    figure = draw_fit_file_data(fit_file_dataframe, "device", max_points=200)
+    assert plt.get_fignums() == []
+    titles = [ax.get_title() for ax in figure.axes]
+    assert "Heart Rate Bpm" in titles
+    assert len(titles) > 1
+    # downsampled to about max_points, gaps add a few break points
+    assert all(len(ax.get_lines()[0].get_xdata()) < 250 for ax in figure.axes)
+
+
+def test_reports_keep_their_place_under_the_searched_folder(tmp_path):
+    path_to_file = str(tmp_path / "data" / "rides" / "activity.fit")
+    root_directory = str(tmp_path / "data")
+    output_directory = str(tmp_path / "reports")
+    assert report_path(path_to_file, output_directory, "svg", root_directory) == os.path.join(
+        output_directory, "rides", "activity_report.svg"
+    )
+    assert report_path(path_to_file, output_directory) == os.path.join(
+        output_directory, "activity_report.png"
+    )
+    assert report_path(path_to_file) == str(tmp_path / "data" / "rides" / "activity_report.png")
+
+
+def test_an_unknown_image_format_is_refused(tmp_path):
+    figure = draw_fit_file_data(get_fit_file_data(PUBLIC_FIT_FILES[0]), "device")
+    with pytest.raises(ValueError, match="image_format"):
+        save_figure(figure, str(tmp_path / "report.jpg"), "jpg")
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_a_folder_is_rendered_with_bad_files_reported(tmp_path, workers):
+    search_directory = tmp_path / "data"
+    for subdirectory, path_to_file in zip(("a", "b"), PUBLIC_FIT_FILES[:2]):
+        (search_directory / subdirectory).mkdir(parents=True)
+        shutil.copy(path_to_file, search_directory / subdirectory / "activity.fit")
+    (search_directory / "bad.fit").write_bytes(b"junk" * 10)
+    output_directory = tmp_path / "reports"
+    report_dataframe = render_reports(
+        str(search_directory), str(output_directory), workers=workers, dpi=20
+    )
+    assert len(report_dataframe) == 3
+    failed = report_dataframe[report_dataframe["error"].notna()]
+    assert list(failed["path"]) == [str(search_directory / "bad.fit")]
+    assert sorted(report_dataframe["report_path"].dropna()) == [
+        str(output_directory / "a" / "activity_report.png"),
+        str(output_directory / "b" / "activity_report.png"),
+    ]
+    for saved_path in report_dataframe["report_path"].dropna():
+        with open(saved_path, "rb") as file:
+            assert file.read(8) == b"\x89PNG\r\n\x1a\n"
+        assert os.stat(saved_path).st_mode & 0o777 == 0o644
+
+
+def test_the_render_command_reports_failures(tmp_path):
+    script = load_script("render_reports")
+    shutil.copy(PUBLIC_FIT_FILES[0], tmp_path / "activity.fit")
+    result = CliRunner().invoke(
+        script.main,
+        ["-path", str(tmp_path), "-format", "svg", "--workers", "1", "--dpi", "20"],
+    )
+    assert result.exit_code == 0, result.output
+    assert os.path.exists(tmp_path / "activity_report.svg")
+    (tmp_path / "bad.fit").write_bytes(b"junk" * 10)
+    result = CliRunner().invoke(script.main, ["-path", str(tmp_path), "--workers", "1"])
+    assert result.exit_code != 0
+    assert "1 reports could not be rendered" in result.output
+
+
+def test_a_saved_peak_curve_is_closed(tmp_path):
+    fit_file_dataframe = get_fit_file_data(PUBLIC_FIT_FILES[0])
+    plt.close("all")
+    save_path = str(tmp_path / "peak_curve.png")
+    plot_sport_peak_curve(
+        fit_file_dataframe, sport_peak_curve(fit_file_dataframe), save_path=save_path
+    )
+    assert os.path.getsize(save_path) > 0
+    assert plt.get_fignums() == []
@@ -0,0 +1,63 @@
+"""
+the fast summary scan against a full fitparse read
+"""
+import shutil
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from analyse_fit_files.parse_fit_file import get_fit_file_messages
+from analyse_fit_files.scan_fit_files import SUMMARY_COLUMNS, fit_file_summary, scan_fit_files
+from analyse_fit_files.summaries import SUMMARY_MESSAGES, activity_summary
+from analyse_fit_files.synthetic_fit_file import write_synthetic_fit_file
+
+from conftest import PUBLIC_DATA_DIRECTORY, PUBLIC_FIT_FILES, load_script
+
+
+def test_the_native_scan_matches_fitparse(public_fit_file):
+    fitparse_messages = get_fit_file_messages(
+        public_fit_file, messages=list(SUMMARY_MESSAGES), engine="fitparse"
+    )
+    summary = fit_file_summary(public_fit_file, engine="native")
+    expected = activity_summary(fitparse_messages)
+    assert {key: summary[key] for key in expected} == pytest.approx(expected)
+
+
+def test_a_long_activity_is_summarised_with_its_records_skipped(tmp_path):
+    path_to_file = str(tmp_path / "synthetic.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.5, sport="cycling")
+    summary = fit_file_summary(path_to_file)
+    assert summary["sport"] == "cycling"
+    assert summary["start_time"] == "2024-01-01 06:00:00"
+    assert summary["duration_s"] == 1800.0
+
+
+def test_a_folder_is_scanned_in_start_time_order_with_errors(tmp_path):
+    for path_to_file in PUBLIC_FIT_FILES[:3]:
+        shutil.copy(path_to_file, tmp_path)
+    (tmp_path / "bad.FIT").write_bytes(b"junk" * 10)
+    summary_dataframe = scan_fit_files(str(tmp_path), workers=2)
+    assert list(summary_dataframe.columns) == SUMMARY_COLUMNS + ["error"]
+    assert len(summary_dataframe) == 4
+    is_error = summary_dataframe["error"].notna()
+    assert list(summary_dataframe.loc[is_error, "path"]) == [str(tmp_path / "bad.FIT")]
+    assert summary_dataframe.loc[~is_error, "start_time"].is_monotonic_increasing
+    assert summary_dataframe["start_time"].dt.tz is not None
+
+
+def test_an_empty_folder_gives_an_empty_scan(tmp_path):
+    summary_dataframe = scan_fit_files(str(tmp_path))
+    assert summary_dataframe.empty
+    assert list(summary_dataframe.columns) == SUMMARY_COLUMNS + ["error"]
+
+
+def test_the_scan_command_saves_a_csv(tmp_path):
+    script = load_script("activity_catalog")
+    output_csv = str(tmp_path / "summaries.csv")
+    result = CliRunner().invoke(
+        script.main,
+        ["scan", "-path", PUBLIC_DATA_DIRECTORY, "--workers", "1", "--output_csv", output_csv],
+    )
+    assert result.exit_code == 0, result.output
+    assert sorted(pd.read_csv(output_csv)["path"]) == sorted(PUBLIC_FIT_FILES)
@@ -0,0 +1,164 @@
+"""
+splits and best segments against plain python loops
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.splits import (
+    UNIT_METERS,
+    activity_splits,
+    best_segments,
+    pace_clock_time,
+    pace_from_speed,
+)
+
+
+def synthetic_run(seed, number_of_samples=600):
+    random = np.random.default_rng(seed)
+    # smart recording steps, a standing stop and an odometer step back
+    intervals = random.choice([1, 1, 1, 2, 4], size=number_of_samples)
+    speed = random.uniform(2.5, 4.5, size=number_of_samples)
+    speed[100:120] = 0.0
+    distance = np.cumsum(intervals * speed)
+    distance[300] -= 0.5
+    return pd.DataFrame(
+        {
+            "timestamp_None": pd.Timestamp("2025-03-01 07:00", tz="US/Eastern")
+            + pd.to_timedelta(np.cumsum(intervals) - intervals[0], unit="s"),
+            "distance_m": distance,
+            "heart_rate_bpm": random.integers(120, 180, size=number_of_samples).astype(float),
+        }
+    )
+
+
+def seconds_and_distance(fit_file_dataframe):
+    timestamps = fit_file_dataframe["timestamp_None"]
+    seconds = list((timestamps - timestamps.min()).dt.total_seconds())
+    distance, furthest = [], 0.0
+    for value in fit_file_dataframe["distance_m"] - fit_file_dataframe["distance_m"].iloc[0]:
+        furthest = max(furthest, value)
+        distance.append(furthest)
+    return seconds, distance
+
+
+def seconds_at(seconds, distance, target):
+    for index in range(len(distance)):
+        if distance[index] >= target:
+            if index == 0 or distance[index] == distance[index - 1]:
+                return seconds[index]
+            fraction = (target - distance[index - 1]) / (distance[index] - distance[index - 1])
+            return seconds[index - 1] + fraction * (seconds[index] - seconds[index - 1])
+    return seconds[-1]
+
+
+def splits_by_loops(fit_file_dataframe, split_distance):
+    seconds, distance = seconds_and_distance(fit_file_dataframe)
+    boundaries = []
+    while not boundaries or boundaries[-1] < distance[-1]:
+        boundaries.append(min((len(boundaries) + 1) * split_distance, distance[-1]))
+    rows, start_seconds, start_distance = [], 0.0, 0.0
+    for number, boundary in enumerate(boundaries):
+        end_seconds = seconds_at(seconds, distance, boundary)
+        heart_rates = [
+            heart_rate
+            for sample_distance, heart_rate in zip(distance, fit_file_dataframe["heart_rate_bpm"])
+            if (number == 0 or sample_distance > boundaries[number - 1])
+            and (sample_distance <= boundary or number == len(boundaries) - 1)
+        ]
+        rows.append(
+            {
+                "split": number + 1,
+                "distance_m": boundary - start_distance,
+                "time_s": end_seconds - start_seconds,
+                "elapsed_s": end_seconds,
+                "heart_rate_bpm": sum(heart_rates) / len(heart_rates) if heart_rates else np.nan,
+            }
+        )
+        start_seconds, start_distance = end_seconds, boundary
+    return pd.DataFrame(rows)
+
+
+def best_segment_by_loops(fit_file_dataframe, segment_distance):
+    seconds, distance = seconds_and_distance(fit_file_dataframe)
+    best_seconds = np.inf
+    for end in range(len(distance)):
+        start_target = distance[end] - segment_distance
+        before = None
+        for index in range(end + 1):
+            if distance[index] <= start_target:
+                before = index
+        if before is None:
+            continue
+        after = min(before + 1, len(distance) - 1)
+        span = distance[after] - distance[before]
+        fraction = (start_target - distance[before]) / span if span > 0 else 0.0
+        start_seconds = seconds[before] + min(max(fraction, 0.0), 1.0) * (
+            seconds[after] - seconds[before]
+        )
+        best_seconds = min(best_seconds, seconds[end] - start_seconds)
+    return best_seconds
+
+
+@pytest.mark.parametrize("unit", ["km", "mile"])
+def test_splits_match_loops(unit):
+    runs = [synthetic_run(seed) for seed in range(3)]
+    splits = activity_splits(runs, unit=unit, activity_ids=["a", "b", "c"])
+    for activity_id, run in zip("abc", runs):
+        expected = splits_by_loops(run, UNIT_METERS[unit])
+        found = splits[splits["activity"] == activity_id].reset_index(drop=True)
+        pd.testing.assert_frame_equal(found[expected.columns], expected, check_dtype=False)
+
+
+def test_best_segments_match_loops():
+    runs = [synthetic_run(seed) for seed in range(3)]
+    distances = [400.0, 1000.0, 1609.34]
+    segments = best_segments(runs, distances, activity_ids=["a", "b", "c"])
+    for activity_id, run in zip("abc", runs):
+        found = segments[segments["activity"] == activity_id].set_index("distance_m")["time_s"]
+        for distance in distances:
+            np.testing.assert_allclose(found[distance], best_segment_by_loops(run, distance))
+
+
+def test_pace_from_speed():
+    np.testing.assert_allclose(pace_from_speed([0.0, 1000 / 300, 4.0]), [np.nan, 5.0, 1000 / 240])
+    np.testing.assert_allclose(pace_from_speed([1609.34 / 480], unit="mile"), [8.0])
+    assert list(pace_clock_time([4.5, np.nan, 4.999])) == ["4:30", "", "5:00"]
+
+
+@pytest.mark.parametrize(
+    "convert",
+    [
+        lambda: pace_from_speed([3.0], unit="miles"),
+        lambda: activity_splits(synthetic_run(0), unit="miles"),
+        lambda: best_segments(synthetic_run(0), unit="miles"),
+    ],
+)
+def test_an_unknown_unit_is_refused(convert):
+    with pytest.raises(ValueError, match="unit must be one of"):
+        convert()
+
+
+def test_empty_input_gives_empty_tables():
+    no_distance = pd.DataFrame({"timestamp_None": [], "heart_rate_bpm": []})
+    for fit_file_dataframes in ([], no_distance):
+        assert activity_splits(fit_file_dataframes).empty
+        assert best_segments(fit_file_dataframes).empty
+    assert "pace_min_per_mile" in activity_splits([], unit="mile").columns
+
+
+def test_activities_without_distance_keep_their_ids():
+    runs = [synthetic_run(0), pd.DataFrame({"heart_rate_bpm": [120.0]}), synthetic_run(1)]
+    splits = activity_splits(runs, activity_ids=["a", "b", "c"])
+    assert list(splits["activity"].unique()) == ["a", "c"]
+    with pytest.raises(ValueError, match="activity id"):
+        activity_splits(runs, activity_ids=["a"])
+
+
+def test_a_segment_longer_than_the_activity_is_left_out():
+    run = synthetic_run(0)
+    segments = best_segments(run, [1000.0, 1e6])
+    assert list(segments["distance_m"]) == [1000.0]
+    assert segments["end_s"].iloc[0] - segments["start_s"].iloc[0] == pytest.approx(
+        segments["time_s"].iloc[0]
+    )
@@ -0,0 +1,58 @@
+"""
+summaries of activities from their file_id, session and lap messages
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.summaries import activity_summary, json_value, local_start_times, utc_text
+
+
+def test_times_are_written_and_read_back_as_utc_text():
+    eastern_time = pd.Timestamp("2025-03-01 07:30", tz="US/Eastern")
+    assert utc_text(eastern_time) == "2025-03-01 12:30:00"
+    assert utc_text(datetime.datetime(2025, 3, 1, 12, 30)) == "2025-03-01 12:30:00"
+    assert utc_text(None) is None and utc_text(pd.NaT) is None
+    start_times = local_start_times(pd.Series(["2025-03-01 12:30:00", None]))
+    assert start_times.iloc[0] == eastern_time
+    assert pd.isna(start_times.iloc[1])
+
+
+def test_field_values_are_made_json_serialisable():
+    assert json_value(np.int16(3)) == 3 and type(json_value(np.int16(3))) is int
+    assert json_value(np.nan) is None
+    assert json_value((1.5, None, np.float32(2.0))) == [1.5, None, 2.0]
+    assert json_value(pd.Timestamp("2025-03-01 12:30", tz="UTC")) == "2025-03-01 12:30:00"
+    assert json_value(b"\x01") == "b'\\x01'"
+
+
+def test_the_sessions_of_a_multisport_activity_are_added_up():
+    start = pd.Timestamp("2025-03-01 07:00", tz="US/Eastern")
+    fit_messages = {
+        "file_id": pd.DataFrame({"manufacturer_None": ["garmin"], "serial_number_None": [123]}),
+        "session": pd.DataFrame(
+            {
+                "sport_None": ["cycling", "running"],
+                "start_time_None": [start, start + pd.Timedelta(hours=2)],
+                "total_elapsed_time_s": [7200.0, 3600.0],
+                "total_timer_time_s": [7000.0, 3500.0],
+                "total_distance_m": [60000.0, 10000.0],
+            }
+        ),
+        "lap": pd.DataFrame({"start_time_None": [start, start + pd.Timedelta(hours=2)]}),
+    }
+    summary = activity_summary(fit_messages)
+    assert summary["sport"] == "multisport"
+    assert summary["start_time"] == "2025-03-01 12:00:00"
+    assert summary["duration_s"] == 10800.0 and summary["distance_m"] == 70000.0
+    assert summary["number_of_laps"] == 2
+    assert summary["manufacturer"] == "garmin" and summary["serial_number"] == "123"
+
+
+def test_an_activity_without_sessions_is_generic():
+    created = pd.Timestamp("2025-03-01 07:00", tz="US/Eastern")
+    summary = activity_summary({"file_id": pd.DataFrame({"time_created_None": [created]})})
+    assert summary["sport"] == "generic"
+    assert summary["start_time"] == "2025-03-01 12:00:00"
+    assert summary["distance_m"] is None and summary["number_of_laps"] == 0
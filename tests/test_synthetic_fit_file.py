@@ -0,0 +1,75 @@
+"""
+the synthetic fit file writer and the benchmark suite
+"""
+import json
+import os
+import shutil
+import struct
+
+import pytest
+from click.testing import CliRunner
+
+from analyse_fit_files.parse_fit_file import get_fit_file_messages
+from analyse_fit_files.synthetic_fit_file import (
+    fit_crc,
+    synthetic_fit_file_bytes,
+    write_synthetic_fit_file,
+)
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+
+def test_the_header_and_file_crcs_check_out():
+    fit_file_bytes = synthetic_fit_file_bytes(hours=0.01)
+    header_size = fit_file_bytes[0]
+    header_crc = struct.unpack("<H", fit_file_bytes[header_size - 2 : header_size])[0]
+    assert header_crc == fit_crc(fit_file_bytes[: header_size - 2])
+    assert fit_crc(fit_file_bytes) == 0
+
+
+def test_only_the_chosen_fields_are_written(tmp_path):
+    path_to_file = str(tmp_path / "synthetic.fit")
+    write_synthetic_fit_file(path_to_file, hours=0.1, fields=["heart_rate", "power"], sport="cycling")
+    fit_messages = get_fit_file_messages(path_to_file, ["record", "session"], engine="native")
+    assert list(fit_messages["record"].columns) == [
+        "timestamp_None",
+        "heart_rate_bpm",
+        "power_watts",
+    ]
+    assert len(fit_messages["record"]) == 360
+    assert fit_messages["session"]["sport_None"].iloc[0] == "cycling"
+
+
+def test_an_unknown_field_is_rejected():
+    with pytest.raises(ValueError, match="unknown record fields"):
+        synthetic_fit_file_bytes(fields=["heart_rate", "watts"])
+
+
+def test_the_benchmark_adds_each_run_to_the_history(tmp_path):
+    benchmark = load_script("benchmark")
+    directory = tmp_path / "fit_files"
+    directory.mkdir()
+    shutil.copy(PUBLIC_FIT_FILES[0], directory)
+    history = str(tmp_path / "history.json")
+    arguments = ["--directory", str(directory), "--synthetic_hours", "0.05", "--engines", "native"]
+    arguments += ["--no_memory", "--history", history]
+    runner = CliRunner()
+    first_run = runner.invoke(benchmark.main, arguments)
+    assert first_run.exit_code == 0, first_run.output
+    second_run = runner.invoke(benchmark.main, arguments)
+    assert "compared with the previous run" in second_run.output
+    with open(history) as file:
+        runs = json.load(file)
+    assert len(runs) == 2
+    benchmarked_files = {result["file"] for result in runs[0]["results"]}
+    assert os.path.basename(PUBLIC_FIT_FILES[0]) in benchmarked_files
+    assert "synthetic_0.05h.fit" in benchmarked_files
+
+
+def test_the_benchmark_rejects_an_unknown_engine(tmp_path):
+    benchmark = load_script("benchmark")
+    result = CliRunner().invoke(
+        benchmark.main, ["--engines", "fastest", "--history", str(tmp_path / "history.json")]
+    )
+    assert result.exit_code != 0
+    assert "engines must be from" in result.output
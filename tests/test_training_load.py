@@ -0,0 +1,147 @@
+"""
+training load against plain python loops
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from analyse_fit_files.parquet_store import table_path
+from analyse_fit_files.training_load import (
+    ACUTE_TRAINING_LOAD_DAYS,
+    CHRONIC_TRAINING_LOAD_DAYS,
+    activity_training_load,
+    activity_training_loads,
+    add_fit_files_to_training_load,
+    normalized_power,
+    training_load_series,
+    update_daily_training_load,
+)
+
+from conftest import PUBLIC_DATA_DIRECTORY, PUBLIC_FIT_FILES
+
+
+def normalized_power_by_loops(seconds, watts, window_seconds=30, max_gap_seconds=5):
+    grid_watts = []
+    for second in range(int(seconds[-1]) + 1):
+        held = max(index for index in range(len(seconds)) if seconds[index] <= second)
+        if second - seconds[held] < max_gap_seconds:
+            grid_watts.append(watts[held])
+    rolling_watts = [
+        sum(grid_watts[start : start + window_seconds]) / window_seconds
+        for start in range(len(grid_watts) - window_seconds + 1)
+    ]
+    return (sum(value**4 for value in rolling_watts) / len(rolling_watts)) ** 0.25
+
+
+def test_normalized_power_matches_loops():
+    random = np.random.default_rng(0)
+    seconds = np.cumsum(random.choice([1, 1, 1, 2, 3, 20], size=400)).astype(float)
+    watts = random.normal(220, 60, size=len(seconds)).clip(0)
+    timestamps = pd.Series(pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta(seconds, "s"))
+    np.testing.assert_allclose(
+        normalized_power(timestamps, watts), normalized_power_by_loops(seconds - seconds[0], watts)
+    )
+
+
+def test_daily_training_load_matches_loops():
+    random = np.random.default_rng(1)
+    dates = pd.to_datetime("2025-01-01") + pd.to_timedelta(
+        np.sort(random.integers(0, 90, size=40)), unit="D"
+    )
+    activities = pd.DataFrame({"date": dates, "load": random.uniform(20, 200, size=len(dates))})
+    empty_daily = pd.DataFrame(columns=["date", "load", "ctl", "atl", "tsb"])
+    # added in two parts, the later part carried forward from the stored days
+    daily = update_daily_training_load(empty_daily, activities.iloc[:25])
+    daily = update_daily_training_load(daily, activities.iloc[25:])
+
+    ctl = atl = 0.0
+    day = dates.min()
+    for row in daily.itertuples():
+        assert row.date == day
+        load = activities.loc[activities["date"] == day, "load"].sum()
+        np.testing.assert_allclose(row.load, load)
+        np.testing.assert_allclose(row.tsb, ctl - atl)
+        ctl += (load - ctl) * (1 - math.exp(-1 / CHRONIC_TRAINING_LOAD_DAYS))
+        atl += (load - atl) * (1 - math.exp(-1 / ACUTE_TRAINING_LOAD_DAYS))
+        np.testing.assert_allclose([row.ctl, row.atl], [ctl, atl])
+        day += pd.Timedelta(days=1)
+    assert day - pd.Timedelta(days=1) == dates.max()
+
+
+def test_missing_thresholds_leave_the_load_missing():
+    fit_file_dataframe = pd.DataFrame(
+        {
+            "timestamp_None": pd.date_range("2025-01-01", periods=120, freq="s", tz="UTC"),
+            "power_watts": 200.0,
+        }
+    )
+    activity_load = activity_training_load(fit_file_dataframe, "a", "cycling")
+    assert np.isnan(activity_load["load"].iloc[0])
+    daily = update_daily_training_load(
+        pd.DataFrame(columns=["date", "load", "ctl", "atl", "tsb"]), activity_load
+    )
+    assert np.isnan(daily["load"].iloc[0])
+    assert daily[["ctl", "atl", "tsb"]].iloc[0].tolist() == [0.0, 0.0, 0.0]
+
+
+def test_ctl_and_atl_are_held_over_days_with_a_missing_load():
+    activities = pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                ["2025-01-01", "2025-01-02", "2025-01-02", "2025-01-03", "2025-01-05"]
+            ),
+            "load": [100.0, np.nan, np.nan, np.nan, 50.0],
+        }
+    )
+    empty_daily = pd.DataFrame(columns=["date", "load", "ctl", "atl", "tsb"])
+    daily = update_daily_training_load(empty_daily, activities)
+    assert daily["date"].dt.day.tolist() == [1, 2, 3, 4, 5]
+    np.testing.assert_array_equal(daily["load"], [100.0, np.nan, np.nan, 0.0, 50.0])
+    first_ctl = 100 * (1 - math.exp(-1 / CHRONIC_TRAINING_LOAD_DAYS))
+    np.testing.assert_allclose(daily["ctl"].iloc[:3], first_ctl)
+    np.testing.assert_allclose(
+        daily["ctl"].iloc[3], first_ctl * math.exp(-1 / CHRONIC_TRAINING_LOAD_DAYS)
+    )
+    # a known load added later to a missing day replaces the gap
+    known = pd.DataFrame({"date": pd.to_datetime(["2025-01-02"]), "load": [30.0]})
+    daily = update_daily_training_load(daily, known)
+    np.testing.assert_array_equal(daily["load"], [100.0, 30.0, np.nan, 0.0, 50.0])
+    assert daily["ctl"].iloc[2] == daily["ctl"].iloc[1] > first_ctl
+
+
+def test_nothing_new_leaves_the_store_empty(tmp_path):
+    store_directory = str(tmp_path / "store")
+    assert add_fit_files_to_training_load(str(tmp_path / "nothing"), store_directory) == []
+    assert training_load_series(store_directory, as_of="2025-01-01").empty
+    assert activity_training_loads(store_directory).empty
+
+
+def test_rest_days_decay_up_to_as_of(tmp_path):
+    store_directory = str(tmp_path)
+    empty_daily = pd.DataFrame(columns=["date", "load", "ctl", "atl", "tsb"])
+    activities = pd.DataFrame({"date": pd.to_datetime(["2025-01-01"]), "load": [100.0]})
+    daily = update_daily_training_load(empty_daily, activities)
+    daily.to_parquet(table_path(store_directory, "daily"))
+    # ten rest days are the same as a day of no load ten days on
+    rested = update_daily_training_load(
+        daily, pd.DataFrame({"date": pd.to_datetime(["2025-01-11"]), "load": [0.0]})
+    )
+    as_of = training_load_series(store_directory, as_of="2025-01-11")
+    pd.testing.assert_frame_equal(as_of, rested, check_dtype=False)
+    assert len(training_load_series(store_directory, as_of="2024-12-31")) == 0
+
+
+def test_two_devices_are_counted_once(tmp_path):
+    store_directory = str(tmp_path)
+    activity_ids = add_fit_files_to_training_load(
+        PUBLIC_DATA_DIRECTORY, store_directory, functional_threshold_power=250
+    )
+    # publicdata holds every session from a coros and a wahoo device
+    assert len(activity_ids) == len(PUBLIC_FIT_FILES)
+    activities = activity_training_loads(store_directory)
+    assert len(activities) == len(PUBLIC_FIT_FILES) // 2
+    assert set(activity_ids) == set(activities["activity_id"])
+    daily = training_load_series(store_directory)
+    np.testing.assert_allclose(daily["load"].sum(), activities["load"].sum())
+    assert add_fit_files_to_training_load(PUBLIC_DATA_DIRECTORY, store_directory) == activity_ids
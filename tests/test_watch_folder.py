@@ -0,0 +1,154 @@
+"""
+the folder watching ingestion service
+"""
+import asyncio
+import json
+import os
+import shutil
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from analyse_fit_files.watch_folder import (
+    _serve_status,
+    is_complete_fit_file,
+    new_status,
+    output_paths,
+    watch_folders,
+)
+
+from conftest import PUBLIC_FIT_FILES
+
+
+def test_a_written_fit_file_is_complete(tmp_path):
+    path_to_file = str(tmp_path / "activity.fit")
+    shutil.copy(PUBLIC_FIT_FILES[0], path_to_file)
+    assert is_complete_fit_file(path_to_file)
+
+
+def test_a_fit_file_still_being_written_is_not_complete(tmp_path):
+    with open(PUBLIC_FIT_FILES[0], "rb") as file:
+        contents = file.read()
+    short_header = tmp_path / "short_header.fit"
+    short_header.write_bytes(contents[:8])
+    truncated = tmp_path / "truncated.fit"
+    truncated.write_bytes(contents[: len(contents) // 2])
+    empty = tmp_path / "empty.fit"
+    empty.write_bytes(b"")
+    assert not is_complete_fit_file(str(short_header))
+    assert not is_complete_fit_file(str(truncated))
+    assert not is_complete_fit_file(str(empty))
+    assert not is_complete_fit_file(str(tmp_path / "missing.fit"))
+
+
+def test_a_file_without_a_fit_header_is_left_for_the_parser(tmp_path):
+    path_to_file = tmp_path / "junk.fit"
+    path_to_file.write_bytes(b"junk" * 10)
+    assert is_complete_fit_file(str(path_to_file))
+
+
+def test_outputs_keep_their_place_under_the_watched_folder(tmp_path):
+    watch_directory = str(tmp_path / "watch")
+    path_to_file = os.path.join(watch_directory, "rides", "activity.fit")
+    record_path, summary_path = output_paths(
+        path_to_file, watch_directory, str(tmp_path / "out"), "csv.gz"
+    )
+    assert record_path == str(tmp_path / "out" / "rides" / "activity.csv.gz")
+    assert summary_path == str(tmp_path / "out" / "rides" / "activity_summary.json")
+    assert output_paths(path_to_file, watch_directory)[0] == os.path.splitext(path_to_file)[0] + ".parquet"
+
+
+def test_a_dropped_fit_file_is_ingested(tmp_path):
+    watch_directory = tmp_path / "watch"
+    output_directory = tmp_path / "out"
+    (watch_directory / "rides").mkdir(parents=True)
+    status_file = str(tmp_path / "status.json")
+    status = {}
+
+    async def drop_and_wait():
+        stop_event = asyncio.Event()
+        service = asyncio.create_task(
+            watch_folders(
+                [str(watch_directory)],
+                output_directory=str(output_directory),
+                workers=1,
+                settle_seconds=0.1,
+                poll_seconds=0.05,
+                status_file=status_file,
+                status_seconds=0.1,
+                stop_event=stop_event,
+                status=status,
+            )
+        )
+        await asyncio.sleep(0.1)
+        shutil.copy(PUBLIC_FIT_FILES[0], watch_directory / "rides" / "activity.fit")
+        (watch_directory / "rides" / "notes.txt").write_text("not a fit file")
+        deadline = time.monotonic() + 60
+        while status.get("processed", 0) + status.get("failed", 0) < 1:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        stop_event.set()
+        return await service
+
+    final_status = asyncio.run(drop_and_wait())
+    assert final_status["processed"] == 1
+    assert final_status["failed"] == 0
+    record_path, summary_path = output_paths(
+        str(watch_directory / "rides" / "activity.fit"),
+        str(watch_directory),
+        str(output_directory),
+    )
+    records = pd.read_parquet(record_path)
+    assert final_status["records"] == len(records) > 0
+    with open(summary_path) as file:
+        assert json.load(file)["records"] == len(records)
+    with open(status_file) as file:
+        assert json.load(file)["processed"] == 1
+    assert sorted(os.listdir(output_directory / "rides")) == [
+        "activity.parquet",
+        "activity_summary.json",
+    ]
+
+
+def test_an_unknown_output_format_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="output_format"):
+        asyncio.run(watch_folders([str(tmp_path)], output_format="xlsx"))
+
+
+def test_the_status_is_served_over_http():
+    status = new_status(["watch"], workers=2, queue_size=4)
+    status["processed"] = 3
+
+    def get(url):
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    async def serve_and_get():
+        server = await _serve_status(status, time.perf_counter(), "127.0.0.1", 0)
+        base_url = f"http://127.0.0.1:{status['status_port']}"
+        loop = asyncio.get_running_loop()
+        try:
+            answers = [
+                await loop.run_in_executor(None, get, f"{base_url}{path}")
+                for path in ("/status", "/", "/other")
+            ]
+        finally:
+            server.close()
+            await server.wait_closed()
+        return answers
+
+    (status_code, body), (root_code, _), (missing_code, missing_body) = asyncio.run(
+        serve_and_get()
+    )
+    assert status_code == root_code == 200
+    assert body["processed"] == 3
+    assert body["workers"] == 2
+    assert body["watch_directories"] == ["watch"]
+    assert missing_code == 404
+    assert missing_body == {"error": "not found"}
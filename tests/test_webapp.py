@@ -0,0 +1,104 @@
+"""
+the web app's upload parsing and comparison plot
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+from analyse_fit_files.parse_fit_file import get_fit_file_data
+
+from conftest import PUBLIC_FIT_FILES, load_script
+
+webapp = load_script("webapp")
+
+
+class Upload(io.BytesIO):
+    """
+    an uploaded file as streamlit gives it to the app
+    """
+
+    def __init__(self, name, contents):
+        super().__init__(contents)
+        self.name = name
+
+
+def read_upload(path_to_file, name=None):
+    with open(path_to_file, "rb") as file:
+        return Upload(name or os.path.basename(path_to_file), file.read())
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    parse_calls = []
+
+    def get_cached_fit_file_data(upload):
+        parse_calls.append(upload)
+        return pd.DataFrame({"timestamp_None": [0], "size": [len(upload.getvalue())]})
+
+    monkeypatch.setattr(webapp, "get_cached_fit_file_data", get_cached_fit_file_data)
+    monkeypatch.setattr(webapp, "parse_worker_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    webapp.parsed_upload_cache()[0].clear()
+    return parse_calls
+
+
+def test_uploads_are_parsed_once_and_keyed_by_contents(parse_calls):
+    first = read_upload(PUBLIC_FIT_FILES[0], name="activity.fit")
+    second = read_upload(PUBLIC_FIT_FILES[1], name="activity.fit")
+    dataframes = webapp.parse_uploads([first, second])
+    assert len(dataframes) == 2 and "activity.fit" in dataframes
+    assert len(parse_calls) == 2
+    assert webapp.parse_uploads([first, second]).keys() == dataframes.keys()
+    assert len(parse_calls) == 2
+
+
+def test_a_failed_upload_is_left_out_and_not_parsed_again(parse_calls, monkeypatch):
+    def get_cached_fit_file_data(upload):
+        parse_calls.append(upload)
+        raise ValueError("not a fit file")
+
+    monkeypatch.setattr(webapp, "get_cached_fit_file_data", get_cached_fit_file_data)
+    broken = Upload("broken.fit", b"not a fit file")
+    assert webapp.parse_uploads([broken]) == {}
+    assert webapp.parse_uploads([broken]) == {}
+    assert len(parse_calls) == 1
+
+
+def test_only_signals_every_upload_has_are_offered():
+    dataframes = {
+        "watch": pd.DataFrame(columns=["timestamp_None", "heart_rate_bpm", "power_watts"]),
+        "strap": pd.DataFrame(columns=["timestamp_None", "heart_rate_bpm"]),
+    }
+    assert webapp.shared_signals(dataframes) == ["heart_rate_bpm"]
+
+
+def test_a_device_without_the_signal_is_left_out_of_the_plot(monkeypatch):
+    figures = []
+    monkeypatch.setattr(webapp.st, "plotly_chart", figures.append)
+    timestamps = pd.date_range("2025-01-01", periods=3, freq="1s")
+    dataframes = {
+        "watch": pd.DataFrame({"timestamp_None": timestamps, "power_watts": [200.0, 250.0, 220.0]}),
+        "strap": pd.DataFrame({"timestamp_None": timestamps, "power_watts": [np.nan] * 3}),
+        "phone": pd.DataFrame({"timestamp_None": timestamps}),
+    }
+    webapp.interactive_compare(dataframes, "power_watts")
+    (figure,) = figures
+    assert [trace.name for trace in figure.data] == ["watch"]
+
+
+def test_the_map_draws_only_simplified_outdoor_tracks(monkeypatch):
+    maps = []
+    monkeypatch.setattr(webapp.st, "map", lambda tracks, **options: maps.append(tracks))
+    outdoor = get_fit_file_data(PUBLIC_FIT_FILES[0])
+    indoor = pd.DataFrame({"timestamp_None": outdoor["timestamp_None"], "heart_rate_bpm": 120.0})
+    webapp.track_map({"indoor": indoor})
+    assert maps == []
+    webapp.track_map({"outdoor": outdoor, "indoor": indoor})
+    (tracks,) = maps
+    assert list(tracks.columns) == ["latitude_degrees", "longitude_degrees"]
+    assert 1 < len(tracks) < len(outdoor)
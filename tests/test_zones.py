@@ -0,0 +1,141 @@
+"""
+time in zones against plain python loops
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_fit_files.visualize_fit_files import histogram_compare, plot_time_in_zones
+from analyse_fit_files.zones import (
+    heart_rate_zone_edges,
+    monthly_time_in_zones,
+    pace_zone_edges,
+    power_zone_edges,
+    sample_durations,
+    time_in_zones,
+    zone_names,
+)
+
+
+def synthetic_activity(seed, number_of_samples=500):
+    random = np.random.default_rng(seed)
+    # smart recording steps and an auto pause
+    intervals = random.choice([1, 1, 1, 2, 3, 30], size=number_of_samples)
+    heart_rate = random.uniform(100, 195, size=number_of_samples)
+    heart_rate[random.random(number_of_samples) < 0.05] = np.nan
+    return pd.DataFrame(
+        {
+            "timestamp_None": pd.Timestamp("2025-05-01 06:00", tz="US/Eastern")
+            + pd.to_timedelta(np.cumsum(intervals), unit="s"),
+            "heart_rate_bpm": heart_rate,
+        }
+    )
+
+
+def zone_seconds_by_loops(fit_file_dataframe, edges, max_gap_seconds):
+    seconds = list(
+        (fit_file_dataframe["timestamp_None"] - fit_file_dataframe["timestamp_None"].iloc[0])
+        .dt.total_seconds()
+    )
+    steps = [later - earlier for earlier, later in zip(seconds, seconds[1:])]
+    typical_step = float(np.median(steps))
+    zone_seconds = [0.0] * (len(edges) + 1)
+    for index, heart_rate in enumerate(fit_file_dataframe["heart_rate_bpm"]):
+        if np.isnan(heart_rate):
+            continue
+        duration = steps[index] if index < len(steps) else typical_step
+        zone = sum(heart_rate >= edge for edge in edges)
+        zone_seconds[zone] += min(duration, max_gap_seconds)
+    return zone_seconds
+
+
+@pytest.mark.parametrize("max_gap_seconds", [5, 60])
+def test_time_in_zones_matches_loops(max_gap_seconds):
+    activities = [synthetic_activity(seed) for seed in range(4)]
+    edges = heart_rate_zone_edges(195)
+    zone_seconds = time_in_zones(
+        activities, "heart_rate_bpm", edges, max_gap_seconds=max_gap_seconds
+    )
+    for position, activity in enumerate(activities):
+        np.testing.assert_allclose(
+            zone_seconds.loc[position].to_numpy(),
+            zone_seconds_by_loops(activity, edges, max_gap_seconds),
+        )
+
+
+def test_groups_add_up_their_activities():
+    activities = [synthetic_activity(seed) for seed in range(4)]
+    edges = heart_rate_zone_edges(195)
+    per_activity = time_in_zones(activities, "heart_rate_bpm", edges)
+    per_group = time_in_zones(activities, "heart_rate_bpm", edges, groups=["a", "b", "a", "b"])
+    np.testing.assert_allclose(per_group.loc["a"], per_activity.loc[0] + per_activity.loc[2])
+    np.testing.assert_allclose(per_group.loc["b"], per_activity.loc[1] + per_activity.loc[3])
+
+
+def test_edges_must_ascend():
+    with pytest.raises(ValueError):
+        time_in_zones(synthetic_activity(0), "heart_rate_bpm", [150, 140])
+
+
+def test_zone_edges_and_names():
+    np.testing.assert_allclose(heart_rate_zone_edges(200), [120, 140, 160, 180])
+    np.testing.assert_allclose(power_zone_edges(200)[:2], [110, 150])
+    # a 5:00 per km threshold is 1000 m in 300 s
+    np.testing.assert_allclose(pace_zone_edges(5.0)[-1], 1.03 * 1000 / 300)
+    with pytest.raises(ValueError, match="unit must be one of"):
+        pace_zone_edges(5.0, unit="miles")
+    assert zone_names([120, 140], "heart_rate_bpm") == [
+        "z1 <120 bpm",
+        "z2 120-140 bpm",
+        "z3 >=140 bpm",
+    ]
+    with pytest.raises(ValueError, match="make 3 zones"):
+        time_in_zones(synthetic_activity(0), "heart_rate_bpm", [120, 140], names=["easy", "hard"])
+
+
+def test_a_pause_counts_for_at_most_the_gap():
+    timestamps = pd.Series(
+        pd.to_datetime(["2025-05-01 06:00:00", "2025-05-01 06:00:01", "2025-05-01 06:10:00"])
+    )
+    np.testing.assert_allclose(sample_durations(timestamps, max_gap_seconds=5), [1, 5, 5])
+    np.testing.assert_allclose(sample_durations(timestamps, max_gap_seconds=None), [1, 599, 300])
+
+
+def test_empty_input_and_missing_signals_have_no_time():
+    edges = heart_rate_zone_edges(195)
+    assert time_in_zones([], "heart_rate_bpm", edges).shape == (0, 5)
+    activities = [synthetic_activity(0), synthetic_activity(1).drop(columns="heart_rate_bpm")]
+    zone_seconds = time_in_zones(activities, "heart_rate_bpm", edges, activity_ids=["a", "b"])
+    assert list(zone_seconds.index) == ["a", "b"]
+    assert zone_seconds.loc["a"].sum() > 0
+    assert zone_seconds.loc["b"].sum() == 0
+    with pytest.raises(ValueError, match="activity id"):
+        time_in_zones(activities, "heart_rate_bpm", edges, activity_ids=["a"])
+
+
+def test_months_add_up_their_activities():
+    activities = [synthetic_activity(seed) for seed in range(3)]
+    activities[2]["timestamp_None"] += pd.Timedelta(days=40)
+    edges = heart_rate_zone_edges(195)
+    per_activity = time_in_zones(activities, "heart_rate_bpm", edges)
+    per_month = monthly_time_in_zones(activities, "heart_rate_bpm", edges)
+    assert list(per_month.index) == ["2025-05", "2025-06"]
+    np.testing.assert_allclose(per_month.loc["2025-05"], per_activity.loc[0] + per_activity.loc[1])
+    np.testing.assert_allclose(per_month.loc["2025-06"], per_activity.loc[2])
+
+
+def test_devices_share_histogram_bins_and_zones_are_drawn():
+    activities = [synthetic_activity(seed) for seed in range(2)]
+    activities[1]["heart_rate_bpm"] += 20
+    histogram_compare(activities, ["first", "second"], "heart_rate_bpm")
+    first_bars, second_bars = plt.gca().containers
+    np.testing.assert_allclose(
+        [patch.get_x() for patch in first_bars], [patch.get_x() for patch in second_bars]
+    )
+    plt.close("all")
+    zone_seconds = time_in_zones(activities, "heart_rate_bpm", heart_rate_zone_edges(195))
+    plot_time_in_zones(zone_seconds)
+    assert plt.gca().get_ylabel() == "hours"
+    assert len(plt.gca().containers) == zone_seconds.shape[1]
+    plt.close("all")